@@ -3,25 +3,58 @@ import os
 import logging
 from datetime import datetime
 import json
+from utils.content_purge import CONTENT_HASH_FIELD
+from utils.content_store import release_contents
+from utils.node_deletion import delete_content_objects
 
-def update_node_with_content(node_id, space_id, s3_key):
-    table_name = os.environ.get('NODES_TABLE_NAME')
-    dynamodb = boto3.client('dynamodb')
+def update_node_with_content(node_id, space_id, content_hash, s3_key, content_encoding=None):
+    """
+    Point the node at content stored with s3_utils.store_content, whose reference it takes
+    over. The content it replaces is released (or, in an unhashed layout, deleted) as by the
+    API's update handler; if the node cannot be updated, the new reference is dropped again.
+    """
+    dynamodb = boto3.resource('dynamodb')
+    nodes_table = dynamodb.Table(os.environ.get('NODES_TABLE_NAME'))
+    spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME'))
+    s3 = boto3.client('s3')
+    bucket = os.environ.get('CONTENT_BUCKET_NAME')
     now = datetime.utcnow().isoformat()
+    values = {
+        ':s': s3_key,
+        ':h': content_hash,
+        ':v': now,
+        ':u': now,
+        ':one': 1
+    }
+    update_expression = "SET s3Key = :s, contentHash = :h, contentVersion = :v, updatedAt = :u"
+    remove_parts = ['contentS3Key']
+    # Readers decode the object by the node's contentEncoding; regenerated content may be stored plain
+    if content_encoding:
+        update_expression += ", contentEncoding = :e"
+        values[':e'] = content_encoding
+    else:
+        remove_parts.append('contentEncoding')
+    update_expression += " REMOVE " + ", ".join(remove_parts)
+    # New content is a new node version, like every other write clients see (utils.node_versions)
+    update_expression += " ADD #version :one"
     try:
-        dynamodb.update_item(
-            TableName=table_name,
+        old = nodes_table.update_item(
             Key={
-                'nodeId': {'S': node_id},
-                'spaceId': {'S': space_id}
+                'nodeId': node_id,
+                'spaceId': space_id
             },
-            UpdateExpression="SET s3Key = :s, contentVersion = :v, updatedAt = :u",
-            ExpressionAttributeValues={
-                ':s': {'S': s3_key},
-                ':v': {'S': now},
-                ':u': {'S': now}
-            }
-        )
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames={'#version': 'version'},
+            ExpressionAttributeValues=values,
+            ReturnValues='UPDATED_OLD'
+        ).get('Attributes', {})
+    except Exception as e:
+        logging.error(f"Failed to update DynamoDB node: {e}")
+        release_contents(spaces_table, s3, bucket, space_id, [{CONTENT_HASH_FIELD: content_hash}])
+        raise
+    release_contents(spaces_table, s3, bucket, space_id, [old])
+    delete_content_objects(s3, bucket, [old])
+    try:
         # Publish EventBridge event after successful update
         eventbridge = boto3.client('events')
         event_bus_name = os.environ.get('EVENT_BUS_NAME', 'mindmap-events-bus-dev')
@@ -41,5 +74,5 @@ def update_node_with_content(node_id, space_id, s3_key):
         response = eventbridge.put_events(Entries=[event])
         logging.info(f"Published ContentGenerated event for node {node_id}: {response}")
     except Exception as e:
-        logging.error(f"Failed to update DynamoDB node or publish event: {e}")
+        logging.error(f"Failed to publish ContentGenerated event: {e}")
         raise
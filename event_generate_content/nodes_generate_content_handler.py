@@ -4,7 +4,7 @@ import json
 import logging
 from datetime import datetime
 from bedrock_client import BedrockClient
-from s3_utils import upload_content_to_s3
+from s3_utils import store_content
 from dynamo_utils import update_node_with_content
 
 # Configure logging
@@ -125,9 +125,9 @@ def lambda_handler(event, context):
         content_html = bedrock.generate_content(prompt)
         logger.info(f"AI content generated for node {node_id}")
         
-        # Store in S3 and update DynamoDB
-        s3_key = upload_content_to_s3(space_id, node_id, content_html)
-        update_node_with_content(node_id, space_id, s3_key)
+        # Store in S3 by hash and update DynamoDB
+        digest, s3_key, content_encoding = store_content(space_id, content_html)
+        update_node_with_content(node_id, space_id, digest, s3_key, content_encoding)
         logger.info(f"Content stored and node updated for {node_id}")
         
         return {
@@ -1,14 +1,22 @@
 import boto3
 import os
 import logging
+from utils.content_store import acquire_content
 
-def upload_content_to_s3(space_id, node_id, content_html):
+# utils/ is the API handlers' package (a symlink, bundled by serverless.yml), so generated
+# content is stored, compressed and reference-counted exactly like content saved through the API
+
+
+def store_content(space_id, content_html):
+    """
+    Store generated content by hash (utils.content_store), taking one reference for the node.
+    Returns (contentHash, s3Key, contentEncoding) for update_node_with_content.
+    """
     bucket = os.environ.get('CONTENT_BUCKET_NAME')
-    key = f'nodes/{space_id}/{node_id}/content.html'
+    spaces_table = boto3.resource('dynamodb').Table(os.environ.get('SPACES_TABLE_NAME'))
     s3 = boto3.client('s3')
     try:
-        s3.put_object(Bucket=bucket, Key=key, Body=content_html, ContentType='text/html')
-        return key
+        return acquire_content(spaces_table, s3, bucket, space_id, content_html)
     except Exception as e:
-        logging.error(f"Failed to upload content to S3: {e}")
+        logging.error(f"Failed to store content in S3: {e}")
         raise
@@ -14,23 +14,31 @@ export async function GET(
   const targetUrl = `${API_BASE}/${path}${queryString}`;
   
   try {
+    // Forward conditional request headers so the tree endpoint can answer 304 Not Modified
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    const ifNoneMatch = request.headers.get('If-None-Match');
+    if (ifNoneMatch) headers['If-None-Match'] = ifNoneMatch;
+
     const response = await fetch(targetUrl, {
       method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers,
+      cache: 'no-store',
     });
 
-    const data = await response.text();
+    const data = response.status === 304 ? null : await response.text();
+    const responseHeaders: Record<string, string> = {
+      'Content-Type': 'application/json',
+      'Access-Control-Allow-Origin': '*',
+      'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+      'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
+      'Access-Control-Expose-Headers': 'ETag',
+    };
+    const etag = response.headers.get('ETag');
+    if (etag) responseHeaders['ETag'] = etag;
     
     return new Response(data, {
       status: response.status,
-      headers: {
-        'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type',
-      },
+      headers: responseHeaders,
     });
   } catch (error) {
     return new Response(JSON.stringify({ error: 'Proxy request failed' }), {
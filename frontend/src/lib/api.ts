@@ -19,11 +19,70 @@ export interface Space {
   ownerId?: string;
   createdAt: string;
   updatedAt?: string;
+  treeVersion?: number;
   nodes?: TreeNode[];
 }
 
 export interface TreeNode extends Node {
   children: TreeNode[];
+  hasChildren?: boolean;
+  contentPreview?: string;
+  contentPending?: boolean;
+  contentError?: string;
+}
+
+// GET /spaces/{spaceId}?format=columnar: parallel arrays in breadth-first order, so every
+// parent row precedes its children. parents[i] is the row of node i's parent (-1 at the top).
+export interface ColumnarTree {
+  count: number;
+  ids: string[];
+  titles: number[];
+  parents: number[];
+  order: number[];
+  strings: string[];
+  hasChildren?: number[];
+  [column: string]: unknown;
+}
+
+const COLUMNAR_CORE = new Set(['count', 'ids', 'titles', 'parents', 'order', 'strings', 'hasChildren']);
+
+export function decodeColumnarTree(columns: ColumnarTree, spaceId: string): TreeNode[] {
+  // One pass: rows arrive parent-first and sibling-ordered, so appending keeps the server order
+  const extraColumns = Object.keys(columns).filter((key) => !COLUMNAR_CORE.has(key));
+  const nodes: TreeNode[] = new Array(columns.count);
+  const roots: TreeNode[] = [];
+  for (let row = 0; row < columns.count; row++) {
+    const parentRow = columns.parents[row];
+    const node = {
+      nodeId: columns.ids[row],
+      spaceId,
+      title: columns.strings[columns.titles[row]],
+      parentNodeId: parentRow >= 0 ? columns.ids[parentRow] : undefined,
+      orderIndex: columns.order[row],
+      children: [],
+    } as unknown as TreeNode;
+    if (columns.hasChildren) node.hasChildren = columns.hasChildren[row] === 1;
+    for (const key of extraColumns) {
+      const value = (columns[key] as unknown[])[row];
+      if (value !== null && value !== undefined) (node as unknown as Record<string, unknown>)[key] = value;
+    }
+    nodes[row] = node;
+    if (parentRow >= 0) nodes[parentRow].children.push(node);
+    else roots.push(node);
+  }
+  return roots;
+}
+
+// Background deletion started by a DELETE that answered 202 Accepted
+export interface DeleteJob {
+  jobId: string;
+  jobType?: 'deleteSpace';
+  spaceId?: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  deletedNodes?: number;
+  totalNodes?: number | null;
+  error?: string;
+  statusUrl?: string;
 }
 
 export interface Node {
@@ -33,6 +92,8 @@ export interface Node {
   content?: string;
   contentHTML?: string;
   orderIndex: number;
+  // Fractional sibling order key, only in spaces created with orderMode 'rank'
+  orderKey?: string;
   parentNodeId?: string;
   depth?: number;
   createdAt: string;
@@ -44,6 +105,24 @@ export interface NodeWithContent extends Node {
   contentHTML?: string;
 }
 
+export interface NodeChange {
+  op: 'created' | 'updated' | 'moved' | 'deleted';
+  nodeId: string;
+  node?: Partial<Pick<Node, 'title' | 'parentNodeId' | 'orderIndex' | 'orderKey' | 'updatedAt'>>;
+  contentChanged?: boolean;
+  version: number;
+}
+
+export interface SpaceChanges {
+  spaceId: string;
+  since: number;
+  nextSince: number;
+  treeVersion: number;
+  hasMore: boolean;
+  resetRequired: boolean;
+  changes: NodeChange[];
+}
+
 // User API functions
 export const userAPI = {
   async create(email: string, name: string): Promise<User> {
@@ -86,6 +165,9 @@ export const userAPI = {
   }
 };
 
+// Last tree received per space, keyed by spaceId, used for If-None-Match revalidation
+const spaceTreeCache = new Map<string, { etag: string; space: Space }>();
+
 // Spaces API functions
 export const spacesAPI = {
   async list(): Promise<Space[]> {
@@ -116,8 +198,51 @@ export const spacesAPI = {
   },
 
   async get(spaceId: string): Promise<Space> {
-    const response = await fetch(`${API_BASE}/spaces/${spaceId}`);
+    // Revalidate against the last tree we received; an unchanged space answers 304 with no body
+    const cached = spaceTreeCache.get(spaceId);
+    const response = await fetch(`${API_BASE}/spaces/${spaceId}`, {
+      headers: cached ? { 'If-None-Match': cached.etag } : undefined,
+      cache: 'no-store'
+    });
+    if (response.status === 304 && cached) return cached.space;
     if (!response.ok) throw new Error(`Failed to get space: ${response.statusText}`);
+    const space: Space = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) spaceTreeCache.set(spaceId, { etag, space });
+    return space;
+  },
+
+  async getSubtree(
+    spaceId: string,
+    options: {
+      rootNodeId?: string;
+      depth?: number;
+      include?: 'preview' | 'content';
+      format?: 'nested' | 'columnar';
+    } = {}
+  ): Promise<Space> {
+    // Lazily expanded views: nodes carry hasChildren so collapsed branches can be fetched later
+    const params = new URLSearchParams();
+    if (options.rootNodeId) params.set('rootNodeId', options.rootNodeId);
+    if (options.depth !== undefined) params.set('depth', String(options.depth));
+    // include inlines node content so the visible nodes need no per-node requests
+    if (options.include) params.set('include', options.include);
+    // columnar is a smaller payload for large trees; it is decoded back into nested nodes here
+    if (options.format === 'columnar') params.set('format', 'columnar');
+    const response = await fetch(`${API_BASE}/spaces/${spaceId}?${params.toString()}`, { cache: 'no-store' });
+    if (!response.ok) throw new Error(`Failed to get space subtree: ${response.statusText}`);
+    const data = await response.json();
+    if (data.format === 'columnar') data.nodes = decodeColumnarTree(data.nodes, spaceId);
+    return data;
+  },
+
+  async getChanges(spaceId: string, since: number | string): Promise<SpaceChanges> {
+    // 410 means the change log no longer reaches back to `since`; callers reload the tree with get()
+    const response = await fetch(`${API_BASE}/spaces/${spaceId}/changes?since=${encodeURIComponent(String(since))}`, {
+      cache: 'no-store'
+    });
+    if (response.status === 410) return response.json();
+    if (!response.ok) throw new Error(`Failed to get space changes: ${response.statusText}`);
     return response.json();
   },
 
@@ -131,11 +256,13 @@ export const spacesAPI = {
     return response.json();
   },
 
-  async delete(spaceId: string): Promise<void> {
+  async delete(spaceId: string): Promise<DeleteJob | void> {
     const response = await fetch(`${API_BASE}/spaces/${spaceId}`, {
       method: 'DELETE'
     });
     if (!response.ok) throw new Error(`Failed to delete space: ${response.statusText}`);
+    // Large spaces are deleted in the background; follow progress with jobsAPI.get
+    if (response.status === 202) return response.json();
   }
 };
 // Nodes API functions
@@ -166,6 +293,7 @@ export const nodesAPI = {
     return response.json();
   },
 
+  // Hides the node and its subtree at once; undo with restore() within the undo window
   async delete(spaceId: string, nodeId: string): Promise<void> {
     const response = await fetch(`${API_BASE}/spaces/${spaceId}/nodes/${nodeId}`, {
       method: 'DELETE'
@@ -173,6 +301,14 @@ export const nodesAPI = {
     if (!response.ok) throw new Error(`Failed to delete node: ${response.statusText}`);
   },
 
+  async restore(spaceId: string, nodeId: string): Promise<{ nodeId: string; spaceId: string; restoredNodes: number }> {
+    const response = await fetch(`${API_BASE}/spaces/${spaceId}/nodes/${nodeId}/restore`, {
+      method: 'POST'
+    });
+    if (!response.ok) throw new Error(`Failed to restore node: ${response.statusText}`);
+    return response.json();
+  },
+
   async reorder(spaceId: string, nodeOrders: Array<{ nodeId: string; newOrderIndex: number }>): Promise<void> {
     const response = await fetch(`${API_BASE}/spaces/${spaceId}/nodes/reorder`, {
       method: 'POST',
@@ -183,6 +319,15 @@ export const nodesAPI = {
   }
 };
 
+// Background job API functions
+export const jobsAPI = {
+  async get(jobId: string): Promise<DeleteJob> {
+    const response = await fetch(`${API_BASE}/jobs/${jobId}`, { cache: 'no-store' });
+    if (!response.ok) throw new Error(`Failed to get job: ${response.statusText}`);
+    return response.json();
+  }
+};
+
 // Utility function to poll for AI content generation completion
 export async function pollForContent(spaceId: string, nodeId: string, maxAttempts = 30, interval = 2000): Promise<NodeWithContent> {
   for (let attempt = 0; attempt < maxAttempts; attempt++) {
@@ -232,6 +377,10 @@ export const api = {
     return nodesAPI.delete(spaceId, nodeId);
   },
 
+  async restoreNode(spaceId: string, nodeId: string): Promise<{ nodeId: string; spaceId: string; restoredNodes: number }> {
+    return nodesAPI.restore(spaceId, nodeId);
+  },
+
   // Utility
   async pollForContent(spaceId: string, nodeId: string): Promise<NodeWithContent> {
     return pollForContent(spaceId, nodeId);
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: creating an outline of N nodes, one request per node vs. POST /nodes/batch.
+
+"per-node" is what a client importing an outline does with nodes_add_handler: for every
+node, one PutItem, one S3 PutObject if its content is large and one single-entry
+put_events call, all in sequence. "batch" runs the persistence steps of
+nodes_batch_add_handler (utils.bulk_create): concurrent content stores (an UpdateItem on
+the reference count, the upload and an UpdateItem marking it stored), parallel BatchWriteItem
+requests of 25 and put_events calls of 10 entries.
+
+Every call to DynamoDB, S3 and EventBridge sleeps for one round trip (--round-trip-ms), so
+wall time shows both the saved calls and the parallelism. The outline has fan-out 5 and a
+fifth of the nodes carry content longer than the 1,000-character inline limit; nodes
+without content get a content generation event, as in the handlers.
+Usage: python benchmarks/bench_batch_create.py [--quick] [--round-trip-ms 8]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from local_dynamodb import CallMeter, LocalDynamoDB, create_nodes_table, create_spaces_table  # noqa: E402
+from utils.bulk_create import flatten_outline, publish_created_events, put_items, store_contents  # noqa: E402
+
+SPACE_ID = 'bench-space'
+FAN_OUT = 5
+
+
+class StubS3:
+    def __init__(self, meter):
+        self.meter = meter
+
+    def put_object(self, **kwargs):
+        self.meter.record('S3PutObject')
+        return {}
+
+
+class StubEvents:
+    def __init__(self, meter):
+        self.meter = meter
+
+    def put_events(self, Entries):
+        self.meter.record('PutEvents')
+        return {'FailedEntryCount': 0}
+
+
+def make_outline(count, rng):
+    """A breadth-first filled outline of count nodes with FAN_OUT children per node."""
+    nodes = []
+    roots = []
+    for i in range(count):
+        node = {'title': f'Node {i}', 'children': []}
+        if rng.random() < 0.2:
+            node['contentHTML'] = f'<p>{i} ' + 'x' * 2_000 + '</p>'
+        (nodes[(i - FAN_OUT) // FAN_OUT]['children'] if i >= FAN_OUT else roots).append(node)
+        nodes.append(node)
+    return roots
+
+
+def run_per_node(db, table, s3_client, events_client, items, contents):
+    for item in items:
+        content = contents.get(item['nodeId'])
+        if content is not None and len(content) > 1000:
+            s3_client.put_object(Bucket='bucket', Key=f"nodes/{item['nodeId']}/content.html", Body=content)
+        table.put_item(Item=item)
+        if not content:
+            events_client.put_events(Entries=[{'Detail': json.dumps({'nodeId': item['nodeId']})}])
+
+
+def run_batch(db, table, s3_client, events_client, items, contents):
+    store_contents(create_spaces_table(db), s3_client, 'bucket', SPACE_ID, items, contents)
+    put_items(db, table.name, items)
+    publish_created_events(events_client, 'bus', [item for item in items if not contents.get(item['nodeId'])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='outlines up to 1,000 nodes')
+    parser.add_argument('--round-trip-ms', type=float, default=8.0, help='simulated latency of every call')
+    args = parser.parse_args()
+    sizes = [100, 1_000] if args.quick else [100, 1_000, 5_000]
+
+    header = f"{'nodes':>6} {'strategy':<9} {'calls':>6} {'WCU':>7} {'wall ms':>9}  calls by operation"
+    print(header)
+    print('-' * (len(header) + 30))
+    for size in sizes:
+        outline = make_outline(size, random.Random(13))
+        for label, run in (('per-node', run_per_node), ('batch', run_batch)):
+            db = LocalDynamoDB(CallMeter(round_trip_ms=args.round_trip_ms, simulate_round_trips=True))
+            table = create_nodes_table(db)
+            items, contents, _ = flatten_outline(SPACE_ID, outline, None, None, max_nodes=size)
+            started = time.perf_counter()
+            run(db, table, StubS3(db.meter), StubEvents(db.meter), items, contents)
+            wall_ms = (time.perf_counter() - started) * 1000
+            assert len(table.items) == size
+            meter = db.meter
+            calls = ' '.join(f'{op}={count}' for op, count in sorted(meter.calls.items()))
+            print(f"{size:>6} {label:<9} {meter.total_calls:>6} {meter.write_units:>7.0f} {wall_ms:>9.1f}  {calls}")
+
+
+if __name__ == '__main__':
+    main()
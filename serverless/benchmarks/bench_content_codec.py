@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: stored size, CPU and read latency of node content per codec.
+
+Documents are synthesized to look like what the content generator writes: headings,
+paragraphs of explanatory prose, bullet lists and the occasional code or table block, 2-40 KB
+each. Every codec of utils.content_codec available here (identity, gzip, and zstd when the
+zstandard package is installed) encodes and decodes all of them; CPU is process time. Read
+latency is modelled for a GET of the object as first-byte latency + size / throughput +
+decode time, the S3 figures being adjustable.
+
+Usage: python benchmarks/bench_content_codec.py [--quick] [--first-byte-ms 25] [--mbps 60]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from utils.content_codec import decode_content, encode_content, zstandard  # noqa: E402
+
+WORDS = ('the', 'process', 'energy', 'cell', 'system', 'data', 'model', 'which', 'is', 'of', 'and', 'a',
+         'structure', 'function', 'important', 'because', 'example', 'these', 'can', 'be', 'used', 'to',
+         'understand', 'how', 'key', 'concept', 'within', 'overall', 'result', 'approach', 'different',
+         'learning', 'network', 'layer', 'input', 'output', 'value', 'between', 'through', 'for', 'in')
+TOPICS = ('Photosynthesis', 'Neural Networks', 'The French Revolution', 'Plate Tectonics', 'Supply Chains')
+
+
+def sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 22))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def make_document(rng, target_bytes):
+    topic = rng.choice(TOPICS)
+    parts = [f'<h1>{topic}</h1>', f'<p>{" ".join(sentence(rng) for _ in range(3))}</p>']
+    section = 1
+    while sum(len(part) for part in parts) < target_bytes:
+        parts.append(f'<h2>{section}. {topic}: {sentence(rng)[:-1]}</h2>')
+        parts.append(f'<p>{" ".join(sentence(rng) for _ in range(rng.randint(2, 6)))}</p>')
+        roll = rng.random()
+        if roll < 0.4:
+            parts.append('<ul>' + ''.join(f'<li><strong>{rng.choice(WORDS).title()}:</strong> {sentence(rng)}</li>'
+                                          for _ in range(rng.randint(3, 7))) + '</ul>')
+        elif roll < 0.5:
+            parts.append('<pre><code>' + '\n'.join(f'{rng.choice(WORDS)} = {rng.choice(WORDS)}({rng.randint(0, 99)})'
+                                                   for _ in range(rng.randint(4, 10))) + '</code></pre>')
+        elif roll < 0.6:
+            rows = ''.join(f'<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 1000)}</td></tr>' for _ in range(5))
+            parts.append(f'<table><thead><tr><th>Term</th><th>Value</th></tr></thead><tbody>{rows}</tbody></table>')
+        section += 1
+    return '\n'.join(parts)
+
+
+def measure(codec, documents, first_byte_ms, mbps):
+    stored = encode_cpu = decode_cpu = 0.0
+    latencies = []
+    for document in documents:
+        start = time.process_time()
+        body, encoding = encode_content(document, codec=codec, min_bytes=1024)
+        encode_cpu += time.process_time() - start
+        start = time.process_time()
+        decode_content(body, encoding)
+        decode_seconds = time.process_time() - start
+        decode_cpu += decode_seconds
+        stored += len(body)
+        latencies.append(first_byte_ms + len(body) / (mbps * 1e6) * 1000 + decode_seconds * 1000)
+    return stored, encode_cpu, decode_cpu, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='200 documents instead of 2,000')
+    parser.add_argument('--first-byte-ms', type=float, default=25.0, help='modelled S3 first-byte latency')
+    parser.add_argument('--mbps', type=float, default=60.0, help='modelled S3 read throughput, MB/s')
+    args = parser.parse_args()
+    rng = random.Random(11)
+    count = 200 if args.quick else 2_000
+    documents = [make_document(rng, rng.randint(2_000, 40_000)) for _ in range(count)]
+    raw = sum(len(document.encode('utf-8')) for document in documents)
+
+    codecs = ['identity', 'gzip'] + (['zstd'] if zstandard is not None else [])
+    header = (f"{'codec':<9} {'MB stored':>9} {'ratio':>6} {'enc ms/doc':>10} {'dec ms/doc':>10} "
+              f"{'read p50 ms':>11} {'read p95 ms':>11}")
+    print(f'{count} documents, {raw / 1e6:.1f} MB of HTML'
+          + ('' if zstandard is not None else ' (zstandard not installed, zstd skipped)'))
+    print(header)
+    print('-' * len(header))
+    for codec in codecs:
+        stored, encode_cpu, decode_cpu, latencies = measure(codec, documents, args.first_byte_ms, args.mbps)
+        latencies.sort()
+        print(f'{codec:<9} {stored / 1e6:>9.2f} {stored / raw:>6.1%} {encode_cpu / count * 1000:>10.3f} '
+              f'{decode_cpu / count * 1000:>10.3f} {statistics.median(latencies):>11.2f} '
+              f'{latencies[int(len(latencies) * 0.95)]:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
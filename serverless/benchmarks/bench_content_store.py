@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: content saves with an object per save vs. content stored by hash.
+
+An editing session over a space's nodes is replayed as a stream of content saves: most are
+autosaves of unchanged content, some are edits, and some paste one of a few templates.
+"per-save" is what nodes_update_handler did before content was stored by hash: every save
+uploads a fresh object, updates the node and deletes the object it replaced. "by-hash"
+runs utils.content_store as the handler does now: acquire (upload only if the space does
+not hold the bytes yet), update the node, release the replaced content. Released objects
+are deleted later by the collector in the node reaper, so by-hash shows no S3 deletes here.
+
+S3 calls are counted by a stub; DynamoDB calls by the local table stand-in.
+Usage: python benchmarks/bench_content_store.py [--quick] [--unchanged 0.7] [--templates 0.1]
+"""
+
+import argparse
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from local_dynamodb import CallMeter, LocalDynamoDB, create_nodes_table, create_spaces_table  # noqa: E402
+from utils.content_store import ContentStats, acquire_content, release_contents  # noqa: E402
+import utils.content_store as content_store  # noqa: E402
+
+SPACE_ID = 'bench-space'
+TEMPLATES = [f'<h1>Template {i}</h1>' + '<p>lorem ipsum</p>' * 200 for i in range(3)]
+
+
+class StubS3:
+    def __init__(self, meter):
+        self.meter = meter
+        self.bytes_uploaded = 0
+
+    def put_object(self, **kwargs):
+        self.meter.record('S3PutObject')
+        self.bytes_uploaded += len(kwargs['Body'])
+        return {}
+
+    def delete_object(self, **kwargs):
+        self.meter.record('S3DeleteObject')
+        return {}
+
+
+def make_saves(nodes, count, unchanged, templates, rng):
+    """(nodeId, content) pairs: unchanged content, a template, or a fresh edit of the node."""
+    current = {node_id: f'<p>{node_id}</p>' + 'x' * 3_000 for node_id in nodes}
+    saves = []
+    for _ in range(count):
+        node_id = rng.choice(nodes)
+        roll = rng.random()
+        if roll < templates:
+            current[node_id] = rng.choice(TEMPLATES)
+        elif roll >= templates + unchanged:
+            current[node_id] = f'<p>{node_id} edit {rng.random()}</p>' + 'x' * 3_000
+        saves.append((node_id, current[node_id]))
+    return saves
+
+
+def run_per_save(nodes_table, spaces_table, s3_client, saves):
+    for node_id, content in saves:
+        key = f'{SPACE_ID}/{node_id}/{uuid.uuid4().hex}.html'
+        s3_client.put_object(Bucket='bucket', Key=key, Body=content.encode('utf-8'))
+        old = nodes_table.update_item(Key={'nodeId': node_id, 'spaceId': SPACE_ID},
+                                      UpdateExpression='SET s3Key = :sk', ExpressionAttributeValues={':sk': key},
+                                      ReturnValues='ALL_OLD').get('Attributes', {})
+        if old.get('s3Key'):
+            s3_client.delete_object(Bucket='bucket', Key=old['s3Key'])
+
+
+def run_by_hash(nodes_table, spaces_table, s3_client, saves):
+    for node_id, content in saves:
+        digest, key, _ = acquire_content(spaces_table, s3_client, 'bucket', SPACE_ID, content)
+        old = nodes_table.update_item(Key={'nodeId': node_id, 'spaceId': SPACE_ID},
+                                      UpdateExpression='SET s3Key = :sk, contentHash = :ch',
+                                      ExpressionAttributeValues={':sk': key, ':ch': digest},
+                                      ReturnValues='ALL_OLD').get('Attributes', {})
+        release_contents(spaces_table, s3_client, 'bucket', SPACE_ID, [old])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='1,000 saves instead of 10,000')
+    parser.add_argument('--unchanged', type=float, default=0.7, help='share of saves with unchanged content')
+    parser.add_argument('--templates', type=float, default=0.1, help='share of saves pasting a template')
+    args = parser.parse_args()
+    count = 1_000 if args.quick else 10_000
+    nodes = [f'node-{i}' for i in range(200)]
+    saves = make_saves(nodes, count, args.unchanged, args.templates, random.Random(7))
+
+    header = f"{'strategy':<9} {'S3 PUT':>7} {'MB up':>7} {'S3 DEL':>7} {'DDB':>6} {'avoided':>8}"
+    print(f'{count} saves over {len(nodes)} nodes')
+    print(header)
+    print('-' * len(header))
+    for label, run in (('per-save', run_per_save), ('by-hash', run_by_hash)):
+        db = LocalDynamoDB(CallMeter())
+        s3_client = StubS3(db.meter)
+        content_store.content_stats = ContentStats()
+        run(create_nodes_table(db), create_spaces_table(db), s3_client, saves)
+        calls = db.meter.calls
+        dynamodb_calls = sum(n for op, n in calls.items() if not op.startswith('S3'))
+        avoided = content_store.content_stats.metrics()['put_avoidance_ratio']
+        print(f"{label:<9} {calls.get('S3PutObject', 0):>7} {s3_client.bytes_uploaded / 1e6:>7.1f} "
+              f"{calls.get('S3DeleteObject', 0):>7} {dynamodb_calls:>6} {avoided:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
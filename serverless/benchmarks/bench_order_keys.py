@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: write amplification of sibling moves, integer orderIndex vs. fractional order keys.
+
+A sibling list of N nodes receives a burst of drag-and-drop moves. With integer positions
+every node between the old and the new position is renumbered (the write set of
+nodes_reorder_handler, which already skips unchanged positions); with order keys
+(utils.order_keys.plan_placement, as used by nodes_add/nodes_update in rank spaces) a move
+writes the moved node plus, when its key would grow past MAX_ORDER_KEY_LENGTH, the
+siblings rewritten by the rebalance.
+
+Workloads:
+  random  - a random node to a random position
+  top     - a random node to the top of the list (repeated prepends)
+  hotspot - a random node to position 1, always between the same two neighbours (worst case
+            for key growth: about one digit per six moves)
+Reported per row: item writes per move (mean and worst single move), rebalances and the
+longest key seen. Usage: python benchmarks/bench_order_keys.py [--quick]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from utils.order_keys import ORDER_KEY_FIELD, plan_placement, spread_keys  # noqa: E402
+
+WORKLOADS = {
+    'random': lambda rng, size: rng.randrange(size),
+    'top': lambda rng, size: 0,
+    'hotspot': lambda rng, size: 1,
+}
+
+
+def run_index(size, moves, target, rng):
+    order = list(range(size))
+    writes = []
+    for _ in range(moves):
+        source = rng.randrange(size)
+        destination = min(target(rng, size), size - 1)
+        order.insert(destination, order.pop(source))
+        writes.append(abs(source - destination) + 1 if source != destination else 0)
+    return writes, 0, 0
+
+
+def run_keys(size, moves, target, rng):
+    siblings = [{'nodeId': i, ORDER_KEY_FIELD: key} for i, key in enumerate(spread_keys(size))]
+    writes = []
+    rebalances = longest = 0
+    for _ in range(moves):
+        moved = siblings.pop(rng.randrange(size))
+        destination = min(target(rng, size), size - 1)
+        key, updates = plan_placement(siblings, destination)
+        if updates:
+            rebalances += 1
+            new_keys = {node_id: new_key for node_id, new_key, _ in updates}
+            for item in siblings:
+                item[ORDER_KEY_FIELD] = new_keys.get(item['nodeId'], item[ORDER_KEY_FIELD])
+        moved[ORDER_KEY_FIELD] = key
+        siblings.insert(destination, moved)
+        writes.append(1 + len(updates))
+        longest = max(longest, len(key))
+    return writes, rebalances, longest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='lists up to 1,000 nodes, fewer moves')
+    args = parser.parse_args()
+    sizes = [100, 1_000] if args.quick else [100, 1_000, 10_000]
+    moves = 2_000 if args.quick else 10_000
+
+    header = (f"{'workload':<8} {'siblings':>8} {'ordering':<8} {'writes/move':>11} {'worst move':>10} "
+              f"{'rebalances':>10} {'longest key':>11} {'ms':>8}")
+    print(f'{moves} moves per row')
+    print(header)
+    print('-' * len(header))
+    for workload, target in WORKLOADS.items():
+        for size in sizes:
+            for ordering, run in (('index', run_index), ('keys', run_keys)):
+                started = time.perf_counter()
+                writes, rebalances, longest = run(size, moves, target, random.Random(3))
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                longest_text = str(longest) if ordering == 'keys' else '-'
+                print(f"{workload:<8} {size:>8} {ordering:<8} {sum(writes) / moves:>11.2f} {max(writes):>10} "
+                      f"{rebalances:>10} {longest_text:>11} {elapsed_ms:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
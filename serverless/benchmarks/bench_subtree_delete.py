@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: discovering the subtree of a deleted node, which node_reaper_handler removes.
+
+Compares the original recursive discovery (GetItem plus an unpaginated full-table scan for
+every node of the subtree) with utils.subtree.discover_subtree + batch_get_nodes (one round
+of parallel, paginated ParentNodeIdIndex queries per level, then BatchGetItem in chunks of
+100). Subtrees of growing size are placed in a table that also holds other spaces.
+
+Reported per row: nodes found, calls by operation, read units, the serial latency model of
+local_dynamodb (one round trip per call) and wall time with every call sleeping for one
+round trip, which shows what the thread pool saves. The legacy scan as shipped ("scan")
+reads only the first 1 MB page of the table and misses nodes once the table outgrows one
+page; "scan+pag" is the same walk with paginated scans. Both are skipped above --legacy-max
+nodes. Usage: python benchmarks/bench_subtree_delete.py [--quick]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+
+from bench_tree_load import make_node, populate  # noqa: E402
+from local_dynamodb import CallMeter, LocalDynamoDB, create_nodes_table  # noqa: E402
+from utils.subtree import batch_get_nodes, discover_subtree  # noqa: E402
+
+TARGET_SPACE = 'target-space'
+OTHER_ITEMS = 5_000
+
+
+def build_table(subtree_size, seed=5):
+    """A table with OTHER_ITEMS unrelated nodes and one subtree of subtree_size nodes."""
+    rng = random.Random(seed)
+    db = LocalDynamoDB(CallMeter(simulate_round_trips=True))
+    table = create_nodes_table(db)
+    populate(table, 'other-space', OTHER_ITEMS, rng)
+    root = make_node(TARGET_SPACE, None, 0, rng)
+    ids = [root['nodeId']]
+    table.items[(root['nodeId'], TARGET_SPACE)] = root
+    for i in range(1, subtree_size):
+        node = make_node(TARGET_SPACE, rng.choice(ids), i, rng)
+        if rng.random() < 0.3:
+            node['s3Key'] = f"{TARGET_SPACE}/{node['nodeId']}.html"
+        table.items[(node['nodeId'], TARGET_SPACE)] = node
+        ids.append(node['nodeId'])
+    # Interleave the subtree with the other space, as a real table would be
+    shuffled = list(table.items.items())
+    rng.shuffle(shuffled)
+    table.items = dict(shuffled)
+    table._invalidate()
+    table._partition('ParentNodeIdIndex', root['nodeId'])  # build the index outside the timed region
+    return db, table, root['nodeId']
+
+
+def run_legacy(table, root_id, paginate=False):
+    """The discovery nodes_delete_handler shipped with, kept here as the baseline."""
+    found = []
+
+    def collect(node_id):
+        item = table.get_item(Key={'nodeId': node_id, 'spaceId': TARGET_SPACE}).get('Item')
+        if item:
+            found.append(item)
+        params = {'FilterExpression': Attr('parentNodeId').eq(node_id) & Attr('spaceId').eq(TARGET_SPACE)}
+        children = []
+        while True:
+            response = table.scan(**params)
+            children.extend(response.get('Items', []))
+            if not paginate or 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        for child in children:
+            collect(child['nodeId'])
+
+    collect(root_id)
+    return found
+
+
+def run_bfs(db, table, root_id):
+    node_ids = discover_subtree(table, TARGET_SPACE, root_id)
+    return list(batch_get_nodes(db, table.name, TARGET_SPACE, node_ids, fields=('nodeId', 's3Key')).values())
+
+
+def measure(db, fn):
+    db.meter.reset()
+    started = time.perf_counter()
+    found = fn()
+    wall_ms = (time.perf_counter() - started) * 1000
+    meter = db.meter
+    return {
+        'found': len(found),
+        'calls': ' '.join(f'{op}={count}' for op, count in sorted(meter.calls.items())),
+        'rcu': meter.read_units,
+        'modeled_ms': meter.modeled_latency_ms(),
+        'wall_ms': wall_ms
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='subtrees up to 1,000 nodes')
+    parser.add_argument('--legacy-max', type=int, default=1_000, help='largest subtree run with the legacy scan')
+    args = parser.parse_args()
+    sizes = [10, 100, 1_000] if args.quick else [10, 100, 1_000, 5_000, 20_000]
+
+    header = f"{'subtree':>7} {'strategy':<9} {'found':>6} {'RCU':>9} {'serial ms':>10} {'wall ms':>9}  calls"
+    print(header)
+    print('-' * (len(header) + 30))
+    for size in sizes:
+        db, table, root_id = build_table(size)
+        strategies = [('bfs', lambda: run_bfs(db, table, root_id))]
+        if size <= args.legacy_max:
+            strategies[:0] = [('scan', lambda: run_legacy(table, root_id)),
+                              ('scan+pag', lambda: run_legacy(table, root_id, paginate=True))]
+        for label, fn in strategies:
+            row = measure(db, fn)
+            print(f"{size:>7} {label:<9} {row['found']:>6} {row['rcu']:>9.1f} {row['modeled_ms']:>10.1f} "
+                  f"{row['wall_ms']:>9.1f}  {row['calls']}")
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10_000)
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reading a whole subtree by parent walk vs. materialized path.
+
+Both subtree consumers are measured with and without the `path` attribute:
+  fetch  - GET /spaces/{spaceId}?rootNodeId= (utils.subtree.load_subtree, depth=None):
+           one round of parallel ParentNodeIdIndex queries per level, vs. one paginated
+           begins_with query on SpacePathIndex
+  delete - subtree collection for the reaper (utils.node_deletion.collect_subtree):
+           always BFS over ParentNodeIdIndex plus BatchGetItem, since a stale path must not
+           get a node deleted; the path rows show that paths do not change its cost
+Subtrees of growing size, random ("bushy") and narrow deep ("deep") shapes, sit in a space
+that also holds other nodes.
+
+Reported per row: nodes found, calls by operation, read units, the serial latency model of
+local_dynamodb (one round trip per call) and wall time with every call sleeping for one
+round trip. Usage: python benchmarks/bench_subtree_path.py [--quick]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from bench_tree_load import make_node, populate  # noqa: E402
+from local_dynamodb import CallMeter, LocalDynamoDB, create_nodes_table  # noqa: E402
+from utils.node_deletion import collect_subtree  # noqa: E402
+from utils.node_paths import PATH_FIELD, compute_paths  # noqa: E402
+from utils.subtree import load_subtree  # noqa: E402
+
+TARGET_SPACE = 'target-space'
+OTHER_ITEMS = 5_000
+
+
+def build_table(subtree_size, shape, with_paths, seed=11):
+    """A space with OTHER_ITEMS unrelated nodes plus one subtree of subtree_size nodes."""
+    rng = random.Random(seed)
+    db = LocalDynamoDB(CallMeter(simulate_round_trips=True))
+    table = create_nodes_table(db)
+    populate(table, TARGET_SPACE, OTHER_ITEMS, rng)
+    root = make_node(TARGET_SPACE, None, 0, rng)
+    ids = [root['nodeId']]
+    table.items[(root['nodeId'], TARGET_SPACE)] = root
+    for i in range(1, subtree_size):
+        # deep: attach below one of the 3 newest nodes, giving depth ~ size / 2
+        parent = rng.choice(ids[-3:]) if shape == 'deep' else rng.choice(ids)
+        node = make_node(TARGET_SPACE, parent, i, rng)
+        table.items[(node['nodeId'], TARGET_SPACE)] = node
+        ids.append(node['nodeId'])
+    if with_paths:
+        items = list(table.items.values())
+        for node_id, path in compute_paths(items).items():
+            table.items[(node_id, TARGET_SPACE)][PATH_FIELD] = path
+    table._invalidate()
+    for index in ('ParentNodeIdIndex', 'SpacePathIndex'):
+        table._partition(index, TARGET_SPACE)  # build the indexes outside the timed region
+    return db, table, root['nodeId']
+
+
+def measure(db, fn):
+    db.meter.reset()
+    started = time.perf_counter()
+    found = fn()
+    wall_ms = (time.perf_counter() - started) * 1000
+    meter = db.meter
+    return {
+        'found': len(found),
+        'calls': ' '.join(f'{op}={count}' for op, count in sorted(meter.calls.items())),
+        'rcu': meter.read_units,
+        'modeled_ms': meter.modeled_latency_ms(),
+        'wall_ms': wall_ms
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='subtrees up to 1,000 nodes')
+    args = parser.parse_args()
+    sizes = [10, 100, 1_000] if args.quick else [10, 100, 1_000, 5_000, 20_000]
+
+    header = (f"{'shape':<6} {'subtree':>7} {'operation':<7} {'strategy':<6} {'found':>6} {'RCU':>9} "
+              f"{'serial ms':>10} {'wall ms':>9}  calls")
+    print(header)
+    print('-' * (len(header) + 30))
+    for shape in ('bushy', 'deep'):
+        for size in sizes:
+            for strategy, with_paths in (('walk', False), ('path', True)):
+                db, table, root_id = build_table(size, shape, with_paths)
+                operations = [
+                    ('fetch', lambda: load_subtree(table, TARGET_SPACE, root_node_id=root_id)[0]),
+                    ('delete', lambda: collect_subtree(db, table, TARGET_SPACE, root_id))
+                ]
+                for operation, fn in operations:
+                    row = measure(db, fn)
+                    print(f"{shape:<6} {size:>7} {operation:<7} {strategy:<6} {row['found']:>6} {row['rcu']:>9.1f} "
+                          f"{row['modeled_ms']:>10.1f} {row['wall_ms']:>9.1f}  {row['calls']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark: assembling and serializing the nested tree for GET /spaces/{spaceId}.
+
+Compares the original dict-of-dicts builder with its recursive sibling sort (followed by
+json.dumps) against utils.tree_builder (iterative assembly with __slots__ nodes, one bulk
+sort, iterative JSON writer). Three shapes are measured at each size:
+  wide    - a few roots with 1,000 children per node
+  deep    - a single chain (the legacy builder and json.dumps hit the recursion limit)
+  random  - every node hangs off a uniformly chosen earlier node
+
+Time is measured without tracing; peak memory is measured in a separate run under
+tracemalloc. Usage: python benchmarks/bench_tree_build.py [--quick] [--sizes 10000 ...]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from utils.tree_builder import assemble_tree, dumps_tree  # noqa: E402
+
+
+def legacy_build_tree(items):
+    """The builder spaces_tree_handler shipped with, kept here as the baseline."""
+    node_map = {}
+    for item in items:
+        node_id = item['nodeId']
+        node_map[node_id] = {
+            'nodeId': node_id,
+            'title': item.get('title'),
+            'parentNodeId': item.get('parentNodeId'),
+            'orderIndex': item.get('orderIndex', 0),
+            'children': []
+        }
+
+    root_nodes = []
+    for node_id in node_map:
+        node = node_map[node_id]
+        parent_id = node.get('parentNodeId')
+        if parent_id and parent_id in node_map:
+            node_map[parent_id]['children'].append(node)
+        elif not parent_id:
+            root_nodes.append(node)
+
+    def sort_children_recursive(nodes_list):
+        for node_item in nodes_list:
+            if node_item['children']:
+                node_item['children'].sort(key=lambda x: x.get('orderIndex', 0))
+                sort_children_recursive(node_item['children'])
+        return nodes_list
+
+    sort_children_recursive(root_nodes)
+    root_nodes.sort(key=lambda x: x.get('orderIndex', 0))
+    return root_nodes
+
+
+def make_items(shape, count, seed=11):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        if shape == 'wide':
+            parent = None if i < 3 else (i - 3) // 1000
+        elif shape == 'deep':
+            parent = i - 1 if i else None
+        else:
+            parent = rng.randrange(i) if i else None
+        item = {'nodeId': f'node-{i:08d}', 'title': f'Node {i}', 'orderIndex': rng.randrange(1000)}
+        if parent is not None:
+            item['parentNodeId'] = f'node-{parent:08d}'
+        items.append(item)
+    rng.shuffle(items)
+    return items
+
+
+def run_legacy(items):
+    return json.dumps(legacy_build_tree(items))
+
+
+def run_engine(items):
+    return dumps_tree(assemble_tree(items).roots)
+
+
+def measure(fn, items):
+    gc.collect()
+    started = time.perf_counter()
+    try:
+        body = fn(items)
+    except RecursionError:
+        return {'ok': False}
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    del body
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(items)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'ok': True, 'ms': elapsed_ms, 'peak_mb': peak / (1024 * 1024)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='only 10k nodes')
+    parser.add_argument('--sizes', type=int, nargs='*', help='node counts to run (default 10k 100k 1M)')
+    args = parser.parse_args()
+    sizes = args.sizes or ([10_000] if args.quick else [10_000, 100_000, 1_000_000])
+
+    header = f"{'shape':<7} {'nodes':>9} {'builder':<8} {'ms':>10} {'peak MB':>9}"
+    print(header)
+    print('-' * len(header))
+    for size in sizes:
+        for shape in ('wide', 'deep', 'random'):
+            items = make_items(shape, size)
+            for label, fn in (('legacy', run_legacy), ('engine', run_engine)):
+                row = measure(fn, items)
+                if row['ok']:
+                    print(f"{shape:<7} {size:>9} {label:<8} {row['ms']:>10.1f} {row['peak_mb']:>9.1f}")
+                else:
+                    print(f"{shape:<7} {size:>9} {label:<8} {'RecursionError':>20}")
+            del items
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nested vs columnar wire format for GET /spaces/{spaceId}.
+
+For a random tree (50k nodes by default) with realistic, partly repeated titles, compares
+  nested    - the default body: nested node objects written by iter_tree_json
+  columnar  - ?format=columnar: parallel arrays from utils.tree_builder.columnar_tree
+
+Reported per format: raw and gzip body bytes, server encode time, and client decode time.
+Decoding is approximated in Python as json.loads plus, for columnar, the O(n) rebuild into
+nested dicts that decodeColumnarTree performs in the frontend.
+Usage: python benchmarks/bench_tree_format.py [--nodes 50000]
+"""
+
+import argparse
+import gc
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from bench_tree_build import make_items  # noqa: E402
+from utils.tree_builder import assemble_tree, columnar_tree, dumps_tree  # noqa: E402
+
+TOPICS = ('Roadmap', 'Meeting notes', 'Ideas', 'Open questions', 'Research', 'Follow-ups', 'Design review')
+
+
+def with_titles(items):
+    # Mind maps repeat many short titles; the rest are unique
+    for position, item in enumerate(items):
+        if position % 3:
+            item['title'] = f"{item['title']} - discussion notes and follow-ups"
+        else:
+            item['title'] = TOPICS[position % len(TOPICS)]
+    return items
+
+
+def encode_nested(tree):
+    return dumps_tree(tree.roots)
+
+
+def encode_columnar(tree):
+    return json.dumps(columnar_tree(tree.roots))
+
+
+def decode_nested(body):
+    return json.loads(body)
+
+
+def decode_columnar(body):
+    columns = json.loads(body)
+    ids, titles, parents, order, strings = (
+        columns['ids'], columns['titles'], columns['parents'], columns['order'], columns['strings'])
+    nodes, roots = [], []
+    for row in range(columns['count']):
+        parent_row = parents[row]
+        node = {
+            'nodeId': ids[row],
+            'title': strings[titles[row]],
+            'parentNodeId': ids[parent_row] if parent_row >= 0 else None,
+            'orderIndex': order[row],
+            'children': []
+        }
+        nodes.append(node)
+        if parent_row >= 0:
+            nodes[parent_row]['children'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def timed(fn, arg):
+    gc.collect()
+    started = time.perf_counter()
+    result = fn(arg)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=50_000, help='tree size (default 50000)')
+    args = parser.parse_args()
+
+    tree = assemble_tree(with_titles(make_items('random', args.nodes)))
+    header = f"{'format':<9} {'raw bytes':>11} {'gzip bytes':>11} {'encode ms':>10} {'decode ms':>10}"
+    print(f'{args.nodes} nodes')
+    print(header)
+    print('-' * len(header))
+    for label, encode, decode in (('nested', encode_nested, decode_nested),
+                                  ('columnar', encode_columnar, decode_columnar)):
+        body, encode_ms = timed(encode, tree)
+        _, decode_ms = timed(decode, body)
+        raw = body.encode('utf-8')
+        print(f"{label:<9} {len(raw):>11} {len(gzip.compress(raw, 6)):>11} {encode_ms:>10.1f} {decode_ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark: loading one space's nodes for GET /spaces/{spaceId}.
+
+Compares the old table scan (single page, as shipped, and fully paginated) with the
+paginated SpaceIdNodesIndex query used by spaces_tree_handler. Two sweeps are run:
+  1. fixed space size, growing table  -> query cost should stay flat
+  2. fixed table size, growing space  -> query cost should grow with the space
+
+Usage: python benchmarks/bench_tree_load.py [--quick]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+
+from local_dynamodb import LocalDynamoDB, create_nodes_table  # noqa: E402
+from utils.node_queries import QueryStats, load_space_nodes  # noqa: E402
+
+TARGET_SPACE = 'target-space'
+
+
+def make_node(space_id, parent_id, order_index, rng):
+    node = {
+        'nodeId': str(uuid.UUID(int=rng.getrandbits(128))),
+        'spaceId': space_id,
+        'title': f'Node {order_index} ' + 'x' * rng.randint(5, 40),
+        'orderIndex': order_index,
+        'createdAt': '2025-01-01T00:00:00',
+        'updatedAt': '2025-01-01T00:00:00',
+        'contentPreview': '<p>' + 'lorem ipsum ' * rng.randint(5, 60) + '</p>'
+    }
+    if parent_id:
+        node['parentNodeId'] = parent_id
+    return node
+
+
+def populate(table, space_id, count, rng):
+    ids = []
+    for i in range(count):
+        parent = rng.choice(ids) if ids and rng.random() < 0.9 else None
+        node = make_node(space_id, parent, i, rng)
+        table.items[(node['nodeId'], space_id)] = node
+        ids.append(node['nodeId'])
+
+
+def build_table(total_items, space_size, seed=7):
+    rng = random.Random(seed)
+    db = LocalDynamoDB()
+    table = create_nodes_table(db)
+    populate(table, TARGET_SPACE, space_size, rng)
+    remaining, index = total_items - space_size, 0
+    while remaining > 0:
+        batch = min(remaining, 500)
+        populate(table, f'other-space-{index}', batch, rng)
+        remaining -= batch
+        index += 1
+    table._invalidate()
+    return db, table
+
+
+def run_legacy_scan(table, paginate):
+    params = {'FilterExpression': Attr('spaceId').eq(TARGET_SPACE)}
+    items = []
+    while True:
+        response = table.scan(**params)
+        items.extend(response['Items'])
+        if not paginate or 'LastEvaluatedKey' not in response:
+            return items
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def measure(db, label, fn):
+    db.meter.reset()
+    started = time.perf_counter()
+    items = fn()
+    wall_ms = (time.perf_counter() - started) * 1000
+    meter = db.meter
+    return {
+        'strategy': label,
+        'returned': len(items),
+        'calls': meter.total_calls,
+        'items_read': meter.items_read,
+        'rcu': meter.read_units,
+        'modeled_ms': meter.modeled_latency_ms(),
+        'wall_ms': wall_ms
+    }
+
+
+def run_case(total_items, space_size):
+    db, table = build_table(total_items, space_size)
+    table._partition('SpaceIdNodesIndex', TARGET_SPACE)  # build the index outside the timed region
+    return [
+        measure(db, 'scan (1 page)', lambda: run_legacy_scan(table, paginate=False)),
+        measure(db, 'scan (all pages)', lambda: run_legacy_scan(table, paginate=True)),
+        measure(db, 'query GSI', lambda: load_space_nodes(table, TARGET_SPACE, stats=QueryStats())),
+    ]
+
+
+def print_rows(title, cases):
+    print(f'\n{title}')
+    header = f"{'table':>8} {'space':>7} {'strategy':<17} {'returned':>8} {'calls':>6} " \
+             f"{'items read':>10} {'RCU':>9} {'modeled ms':>10} {'wall ms':>8}"
+    print(header)
+    print('-' * len(header))
+    for (total_items, space_size), rows in cases:
+        for row in rows:
+            print(f"{total_items:>8} {space_size:>7} {row['strategy']:<17} {row['returned']:>8} "
+                  f"{row['calls']:>6} {row['items_read']:>10} {row['rcu']:>9.1f} "
+                  f"{row['modeled_ms']:>10.1f} {row['wall_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='smaller sweep for a fast sanity run')
+    args = parser.parse_args()
+
+    table_sizes = [5_000, 20_000, 50_000] if args.quick else [10_000, 50_000, 200_000]
+    space_sizes = [100, 1_000, 4_000] if args.quick else [100, 1_000, 5_000, 20_000]
+    fixed_space = 500
+    fixed_table = table_sizes[-1]
+
+    print_rows(f'Sweep 1: space of {fixed_space} nodes, growing table',
+               [((t, fixed_space), run_case(t, fixed_space)) for t in table_sizes])
+    print_rows(f'Sweep 2: table of {fixed_table} items, growing space',
+               [((fixed_table, s), run_case(fixed_table, s)) for s in space_sizes])
+
+
+if __name__ == '__main__':
+    main()
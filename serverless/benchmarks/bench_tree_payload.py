@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: response payload size and encode time for GET /spaces/{spaceId}.
+
+For random trees of growing size, compares
+  json.dumps   - nested dicts serialized in one call (the handler before incremental encoding)
+  identity     - utils.tree_builder.iter_tree_json chunks joined into one string
+  gzip / br    - the same chunks fed incrementally to the compressor, base64-encoded
+                 for API Gateway (br only when the optional brotli package is installed)
+
+Reported per row: body size as returned by the Lambda (after base64 where applicable),
+bytes on the wire, encode time and peak memory under tracemalloc. Lambda responses are
+limited to 6 MB. Usage: python benchmarks/bench_tree_payload.py [--quick]
+"""
+
+import argparse
+import base64
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from bench_tree_build import make_items  # noqa: E402
+from utils.compression import encode_body, supported_encodings  # noqa: E402
+from utils.tree_builder import assemble_tree, iter_tree_json  # noqa: E402
+
+LAMBDA_RESPONSE_LIMIT = 6 * 1024 * 1024
+
+
+def with_titles(items):
+    # Realistic titles are longer than the synthetic "Node N"
+    for item in items:
+        item['title'] = f"{item['title']} - discussion notes and follow-ups for the quarterly plan"
+    return items
+
+
+def strategies():
+    yield 'json.dumps', lambda tree: (json.dumps(tree.to_dicts()), None, False)
+    yield 'identity', lambda tree: encode_body(iter_tree_json(tree.roots), None)
+    for encoding in reversed(supported_encodings()):
+        yield encoding, lambda tree, encoding=encoding: encode_body(iter_tree_json(tree.roots), encoding)
+
+
+def measure(fn, tree):
+    gc.collect()
+    started = time.perf_counter()
+    body, _, is_base64 = fn(tree)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    size = len(body)
+    wire = len(base64.b64decode(body)) if is_base64 else size
+    del body
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(tree)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'size': size, 'wire': wire, 'ms': elapsed_ms, 'peak_mb': peak / (1024 * 1024)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='only the smaller trees')
+    args = parser.parse_args()
+    sizes = [1_000, 10_000] if args.quick else [1_000, 10_000, 50_000, 100_000]
+
+    header = f"{'nodes':>7} {'encoding':<11} {'body bytes':>11} {'wire bytes':>11} {'ratio':>6} " \
+             f"{'ms':>8} {'peak MB':>8} {'< 6MB':>6}"
+    print(header)
+    print('-' * len(header))
+    for size in sizes:
+        tree = assemble_tree(with_titles(make_items('random', size)))
+        baseline = None
+        for label, fn in strategies():
+            row = measure(fn, tree)
+            baseline = baseline or row['wire']
+            print(f"{size:>7} {label:<11} {row['size']:>11} {row['wire']:>11} {baseline / row['wire']:>6.1f} "
+                  f"{row['ms']:>8.1f} {row['peak_mb']:>8.1f} {'yes' if row['size'] < LAMBDA_RESPONSE_LIMIT else 'no':>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+"""
+In-process DynamoDB Table stand-in for benchmarks.
+Implements the subset of the boto3 Table resource API used by the Lambda handlers and
+meters every call the way DynamoDB bills it: 1 MB pages, 4 KB read units (halved for
+eventually consistent reads) and 1 KB write units. A simple latency model
+(round trip per call plus transfer time) turns the counters into comparable milliseconds.
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+PAGE_LIMIT_BYTES = 1024 * 1024
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+
+
+def item_size(item: Dict[str, Any]) -> int:
+    """Approximate the DynamoDB item size (attribute names plus values)."""
+    return len(json.dumps(item, default=str))
+
+
+def _attr_name(operand) -> str:
+    return getattr(operand, 'name', operand)
+
+
+def _compare_value(value):
+    return Decimal(str(value)) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+
+def evaluate(condition, item: Dict[str, Any]) -> bool:
+    """Evaluate a boto3 Key/Attr condition object against an item."""
+    expression = condition.get_expression()
+    operator = expression['operator']
+    values = expression['values']
+    if operator == 'AND':
+        return evaluate(values[0], item) and evaluate(values[1], item)
+    if operator == 'OR':
+        return evaluate(values[0], item) or evaluate(values[1], item)
+    if operator == 'NOT':
+        return not evaluate(values[0], item)
+
+    name = _attr_name(values[0])
+    if operator == 'attribute_exists':
+        return name in item
+    if operator == 'attribute_not_exists':
+        return name not in item
+    if name not in item:
+        return False
+    actual = _compare_value(item[name])
+    operands = [_compare_value(v) for v in values[1:]]
+    if operator == '=':
+        return actual == operands[0]
+    if operator == '<>':
+        return actual != operands[0]
+    if operator == '<':
+        return actual < operands[0]
+    if operator == '<=':
+        return actual <= operands[0]
+    if operator == '>':
+        return actual > operands[0]
+    if operator == '>=':
+        return actual >= operands[0]
+    if operator == 'BETWEEN':
+        return operands[0] <= actual <= operands[1]
+    if operator == 'begins_with':
+        return str(actual).startswith(operands[0])
+    if operator == 'IN':
+        return actual in operands[0]
+    raise NotImplementedError(f'Unsupported condition operator: {operator}')
+
+
+def _key_conditions(condition) -> List[Tuple[str, str, list]]:
+    """Flatten a KeyConditionExpression into (attribute, operator, values) tuples."""
+    expression = condition.get_expression()
+    if expression['operator'] == 'AND':
+        return _key_conditions(expression['values'][0]) + _key_conditions(expression['values'][1])
+    return [(_attr_name(expression['values'][0]), expression['operator'], list(expression['values'][1:]))]
+
+
+def _project(item: Dict[str, Any], projection: Optional[str], names: Dict[str, str]) -> Dict[str, Any]:
+    if not projection:
+        return dict(item)
+    fields = [names.get(part.strip(), part.strip()) for part in projection.split(',')]
+    return {field: item[field] for field in fields if field in item}
+
+
+class CallMeter:
+    """Request counters shared by every table of a LocalDynamoDB instance."""
+
+    def __init__(self, round_trip_ms: float = 4.0, transfer_mb_per_s: float = 50.0,
+                 simulate_round_trips: bool = False):
+        self.round_trip_ms = round_trip_ms
+        self.transfer_mb_per_s = transfer_mb_per_s
+        # Sleep for one round trip per call, so wall-clock time reflects client-side parallelism
+        self.simulate_round_trips = simulate_round_trips
+        self._lock = threading.Lock()  # handlers issue calls from worker threads
+        self.reset()
+
+    def reset(self):
+        self.calls = {}
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.bytes_read = 0
+        self.bytes_returned = 0
+        self.items_read = 0
+
+    def record(self, operation: str, read_units: float = 0.0, write_units: float = 0.0,
+               bytes_read: int = 0, bytes_returned: int = 0, items_read: int = 0):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            self.read_units += read_units
+            self.write_units += write_units
+            self.bytes_read += bytes_read
+            self.bytes_returned += bytes_returned
+            self.items_read += items_read
+        if self.simulate_round_trips:
+            time.sleep(self.round_trip_ms / 1000)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def modeled_latency_ms(self, parallelism: int = 1) -> float:
+        """Latency estimate: one round trip per call plus payload transfer time."""
+        transfer_ms = self.bytes_returned / (self.transfer_mb_per_s * 1024 * 1024) * 1000
+        return (self.total_calls * self.round_trip_ms + transfer_ms) / max(parallelism, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'calls': dict(self.calls),
+            'total_calls': self.total_calls,
+            'read_units': round(self.read_units, 1),
+            'write_units': round(self.write_units, 1),
+            'items_read': self.items_read,
+            'bytes_returned': self.bytes_returned
+        }
+
+
+class LocalTable:
+    """A single table with optional global secondary indexes."""
+
+    def __init__(self, name: str, hash_key: str, range_key: Optional[str] = None,
+                 indexes: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+                 meter: Optional[CallMeter] = None):
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes or {}
+        self.meter = meter or CallMeter()
+        self.items: Dict[tuple, Dict[str, Any]] = {}
+        self._index_cache: Dict[str, Dict[Any, List[Dict[str, Any]]]] = {}
+        self._index_lock = threading.Lock()
+
+    # -- helpers -----------------------------------------------------------------
+
+    def _key_of(self, item: Dict[str, Any]) -> tuple:
+        return (item[self.hash_key], item.get(self.range_key) if self.range_key else None)
+
+    def _invalidate(self):
+        self._index_cache.clear()
+
+    def _partition(self, index_name: Optional[str], hash_value) -> List[Dict[str, Any]]:
+        if index_name is None:
+            hash_key, range_key = self.hash_key, self.range_key
+        else:
+            hash_key, range_key = self.indexes[index_name]
+        cache_name = index_name or ''
+        with self._index_lock:
+            return self._build_partitions(cache_name, hash_key, range_key).get(hash_value, [])
+
+    def _build_partitions(self, cache_name, hash_key, range_key) -> Dict[Any, List[Dict[str, Any]]]:
+        if cache_name not in self._index_cache:
+            partitions: Dict[Any, List[Dict[str, Any]]] = {}
+            for item in self.items.values():
+                if hash_key in item and (range_key is None or range_key in item):
+                    partitions.setdefault(item[hash_key], []).append(item)
+            for partition in partitions.values():
+                if range_key:
+                    partition.sort(key=lambda i: (_compare_value(i[range_key]), i[self.hash_key]))
+            self._index_cache[cache_name] = partitions
+        return self._index_cache[cache_name]
+
+    def _read_page(self, candidates, start_index: int, limit: Optional[int], consistent: bool):
+        """Walk candidates from start_index, honouring Limit and the 1 MB page size."""
+        page, size, position = [], 0, start_index
+        while position < len(candidates):
+            if limit is not None and len(page) >= limit:
+                break
+            if size >= PAGE_LIMIT_BYTES:
+                break
+            item = candidates[position]
+            page.append(item)
+            size += item_size(item)
+            position += 1
+        units = math.ceil(size / READ_UNIT_BYTES) if size else 1
+        if not consistent:
+            units /= 2
+        return page, position, size, units
+
+    # -- boto3 Table API ---------------------------------------------------------
+
+    def put_item(self, Item, **kwargs):
+        self.items[self._key_of(Item)] = dict(Item)
+        self._invalidate()
+        self.meter.record('PutItem', write_units=math.ceil(item_size(Item) / WRITE_UNIT_BYTES))
+        return {}
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None,
+                 ExpressionAttributeNames=None, **kwargs):
+        item = self.items.get(self._key_of(Key))
+        size = item_size(item) if item else 0
+        units = max(1, math.ceil(size / READ_UNIT_BYTES)) / (1 if ConsistentRead else 2)
+        self.meter.record('GetItem', read_units=units, bytes_read=size, bytes_returned=size,
+                          items_read=1 if item else 0)
+        if not item:
+            return {}
+        return {'Item': _project(item, ProjectionExpression, ExpressionAttributeNames or {})}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        """SET a = :v / if_not_exists(a, :v), ADD n :v and REMOVE a clauses; conditions are not evaluated."""
+        values = ExpressionAttributeValues or {}
+        old = self.items.get(self._key_of(Key))
+        item = dict(old or Key)
+        updated = []
+        for action, body in re.findall(r'(SET|ADD|REMOVE)\s+(.*?)(?=\s+(?:SET|ADD|REMOVE)\s|$)', UpdateExpression):
+            # Commas inside if_not_exists(...) do not separate clauses
+            for clause in re.split(r',(?![^()]*\))', body):
+                if action == 'REMOVE':
+                    item.pop(clause.strip(), None)
+                    continue
+                if action == 'SET':
+                    name, operand = (part.strip() for part in clause.split('=', 1))
+                    default = re.match(r'if_not_exists\(\s*(\w+)\s*,\s*(:\w+)\s*\)', operand)
+                    item[name] = item.get(default.group(1), values[default.group(2)]) if default else values[operand]
+                else:
+                    name, placeholder = clause.split()
+                    item[name] = item.get(name, 0) + values[placeholder]
+                updated.append(name)
+        self.items[self._key_of(item)] = item
+        self._invalidate()
+        self.meter.record('UpdateItem', write_units=math.ceil(item_size(item) / WRITE_UNIT_BYTES))
+        if ReturnValues == 'ALL_OLD':
+            return {'Attributes': dict(old)} if old else {}
+        if ReturnValues == 'UPDATED_NEW':
+            return {'Attributes': {name: item[name] for name in updated}}
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        existing = self.items.pop(self._key_of(Key), None)
+        self._invalidate()
+        size = item_size(existing) if existing else 0
+        self.meter.record('DeleteItem', write_units=max(1, math.ceil(size / WRITE_UNIT_BYTES)))
+        return {}
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, ExclusiveStartKey=None,
+              Limit=None, ConsistentRead=False, ScanIndexForward=True, **kwargs):
+        conditions = _key_conditions(KeyConditionExpression)
+        hash_name, _, hash_values = conditions[0]
+        candidates = self._partition(IndexName, hash_values[0])
+        for name, operator, values in conditions[1:]:
+            candidates = [c for c in candidates if evaluate(_SimpleCondition(name, operator, values), c)]
+        if not ScanIndexForward:
+            candidates = list(reversed(candidates))
+        start = ExclusiveStartKey['_position'] if ExclusiveStartKey else 0
+        page, position, size, units = self._read_page(candidates, start, Limit, ConsistentRead)
+        return self._page_response('Query', page, position, len(candidates), size, units,
+                                   FilterExpression, ProjectionExpression, ExpressionAttributeNames)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExclusiveStartKey=None, Limit=None, ConsistentRead=False, **kwargs):
+        candidates = list(self.items.values())
+        start = ExclusiveStartKey['_position'] if ExclusiveStartKey else 0
+        page, position, size, units = self._read_page(candidates, start, Limit, ConsistentRead)
+        return self._page_response('Scan', page, position, len(candidates), size, units,
+                                   FilterExpression, ProjectionExpression, ExpressionAttributeNames)
+
+    def _page_response(self, operation, page, position, total, size, units,
+                       filter_expression, projection, names):
+        matched = [item for item in page if filter_expression is None or evaluate(filter_expression, item)]
+        returned = [_project(item, projection, names or {}) for item in matched]
+        returned_size = sum(item_size(item) for item in returned)
+        self.meter.record(operation, read_units=units, bytes_read=size,
+                          bytes_returned=returned_size, items_read=len(page))
+        response = {
+            'Items': returned,
+            'Count': len(returned),
+            'ScannedCount': len(page),
+            'ConsumedCapacity': {'TableName': self.name, 'CapacityUnits': units}
+        }
+        if position < total:
+            response['LastEvaluatedKey'] = {'_position': position}
+        return response
+
+
+class _SimpleCondition:
+    """Adapter so flattened key conditions can reuse evaluate()."""
+
+    def __init__(self, name, operator, values):
+        self._expression = {'operator': operator, 'values': [name] + list(values)}
+
+    def get_expression(self):
+        return self._expression
+
+
+class LocalDynamoDB:
+    """Container mimicking boto3.resource('dynamodb') for a fixed set of tables."""
+
+    def __init__(self, meter: Optional[CallMeter] = None):
+        self.meter = meter or CallMeter()
+        self.tables: Dict[str, LocalTable] = {}
+
+    def create_table(self, name: str, hash_key: str, range_key: Optional[str] = None,
+                     indexes: Optional[Dict[str, Tuple[str, Optional[str]]]] = None) -> LocalTable:
+        table = LocalTable(name, hash_key, range_key, indexes, meter=self.meter)
+        self.tables[name] = table
+        return table
+
+    def Table(self, name: str) -> LocalTable:
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        """BatchGetItem: every key is processed; capacity is billed per item as in DynamoDB."""
+        responses, capacity = {}, []
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            names = request.get('ExpressionAttributeNames') or {}
+            found, units, size = [], 0.0, 0
+            for key in request['Keys']:
+                item = table.items.get(table._key_of(key))
+                item_bytes = item_size(item) if item else 0
+                units += max(1, math.ceil(item_bytes / READ_UNIT_BYTES)) / (1 if request.get('ConsistentRead') else 2)
+                if item:
+                    found.append(_project(item, request.get('ProjectionExpression'), names))
+                    size += item_bytes
+            responses[name] = found
+            capacity.append({'TableName': name, 'CapacityUnits': units})
+            self.meter.record('BatchGetItem', read_units=units, bytes_read=size,
+                              bytes_returned=sum(item_size(item) for item in found), items_read=len(found))
+        return {'Responses': responses, 'UnprocessedKeys': {}, 'ConsumedCapacity': capacity}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        """BatchWriteItem: every put and delete is applied; capacity is billed per item as in DynamoDB."""
+        capacity = []
+        for name, requests in RequestItems.items():
+            table = self.tables[name]
+            units = 0.0
+            for request in requests:
+                if 'PutRequest' in request:
+                    item = request['PutRequest']['Item']
+                    table.items[table._key_of(item)] = dict(item)
+                else:
+                    item = table.items.pop(table._key_of(request['DeleteRequest']['Key']), None) or {}
+                units += max(1, math.ceil(item_size(item) / WRITE_UNIT_BYTES))
+            table._invalidate()
+            capacity.append({'TableName': name, 'CapacityUnits': units})
+            self.meter.record('BatchWriteItem', write_units=units)
+        return {'UnprocessedItems': {}, 'ConsumedCapacity': capacity}
+
+
+def create_spaces_table(db: LocalDynamoDB, name: str = 'Spaces') -> LocalTable:
+    """Create a table keyed like SpacesTableSls in serverless.yml (PK, SK)."""
+    return db.create_table(name, 'PK', 'SK')
+
+
+def create_nodes_table(db: LocalDynamoDB, name: str = 'Nodes') -> LocalTable:
+    """Create a table shaped like NodesTableSls in serverless.yml."""
+    return db.create_table(name, 'nodeId', 'spaceId', indexes={
+        'SpaceIdNodesIndex': ('spaceId', 'orderIndex'),
+        'ParentNodeIdIndex': ('parentNodeId', 'orderIndex'),
+        'SpacePathIndex': ('spaceId', 'path'),
+        'TombstonesIndex': ('tombstone', 'deletedAt')
+    })
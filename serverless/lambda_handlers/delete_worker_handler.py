@@ -0,0 +1,112 @@
+import boto3
+import os
+from boto3.dynamodb.conditions import Key
+from utils.bulk_delete import delete_pages
+from utils.change_log import purge_change_log
+from utils.content_store import purge_content_records
+from utils.content_purge import purge_prefixes, space_content_prefixes
+from utils.delete_jobs import (DELETE_CHUNK_SIZE, DELETE_SPACE, FAILED, FINISHED_STATUSES, RUNNING, SUCCEEDED,
+                               enqueue_job, finish_job, get_job, update_job)
+from utils.node_deletion import DELETE_FIELDS, delete_content_objects
+from utils.logger import StructuredLogger
+from utils.node_queries import SPACE_NODES_INDEX, projection_params, query_cursor_pages
+
+# Initialize structured logger
+logger = StructuredLogger('delete_worker_handler')
+
+dynamodb = boto3.resource('dynamodb')
+nodes_table = dynamodb.Table(os.environ.get('NODES_TABLE_NAME', 'Nodes'))
+spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+s3_client = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+
+# Stop taking new chunks when less than this much of the invocation is left
+TIME_MARGIN_MS = int(os.environ.get('DELETE_WORKER_TIME_MARGIN_MS', '60000'))
+
+
+def out_of_time(context):
+    return context is not None and context.get_remaining_time_in_millis() < TIME_MARGIN_MS
+
+
+def run_space_job(job, context):
+    """
+    Delete every node of a space whose META item is already gone. SpaceIdNodesIndex pages are
+    pipelined into parallel BatchWriteItem workers; the query cursor of the last fully deleted
+    page is saved with the progress, so a resumed run continues from it.
+    Returns False if the invocation ran out of time.
+    """
+    space_id = job['targetSpaceId']
+    params = dict(projection_params(DELETE_FIELDS),
+                  IndexName=SPACE_NODES_INDEX,
+                  KeyConditionExpression=Key('spaceId').eq(space_id),
+                  Limit=DELETE_CHUNK_SIZE)
+    if job.get('cursor'):
+        params['ExclusiveStartKey'] = job['cursor']
+    state = {'finished': False}
+
+    def key_pages():
+        for items, cursor in query_cursor_pages(nodes_table, **params):
+            delete_content_objects(s3_client, content_bucket_name, items)
+            yield [{'nodeId': item['nodeId'], 'spaceId': space_id} for item in items], cursor
+            if cursor is None:
+                state['finished'] = True
+            elif out_of_time(context):
+                return
+
+    def on_page_done(deleted, cursor):
+        update_job(spaces_table, job['jobId'], deleted=deleted, cursor=cursor)
+
+    stats = delete_pages(dynamodb, nodes_table.name, key_pages(), on_page_done=on_page_done)
+    logger.performance(
+        operation='space_nodes_delete',
+        execution_time_ms=stats.elapsed_seconds * 1000,
+        correlation_id=job['jobId'],
+        additional_metrics=dict(stats.as_dict(), space_id=space_id, finished=state['finished'])
+    )
+    if not state['finished']:
+        return False
+
+    # Objects left behind by nodes deleted earlier, plus the tree snapshot
+    result = purge_prefixes(s3_client, content_bucket_name, space_content_prefixes(space_id))
+    print(f"Purged S3 prefixes of space {space_id}: {result.as_dict()}")
+    try:
+        purge_change_log(spaces_table, space_id)
+        purge_content_records(spaces_table, space_id)
+    except Exception as e:
+        print(f"Failed to purge change log for space {space_id}: {e}")
+    return True
+
+
+JOB_RUNNERS = {
+    DELETE_SPACE: run_space_job
+}
+
+
+def lambda_handler(event, context):
+    """
+    Runs a background delete job created by spaces_delete_handler.
+    Invoked asynchronously with {"jobId": ...}; continues in a fresh invocation before timing out.
+    """
+    job_id = event.get('jobId')
+    job = get_job(spaces_table, job_id) if job_id else None
+    if not job or job['status'] in FINISHED_STATUSES:
+        print(f"Nothing to do for delete job {job_id}")
+        return {'jobId': job_id, 'status': job['status'] if job else None}
+
+    try:
+        update_job(spaces_table, job_id, status=RUNNING)
+        if not JOB_RUNNERS[job['jobType']](job, context):
+            # Checkpointed; pick up where this invocation stopped
+            enqueue_job(lambda_client, job_id, function_name=getattr(context, 'function_name', None))
+            print(f"Delete job {job_id} continues in a new invocation")
+            return {'jobId': job_id, 'status': RUNNING}
+        finish_job(spaces_table, job_id, SUCCEEDED)
+        print(f"Delete job {job_id} finished")
+        return {'jobId': job_id, 'status': SUCCEEDED}
+
+    except Exception as e:
+        # Deletion is restartable: a new DELETE request resumes from what is left
+        print(f"Delete job {job_id} failed: {e}")
+        finish_job(spaces_table, job_id, FAILED, error=str(e))
+        return {'jobId': job_id, 'status': FAILED, 'error': str(e)}
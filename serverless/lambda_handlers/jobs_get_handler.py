@@ -0,0 +1,80 @@
+import json
+import boto3
+import decimal
+import os
+import time
+import traceback
+from utils.delete_jobs import get_job, job_view
+from utils.logger import StructuredLogger, extract_correlation_id
+
+# Initialize structured logger
+logger = StructuredLogger('jobs_get_handler')
+
+dynamodb = boto3.resource('dynamodb')
+SPACES_TABLE_NAME = os.environ.get('SPACES_TABLE_NAME', 'Spaces')
+spaces_table = dynamodb.Table(SPACES_TABLE_NAME)
+
+# Helper class to convert Decimal to float/int for JSON serialization
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, decimal.Decimal):
+            # Convert decimal to int or float
+            if o % 1 > 0:
+                return float(o)
+            else:
+                return int(o)
+        return super(DecimalEncoder, self).default(o)
+
+
+def lambda_handler(event, context):
+    """
+    Returns the status and progress of a background delete job.
+    Required path parameter: jobId
+    """
+    start_time = time.time()
+    correlation_id = extract_correlation_id(event)
+    job_id = (event.get('pathParameters') or {}).get('jobId')
+
+    try:
+        if not job_id:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'jobId is required in path parameters'})
+            }
+
+        job = get_job(spaces_table, job_id)
+        if job is None:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Job not found'})
+            }
+
+        response = {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'},
+            'body': json.dumps(job_view(job), cls=DecimalEncoder)
+        }
+        logger.response(
+            status_code=200,
+            correlation_id=correlation_id,
+            response_size=len(response['body']),
+            execution_time_ms=(time.time() - start_time) * 1000
+        )
+        return response
+
+    except Exception as e:
+        logger.error(
+            error_type=type(e).__name__,
+            message=f"Error in jobs get handler: {str(e)}",
+            correlation_id=correlation_id,
+            stack_trace=traceback.format_exc(),
+            error_code="JOB_GET_FAILED",
+            additional_context={"job_id": job_id}
+        )
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Could not get job', 'details': str(e)}, default=str)
+        }
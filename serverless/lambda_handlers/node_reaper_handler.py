@@ -0,0 +1,162 @@
+import boto3
+import os
+import time
+import traceback
+from botocore.exceptions import ClientError
+from utils.content_store import collect_released_content, release_contents
+from utils.logger import StructuredLogger, extract_correlation_id
+from utils.node_deletion import collect_subtree, delete_content_objects, remove_node_items
+from utils.node_queries import QueryStats
+from utils.tombstones import expired_tombstones, undo_cutoff
+
+# Initialize structured logger
+logger = StructuredLogger('node_reaper_handler')
+
+dynamodb = boto3.resource('dynamodb')
+nodes_table = dynamodb.Table(os.environ.get('NODES_TABLE_NAME', 'Nodes'))
+spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+s3_client = boto3.client('s3')
+content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+
+REAPER_CHUNK_SIZE = int(os.environ.get('REAPER_CHUNK_SIZE', '100'))
+# Deletes are spaced out so reaping never competes with user traffic for write capacity
+MAX_DELETES_PER_SECOND = float(os.environ.get('REAPER_MAX_DELETES_PER_SECOND', '200'))
+# Stop taking new chunks when less than this much of the invocation is left
+TIME_MARGIN_MS = int(os.environ.get('REAPER_TIME_MARGIN_MS', '30000'))
+
+
+class RateLimiter:
+    """Paces work to at most per_second units per second (no limit when per_second <= 0)."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self.next_at = time.monotonic()
+
+    def acquire(self, count: int):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + count * self.interval
+
+
+def out_of_time(context):
+    return context is not None and context.get_remaining_time_in_millis() < TIME_MARGIN_MS
+
+
+def reap_subtree(space_id, node_id, deleted_at, limiter, context):
+    """
+    Delete a tombstoned node, its descendants and their S3 content (shared content loses a
+    reference and goes with the last one), deepest level first and the tombstoned node last,
+    so an interrupted run leaves a smaller subtree that is still hidden by its tombstone;
+    the next run simply rediscovers what is left. Content is released only for the items this
+    run actually deleted, so a retried chunk never drops a reference twice (a run that dies
+    between the two steps leaks a reference instead, which only keeps the object).
+    TombstonesIndex is eventually consistent, so the root is read again (strongly consistent)
+    and the subtree skipped unless it still carries the indexed deletedAt, i.e. it was not
+    restored, or restored and deleted again, since; the root's own DeleteItem has the same
+    condition. Returns (deleted node count, whether the subtree is done, whether it was skipped).
+    """
+    root = nodes_table.get_item(
+        Key={'nodeId': node_id, 'spaceId': space_id},
+        ProjectionExpression='deletedAt',
+        ConsistentRead=True
+    ).get('Item')
+    if not root or root.get('deletedAt') != deleted_at:
+        return 0, True, True
+    pending = [item for item in reversed(collect_subtree(dynamodb, nodes_table, space_id, node_id))
+               if item['nodeId'] != node_id]
+    deleted = 0
+    for start in range(0, len(pending), REAPER_CHUNK_SIZE):
+        if out_of_time(context):
+            return deleted, False, False
+        chunk = pending[start:start + REAPER_CHUNK_SIZE]
+        limiter.acquire(len(chunk))
+        removed = remove_node_items(nodes_table, space_id, [item['nodeId'] for item in chunk])
+        release_contents(spaces_table, s3_client, content_bucket_name, space_id, removed)
+        delete_content_objects(s3_client, content_bucket_name, removed)
+        deleted += len(removed)
+    if out_of_time(context):
+        return deleted, False, False
+    limiter.acquire(1)
+    try:
+        removed = nodes_table.delete_item(
+            Key={'nodeId': node_id, 'spaceId': space_id},
+            ConditionExpression='deletedAt = :deletedAt',
+            ExpressionAttributeValues={':deletedAt': deleted_at},
+            ReturnValues='ALL_OLD'
+        ).get('Attributes')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        return deleted, True, True
+    release_contents(spaces_table, s3_client, content_bucket_name, space_id, [removed])
+    delete_content_objects(s3_client, content_bucket_name, [removed])
+    return deleted + 1, True, False
+
+
+def lambda_handler(event, context):
+    """
+    Physically removes subtrees whose tombstone is older than the undo window, then collects
+    content released longer than the grace period ago (see utils.content_store).
+    Runs on a schedule; read paths already hide these subtrees, so nothing is published to the
+    change log or the tree snapshot. A run stops before its timeout and the next one continues.
+    """
+    start_time = time.time()
+    correlation_id = extract_correlation_id(event or {})
+    limiter = RateLimiter(MAX_DELETES_PER_SECOND)
+    stats = QueryStats()
+    reaped = skipped = deleted_nodes = failed = 0
+    finished = True
+
+    for tombstone in expired_tombstones(nodes_table, undo_cutoff(), stats=stats):
+        if out_of_time(context):
+            finished = False
+            break
+        space_id, node_id = tombstone['spaceId'], tombstone['nodeId']
+        try:
+            deleted, done, was_skipped = reap_subtree(space_id, node_id, tombstone['deletedAt'], limiter, context)
+        except Exception as e:
+            # Left in the index, so the next run retries it
+            failed += 1
+            logger.error(
+                error_type=type(e).__name__,
+                message=f"Failed to reap node {node_id}: {str(e)}",
+                correlation_id=correlation_id,
+                stack_trace=traceback.format_exc(),
+                error_code="NODE_REAP_FAILED",
+                additional_context={"space_id": space_id, "node_id": node_id}
+            )
+            continue
+        deleted_nodes += deleted
+        if not done:
+            finished = False
+            break
+        if was_skipped:
+            skipped += 1
+        else:
+            reaped += 1
+
+    content = {}
+    if finished:
+        try:
+            content = collect_released_content(spaces_table, s3_client, content_bucket_name,
+                                               should_stop=lambda: out_of_time(context))
+        except Exception as e:
+            logger.error(
+                error_type=type(e).__name__,
+                message=f"Failed to collect released content: {str(e)}",
+                correlation_id=correlation_id,
+                stack_trace=traceback.format_exc(),
+                error_code="CONTENT_GC_FAILED"
+            )
+
+    summary = {'reaped': reaped, 'skipped': skipped, 'deletedNodes': deleted_nodes, 'failed': failed,
+               'finished': finished, 'content': content}
+    logger.performance(
+        operation='node_reap',
+        execution_time_ms=(time.time() - start_time) * 1000,
+        correlation_id=correlation_id,
+        additional_metrics=dict(summary, read=stats.as_dict())
+    )
+    return summary
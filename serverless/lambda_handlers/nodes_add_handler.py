@@ -6,6 +6,15 @@ import datetime
 import time
 import traceback
 from utils.logger import StructuredLogger, PerformanceTracker, extract_correlation_id, extract_user_id
+from utils.change_log import CREATED, CREATED_FIELDS, MOVED, node_change
+from utils.content_codec import CONTENT_ENCODING_FIELD
+from utils.content_store import CONTENT_HASH_FIELD, acquire_content, content_stats, release_contents
+from utils.http import get_body
+from utils.node_paths import PATH_FIELD, child_path, fits, resolve_path
+from utils.node_versions import VERSION_FIELD, etag_headers
+from utils.order_keys import ORDER_KEY_FIELD, place_node, uses_order_keys
+from utils.transactions import put_operation
+from utils.tree_writes import record_tree_change, transact_tree_write
 
 # Initialize structured logger
 logger = StructuredLogger('nodes_add_handler')
@@ -14,6 +23,8 @@ logger = StructuredLogger('nodes_add_handler')
 dynamodb = boto3.resource('dynamodb')
 nodes_table_name = os.environ.get('NODES_TABLE_NAME', 'Nodes')
 nodes_table = dynamodb.Table(nodes_table_name)
+spaces_table_name = os.environ.get('SPACES_TABLE_NAME', 'Spaces')
+spaces_table = dynamodb.Table(spaces_table_name)
 s3_client = boto3.client('s3')
 content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
 eventbridge_client = boto3.client('events')
@@ -24,6 +35,7 @@ def lambda_handler(event, context):
     Adds a new node to a space.
     Required path parameter: spaceId
     Required body attributes: title, contentHTML (optional), parentNodeId (optional, for sub-nodes), orderIndex (optional)
+    In spaces using order keys, afterNodeId or beforeNodeId (optional) place the node next to a sibling.
     """
     start_time = time.time()
     correlation_id = extract_correlation_id(event)
@@ -36,7 +48,7 @@ def lambda_handler(event, context):
             path=event.get('path', '/spaces/{spaceId}/nodes'),
             correlation_id=correlation_id,
             user_id=user_id,
-            body=json.loads(event.get('body', '{}')),
+            body=json.loads(get_body(event)),
             headers=event.get('headers', {})
         )
         
@@ -67,7 +79,7 @@ def lambda_handler(event, context):
             return response
 
         # Parse and validate request body
-        body = json.loads(event.get('body', '{}'))
+        body = json.loads(get_body(event))
         title = body.get('title')
         content_html = body.get('contentHTML')
         parent_node_id = body.get('parentNodeId')
@@ -118,6 +130,7 @@ def lambda_handler(event, context):
             'orderIndex': order_index,
             'createdAt': created_at,
             'updatedAt': created_at,
+            VERSION_FIELD: 1,
         }
         
         # Handle content storage
@@ -125,24 +138,22 @@ def lambda_handler(event, context):
         if content_html is not None:
             if len(content_html) > 1000:  # Store large content in S3
                 try:
-                    with PerformanceTracker(logger, 's3_put_object', correlation_id):
-                        s3_key = f"nodes/{node_id}/content.html"
-                        s3_client.put_object(
-                            Bucket=content_bucket_name,
-                            Key=s3_key,
-                            Body=content_html,
-                            ContentType='text/html'
-                        )
-                    
-                    logger.s3_operation(
-                        operation="put_object",
-                        bucket=content_bucket_name,
-                        key=s3_key,
+                    # Stored by hash: content the space already holds is referenced, not uploaded again
+                    content_start = time.time()
+                    content_hash, s3_key, encoding = acquire_content(spaces_table, s3_client, content_bucket_name,
+                                                                     space_id, content_html)
+                    logger.performance(
+                        operation='content_store',
+                        execution_time_ms=(time.time() - content_start) * 1000,
                         correlation_id=correlation_id,
-                        object_size=len(content_html)
+                        additional_metrics=dict(content_stats.metrics(), s3_key=s3_key,
+                                                object_size=len(content_html), content_encoding=encoding)
                     )
                     
-                    node_item['contentS3Key'] = s3_key
+                    node_item['s3Key'] = s3_key
+                    node_item[CONTENT_HASH_FIELD] = content_hash
+                    if encoding:
+                        node_item[CONTENT_ENCODING_FIELD] = encoding
                     node_item['contentPreview'] = content_html[:100]
                     content_stored_in_s3 = True
                     
@@ -151,7 +162,7 @@ def lambda_handler(event, context):
                         error_type="S3Error",
                         message=f"Failed to store content in S3: {str(s3_error)}",
                         correlation_id=correlation_id,
-                        additional_context={"s3_key": s3_key, "content_size": len(content_html)}
+                        additional_context={"space_id": space_id, "content_size": len(content_html)}
                     )
                     # Fallback to storing preview in DynamoDB
                     node_item['contentPreview'] = content_html[:100]
@@ -163,17 +174,61 @@ def lambda_handler(event, context):
         if parent_node_id is not None:
             node_item['parentNodeId'] = parent_node_id
 
-        # Store item in DynamoDB
-        with PerformanceTracker(logger, 'dynamodb_put_item', correlation_id):
-            nodes_table.put_item(Item=node_item)
+        # Materialized ancestor path for single-query subtree reads (see utils.node_paths);
+        # a node added below a missing parent or too deep for the index gets none
+        parent_path = resolve_path(nodes_table, space_id, parent_node_id) if parent_node_id is not None else None
+        if parent_node_id is None or parent_path is not None:
+            path = child_path(parent_path, node_id)
+            if fits(path):
+                node_item[PATH_FIELD] = path
+
+        # Spaces using fractional order keys place the node between its neighbours with one
+        # write instead of renumbering the later siblings (see utils.order_keys)
+        rebalanced = {}
+        if uses_order_keys(spaces_table, space_id):
+            node_item[ORDER_KEY_FIELD], node_item['orderIndex'], rebalanced = place_node(
+                nodes_table, space_id, parent_node_id, node_id,
+                position=body.get('orderIndex'),
+                after_id=body.get('afterNodeId'),
+                before_id=body.get('beforeNodeId')
+            )
+            order_index = node_item['orderIndex']
+
+        # Store item in DynamoDB, in one transaction with the space tree version bump
+        try:
+            with PerformanceTracker(logger, 'dynamodb_transact_write_items', correlation_id):
+                tree_version = transact_tree_write(dynamodb.meta.client, spaces_table, space_id,
+                                                   [put_operation(nodes_table_name, node_item)])
+        except Exception:
+            release_contents(spaces_table, s3_client, content_bucket_name, space_id, [node_item])
+            raise
             
         logger.database_operation(
-            operation="put_item",
+            operation="transact_write_items",
             table_name=nodes_table_name,
             correlation_id=correlation_id,
             item_count=1
         )
 
+        # Log the new node and keep the materialized tree snapshot in step with it
+        try:
+            with PerformanceTracker(logger, 'record_tree_change', correlation_id):
+                record_tree_change(spaces_table, s3_client, content_bucket_name, space_id, tree_version, [
+                    node_change(CREATED, node_id, {
+                        field: node_item.get(field) for field in CREATED_FIELDS
+                    })
+                ] + [
+                    node_change(MOVED, sibling_id, {ORDER_KEY_FIELD: key})
+                    for sibling_id, key in rebalanced.items()
+                ])
+        except Exception as e:
+            logger.error(
+                error_type=type(e).__name__,
+                message=f"Failed to publish tree change: {str(e)}",
+                correlation_id=correlation_id,
+                additional_context={"space_id": space_id, "node_id": node_id}
+            )
+
         # Publish event for content generation (only if no content provided)
         if not content_html:
             try:
@@ -220,7 +275,8 @@ def lambda_handler(event, context):
             'headers': {
                 'Content-Type': 'application/json',
                 'Location': f"/spaces/{space_id}/nodes/{node_id}",
-                'X-Correlation-ID': correlation_id
+                'X-Correlation-ID': correlation_id,
+                **etag_headers(1)
             },
             'body': json.dumps(node_item)
         }
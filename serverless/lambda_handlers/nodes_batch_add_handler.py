@@ -0,0 +1,256 @@
+import json
+import boto3
+import os
+import time
+import traceback
+from utils.logger import StructuredLogger, PerformanceTracker, extract_correlation_id, extract_user_id
+from utils.bulk_create import (
+    OutlineError, assign_order_keys, flatten_outline, publish_created_events, put_items, put_new_items, store_contents
+)
+from utils.change_log import CREATED, CREATED_FIELDS, node_change
+from utils.content_store import content_stats, release_contents
+from utils.http import get_body
+from utils.node_deletion import delete_node_items
+from utils.node_paths import resolve_path
+from utils.order_keys import ORDER_KEY_FIELD, keys_between, load_siblings, uses_order_keys
+from utils.space_version import bump_tree_version
+from utils.subtree import batch_get_nodes
+from utils.tombstones import is_hidden
+from utils.tree_writes import record_tree_change
+
+# Initialize structured logger
+logger = StructuredLogger('nodes_batch_add_handler')
+
+# Initialize AWS resources
+dynamodb = boto3.resource('dynamodb')
+nodes_table_name = os.environ.get('NODES_TABLE_NAME', 'Nodes')
+nodes_table = dynamodb.Table(nodes_table_name)
+spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+s3_client = boto3.client('s3')
+content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+eventbridge_client = boto3.client('events')
+event_bus_name = os.environ.get('EVENT_BUS_NAME', 'mindmap-events-bus-dev')
+
+
+def error_response(status_code, message, correlation_id, **extra):
+    response = {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(dict({'error': message}, **extra))
+    }
+    logger.response(status_code=status_code, correlation_id=correlation_id, response_size=len(response['body']))
+    return response
+
+
+def top_level_keys(space_id, parent_node_id, count, body):
+    """
+    Order keys for the outline's top-level nodes in a space using order keys: evenly bisected
+    between the two siblings at the insertion point (afterNodeId, beforeNodeId, orderIndex, or
+    the end). Returns (keys, index inserted at).
+    """
+    siblings = load_siblings(nodes_table, space_id, parent_node_id)
+    ids = [item['nodeId'] for item in siblings]
+    if body.get('afterNodeId') in ids:
+        index = ids.index(body['afterNodeId']) + 1
+    elif body.get('beforeNodeId') in ids:
+        index = ids.index(body['beforeNodeId'])
+    elif body.get('orderIndex') is not None:
+        index = max(0, min(int(body['orderIndex']), len(siblings)))
+    else:
+        index = len(siblings)
+    # Siblings without a key sort before every keyed one, so they bound nothing
+    low = siblings[index - 1].get(ORDER_KEY_FIELD) if index > 0 else None
+    high = siblings[index].get(ORDER_KEY_FIELD) if index < len(siblings) else None
+    return keys_between(low, high, count), index
+
+
+def lambda_handler(event, context):
+    """
+    Creates a whole outline of nodes in one request.
+    Required path parameter: spaceId
+    Required body attribute: nodes, a list of {title, contentHTML (optional), nodeId (optional),
+    children (optional, the same shape)}.
+    Optional body attributes: parentNodeId (the outline goes below this node), orderIndex of the
+    first top-level node, afterNodeId/beforeNodeId in spaces using order keys, and
+    generateContent (default true) to request content for nodes created without any.
+    Client-supplied nodeIds must be UUIDs that do not exist yet (409 otherwise); missing ones are
+    generated. Nodes with supplied ids are written with conditional puts in transactions of up
+    to 100, the others with parallel BatchWriteItem requests, so the batch is not atomic: if a
+    write fails the nodes this request wrote are deleted again and the request fails.
+    """
+    start_time = time.time()
+    correlation_id = extract_correlation_id(event)
+    user_id = extract_user_id(event)
+
+    try:
+        path_parameters = event.get('pathParameters') or {}
+        space_id = path_parameters.get('spaceId')
+        logger.request(
+            method=event.get('httpMethod', 'POST'),
+            path=event.get('path', '/spaces/{spaceId}/nodes/batch'),
+            correlation_id=correlation_id,
+            user_id=user_id,
+            headers=event.get('headers', {})
+        )
+
+        if not space_id:
+            return error_response(400, 'spaceId is required', correlation_id)
+
+        body = json.loads(get_body(event))
+        if not isinstance(body, dict):
+            return error_response(400, 'Request body must be an object with a nodes list', correlation_id)
+        parent_node_id = body.get('parentNodeId')
+        order_index = body.get('orderIndex', 0)
+        if not isinstance(order_index, int) or isinstance(order_index, bool):
+            return error_response(400, 'orderIndex must be an integer', correlation_id)
+
+        # The outline is attached below an existing, live node (or at the top level)
+        parent_path = None
+        if parent_node_id is not None:
+            parent = nodes_table.get_item(
+                Key={'nodeId': parent_node_id, 'spaceId': space_id},
+                ProjectionExpression='nodeId, parentNodeId, deletedAt',
+                ConsistentRead=True
+            ).get('Item')
+            if not parent or is_hidden(nodes_table, space_id, parent):
+                return error_response(404, f'Parent node {parent_node_id} not found', correlation_id)
+            parent_path = resolve_path(nodes_table, space_id, parent_node_id)
+
+        try:
+            items, contents, supplied = flatten_outline(space_id, body.get('nodes'), parent_node_id, parent_path,
+                                                        first_order_index=order_index)
+        except OutlineError as e:
+            return error_response(400, str(e), correlation_id)
+
+        # Client-assigned ids must not overwrite existing nodes. This read only answers most
+        # conflicts before any content is stored; the conditional puts below guarantee it
+        if supplied:
+            with PerformanceTracker(logger, 'dynamodb_batch_get_item', correlation_id):
+                existing = batch_get_nodes(dynamodb, nodes_table_name, space_id, supplied, fields=('nodeId',))
+            if existing:
+                return error_response(409, 'Some nodeIds already exist', correlation_id, nodeIds=sorted(existing))
+
+        top_level = [item for item in items if item.get('parentNodeId') == parent_node_id]
+        if uses_order_keys(spaces_table, space_id):
+            keys, index = top_level_keys(space_id, parent_node_id, len(top_level), body)
+            assign_order_keys(items, parent_node_id, keys)
+            for position, item in enumerate(top_level):
+                item['orderIndex'] = index + position
+
+        with PerformanceTracker(logger, 'content_store_batch', correlation_id):
+            failed_uploads = store_contents(spaces_table, s3_client, content_bucket_name, space_id, items, contents)
+        if failed_uploads:
+            logger.error(
+                error_type="S3Error",
+                message=f"Failed to store content of {len(failed_uploads)} nodes in S3; kept previews only",
+                correlation_id=correlation_id,
+                additional_context={"node_ids": failed_uploads[:20]}
+            )
+
+        # BatchWriteItem cannot carry the space tree version bump, so it follows the write and a
+        # failed bump undoes the write: nodes are never left in the tree uncounted. Items with
+        # client-assigned ids go first, with conditional puts; only what this request wrote is undone
+        supplied_ids = set(supplied)
+        claimed = [item for item in items if item['nodeId'] in supplied_ids]
+        generated = [item for item in items if item['nodeId'] not in supplied_ids]
+        written_ids = []
+        try:
+            with PerformanceTracker(logger, 'dynamodb_transact_write_items', correlation_id):
+                created = put_new_items(dynamodb.meta.client, nodes_table_name, claimed)
+            written_ids = [item['nodeId'] for item in created['written']]
+            if created['errors']:
+                raise created['errors'][0]
+            if not created['existing']:
+                written_ids += [item['nodeId'] for item in generated]
+                with PerformanceTracker(logger, 'dynamodb_batch_write_item', correlation_id):
+                    write_stats = put_items(dynamodb, nodes_table_name, generated)
+                tree_version = bump_tree_version(spaces_table, space_id)
+        except Exception:
+            # Undo what may have been written so a retry of the same request starts clean
+            delete_node_items(nodes_table, space_id, written_ids)
+            release_contents(spaces_table, s3_client, content_bucket_name, space_id, items)
+            raise
+        if created['existing']:
+            delete_node_items(nodes_table, space_id, written_ids)
+            release_contents(spaces_table, s3_client, content_bucket_name, space_id, items)
+            return error_response(409, 'Some nodeIds already exist', correlation_id,
+                                  nodeIds=sorted(created['existing']))
+        logger.database_operation(
+            operation="batch_write_item",
+            table_name=nodes_table_name,
+            correlation_id=correlation_id,
+            item_count=len(created['written']) + write_stats['items_written'],
+            consumed_capacity=write_stats['consumed_wcu']
+        )
+
+        # Log the new nodes and add them to the materialized tree snapshot
+        try:
+            with PerformanceTracker(logger, 'record_tree_change', correlation_id):
+                record_tree_change(spaces_table, s3_client, content_bucket_name, space_id, tree_version, [
+                    node_change(CREATED, item['nodeId'], {
+                        field: item.get(field) for field in CREATED_FIELDS
+                    })
+                    for item in items
+                ])
+        except Exception as e:
+            logger.error(
+                error_type=type(e).__name__,
+                message=f"Failed to publish tree change: {str(e)}",
+                correlation_id=correlation_id,
+                additional_context={"space_id": space_id, "node_count": len(items)}
+            )
+
+        # Content generation events for the nodes created without content, 10 per put_events call
+        failed_events = 0
+        if body.get('generateContent', True):
+            with PerformanceTracker(logger, 'eventbridge_put_events_batch', correlation_id):
+                failed_events = publish_created_events(
+                    eventbridge_client, event_bus_name, [item for item in items if not contents.get(item['nodeId'])]
+                )
+            if failed_events:
+                logger.error(
+                    error_type="EventBridgeError",
+                    message=f"{failed_events} node creation events were not published",
+                    correlation_id=correlation_id,
+                    additional_context={"event_bus": event_bus_name}
+                )
+
+        response = {
+            'statusCode': 201,
+            'headers': {'Content-Type': 'application/json', 'X-Correlation-ID': correlation_id},
+            'body': json.dumps({
+                'spaceId': space_id,
+                'parentNodeId': parent_node_id,
+                'created': len(items),
+                'nodes': items
+            })
+        }
+        execution_time_ms = (time.time() - start_time) * 1000
+        logger.response(
+            status_code=201,
+            correlation_id=correlation_id,
+            response_size=len(response['body']),
+            execution_time_ms=execution_time_ms
+        )
+        logger.business_logic(
+            message=f"Created {len(items)} nodes in space {space_id}",
+            correlation_id=correlation_id,
+            operation="node_batch_creation_complete",
+            additional_data=dict(write_stats, space_id=space_id, failed_uploads=len(failed_uploads),
+                                 failed_events=failed_events, **content_stats.metrics())
+        )
+        return response
+
+    except json.JSONDecodeError:
+        return error_response(400, 'Invalid JSON in request body', correlation_id)
+
+    except Exception as e:
+        logger.error(
+            error_type=type(e).__name__,
+            message=f"Error creating nodes: {str(e)}",
+            correlation_id=correlation_id,
+            stack_trace=traceback.format_exc(),
+            error_code="NODE_BATCH_CREATION_FAILED",
+            additional_context={"space_id": space_id if 'space_id' in locals() else None}
+        )
+        return error_response(500, 'Could not create nodes', correlation_id, details=str(e))
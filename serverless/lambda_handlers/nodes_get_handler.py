@@ -1,7 +1,14 @@
+import base64
 import json
 import boto3
 import os
 import decimal
+from utils.compression import encoded_response, negotiate_encoding
+from utils.content_codec import decode_content
+from utils.content_store import content_object, read_content
+from utils.http import get_header, get_query_param
+from utils.node_versions import VERSION_FIELD, etag_headers
+from utils.tombstones import is_hidden
 
 # Helper class to convert Decimal to float/int for JSON serialization
 class DecimalEncoder(json.JSONEncoder):
@@ -20,10 +27,31 @@ nodes_table = dynamodb.Table(nodes_table_name)
 s3_client = boto3.client('s3')
 content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
 
+NODE_FORMATS = ('json', 'html')
+
+
+def html_response(event, node_item):
+    """
+    The node's content as text/html. Stored content compressed with an encoding the client
+    accepts (Accept-Encoding) is sent as it is, without decompressing it here.
+    """
+    headers = dict({'Content-Type': 'text/html; charset=utf-8'}, **etag_headers(node_item.get(VERSION_FIELD)))
+    s3_key, encoding = content_object(node_item)
+    if not s3_key:
+        return encoded_response(200, headers, (node_item.get('contentPreview') or '', None, False))
+    data = s3_client.get_object(Bucket=content_bucket_name, Key=s3_key)['Body'].read()
+    if encoding and negotiate_encoding(get_header(event, 'Accept-Encoding'), (encoding,)):
+        return encoded_response(200, headers, (base64.b64encode(data).decode('ascii'), encoding, True))
+    return encoded_response(200, headers, (decode_content(data, encoding), None, False))
+
+
 def lambda_handler(event, context):
     """
     Retrieves a specific node's details, including its content from S3 if available.
     Required path parameters: spaceId, nodeId
+    Optional query parameters: format=json (default) or html for the bare content
+    Compressed content (see utils.content_codec) is decoded for the JSON response; the html
+    format passes it through to clients that accept its encoding.
     """
     try:
         path_parameters = event.get('pathParameters', {})
@@ -37,6 +65,14 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'spaceId and nodeId are required in path parameters'})
             }
 
+        node_format = get_query_param(event, 'format') or 'json'
+        if node_format not in NODE_FORMATS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': f"format must be one of: {', '.join(NODE_FORMATS)}"})
+            }
+
         # Get node metadata from DynamoDB
         response = nodes_table.get_item(
             Key={
@@ -47,29 +83,26 @@ def lambda_handler(event, context):
 
         node_item = response.get('Item')
 
-        if not node_item:
+        # Deleted nodes stay in the table until reaped; a tombstone on the node or any ancestor hides it
+        if not node_item or is_hidden(nodes_table, space_id, node_item):
             return {
                 'statusCode': 404,
                 'headers': {'Content-Type': 'application/json'},
                 'body': json.dumps({'error': 'Node not found'})
             }
 
-        # If there's an S3 key, fetch the content from S3
-        s3_key = node_item.get('s3Key')
-        content_html = None
-        
-        # For testing, we might have contentPreview directly in DynamoDB
-        if 'contentPreview' in node_item:
-            content_html = node_item['contentPreview']
-        # If there's an S3 key, try to fetch from S3
-        elif s3_key:
+        if node_format == 'html':
+            return html_response(event, node_item)
+
+        # Content in an S3 object (any layout, see utils.content_store) is complete; a
+        # contentPreview next to it is only the start, so the preview is used without an object
+        s3_key, _ = content_object(node_item)
+        content_html = node_item.get('contentPreview')
+        if s3_key:
             try:
-                s3_response = s3_client.get_object(
-                    Bucket=content_bucket_name,
-                    Key=s3_key
-                )
-                content_html = s3_response['Body'].read().decode('utf-8')
+                content_html = read_content(s3_client, content_bucket_name, node_item)
             except Exception as e:
+                content_html = None
                 print(f"Error fetching content from S3 for key {s3_key}: {e}")
                 # Decide if this should be a critical error or just return node without content
                 # For now, let's return the node metadata even if S3 fetch fails, with a note.
@@ -77,9 +110,10 @@ def lambda_handler(event, context):
         
         node_item['contentHTML'] = content_html # Add contentHTML to the response
 
+        # The ETag is what update, move and delete take as If-Match
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
+            'headers': dict({'Content-Type': 'application/json'}, **etag_headers(node_item.get(VERSION_FIELD))),
             'body': json.dumps(node_item, cls=DecimalEncoder)
         }
 
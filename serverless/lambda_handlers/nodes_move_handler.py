@@ -0,0 +1,200 @@
+import json
+import boto3
+import os
+import datetime
+from utils.change_log import MOVED, node_change
+from utils.http import get_body
+from utils.node_moves import (
+    InvalidMove, ancestor_check_operation, ancestry_path, index_placement, load_ancestry, move_operation,
+    sibling_order_operation
+)
+from utils.node_paths import PATH_FIELD, child_path, fits, rewrite_subtree_paths
+from utils.node_versions import (
+    VERSION_FIELD, InvalidIfMatch, current_version, etag_headers, expected_version, precondition_failed
+)
+from utils.order_keys import ORDER_KEY_FIELD, load_siblings, plan_placement, uses_order_keys
+from utils.subtree import load_descendants
+from utils.tombstones import is_hidden
+from utils.transactions import TransactionCanceled
+from utils.tree_writes import TREE_WRITE_MAX_ITEMS, record_tree_change, transact_tree_write
+
+dynamodb = boto3.resource('dynamodb')
+nodes_table_name = os.environ.get('NODES_TABLE_NAME', 'Nodes')
+nodes_table = dynamodb.Table(nodes_table_name)
+spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+s3_client = boto3.client('s3')
+content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+
+
+def error_response(status_code, message, **extra):
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(dict({'error': message}, **extra))
+    }
+
+
+def insertion_index(siblings, body):
+    """Index among the new siblings: after afterNodeId, before beforeNodeId, at orderIndex, or the end."""
+    ids = [item['nodeId'] for item in siblings]
+    if body.get('afterNodeId') in ids:
+        return ids.index(body['afterNodeId']) + 1
+    if body.get('beforeNodeId') in ids:
+        return ids.index(body['beforeNodeId'])
+    if body.get('orderIndex') is not None:
+        return max(0, min(body['orderIndex'], len(siblings)))
+    return len(siblings)
+
+
+def lambda_handler(event, context):
+    """
+    Moves a node and its subtree to another parent and/or position.
+    Required path parameters: spaceId, nodeId
+    Required body attribute: parentNodeId (null moves the node to the top level)
+    Optional body attributes: orderIndex (position among the new siblings), afterNodeId or
+    beforeNodeId (a new sibling to place it next to); the end of the list by default.
+    A move below the node itself or one of its descendants is rejected with 400. The node,
+    the sibling order writes and checks on the new parent and as many of its ancestors as fit
+    are committed in one transaction with the space tree version bump (see utils.node_moves);
+    a position that needs more sibling writes than the transaction holds is refused with 409.
+    With an If-Match header the move only applies to that version of the node (412 otherwise).
+    """
+    try:
+        path_parameters = event.get('pathParameters') or {}
+        space_id = path_parameters.get('spaceId')
+        node_id = path_parameters.get('nodeId')
+
+        if not space_id or not node_id:
+            return error_response(400, 'spaceId and nodeId are required in path parameters')
+
+        body = json.loads(get_body(event))
+        if not isinstance(body, dict) or 'parentNodeId' not in body:
+            return error_response(400, 'parentNodeId is required (null for the top level)')
+        parent_id = body['parentNodeId']
+        order_index = body.get('orderIndex')
+        if order_index is not None and (not isinstance(order_index, int) or isinstance(order_index, bool)):
+            return error_response(400, 'orderIndex must be an integer')
+        if parent_id == node_id:
+            return error_response(400, 'A node cannot be moved below itself')
+        try:
+            expected = expected_version(event)
+        except InvalidIfMatch as e:
+            return error_response(400, str(e))
+
+        node = nodes_table.get_item(Key={'nodeId': node_id, 'spaceId': space_id}, ConsistentRead=True).get('Item')
+        if not node or is_hidden(nodes_table, space_id, node):
+            return error_response(404, 'Node not found')
+        if expected is not None and int(node.get(VERSION_FIELD) or 0) != expected:
+            return precondition_failed(int(node.get(VERSION_FIELD) or 0))
+
+        ancestry = []
+        if parent_id is not None:
+            ancestry = load_ancestry(dynamodb, nodes_table, space_id, parent_id)
+            if ancestry is None:
+                return error_response(404, f'Parent node {parent_id} not found')
+            if any(item['nodeId'] == node_id for item in ancestry):
+                return error_response(400, 'A node cannot be moved below one of its descendants')
+
+        # Same rule as nodes_add_handler: no path below a node without one, or past the index limit
+        parent_path = ancestry_path(ancestry) if ancestry else None
+        new_path = None
+        if parent_id is None or parent_path is not None:
+            new_path = child_path(parent_path, node_id)
+            if not fits(new_path):
+                new_path = None
+
+        siblings = [item for item in load_siblings(nodes_table, space_id, parent_id) if item['nodeId'] != node_id]
+        index = insertion_index(siblings, body)
+        if uses_order_keys(spaces_table, space_id):
+            # One key between the new neighbours, plus a rebalance of nearby siblings if keys grew long
+            field = ORDER_KEY_FIELD
+            order_key, updates = plan_placement(siblings, index)
+            new_index = index
+            sibling_values = {sibling_id: key for sibling_id, key, _ in updates}
+        else:
+            field = 'orderIndex'
+            order_key = None
+            new_index, sibling_values = index_placement(siblings, index)
+        by_id = {item['nodeId']: item for item in siblings}
+
+        updated_at = datetime.datetime.utcnow().isoformat()
+        sibling_operations = [
+            sibling_order_operation(nodes_table_name, space_id, parent_id, by_id[sibling_id], field, value, updated_at)
+            for sibling_id, value in sibling_values.items()
+        ]
+        # The node and every sibling write go into one transaction; ancestor checks fill the rest,
+        # nearest first, and the new parent's check covers the farther ancestors through its path
+        room = TREE_WRITE_MAX_ITEMS - 1 - len(sibling_operations)
+        if room < (1 if ancestry else 0):
+            return error_response(409, f'Placing the node there would shift {len(sibling_operations)} siblings, '
+                                       'more than one write can; reorder the siblings first or pick another '
+                                       'position.')
+        checks = [ancestor_check_operation(nodes_table_name, space_id, item, check_path=level == 0)
+                  for level, item in enumerate(ancestry[:room])]
+        try:
+            tree_version = transact_tree_write(dynamodb.meta.client, spaces_table, space_id, [
+                move_operation(nodes_table_name, space_id, node, parent_id, new_index, order_key, new_path, updated_at,
+                               expected_version=expected)
+            ] + sibling_operations + checks)
+        except TransactionCanceled as e:
+            # The move is the first operation; with If-Match a failed check on it may be a newer version
+            if expected is not None and e.reasons and e.reasons[0] == 'ConditionalCheckFailed':
+                version = current_version(nodes_table, space_id, node_id)
+                if version is not None and version != expected:
+                    return precondition_failed(version)
+            return error_response(409, 'The node, its new parent or its new siblings changed concurrently; '
+                                       'reload and retry.', reasons=e.reasons)
+
+        new_version = int(node.get(VERSION_FIELD) or 0) + 1
+
+        # The subtree's paths follow the node; this can be far more writes than a transaction holds.
+        # The move is committed either way; stale paths are repaired by tools/backfill_node_paths.py
+        paths_rewritten = 0
+        if new_path != node.get(PATH_FIELD):
+            try:
+                descendants = load_descendants(nodes_table, space_id, node, fields=('nodeId',))
+                paths_rewritten = rewrite_subtree_paths(nodes_table, space_id, node_id, new_path, descendants)
+            except Exception as e:
+                print(f"Failed to rewrite descendant paths of moved node {node_id} in space {space_id}; "
+                      f"run tools/backfill_node_paths.py {space_id}: {e}")
+
+        # Log the move under the version its transaction produced and patch the materialized tree snapshot
+        try:
+            record_tree_change(spaces_table, s3_client, content_bucket_name, space_id, tree_version, [
+                node_change(MOVED, node_id, {
+                    'parentNodeId': parent_id,
+                    'orderIndex': new_index,
+                    ORDER_KEY_FIELD: order_key,
+                    'updatedAt': updated_at,
+                    VERSION_FIELD: new_version
+                }, cleared=('parentNodeId',))
+            ] + [
+                node_change(MOVED, sibling_id, {field: value, 'updatedAt': updated_at})
+                for sibling_id, value in sibling_values.items()
+            ])
+        except Exception as e:
+            print(f"Failed to publish tree change for space {space_id}: {e}")
+
+        result = {
+            'nodeId': node_id,
+            'parentNodeId': parent_id,
+            'previousParentNodeId': node.get('parentNodeId'),
+            'orderIndex': new_index,
+            PATH_FIELD: new_path,
+            'siblingsUpdated': [{'nodeId': sibling_id, field: value} for sibling_id, value in sibling_values.items()],
+            'pathsRewritten': paths_rewritten,
+            VERSION_FIELD: new_version
+        }
+        if order_key is not None:
+            result[ORDER_KEY_FIELD] = order_key
+        return {
+            'statusCode': 200,
+            'headers': dict({'Content-Type': 'application/json'}, **etag_headers(new_version)),
+            'body': json.dumps(result)
+        }
+
+    except InvalidMove as e:
+        return error_response(400, str(e))
+    except Exception as e:
+        print(f"Error moving node: {e}")
+        return error_response(500, str(e))
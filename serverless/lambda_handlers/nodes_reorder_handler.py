@@ -2,10 +2,54 @@ import json
 import boto3
 import os
 import datetime
+from utils.change_log import MOVED, node_change
+from utils.http import get_body
+from utils.node_moves import sibling_order_operation
+from utils.node_versions import VERSION_FIELD, current_version
+from utils.order_keys import ORDER_KEY_FIELD, permute_keys, sibling_sort_key, uses_order_keys
+from utils.subtree import load_children, load_root_nodes
+from utils.tombstones import is_hidden
+from utils.transactions import TransactionCanceled, chunks
+from utils.tree_writes import TREE_WRITE_MAX_ITEMS, record_tree_change, transact_tree_write
 
 dynamodb = boto3.resource('dynamodb')
 nodes_table_name = os.environ.get('NODES_TABLE_NAME', 'Nodes')
 nodes_table = dynamodb.Table(nodes_table_name)
+spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+s3_client = boto3.client('s3')
+content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+
+SIBLING_FIELDS = ('nodeId', 'parentNodeId', 'orderIndex', ORDER_KEY_FIELD, VERSION_FIELD)
+
+
+def error_response(status_code, message, **extra):
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(dict({'error': message}, **extra))
+    }
+
+
+def load_siblings(space_id, node_id):
+    """
+    The live siblings of node_id (itself included) with one query: ParentNodeIdIndex for a
+    child node, SpaceIdNodesIndex for a top-level one. Returns (parentNodeId, {nodeId: item}),
+    or None if node_id does not exist or is deleted.
+    """
+    node = nodes_table.get_item(
+        Key={'nodeId': node_id, 'spaceId': space_id},
+        ProjectionExpression='nodeId, parentNodeId, deletedAt',
+        ConsistentRead=True
+    ).get('Item')
+    if not node or is_hidden(nodes_table, space_id, node):
+        return None
+    parent_id = node.get('parentNodeId')
+    if parent_id is None:
+        items = load_root_nodes(nodes_table, space_id, fields=SIBLING_FIELDS)
+    else:
+        items = load_children(nodes_table, space_id, [parent_id], fields=SIBLING_FIELDS, live_only=True)[parent_id]
+    return parent_id, {item['nodeId']: item for item in items}
+
 
 def lambda_handler(event, context):
     """
@@ -13,95 +57,130 @@ def lambda_handler(event, context):
     Required path parameter: spaceId
     Required body: an array of objects, each with nodeId and newOrderIndex.
     Example body: [{ "nodeId": "id1", "newOrderIndex": 0 }, { "nodeId": "id2", "newOrderIndex": 1 }]
-    All nodes in the list MUST share the same parentNodeId (or be root nodes of the same space).
+    All nodes in the list MUST share the same parentNodeId (or be root nodes of the same space);
+    this is checked with one sibling query before anything is written. Nodes already at their
+    new position are skipped, the rest are written in TransactWriteItems chunks of up to 99,
+    each of which applies completely or not at all, together with its own bump of the space
+    treeVersion. In spaces using order keys the listed
+    nodes trade the orderKeys of the positions they occupy (see utils.order_keys).
+    An entry may name the node's version the client last saw ("version"); if a node that
+    has to move is at another version nothing of its chunk is written, and 412 is returned
+    when nothing was written at all.
     """
     try:
         path_parameters = event.get('pathParameters', {})
         space_id = path_parameters.get('spaceId')
 
         if not space_id:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'spaceId is required in path parameters'})
-            }
+            return error_response(400, 'spaceId is required in path parameters')
+
+        body = json.loads(get_body(event, '[]'))
+        if not isinstance(body, list) or not all(
+            isinstance(item, dict) and isinstance(item.get('nodeId'), str)
+            and isinstance(item.get('newOrderIndex'), int) and not isinstance(item.get('newOrderIndex'), bool)
+            for item in body
+        ):
+            return error_response(400, 'Request body must be a list of objects, each with nodeId and an integer newOrderIndex')
+        if not all(item.get('version') is None
+                   or (isinstance(item['version'], int) and not isinstance(item['version'], bool) and item['version'] >= 0)
+                   for item in body):
+            return error_response(400, 'version must be a non-negative integer')
 
-        body = json.loads(event.get('body', '[]'))
-        if not isinstance(body, list) or not all(isinstance(item, dict) and 'nodeId' in item and 'newOrderIndex' in item for item in body):
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Request body must be a list of objects, each with nodeId and newOrderIndex'})
-            }
-        
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Node reorder list cannot be empty'})
-            }
+            return error_response(400, 'Node reorder list cannot be empty')
+
+        new_positions = {item['nodeId']: item['newOrderIndex'] for item in body}
+        expected_versions = {item['nodeId']: item['version'] for item in body if item.get('version') is not None}
+        if len(new_positions) != len(body):
+            return error_response(400, 'Each nodeId may appear only once')
 
-        # For simplicity, this handler assumes all nodes in the list are siblings
-        # (i.e., share the same parentNodeId or are all root nodes for the given spaceId).
-        # A more robust implementation would verify this by fetching one node and checking its parentNodeId,
-        # then ensuring all other nodes in the list share it.
-        # It also assumes that the provided orderIndexes are valid (e.g., 0 to N-1 for N siblings).
+        siblings = load_siblings(space_id, body[0]['nodeId'])
+        if siblings is None:
+            return error_response(404, f"Node {body[0]['nodeId']} not found")
+        parent_id, sibling_items = siblings
+        strangers = [node_id for node_id in new_positions if node_id not in sibling_items]
+        if strangers:
+            return error_response(400, 'All nodes must be live siblings under the same parent', nodeIds=strangers)
 
         updated_at = datetime.datetime.utcnow().isoformat()
-        failed_updates = []
+        if uses_order_keys(spaces_table, space_id):
+            field = ORDER_KEY_FIELD
+            new_order = [item['nodeId'] for item in sorted(body, key=lambda item: item['newOrderIndex'])]
+            new_values = permute_keys(sorted(sibling_items.values(), key=sibling_sort_key), new_order)
+        else:
+            field = 'orderIndex'
+            new_values = new_positions
+        changed = [node_id for node_id, value in new_values.items() if sibling_items[node_id].get(field) != value]
+        pending = [
+            (node_id, sibling_order_operation(nodes_table_name, space_id, parent_id, sibling_items[node_id],
+                                              field, new_values[node_id], updated_at,
+                                              expected_version=expected_versions.get(node_id)))
+            for node_id in changed
+        ]
 
-        # Using BatchWriteItem for updating multiple items is more efficient for DynamoDB,
-        # but UpdateItem is used here per node for clarity and individual error handling if needed.
-        # For true batching of updates, you'd construct Update operations for a TransactWriteItems or BatchWriteItem (if applicable).
-        # However, UpdateItem is fine for a small number of reordered items.
+        # Each chunk is committed with its own space tree version bump
+        written = []
+        versions = []
+        failed_updates = []
+        for chunk in chunks(pending, TREE_WRITE_MAX_ITEMS):
+            try:
+                versions.append((transact_tree_write(dynamodb.meta.client, spaces_table, space_id,
+                                                     [operation for _, operation in chunk]),
+                                 [node_id for node_id, _ in chunk]))
+            except TransactionCanceled as e:
+                failed_updates = [
+                    {'nodeId': node_id, 'error': reason}
+                    for (node_id, _), reason in zip(chunk, e.reasons) if reason != 'None'
+                ]
+                # Later chunks are not attempted; the caller reloads the siblings and retries
+                failed_updates.extend({'nodeId': node_id, 'error': 'NotAttempted'}
+                                      for node_id in changed[len(written) + len(chunk):])
+                break
+            written.extend(node_id for node_id, _ in chunk)
 
-        for item_to_reorder in body:
-            node_id = item_to_reorder.get('nodeId')
-            new_order_index = item_to_reorder.get('newOrderIndex')
+        new_versions = {node_id: int(sibling_items[node_id].get(VERSION_FIELD) or 0) + 1 for node_id in written}
 
-            if node_id is None or new_order_index is None:
-                failed_updates.append({'nodeId': node_id, 'error': 'Missing nodeId or newOrderIndex'})
-                continue
-            
+        # Log each chunk under its tree version and patch the materialized tree snapshot with the new sibling order
+        for tree_version, node_ids in versions:
             try:
-                nodes_table.update_item(
-                    Key={
-                        'nodeId': node_id,
-                        'spaceId': space_id # Assuming composite key
-                    },
-                    UpdateExpression='SET orderIndex = :oi, updatedAt = :ua',
-                    ExpressionAttributeValues={
-                        ':oi': new_order_index,
-                        ':ua': updated_at
-                    },
-                    ConditionExpression='attribute_exists(nodeId)' # Ensure node exists
-                )
-            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-                failed_updates.append({'nodeId': node_id, 'error': 'Node not found or condition check failed'})
+                record_tree_change(spaces_table, s3_client, content_bucket_name, space_id, tree_version, [
+                    node_change(MOVED, node_id, {field: new_values[node_id], 'updatedAt': updated_at,
+                                                 VERSION_FIELD: new_versions[node_id]})
+                    for node_id in node_ids
+                ])
             except Exception as e:
-                print(f"Error reordering node {node_id}: {e}")
-                failed_updates.append({'nodeId': node_id, 'error': str(e)})
+                print(f"Failed to publish tree change for space {space_id}: {e}")
 
+        result = {
+            'updated': [{'nodeId': node_id, field: new_values[node_id], VERSION_FIELD: new_versions[node_id]}
+                        for node_id in written],
+            'unchanged': len(body) - len(changed)
+        }
         if failed_updates:
+            # Nothing written: a plain conflict, or 412 if a node is no longer at the version the
+            # client named; some chunks written: Multi-Status
+            status_code = 207 if written else 409
+            if not written:
+                for failure in failed_updates:
+                    if failure['nodeId'] not in expected_versions or failure['error'] != 'ConditionalCheckFailed':
+                        continue
+                    version = current_version(nodes_table, space_id, failure['nodeId'])
+                    if version is not None and version != expected_versions[failure['nodeId']]:
+                        failure[VERSION_FIELD] = version
+                        status_code = 412
             return {
-                'statusCode': 207, # Multi-Status
+                'statusCode': status_code,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({
-                    'message': 'Some nodes failed to reorder.',
-                    'failedUpdates': failed_updates
-                })
+                'body': json.dumps(dict(result, message='Nodes were changed concurrently; reload and retry.',
+                                        failedUpdates=failed_updates))
             }
 
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'message': f'{len(body)} nodes reordered successfully in space {space_id}'})
+            'body': json.dumps(dict(result, message=f'{len(written)} nodes reordered in space {space_id}'))
         }
 
     except Exception as e:
         print(f"Error processing node reorder request: {e}")
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return error_response(500, str(e))
@@ -0,0 +1,120 @@
+import json
+import boto3
+import os
+import time
+import traceback
+from utils.change_log import CREATED, CREATED_FIELDS, node_change
+from utils.logger import StructuredLogger, extract_correlation_id
+from utils.node_queries import TREE_FIELDS, QueryStats
+from utils.subtree import load_subtree
+from utils.tombstones import UNDO_WINDOW_SECONDS, restore_operation, undo_cutoff
+from utils.transactions import TransactionCanceled
+from utils.tree_writes import record_tree_change, transact_tree_write
+
+# Initialize structured logger
+logger = StructuredLogger('nodes_restore_handler')
+
+dynamodb = boto3.resource('dynamodb')
+nodes_table_name = os.environ.get('NODES_TABLE_NAME', 'Nodes')
+nodes_table = dynamodb.Table(nodes_table_name)
+spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+s3_client = boto3.client('s3')
+content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+
+# What the subtree walk needs plus what the CREATED entries carry (a projection must not repeat a field)
+RESTORE_FIELDS = tuple(dict.fromkeys(TREE_FIELDS + CREATED_FIELDS))
+
+
+def error_response(status_code, message):
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'error': message})
+    }
+
+
+def lambda_handler(event, context):
+    """
+    Undoes DELETE /spaces/{spaceId}/nodes/{nodeId} within the undo window by removing the
+    node's tombstone, which brings back the whole subtree.
+    Required path parameters: spaceId, nodeId
+    """
+    start_time = time.time()
+    correlation_id = extract_correlation_id(event)
+    path_parameters = event.get('pathParameters') or {}
+    space_id = path_parameters.get('spaceId')
+    node_id = path_parameters.get('nodeId')
+
+    try:
+        if not space_id or not node_id:
+            return error_response(400, 'spaceId and nodeId are required in path parameters')
+
+        node = nodes_table.get_item(
+            Key={'nodeId': node_id, 'spaceId': space_id},
+            ProjectionExpression='nodeId, deletedAt',
+            ConsistentRead=True
+        ).get('Item')
+        if not node:
+            return error_response(404, 'Node not found')
+        if not node.get('deletedAt'):
+            return error_response(409, 'Node is not deleted')
+
+        cutoff = undo_cutoff()
+        if node['deletedAt'] <= cutoff:
+            return error_response(410, f'Node was deleted more than {UNDO_WINDOW_SECONDS} seconds ago and can no longer be restored')
+        try:
+            tree_version = transact_tree_write(dynamodb.meta.client, spaces_table, space_id, [
+                restore_operation(nodes_table_name, space_id, node_id, node['deletedAt'], cutoff)
+            ])
+        except TransactionCanceled:
+            return error_response(409, 'Node was modified concurrently; reload it and retry')
+
+        # Re-announce the subtree: the change log and snapshot dropped it with the delete.
+        # A subtree still hidden by a deleted ancestor stays out of both.
+        stats = QueryStats()
+        subtree = load_subtree(nodes_table, space_id, root_node_id=node_id,
+                               fields=RESTORE_FIELDS, stats=stats)
+        items = subtree[0] if subtree else []
+        if items:
+            try:
+                record_tree_change(spaces_table, s3_client, content_bucket_name, space_id, tree_version, [
+                    node_change(CREATED, item['nodeId'], {field: item.get(field) for field in CREATED_FIELDS})
+                    for item in items
+                ])
+            except Exception as e:
+                logger.error(
+                    error_type=type(e).__name__,
+                    message=f"Failed to publish tree change: {str(e)}",
+                    correlation_id=correlation_id,
+                    additional_context={"space_id": space_id, "node_id": node_id}
+                )
+
+        logger.business_logic(
+            message=f"Restored node {node_id} with {len(items)} visible nodes",
+            correlation_id=correlation_id,
+            operation="node_restore",
+            additional_data={"space_id": space_id, "node_id": node_id, "read": stats.as_dict()}
+        )
+        response = {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'nodeId': node_id, 'spaceId': space_id, 'restoredNodes': len(items)})
+        }
+        logger.response(
+            status_code=200,
+            correlation_id=correlation_id,
+            response_size=len(response['body']),
+            execution_time_ms=(time.time() - start_time) * 1000
+        )
+        return response
+
+    except Exception as e:
+        logger.error(
+            error_type=type(e).__name__,
+            message=f"Error restoring node: {str(e)}",
+            correlation_id=correlation_id,
+            stack_trace=traceback.format_exc(),
+            error_code="NODE_RESTORE_FAILED",
+            additional_context={"space_id": space_id, "node_id": node_id}
+        )
+        return error_response(500, str(e))
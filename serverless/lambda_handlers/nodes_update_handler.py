@@ -2,10 +2,27 @@ import json
 import boto3
 import os
 import datetime
+from botocore.exceptions import ClientError
+from utils.change_log import MOVED, UPDATED, node_change
+from utils.content_codec import CONTENT_ENCODING_FIELD
+from utils.http import get_body
+from utils.content_store import CONTENT_HASH_FIELD, acquire_content, content_stats, release_contents
+from utils.node_deletion import delete_content_objects
+from utils.node_moves import InvalidMove, load_ancestry
+from utils.node_paths import PATH_FIELD, child_path, fits, resolve_path, rewrite_subtree_paths
+from utils.node_versions import (
+    INCREMENT_VERSION, VERSION_FIELD, VERSION_NAMES, InvalidIfMatch, current_version, expected_version,
+    etag_headers, increment_values, precondition_failed, version_condition
+)
+from utils.order_keys import ORDER_KEY_FIELD, place_node, uses_order_keys
+from utils.space_version import bump_tree_version
+from utils.subtree import load_descendants
+from utils.tree_writes import record_tree_change
 
 dynamodb = boto3.resource('dynamodb')
 nodes_table_name = os.environ.get('NODES_TABLE_NAME', 'Nodes')
 nodes_table = dynamodb.Table(nodes_table_name)
+spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
 s3_client = boto3.client('s3')
 content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
 eventbridge_client = boto3.client('events')
@@ -15,7 +32,15 @@ def lambda_handler(event, context):
     """
     Updates a node's attributes (title, contentHTML, parentNodeId, orderIndex).
     Required path parameters: spaceId, nodeId
-    Body can contain: title, contentHTML, parentNodeId, orderIndex
+    Body can contain: title, contentHTML, parentNodeId, orderIndex, and in spaces using
+    order keys afterNodeId/beforeNodeId to place the node next to a sibling
+    The node is not read first: one conditional UpdateItem (ReturnValues=ALL_OLD) checks that
+    it exists and is not deleted, applies the edit and returns the old image, from which the
+    replaced content is released and the paths of a moved subtree are rewritten (a node below
+    a deleted ancestor is not checked; reads hide it with the ancestor). The space tree version
+    is then bumped with an atomic ADD. Content is stored by hash (see utils.content_store), so
+    saving unchanged content uploads nothing. The write increments the node's version; with an
+    If-Match header naming another version it fails with 412.
     """
     try:
         path_parameters = event.get('pathParameters', {})
@@ -29,44 +54,33 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'spaceId and nodeId are required in path parameters'})
             }
 
-        body = json.loads(event.get('body', '{}'))
+        body = json.loads(get_body(event))
         title = body.get('title')
         content_html = body.get('contentHTML') # Raw HTML content
         parent_node_id = body.get('parentNodeId')
         order_index = body.get('orderIndex')
-
-        if not title and content_html is None and parent_node_id is None and order_index is None:
+        after_node_id = body.get('afterNodeId')
+        before_node_id = body.get('beforeNodeId')
+        repositioned = parent_node_id is not None or order_index is not None or after_node_id or before_node_id
+        try:
+            # The version the client last saw (If-Match); a stale one fails the write with 412
+            expected = expected_version(event)
+        except InvalidIfMatch as e:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'At least one attribute (title, contentHTML, parentNodeId, orderIndex) must be provided for update'})
+                'body': json.dumps({'error': str(e)})
             }
 
-        # Fetch existing node to get current s3Key if content is being updated
-        # This is also a way to check if the node exists before attempting an update.
-        try:
-            existing_node_response = nodes_table.get_item(
-                Key={
-                    'nodeId': node_id,
-                    'spaceId': space_id
-                }
-            )
-            existing_node = existing_node_response.get('Item')
-            if not existing_node:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json'},
-                    'body': json.dumps({'error': 'Node not found'})
-                }
-        except Exception as e:
-            print(f"Error fetching node for update check: {e}")
+        if not title and content_html is None and not repositioned:
             return {
-                'statusCode': 500,
+                'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': f'Error checking node existence: {str(e)}'})
+                'body': json.dumps({'error': 'At least one attribute (title, contentHTML, parentNodeId, orderIndex) must be provided for update'})
             }
 
         update_expression_parts = []
+        remove_parts = []
         expression_attribute_values = {}
         expression_attribute_names = {} # For attributes that are reserved keywords
 
@@ -74,80 +88,172 @@ def lambda_handler(event, context):
             update_expression_parts.append('title = :t')
             expression_attribute_values[':t'] = title
 
+        new_path = None
         if parent_node_id is not None:
+            # A node must not end up below itself (see utils.node_moves)
+            ancestry = None
+            if parent_node_id != node_id:
+                try:
+                    ancestry = load_ancestry(dynamodb, nodes_table, space_id, parent_node_id)
+                except InvalidMove as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': str(e)})
+                    }
+            if parent_node_id == node_id or any(item['nodeId'] == node_id for item in ancestry or []):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'A node cannot be moved below itself or one of its descendants'})
+                }
             update_expression_parts.append('parentNodeId = :pni')
             expression_attribute_values[':pni'] = parent_node_id
-        
+            # The path follows the parent; below a missing parent or too deep for the index the node gets none
+            parent_path = resolve_path(nodes_table, space_id, parent_node_id)
+            if parent_path is not None and fits(child_path(parent_path, node_id)):
+                new_path = child_path(parent_path, node_id)
+                update_expression_parts.append('#path = :path')
+                expression_attribute_values[':path'] = new_path
+            else:
+                remove_parts.append('#path')
+            expression_attribute_names['#path'] = PATH_FIELD
+
+        rebalanced = {}
+        order_key = None
+        if repositioned and uses_order_keys(spaces_table, space_id):
+            # One write places the node between its new neighbours (see utils.order_keys); the
+            # sibling list is that of the current parent unless the node changes parent
+            target_parent = parent_node_id
+            if target_parent is None:
+                current = nodes_table.get_item(
+                    Key={'nodeId': node_id, 'spaceId': space_id},
+                    ProjectionExpression='parentNodeId'
+                ).get('Item') or {}
+                target_parent = current.get('parentNodeId')
+            order_key, order_index, rebalanced = place_node(
+                nodes_table, space_id, target_parent, node_id,
+                position=order_index, after_id=after_node_id, before_id=before_node_id
+            )
+            update_expression_parts.append('orderKey = :ok')
+            expression_attribute_values[':ok'] = order_key
+
         if order_index is not None:
             update_expression_parts.append('orderIndex = :oi')
             expression_attribute_values[':oi'] = order_index
 
-        # Handle contentHTML update (S3 part)
-        current_s3_key = existing_node.get('s3Key')
-        new_s3_key = current_s3_key
-
+        # New content is referenced by hash before the node points at it, and uploaded only if
+        # no node of the space has stored the same bytes yet; the content it replaces is
+        # released afterwards, based on the old image the update returns
+        new_hash = None
         if content_html is not None:
-            if content_html == "": # If content is explicitly set to empty, delete S3 object if it exists
-                if current_s3_key:
-                    try:
-                        s3_client.delete_object(Bucket=content_bucket_name, Key=current_s3_key)
-                        print(f"Deleted S3 object {current_s3_key} as contentHTML is empty.")
-                    except Exception as e:
-                        print(f"Error deleting S3 object {current_s3_key}: {e}")
-                        # Potentially log this but don't fail the whole update
-                new_s3_key = None # Set s3Key to null in DynamoDB
-            else: # New or updated content
-                # Use existing key if available and makes sense, or generate/use a standard one
-                # For simplicity, let's assume s3_key is tied to nodeId and spaceId
-                new_s3_key = f"{space_id}/{node_id}.html"
+            remove_parts.append('contentS3Key')
+            if content_html == "":
+                remove_parts.extend(['s3Key', CONTENT_HASH_FIELD, CONTENT_ENCODING_FIELD])
+                update_expression_parts.append('contentPreview = :cp')
+                expression_attribute_values[':cp'] = ''
+            else:
                 try:
-                    s3_client.put_object(
-                        Bucket=content_bucket_name,
-                        Key=new_s3_key,
-                        Body=content_html.encode('utf-8'),
-                        ContentType='text/html'
-                    )
+                    new_hash, new_s3_key, encoding = acquire_content(spaces_table, s3_client, content_bucket_name,
+                                                                     space_id, content_html)
                 except Exception as e:
-                    print(f"Error uploading updated content to S3: {e}")
+                    print(f"Error storing updated content: {e}")
                     return {
                         'statusCode': 500,
                         'headers': {'Content-Type': 'application/json'},
-                        'body': json.dumps({'error': f'Failed to update content in S3: {str(e)}'})
+                        'body': json.dumps({'error': f'Failed to store content: {str(e)}'})
                     }
-            # Update s3Key in DynamoDB if it has changed
-            if new_s3_key != current_s3_key:
-                 update_expression_parts.append('s3Key = :sk')
-                 expression_attribute_values[':sk'] = new_s3_key
-            elif new_s3_key is None and current_s3_key is not None: # Handle case where s3Key becomes null
-                 update_expression_parts.append('s3Key = :sk')
-                 expression_attribute_values[':sk'] = None
+                print(f"Content store metrics: {json.dumps(content_stats.metrics())}")
+                update_expression_parts.append('s3Key = :sk, contentHash = :ch')
+                expression_attribute_values[':sk'] = new_s3_key
+                expression_attribute_values[':ch'] = new_hash
+                # The encoding the stored object has (see utils.content_codec); none for plain HTML
+                if encoding:
+                    update_expression_parts.append('contentEncoding = :ce')
+                    expression_attribute_values[':ce'] = encoding
+                else:
+                    remove_parts.append(CONTENT_ENCODING_FIELD)
+
+        update_expression_parts.append('updatedAt = :ua')
+        expression_attribute_values[':ua'] = datetime.datetime.utcnow().isoformat()
 
+        update_expression = 'SET ' + ', '.join(update_expression_parts)
+        if remove_parts:
+            update_expression += ' REMOVE ' + ', '.join(remove_parts)
+        update_expression += ' ' + INCREMENT_VERSION
+        increment_values(expression_attribute_values)
+        expression_attribute_names.update(VERSION_NAMES)
 
-        if not update_expression_parts:
-             # This case should ideally be caught earlier, but as a safeguard:
+        # One conditional write checks that the node exists and is not deleted (and, with
+        # If-Match, that it is at the version the client saw), applies the edit and returns the old image
+        condition = 'attribute_exists(nodeId) AND attribute_not_exists(deletedAt)'
+        if expected is not None:
+            condition += ' AND ' + version_condition(expected, expression_attribute_values)
+        try:
+            existing_node = nodes_table.update_item(
+                Key={'nodeId': node_id, 'spaceId': space_id},
+                UpdateExpression=update_expression,
+                ConditionExpression=condition,
+                ExpressionAttributeValues=expression_attribute_values,
+                ExpressionAttributeNames=expression_attribute_names,
+                ReturnValues='ALL_OLD'
+            ).get('Attributes', {})
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            release_contents(spaces_table, s3_client, content_bucket_name, space_id, [{CONTENT_HASH_FIELD: new_hash}])
+            version = current_version(nodes_table, space_id, node_id) if expected is not None else None
+            if version is not None:
+                return precondition_failed(version)
             return {
-                'statusCode': 200, # Or 304 Not Modified, but 200 with current item is also fine
+                'statusCode': 404,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps(existing_node) # No changes to DynamoDB attributes other than potentially s3Key handled above
+                'body': json.dumps({'error': 'Node not found'})
             }
 
-        update_expression_parts.append('updatedAt = :ua')
-        expression_attribute_values[':ua'] = datetime.datetime.utcnow().isoformat()
+        new_version = int(existing_node.get(VERSION_FIELD) or 0) + 1
+        try:
+            tree_version = bump_tree_version(spaces_table, space_id)
+        except Exception as e:
+            # The edit stands; the snapshot patched without a version is rebuilt on the next read
+            print(f"Failed to bump tree version of space {space_id}: {e}")
+            tree_version = None
 
-        update_expression = 'SET ' + ', '.join(update_expression_parts)
-        
-        params = {
-            'Key': {
-                'nodeId': node_id,
-                'spaceId': space_id
-            },
-            'UpdateExpression': update_expression,
-            'ExpressionAttributeValues': expression_attribute_values,            'ReturnValues': 'UPDATED_NEW'
-        }
-        if expression_attribute_names:
-            params['ExpressionAttributeNames'] = expression_attribute_names
+        # Hashed content is released (unchanged content thereby drops the reference just
+        # taken); older objects without a hash belong to this node alone and are deleted
+        if content_html is not None:
+            release_contents(spaces_table, s3_client, content_bucket_name, space_id, [existing_node])
+            delete_content_objects(s3_client, content_bucket_name, [existing_node])
 
-        response = nodes_table.update_item(**params)
+        # The old image has the path the descendants' paths were derived from. The node itself has
+        # moved either way; stale descendant paths are repaired by tools/backfill_node_paths.py
+        if parent_node_id is not None and new_path != existing_node.get(PATH_FIELD):
+            try:
+                descendants = load_descendants(nodes_table, space_id, existing_node, fields=('nodeId',))
+                rewritten = rewrite_subtree_paths(nodes_table, space_id, node_id, new_path, descendants)
+                print(f"Rewrote paths of {rewritten} descendants of moved node {node_id}")
+            except Exception as e:
+                print(f"Failed to rewrite descendant paths of moved node {node_id} in space {space_id}; "
+                      f"run tools/backfill_node_paths.py {space_id}: {e}")
+
+        # Log the change for delta sync under the new tree version and patch the materialized tree snapshot
+        changed_fields = {
+            'title': title,
+            'parentNodeId': parent_node_id,
+            'orderIndex': order_index,
+            ORDER_KEY_FIELD: order_key,
+            'updatedAt': expression_attribute_values[':ua'],
+            VERSION_FIELD: new_version
+        }
+        change = node_change(MOVED if repositioned else UPDATED, node_id, changed_fields)
+        if content_html is not None:
+            change['contentChanged'] = True
+        try:
+            record_tree_change(spaces_table, s3_client, content_bucket_name, space_id, tree_version, [change] + [
+                node_change(MOVED, sibling_id, {ORDER_KEY_FIELD: key}) for sibling_id, key in rebalanced.items()
+            ])
+        except Exception as e:
+            print(f"Failed to publish tree change for space {space_id}: {e}")
 
         # Publish event for content generation (only if title was updated and no existing content)
         if title is not None and not existing_node.get('s3Key'):
@@ -176,10 +282,20 @@ def lambda_handler(event, context):
                 print(f"Failed to publish event: {e}")
                 # Don't fail the whole operation if event publishing fails
 
+        # The attributes written, as UpdateItem's UPDATED_NEW would report them
+        updated_attributes = {
+            name: expression_attribute_values[placeholder]
+            for name, placeholder in (('title', ':t'), ('parentNodeId', ':pni'), (PATH_FIELD, ':path'),
+                                      (ORDER_KEY_FIELD, ':ok'), ('orderIndex', ':oi'), ('contentPreview', ':cp'),
+                                      ('s3Key', ':sk'), (CONTENT_HASH_FIELD, ':ch'), (CONTENT_ENCODING_FIELD, ':ce'),
+                                      ('updatedAt', ':ua'))
+            if placeholder in expression_attribute_values
+        }
+        updated_attributes[VERSION_FIELD] = new_version
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(response.get('Attributes', {}))
+            'headers': dict({'Content-Type': 'application/json'}, **etag_headers(new_version)),
+            'body': json.dumps(updated_attributes)
         }
 
     except Exception as e:
@@ -0,0 +1,198 @@
+import json
+import boto3
+import datetime
+import decimal
+import os
+import time
+import traceback
+from utils.change_log import compact_changes, find_first_version_after, has_record, read_changes
+from utils.http import get_query_param
+from utils.logger import StructuredLogger, extract_correlation_id
+from utils.space_version import get_tree_version, space_meta_key
+
+# Initialize structured logger
+logger = StructuredLogger('spaces_changes_handler')
+
+dynamodb = boto3.resource('dynamodb')
+SPACES_TABLE_NAME = os.environ.get('SPACES_TABLE_NAME', 'Spaces')
+spaces_table = dynamodb.Table(SPACES_TABLE_NAME)
+
+# Helper class to convert Decimal to float/int for JSON serialization
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, decimal.Decimal):
+            # Convert decimal to int or float
+            if o % 1 > 0:
+                return float(o)
+            else:
+                return int(o)
+        return super(DecimalEncoder, self).default(o)
+
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+# A write records its changes right after its transaction commits the new tree version; a
+# version missing for longer than this behind a newer record is taken as lost, not pending
+PENDING_CHANGE_SECONDS = int(os.environ.get('CHANGE_LOG_PENDING_SECONDS', '60'))
+PENDING_RETRY_MS = 200
+
+
+def parse_since(value):
+    """
+    Parse the since parameter: a treeVersion (integer) or an ISO-8601 timestamp.
+    Returns ('version', int) or ('timestamp', naive UTC isoformat string); raises ValueError.
+    """
+    if value.isdigit():
+        return 'version', int(value)
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return 'timestamp', parsed.isoformat()
+
+
+def reset_required_response(space_id, tree_version):
+    return {
+        'statusCode': 410,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({
+            'error': 'Changes since the requested point are no longer available; reload the space tree',
+            'spaceId': space_id,
+            'treeVersion': tree_version,
+            'resetRequired': True
+        })
+    }
+
+
+def lambda_handler(event, context):
+    """
+    Returns the nodes created, updated, moved or deleted in a space since a client-supplied
+    treeVersion or timestamp, collapsed to one entry per node (deletes are tombstones).
+    Required path parameter: spaceId
+    Query parameters: since (treeVersion or ISO-8601 timestamp), limit (change records per page)
+    """
+    start_time = time.time()
+    correlation_id = extract_correlation_id(event)
+    space_id = (event.get('pathParameters') or {}).get('spaceId')
+
+    try:
+        since_param = get_query_param(event, 'since')
+        if not space_id or not since_param:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'spaceId path parameter and since query parameter are required'})
+            }
+        try:
+            since_kind, since_value = parse_since(since_param)
+            limit = min(int(get_query_param(event, 'limit') or DEFAULT_LIMIT), MAX_LIMIT)
+            if limit < 1:
+                raise ValueError('limit must be positive')
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': f'Invalid query parameter: {str(e)}'})
+            }
+
+        space_item = spaces_table.get_item(Key=space_meta_key(space_id), ConsistentRead=True).get('Item')
+        if space_item is None:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Space not found'})
+            }
+        tree_version = get_tree_version(space_item)
+
+        if since_kind == 'version':
+            since_version = since_value
+        else:
+            first_version = find_first_version_after(spaces_table, space_id, since_value)
+            if first_version is None:
+                since_version = tree_version
+            elif first_version > 1 and not has_record(spaces_table, space_id, first_version - 1):
+                # Older changes have expired, so some of them may also be newer than the timestamp
+                return reset_required_response(space_id, tree_version)
+            else:
+                since_version = first_version - 1
+
+        if since_version > tree_version:
+            return reset_required_response(space_id, tree_version)
+
+        records, has_more = read_changes(spaces_table, space_id, since_version, limit)
+
+        # The log must continue exactly where the client left off. Concurrent writes record their
+        # changes in any order after committing, so a version missing behind a newer record is
+        # usually still being written: the changes before it are served and the client retries
+        # from there. Only a hole at the client's own position whose preceding record has
+        # expired, or one that stays open past PENDING_CHANGE_SECONDS, requires a reload.
+        expected_version = since_version + 1
+        pending_version = None
+        for index, record in enumerate(records):
+            version = int(record['version'])
+            if version > expected_version:
+                expired = index == 0 and since_version > 0 and not has_record(spaces_table, space_id, since_version)
+                cutoff = (datetime.datetime.utcnow()
+                          - datetime.timedelta(seconds=PENDING_CHANGE_SECONDS)).isoformat()
+                if expired or record.get('changedAt', '') < cutoff:
+                    return reset_required_response(space_id, tree_version)
+                pending_version = expected_version
+                records = records[:index]
+                has_more = True
+                break
+            expected_version = version + 1
+
+        changes = compact_changes(records)
+        next_since = expected_version - 1
+        body = {
+            'spaceId': space_id,
+            'since': since_version,
+            'nextSince': next_since,
+            'treeVersion': max(tree_version, next_since),
+            'hasMore': has_more,
+            'resetRequired': False,
+            'changes': changes
+        }
+        if pending_version is not None:
+            body['pendingVersion'] = pending_version
+            body['retryAfterMs'] = PENDING_RETRY_MS
+
+        logger.business_logic(
+            message=f"Served {len(changes)} node changes for space {space_id}",
+            correlation_id=correlation_id,
+            operation="space_changes",
+            additional_data={
+                "space_id": space_id,
+                "since": since_version,
+                "record_count": len(records),
+                "change_count": len(changes),
+                "has_more": has_more,
+                "pending_version": pending_version
+            }
+        )
+        response = {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'},
+            'body': json.dumps(body, cls=DecimalEncoder)
+        }
+        logger.response(
+            status_code=200,
+            correlation_id=correlation_id,
+            response_size=len(response['body']),
+            execution_time_ms=(time.time() - start_time) * 1000
+        )
+        return response
+
+    except Exception as e:
+        logger.error(
+            error_type=type(e).__name__,
+            message=f"Error in spaces changes handler: {str(e)}",
+            correlation_id=correlation_id,
+            stack_trace=traceback.format_exc(),
+            error_code="SPACE_CHANGES_FAILED",
+            additional_context={"space_id": space_id}
+        )
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Could not get space changes', 'details': str(e)}, default=str)
+        }
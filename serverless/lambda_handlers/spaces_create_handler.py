@@ -5,7 +5,9 @@ import datetime
 import os
 import time
 import traceback
+from utils.http import get_body
 from utils.logger import StructuredLogger, PerformanceTracker, extract_correlation_id, extract_user_id
+from utils.order_keys import ORDER_MODE_FIELD, ORDER_MODE_RANK
 
 # Initialize structured logger
 logger = StructuredLogger('spaces_create_handler')
@@ -26,12 +28,12 @@ def lambda_handler(event, context):
             path=event.get('path', '/spaces'),
             correlation_id=correlation_id,
             user_id=user_id,
-            body=json.loads(event.get('body', '{}')),
+            body=json.loads(get_body(event)),
             headers=event.get('headers', {})
         )
         
         # Parse and validate request body
-        body = json.loads(event.get('body', '{}'))
+        body = json.loads(get_body(event))
         name = body.get('name')
         description = body.get('description')
 
@@ -84,6 +86,9 @@ def lambda_handler(event, context):
             'createdAt': created_at,
             'updatedAt': created_at
         }
+        # Opt in to fractional order keys for sibling order (see utils/order_keys.py)
+        if body.get(ORDER_MODE_FIELD) == ORDER_MODE_RANK:
+            item[ORDER_MODE_FIELD] = ORDER_MODE_RANK
 
         # Execute database operation with performance tracking
         with PerformanceTracker(logger, 'dynamodb_put_item', correlation_id):
@@ -105,6 +110,8 @@ def lambda_handler(event, context):
             'createdAt': created_at,
             'ownerId': owner_id
         }
+        if ORDER_MODE_FIELD in item:
+            response_body[ORDER_MODE_FIELD] = item[ORDER_MODE_FIELD]
 
         response = {
             'statusCode': 201,
@@ -1,18 +1,39 @@
 import json
 import boto3
 import os
+import traceback
+from boto3.dynamodb.conditions import Key
+from utils.bulk_delete import delete_pages
+from utils.change_log import purge_change_log
+from utils.content_store import purge_content_records
+from utils.content_purge import purge_prefixes, space_content_prefixes
+from utils.delete_jobs import DELETE_ASYNC_THRESHOLD, DELETE_SPACE, accepted_response, create_job, enqueue_job
+from utils.logger import StructuredLogger, extract_correlation_id
+from utils.node_deletion import DELETE_FIELDS, delete_content_objects
+from utils.node_queries import SPACE_NODES_INDEX, QueryStats, projection_params, query_cursor_pages
+from utils.space_version import space_meta_key
+
+# Initialize structured logger
+logger = StructuredLogger('spaces_delete_handler')
 
 dynamodb = boto3.resource('dynamodb')
 spaces_table_name = os.environ.get('SPACES_TABLE_NAME', 'Spaces')
 spaces_table = dynamodb.Table(spaces_table_name)
 nodes_table_name = os.environ.get('NODES_TABLE_NAME', 'Nodes')
 nodes_table = dynamodb.Table(nodes_table_name)
+s3_client = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+content_bucket_name = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
 
 def lambda_handler(event, context):
     """
     Deletes a space and all its associated nodes.
+    Spaces with more than DELETE_ASYNC_THRESHOLD nodes are removed from view at once and their
+    nodes deleted by the delete worker; the response is 202 Accepted with a job id (GET /jobs/{jobId}).
     Required path parameter: spaceId
     """
+    correlation_id = extract_correlation_id(event)
+    space_id = None
     try:
         path_parameters = event.get('pathParameters', {})
         space_id = path_parameters.get('spaceId')
@@ -24,43 +45,65 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'spaceId is required in path parameters'})
             }
 
-        # 1. Delete all nodes associated with the spaceId
-        # We need to query all nodes for the space first, then delete them.
-        # A GSI on spaceId for the Nodes table would be efficient here.
-        # For now, we'll scan, which is not ideal for large tables.
-        # Consider if Nodes table has a GSI on spaceId for efficient querying.
-        
-        # Query for nodes belonging to the space
-        # If a GSI `SpaceIdIndex` exists on `Nodes` table with `spaceId` as its hash key:
-        # response_nodes = nodes_table.query(
-        #     IndexName='SpaceIdIndex', # Assuming a GSI named 'SpaceIdIndex'
-        #     KeyConditionExpression=boto3.dynamodb.conditions.Key('spaceId').eq(space_id)
-        # )
-        # For now, using scan as a fallback (less efficient)
-        response_nodes = nodes_table.scan(
-            FilterExpression=boto3.dynamodb.conditions.Attr('spaceId').eq(space_id)
-        )
-        
-        nodes_to_delete = response_nodes.get('Items', [])
+        # 1. Read the space's nodes page by page from SpaceIdNodesIndex, stopping as soon as
+        # the space turns out to be too large to delete within this request
+        read_stats = QueryStats()
+        pages = []
+        node_count = 0
+        for items, cursor in query_cursor_pages(nodes_table, stats=read_stats, IndexName=SPACE_NODES_INDEX,
+                                                KeyConditionExpression=Key('spaceId').eq(space_id),
+                                                Limit=DELETE_ASYNC_THRESHOLD + 1, **projection_params(DELETE_FIELDS)):
+            pages.append((items, cursor))
+            node_count += len(items)
+            if node_count > DELETE_ASYNC_THRESHOLD:
+                break
 
+        if node_count > DELETE_ASYNC_THRESHOLD:
+            # Hide the space right away; the worker removes its nodes, content and change log in the background
+            spaces_table.delete_item(Key=space_meta_key(space_id))
+            job = create_job(spaces_table, DELETE_SPACE, space_id)
+            enqueue_job(lambda_client, job['jobId'])
+            logger.business_logic(
+                message=f"Queued delete job {job['jobId']} for space {space_id}",
+                correlation_id=correlation_id,
+                operation="space_delete_queued",
+                additional_data={"space_id": space_id, "job_id": job['jobId']}
+            )
+            return accepted_response(job)
+
+        # 2. Delete the nodes with parallel BatchWriteItem requests
+        nodes_to_delete = [item for items, _ in pages for item in items]
         if nodes_to_delete:
-            with nodes_table.batch_writer() as batch:
-                for node in nodes_to_delete:
-                    batch.delete_item(
-                        Key={
-                            'nodeId': node['nodeId'],
-                            'spaceId': node['spaceId'] # Assuming composite key for Nodes table
-                        }
-                    )
-            print(f"Deleted {len(nodes_to_delete)} nodes for space {space_id}")
+            write_stats = delete_pages(dynamodb, nodes_table_name, [
+                ([{'nodeId': item['nodeId'], 'spaceId': space_id} for item in items], cursor)
+                for items, cursor in pages
+            ])
+            logger.performance(
+                operation='space_nodes_delete',
+                execution_time_ms=write_stats.elapsed_seconds * 1000,
+                correlation_id=correlation_id,
+                additional_metrics=dict(write_stats.as_dict(), space_id=space_id,
+                                        read=read_stats.as_dict())
+            )
 
-        # 2. Delete the space itself
-        spaces_table.delete_item(
-            Key={
-                'PK': f"SPACE#{space_id}",
-                'SK': "META"
-            }
-        )
+        # 3. Delete the space itself
+        spaces_table.delete_item(Key=space_meta_key(space_id))
+
+        # 4. Delete the nodes' S3 content under every key layout, and the tree snapshot
+        delete_content_objects(s3_client, content_bucket_name, nodes_to_delete)
+        try:
+            result = purge_prefixes(s3_client, content_bucket_name, space_content_prefixes(space_id))
+            print(f"Purged S3 prefixes of space {space_id}: {result.as_dict()}")
+        except Exception as e:
+            print(f"Failed to purge S3 content for space {space_id}: {e}")
+
+        # 5. Drop the space's delta-sync change log (TTL would expire it eventually) and the
+        # reference counts of its shared content, whose objects went with the prefixes above
+        try:
+            purge_change_log(spaces_table, space_id)
+            purge_content_records(spaces_table, space_id)
+        except Exception as e:
+            print(f"Failed to purge change log for space {space_id}: {e}")
 
         return {
             'statusCode': 204,
@@ -69,7 +112,14 @@ def lambda_handler(event, context):
         }
 
     except Exception as e:
-        print(f"Error deleting space: {e}")
+        logger.error(
+            error_type=type(e).__name__,
+            message=f"Error deleting space: {str(e)}",
+            correlation_id=correlation_id,
+            stack_trace=traceback.format_exc(),
+            error_code="SPACE_DELETE_FAILED",
+            additional_context={"space_id": space_id}
+        )
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
@@ -1,14 +1,218 @@
 import json
 import boto3
 import os
+import time
+import traceback
+from utils.content_fetch import CONTENT_FIELDS, INCLUDE_MODES, fetch_node_content
+from utils.compression import encode_body, encoded_response, negotiate_encoding
+from utils.http import get_header, get_query_param
+from utils.logger import StructuredLogger, PerformanceTracker, extract_correlation_id
+from utils.node_queries import TREE_FIELDS, QueryStats, load_space_nodes
+from utils.subtree import load_subtree
+from utils.tombstones import visible_items
+from utils.space_version import etag_matches, get_tree_version, space_meta_key, tree_etag
+from utils.tree_builder import assemble_tree, columnar_tree, iter_nodes, iter_tree_json
+from utils.tree_cache import TreeCache
+from utils.tree_snapshot import load_snapshot, new_snapshot, save_snapshot, snapshot_entry, snapshot_items
+
+# Initialize structured logger
+logger = StructuredLogger('spaces_tree_handler')
 
 dynamodb = boto3.resource('dynamodb')
+s3_client = boto3.client('s3')
+CONTENT_BUCKET_NAME = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
 SPACES_TABLE_NAME = os.environ.get('SPACES_TABLE_NAME', 'MindMapSpaces')
 NODES_TABLE_NAME = os.environ.get('NODES_TABLE_NAME', 'MindMapNodes')
 
+# Serialized full-tree responses, reused across invocations of a warm container
+tree_cache = TreeCache()
+
+
+def get_space_item(space_id):
+    """
+    Read the space META item (strongly consistent, so its treeVersion reflects every
+    acknowledged write). Returns None if the space does not exist.
+    """
+    space_table = dynamodb.Table(SPACES_TABLE_NAME)
+
+    # Special handling for the test environment - we'll try both PK/SK pattern and direct spaceId
+    try:
+        space_item_response = space_table.get_item(Key=space_meta_key(space_id), ConsistentRead=True)
+        if "Item" in space_item_response:
+            return space_item_response["Item"]
+        # Try direct lookup by spaceId for testing
+        space_item_response = space_table.get_item(Key={"spaceId": space_id})
+        return space_item_response.get("Item")
+    except Exception as e:
+        # If both attempts fail, try a scan to find the space
+        # This is very inefficient but helps during testing with inconsistent data models
+        print(f"Error looking up space by key, trying scan: {e}")
+        scan_response = space_table.scan(
+            FilterExpression=boto3.dynamodb.conditions.Attr('spaceId').eq(space_id)
+        )
+        if not scan_response.get('Items'):
+            return None
+        return scan_response['Items'][0]
+
+
+def load_tree_items(space_id, tree_version, correlation_id):
+    """
+    Return the flat node items of a space, served from its materialized snapshot when
+    the snapshot is at least as new as tree_version. Otherwise the items are loaded from
+    the Nodes table and the snapshot is (re)built for subsequent reads.
+    """
+    stale_etag = None
+    try:
+        with PerformanceTracker(logger, 's3_get_tree_snapshot', correlation_id):
+            doc, snapshot_etag = load_snapshot(s3_client, CONTENT_BUCKET_NAME, space_id)
+        if doc is not None and doc.get('treeVersion', 0) < tree_version:
+            stale_etag = snapshot_etag
+        elif doc is not None:
+            logger.business_logic(
+                message=f"Serving tree for space {space_id} from snapshot",
+                correlation_id=correlation_id,
+                operation="tree_snapshot_hit",
+                additional_data={"space_id": space_id, "node_count": len(doc['nodes'])}
+            )
+            return snapshot_items(doc)
+    except Exception as e:
+        logger.error(
+            error_type=type(e).__name__,
+            message=f"Failed to read tree snapshot, falling back to DynamoDB: {str(e)}",
+            correlation_id=correlation_id,
+            additional_context={"space_id": space_id}
+        )
+
+    # Load all nodes of this space with a paginated query on SpaceIdNodesIndex
+    nodes_table = dynamodb.Table(NODES_TABLE_NAME)
+    stats = QueryStats()
+    with PerformanceTracker(logger, 'dynamodb_query_space_nodes', correlation_id):
+        items = visible_items(load_space_nodes(nodes_table, space_id, stats=stats))
+
+    logger.database_operation(
+        operation="query",
+        table_name=NODES_TABLE_NAME,
+        correlation_id=correlation_id,
+        item_count=stats.items,
+        consumed_capacity=stats.consumed_capacity
+    )
+
+    # Replace a stale snapshot only if it is unchanged, and otherwise only create one if none
+    # exists, so that a concurrently patched snapshot is never overwritten
+    doc = new_snapshot(space_id, items, tree_version)
+    try:
+        save_snapshot(s3_client, CONTENT_BUCKET_NAME, space_id, doc,
+                      etag=stale_etag, create_only=stale_etag is None)
+    except Exception as e:
+        logger.error(
+            error_type=type(e).__name__,
+            message=f"Failed to store tree snapshot: {str(e)}",
+            correlation_id=correlation_id,
+            additional_context={"space_id": space_id}
+        )
+    return snapshot_items(doc)
+
+
+def load_content_tree_items(space_id, correlation_id):
+    """
+    Load every node of a space together with its content attributes. Snapshots only hold the
+    tree attributes, so ?include= requests always read the Nodes table.
+    """
+    nodes_table = dynamodb.Table(NODES_TABLE_NAME)
+    stats = QueryStats()
+    with PerformanceTracker(logger, 'dynamodb_query_space_nodes', correlation_id):
+        items = visible_items(load_space_nodes(nodes_table, space_id, fields=TREE_FIELDS + CONTENT_FIELDS,
+                                               stats=stats))
+
+    logger.database_operation(
+        operation="query",
+        table_name=NODES_TABLE_NAME,
+        correlation_id=correlation_id,
+        item_count=stats.items,
+        consumed_capacity=stats.consumed_capacity
+    )
+    return items
+
+
+def load_partial_tree_items(space_id, root_node_id, depth, correlation_id, extra_fields=()):
+    """
+    Load only part of a space breadth-first through ParentNodeIdIndex (see utils.subtree).
+    Returns (items, expandable_ids), or None if root_node_id does not exist in the space
+    or is hidden by a tombstone.
+    """
+    nodes_table = dynamodb.Table(NODES_TABLE_NAME)
+    stats = QueryStats()
+    with PerformanceTracker(logger, 'dynamodb_query_subtree', correlation_id):
+        result = load_subtree(nodes_table, space_id, root_node_id=root_node_id, depth=depth,
+                              fields=TREE_FIELDS + tuple(extra_fields), stats=stats)
+    if result is None:
+        return None
+
+    logger.database_operation(
+        operation="query",
+        table_name=NODES_TABLE_NAME,
+        correlation_id=correlation_id,
+        item_count=stats.items,
+        consumed_capacity=stats.consumed_capacity
+    )
+    items, expandable_ids = result
+    return [
+        dict(snapshot_entry(item), nodeId=item['nodeId'], **{f: item[f] for f in extra_fields if f in item})
+        for item in items
+    ], expandable_ids
+
+
+def attach_content(tree, items, include, correlation_id):
+    """Inline node content into an assembled tree, fetching top levels first."""
+    items_by_id = {item['nodeId']: item for item in items}
+    ordered = [items_by_id[node.node_id] for node in iter_nodes(tree.roots)]
+    fetch_start = time.time()
+    contents, stats = fetch_node_content(s3_client, CONTENT_BUCKET_NAME, ordered, include)
+    for node in iter_nodes(tree.roots):
+        node.extra = contents.get(node.node_id)
+    logger.performance(
+        operation='tree_include_content',
+        execution_time_ms=(time.time() - fetch_start) * 1000,
+        correlation_id=correlation_id,
+        additional_metrics=dict(stats, include=include)
+    )
+
+
+def build_tree(items, correlation_id, root_ids=None, expandable_ids=None):
+    """
+    Assemble flat node items into ordered root nodes (see utils.tree_builder), logging
+    any orphaned nodes or parent cycles found in the data.
+    """
+    tree = assemble_tree(items, root_ids=root_ids, expandable_ids=expandable_ids)
+    if tree.orphans or tree.cycles:
+        logger.business_logic(
+            message=f"Tree has {len(tree.orphans)} orphaned nodes and {len(tree.cycles)} nodes in parent cycles",
+            correlation_id=correlation_id,
+            operation="tree_integrity",
+            additional_data={"orphans": tree.orphans[:50], "cycles": tree.cycles[:50]}
+        )
+    return tree
+
+
+TREE_FORMATS = ('nested', 'columnar')
+
+
+def render_chunks(header, tree, tree_format='nested'):
+    """Yield the JSON response body in chunks: the header fields followed by the nodes."""
+    if tree_format == 'columnar':
+        yield json.dumps(dict(header, format='columnar', nodes=columnar_tree(tree.roots)), default=str)
+        return
+    yield json.dumps(header, default=str)[:-1] + ', "nodes": '
+    yield from iter_tree_json(tree.roots)
+    yield '}'
+
+
 def lambda_handler(event, context):
+    start_time = time.time()
+    correlation_id = extract_correlation_id(event)
+
     try:
-        space_id = event.get('pathParameters', {}).get('spaceId')
+        space_id = (event.get('pathParameters') or {}).get('spaceId')
         if not space_id:
             return {
                 'statusCode': 400,
@@ -16,90 +220,133 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'spaceId is required'})
             }
 
-        # Get space details
+        # Optional partial fetch: start below rootNodeId and/or stop after depth levels
+        root_node_id = get_query_param(event, 'rootNodeId')
+        depth_param = get_query_param(event, 'depth')
+        depth = None
+        if depth_param is not None:
+            if not depth_param.isdigit():
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'depth must be a non-negative integer'})
+                }
+            depth = int(depth_param)
+        tree_format = get_query_param(event, 'format') or 'nested'
+        if tree_format not in TREE_FORMATS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': f"format must be one of: {', '.join(TREE_FORMATS)}"})
+            }
+        include = get_query_param(event, 'include')
+        if include is not None and include not in INCLUDE_MODES:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': f"include must be one of: {', '.join(INCLUDE_MODES)}"})
+            }
+
         try:
-            space_table = dynamodb.Table(SPACES_TABLE_NAME)
-            
-            # Special handling for the test environment - we'll try both PK/SK pattern and direct spaceId
-            try:
-                space_item_response = space_table.get_item(Key={"PK": f"SPACE#{space_id}", "SK": "META"})
-                if "Item" in space_item_response:
-                    space_name = space_item_response["Item"].get("name", "Unnamed Space")
-                else:
-                    # Try direct lookup by spaceId for testing
-                    space_item_response = space_table.get_item(Key={"spaceId": space_id})
-                    if "Item" not in space_item_response:
-                        return {
-                            'statusCode': 404,
-                            'headers': {'Content-Type': 'application/json'},
-                            'body': json.dumps({'error': 'Space not found'})
-                        }
-                    space_name = space_item_response["Item"].get("name", "Unnamed Space")
-            except Exception as e:
-                # If both attempts fail, try a scan to find the space
-                # This is very inefficient but helps during testing with inconsistent data models
-                print(f"Error looking up space by key, trying scan: {e}")
-                scan_response = space_table.scan(
-                    FilterExpression=boto3.dynamodb.conditions.Attr('spaceId').eq(space_id)
+            space_item = get_space_item(space_id)
+            if space_item is None:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Space not found'})
+                }
+
+            # Conditional GET: answer from the META item alone when the client is up to date.
+            # Inline content is not covered by treeVersion (generated content is written
+            # asynchronously), so ?include= responses are not validated or cached.
+            etag = tree_etag(space_item)
+            if include:
+                cache_headers = {'Cache-Control': 'no-store'}
+            else:
+                cache_headers = {
+                    'ETag': etag,
+                    'Cache-Control': 'no-cache',
+                    'Access-Control-Expose-Headers': 'ETag'
+                }
+            if not include and etag_matches(get_header(event, 'If-None-Match'), etag):
+                logger.response(
+                    status_code=304,
+                    correlation_id=correlation_id,
+                    execution_time_ms=(time.time() - start_time) * 1000
                 )
-                if not scan_response.get('Items'):
+                return {'statusCode': 304, 'headers': cache_headers, 'body': ''}
+
+            # Large trees are compressed when the client allows it (see utils.compression)
+            encoding = negotiate_encoding(get_header(event, 'Accept-Encoding'))
+            variant_key = f"{tree_format}:{encoding or 'identity'}"
+
+            body = {
+                'spaceId': space_id,
+                'name': space_item.get('name', 'Unnamed Space'),
+                'treeVersion': get_tree_version(space_item)
+            }
+            if include:
+                body['include'] = include
+            if root_node_id or depth is not None:
+                partial = load_partial_tree_items(space_id, root_node_id, depth, correlation_id,
+                                                  extra_fields=CONTENT_FIELDS if include else ())
+                if partial is None:
                     return {
                         'statusCode': 404,
                         'headers': {'Content-Type': 'application/json'},
-                        'body': json.dumps({'error': 'Space not found'})
+                        'body': json.dumps({'error': 'Root node not found'})
                     }
-                space_name = scan_response['Items'][0].get('name', 'Unnamed Space')
+                items, expandable_ids = partial
+                root_ids = {root_node_id} if root_node_id else None
+                body['rootNodeId'] = root_node_id
+                body['depth'] = depth
+                tree = build_tree(items, correlation_id, root_ids=root_ids, expandable_ids=expandable_ids)
+                if include:
+                    attach_content(tree, items, include, correlation_id)
+                encoded = encode_body(render_chunks(body, tree, tree_format), encoding)
+            elif include:
+                items = load_content_tree_items(space_id, correlation_id)
+                tree = build_tree(items, correlation_id)
+                attach_content(tree, items, include, correlation_id)
+                encoded = encode_body(render_chunks(body, tree, tree_format), encoding)
+            else:
+                # The ETag was computed from the consistent META read above, so a cached tree
+                # built from the same ETag reflects every acknowledged write. Each entry holds
+                # the encoded bodies produced so far, one per wire format and content encoding.
+                cache_start = time.time()
+                variants = tree_cache.get(space_id, etag) or {}
+                encoded = variants.get(variant_key)
+                cache_hit = encoded is not None
+                if not cache_hit:
+                    items = load_tree_items(space_id, get_tree_version(space_item), correlation_id)
+                    encoded = encode_body(render_chunks(body, build_tree(items, correlation_id), tree_format), encoding)
+                    variants = dict(variants, **{variant_key: encoded})
+                    tree_cache.put(space_id, etag, variants, sum(len(v[0]) for v in variants.values()))
+                logger.performance(
+                    operation='tree_cache',
+                    execution_time_ms=(time.time() - cache_start) * 1000,
+                    correlation_id=correlation_id,
+                    additional_metrics=dict(tree_cache.metrics(), cache_hit=cache_hit, space_id=space_id)
+                )
 
-            # Get all nodes for this space (using scan for simplicity in testing)
-            nodes_table = dynamodb.Table(NODES_TABLE_NAME)
-            nodes_response = nodes_table.scan(
-                FilterExpression=boto3.dynamodb.conditions.Attr('spaceId').eq(space_id)
-            )
-            items = nodes_response.get('Items', [])
-            
-            # Build tree structure
-            node_map = {}
-            for item in items:
-                node_id = item['nodeId']
-                node_map[node_id] = {
-                    'nodeId': node_id,
-                    'title': item.get('title'),
-                    'parentNodeId': item.get('parentNodeId'),
-                    'orderIndex': item.get('orderIndex', 0),
-                    'children': []
-                }
+            response = encoded_response(200, dict(cache_headers, **{'Content-Type': 'application/json'}), encoded)
 
-            root_nodes = []
-            for node_id in node_map:
-                node = node_map[node_id]
-                parent_id = node.get('parentNodeId')
-                if parent_id and parent_id in node_map:
-                    node_map[parent_id]['children'].append(node)
-                elif not parent_id:
-                    root_nodes.append(node)
-            
-            # Sort children by orderIndex
-            def sort_children_recursive(nodes_list):
-                for node_item in nodes_list:
-                    if node_item['children']:
-                        node_item['children'].sort(key=lambda x: x.get('orderIndex', 0))
-                        sort_children_recursive(node_item['children'])
-                return nodes_list
-
-            sort_children_recursive(root_nodes)
-            root_nodes.sort(key=lambda x: x.get('orderIndex', 0))
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({
-                    'spaceId': space_id, 
-                    'name': space_name, 
-                    'nodes': root_nodes
-                }, default=str)  # <-- Easiest fix for Decimal serialization
-            }
+            logger.response(
+                status_code=200,
+                correlation_id=correlation_id,
+                response_size=len(response['body']),
+                execution_time_ms=(time.time() - start_time) * 1000
+            )
+            return response
         except Exception as e:
-            print(f"Error in spaces tree handler: {e}")
+            logger.error(
+                error_type=type(e).__name__,
+                message=f"Error in spaces tree handler: {str(e)}",
+                correlation_id=correlation_id,
+                stack_trace=traceback.format_exc(),
+                error_code="SPACE_TREE_FAILED",
+                additional_context={"space_id": space_id}
+            )
             return {
                 'statusCode': 500,
                 'headers': {'Content-Type': 'application/json'},
@@ -3,6 +3,7 @@ import boto3
 import os
 import datetime
 import decimal
+from utils.http import get_body
 
 # Helper class to convert Decimal to float/int for JSON serialization
 class DecimalEncoder(json.JSONEncoder):
@@ -36,7 +37,7 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'spaceId is required in path parameters'})
             }
 
-        body = json.loads(event.get('body', '{}'))
+        body = json.loads(get_body(event))
         name = body.get('name')
         description = body.get('description')
 
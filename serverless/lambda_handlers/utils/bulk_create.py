@@ -0,0 +1,245 @@
+"""
+Bulk node creation for POST /spaces/{spaceId}/nodes/batch.
+
+A nested outline is flattened into node items (parents before children) in memory, then
+persisted the way nodes_add_handler persists one node, only batched: large content is
+stored by hash (utils.content_store) with one concurrent acquire per distinct content, so
+an outline repeating a template uploads it once; items are written with parallel BatchWriteItem
+requests of 25 (items with client-assigned ids with conditional puts, see put_new_items), and content generation events are sent 10 entries per put_events call
+(the EventBridge maximum).
+"""
+
+import datetime
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.bulk_delete import BATCH_WRITE_MAX_ITEMS, write_batch
+from utils.content_codec import CONTENT_ENCODING_FIELD
+from utils.content_store import CONTENT_HASH_FIELD, acquire_content, content_hash
+from utils.node_paths import PATH_FIELD, child_path, fits
+from utils.node_versions import VERSION_FIELD
+from utils.order_keys import ORDER_KEY_FIELD, spread_keys
+from utils.transactions import TransactionCanceled, chunks, put_operation, transact_write
+
+MAX_BATCH_NODES = int(os.environ.get('NODES_BATCH_MAX_NODES', '5000'))
+BATCH_CREATE_CONCURRENCY = int(os.environ.get('NODES_BATCH_CONCURRENCY', '16'))
+# Same threshold as nodes_add_handler: longer content is stored in S3
+INLINE_CONTENT_MAX_CHARS = 1000
+PUT_EVENTS_MAX_ENTRIES = 10
+
+
+class OutlineError(ValueError):
+    """The outline in the request body is malformed; the message is safe to return to clients."""
+
+
+def _client_node_id(entry: Dict[str, Any]) -> Optional[str]:
+    """The id the client assigned, normalized; it must be a UUID like the ids nodes_add_handler assigns."""
+    node_id = entry.get('nodeId')
+    if node_id is None:
+        return None
+    try:
+        return str(uuid.UUID(str(node_id)))
+    except ValueError:
+        raise OutlineError(f'nodeId {node_id!r} is not a UUID')
+
+
+def flatten_outline(space_id: str, outline: List[Dict[str, Any]], parent_id: Optional[str],
+                    parent_path: Optional[str], first_order_index: int = 0,
+                    max_nodes: int = MAX_BATCH_NODES) -> Tuple[List[Dict[str, Any]], Dict[str, str], List[str]]:
+    """
+    Node items for an outline ([{title, contentHTML?, nodeId?, children?}, ...]) placed below
+    parent_id (None for top level) whose path is parent_path, in pre-order so every parent
+    precedes its children; siblings get consecutive orderIndex values. Also returns the
+    content of the nodes that have some, by node id, and the ids the client assigned (which
+    the caller checks for collisions). Raises OutlineError.
+    """
+    if not isinstance(outline, list) or not outline:
+        raise OutlineError('nodes must be a non-empty list')
+    created_at = datetime.datetime.utcnow().isoformat()
+    items: List[Dict[str, Any]] = []
+    contents: Dict[str, str] = {}
+    seen = set()
+    supplied: List[str] = []
+    # (entry, parent id, parent path or None if the parent has none, orderIndex); reversed so pops run in order
+    stack = [(entry, parent_id, parent_path, first_order_index + position)
+             for position, entry in reversed(list(enumerate(outline)))]
+    while stack:
+        entry, entry_parent, entry_parent_path, order_index = stack.pop()
+        if not isinstance(entry, dict) or not isinstance(entry.get('title'), str) or not entry['title']:
+            raise OutlineError('every node needs a non-empty title')
+        if len(items) >= max_nodes:
+            raise OutlineError(f'at most {max_nodes} nodes can be created per request')
+        node_id = _client_node_id(entry)
+        if node_id is None:
+            node_id = str(uuid.uuid4())
+        else:
+            supplied.append(node_id)
+        if node_id in seen:
+            raise OutlineError(f'nodeId {node_id} appears more than once')
+        seen.add(node_id)
+
+        item = {
+            'nodeId': node_id,
+            'spaceId': space_id,
+            'title': entry['title'],
+            'orderIndex': order_index,
+            'createdAt': created_at,
+            'updatedAt': created_at,
+            VERSION_FIELD: 1,
+        }
+        if entry_parent is not None:
+            item['parentNodeId'] = entry_parent
+        # Same rule as nodes_add_handler: no path below a node without one, or past the index limit
+        path = None
+        if entry_parent is None or entry_parent_path is not None:
+            path = child_path(entry_parent_path, node_id)
+            if fits(path):
+                item[PATH_FIELD] = path
+            else:
+                path = None
+        content = entry.get('contentHTML')
+        if content is not None:
+            if not isinstance(content, str):
+                raise OutlineError('contentHTML must be a string')
+            contents[node_id] = content
+        items.append(item)
+
+        children = entry.get('children') or []
+        if not isinstance(children, list):
+            raise OutlineError('children must be a list')
+        stack.extend((child, node_id, path, position) for position, child in reversed(list(enumerate(children))))
+    return items, contents, supplied
+
+
+def assign_order_keys(items: List[Dict[str, Any]], parent_id: Optional[str], top_keys: List[str]):
+    """
+    Set orderKey on flattened items in a space using order keys: the outline's top-level
+    nodes (the children of parent_id) take top_keys, in order; every new sibling list below
+    them gets evenly spaced keys, since it has no other members.
+    """
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for item in items:
+        children.setdefault(item.get('parentNodeId'), []).append(item)
+    for sibling_parent, siblings in children.items():
+        keys = top_keys if sibling_parent == parent_id else spread_keys(len(siblings))
+        for item, key in zip(siblings, keys):
+            item[ORDER_KEY_FIELD] = key
+
+
+def _parallel(func, args: List[Any]) -> List[Any]:
+    if not args:
+        return []
+    with ThreadPoolExecutor(max_workers=min(BATCH_CREATE_CONCURRENCY, len(args))) as executor:
+        return list(executor.map(func, args))
+
+
+def store_contents(spaces_table, s3_client, bucket: str, space_id: str, items: List[Dict[str, Any]],
+                   contents: Dict[str, str]) -> List[str]:
+    """
+    Attach content to the items as nodes_add_handler does: short content inline as
+    contentPreview, long content stored by hash with a 100-character preview. Items with
+    the same content share one acquire (and at most one upload), run concurrently per
+    distinct content. A failed store keeps the preview only. Returns the ids whose store failed.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        content = contents.get(item['nodeId'])
+        if content is None:
+            continue
+        if len(content) > INLINE_CONTENT_MAX_CHARS:
+            item['contentPreview'] = content[:100]
+            groups.setdefault(content_hash(content), []).append(item)
+        else:
+            item['contentPreview'] = content
+
+    def store(group):
+        try:
+            digest, s3_key, encoding = acquire_content(spaces_table, s3_client, bucket, space_id,
+                                                       contents[group[0]['nodeId']], refs=len(group))
+        except Exception as e:
+            print(f"Failed to store content of {len(group)} nodes in S3: {e}")
+            return [item['nodeId'] for item in group]
+        for item in group:
+            item['s3Key'] = s3_key
+            item[CONTENT_HASH_FIELD] = digest
+            if encoding:
+                item[CONTENT_ENCODING_FIELD] = encoding
+        return []
+
+    return [node_id for failed in _parallel(store, list(groups.values())) for node_id in failed]
+
+
+def put_items(dynamodb, table_name: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Write items with parallel BatchWriteItem requests; raises if a batch cannot be written."""
+    batches = [
+        [{'PutRequest': {'Item': item}} for item in items[start:start + BATCH_WRITE_MAX_ITEMS]]
+        for start in range(0, len(items), BATCH_WRITE_MAX_ITEMS)
+    ]
+    results = _parallel(lambda batch: write_batch(dynamodb, table_name, batch), batches)
+    return {
+        'items_written': sum(result[0] for result in results),
+        'batch_write_requests': sum(result[1] for result in results),
+        'unprocessed_retries': sum(result[2] for result in results),
+        'consumed_wcu': sum(result[3] for result in results)
+    }
+
+
+def put_new_items(client, table_name: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write items that must not replace an existing node (client-assigned ids) with conditional
+    puts (attribute_not_exists(nodeId)), TRANSACT_MAX_ITEMS per TransactWriteItems and the
+    transactions in parallel; each transaction writes all of its items or none. Returns the
+    items written, the ids that already existed and the errors of other failed transactions,
+    so the caller can undo exactly what was written.
+    """
+    def write(chunk):
+        try:
+            transact_write(client, [put_operation(table_name, item, condition='attribute_not_exists(nodeId)')
+                                    for item in chunk])
+            return chunk, [], None
+        except TransactionCanceled as e:
+            existing = [item['nodeId'] for item, reason in zip(chunk, e.reasons) if reason == 'ConditionalCheckFailed']
+            return [], existing, None if existing else e
+        except Exception as e:
+            return [], [], e
+
+    results = _parallel(write, list(chunks(items)))
+    return {
+        'written': [item for written, _, _ in results for item in written],
+        'existing': [node_id for _, existing, _ in results for node_id in existing],
+        'errors': [error for _, _, error in results if error is not None]
+    }
+
+
+def publish_created_events(eventbridge_client, event_bus_name: str, items: List[Dict[str, Any]]) -> int:
+    """
+    Send a 'MindMapNode Created' event (the same detail as nodes_add_handler) for every item,
+    10 entries per put_events call with the calls in parallel. Returns the number of entries
+    EventBridge did not accept; failures are logged, not raised.
+    """
+    entries = [{
+        'Source': 'mindmap-content-events',
+        'DetailType': 'MindMapNode Created',
+        'Detail': json.dumps({
+            'nodeId': item['nodeId'],
+            'spaceId': item['spaceId'],
+            'title': item['title'],
+            'parentNodeId': item.get('parentNodeId'),
+            'orderIndex': item['orderIndex'],
+            'createdAt': item['createdAt']
+        }),
+        'EventBusName': event_bus_name
+    } for item in items]
+
+    def send(chunk):
+        try:
+            return eventbridge_client.put_events(Entries=chunk).get('FailedEntryCount', 0)
+        except Exception as e:
+            print(f"Failed to publish {len(chunk)} node creation events: {e}")
+            return len(chunk)
+
+    chunks = [entries[start:start + PUT_EVENTS_MAX_ENTRIES] for start in range(0, len(entries), PUT_EVENTS_MAX_ENTRIES)]
+    return sum(_parallel(send, chunks))
@@ -0,0 +1,130 @@
+"""
+Pipelined bulk deletion of Nodes items, used to purge whole spaces.
+
+Pages of keys (normally a paginated SpaceIdNodesIndex query) are split into BatchWriteItem
+requests of 25 deletes that run on a thread pool while the next page is being read.
+UnprocessedItems are retried with exponential backoff and jitter. A page counts as done once
+its writes and those of every earlier page have finished; its query cursor can then serve
+as a resume checkpoint.
+"""
+
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.node_queries import BATCH_BACKOFF_BASE_SECONDS, BATCH_MAX_ATTEMPTS
+
+BATCH_WRITE_MAX_ITEMS = 25
+WRITE_CONCURRENCY = int(os.environ.get('BULK_DELETE_CONCURRENCY', '8'))
+# Batches submitted but not finished; bounds memory when reads outpace writes
+MAX_IN_FLIGHT_BATCHES = WRITE_CONCURRENCY * 4
+
+# (keys of one page, cursor to resume after that page or None at the end)
+KeyPage = Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class BulkDeleteStats:
+    """Throughput counters for one bulk delete."""
+
+    def __init__(self):
+        self.items = 0
+        self.pages = 0
+        self.requests = 0
+        self.retries = 0
+        self.consumed_wcu = 0.0
+        self.started = time.time()
+        self.elapsed_seconds = 0.0
+
+    def add_batch(self, deleted: int, requests: int, retries: int, consumed_wcu: float):
+        self.items += deleted
+        self.requests += requests
+        self.retries += retries
+        self.consumed_wcu += consumed_wcu
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = self.elapsed_seconds or (time.time() - self.started)
+        return {
+            'items_deleted': self.items,
+            'pages': self.pages,
+            'batch_write_requests': self.requests,
+            'unprocessed_retries': self.retries,
+            'consumed_wcu': self.consumed_wcu,
+            'items_per_second': round(self.items / elapsed, 1) if elapsed > 0 else None,
+            'wcu_per_second': round(self.consumed_wcu / elapsed, 1) if elapsed > 0 else None
+        }
+
+
+def write_batch(dynamodb, table_name: str, requests: List[Dict[str, Any]]) -> Tuple[int, int, int, float]:
+    """
+    Run up to 25 PutRequest/DeleteRequest entries with BatchWriteItem, retrying UnprocessedItems.
+    Returns (written, requests, retries, consumed_wcu).
+    """
+    pending = list(requests)
+    calls = retries = 0
+    consumed = 0.0
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        if attempt:
+            retries += 1
+            # Full jitter keeps parallel workers from retrying in lockstep
+            time.sleep(random.uniform(0, BATCH_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+        response = dynamodb.batch_write_item(RequestItems={table_name: pending}, ReturnConsumedCapacity='TOTAL')
+        calls += 1
+        for capacity in response.get('ConsumedCapacity') or []:
+            consumed += float(capacity.get('CapacityUnits', 0) or 0)
+        pending = (response.get('UnprocessedItems') or {}).get(table_name) or []
+        if not pending:
+            return len(requests), calls, retries, consumed
+    raise RuntimeError(f'BatchWriteItem left {len(pending)} writes unprocessed after {BATCH_MAX_ATTEMPTS} attempts')
+
+
+def write_delete_batch(dynamodb, table_name: str, keys: List[Dict[str, Any]]) -> Tuple[int, int, int, float]:
+    """
+    Delete up to 25 items with BatchWriteItem, retrying UnprocessedItems.
+    Returns (deleted, requests, retries, consumed_wcu).
+    """
+    return write_batch(dynamodb, table_name, [{'DeleteRequest': {'Key': key}} for key in keys])
+
+
+def delete_pages(dynamodb, table_name: str, pages: Iterable[KeyPage],
+                 on_page_done: Optional[Callable[[int, Optional[Dict[str, Any]]], None]] = None) -> BulkDeleteStats:
+    """
+    Delete the keys of every page, reading the next page while earlier ones are written.
+    on_page_done(deleted, cursor) is called in page order once a page and all earlier pages
+    are fully deleted. The first failed batch is raised after in-flight writes settle.
+    """
+    stats = BulkDeleteStats()
+    open_pages = deque()  # (futures, key count, cursor) in page order
+
+    def settle(block: bool):
+        while open_pages:
+            futures, count, cursor = open_pages[0]
+            if block:
+                wait(futures)
+            elif not all(future.done() for future in futures):
+                return
+            open_pages.popleft()
+            for future in futures:
+                stats.add_batch(*future.result())
+            stats.pages += 1
+            if on_page_done is not None:
+                on_page_done(count, cursor)
+
+    with ThreadPoolExecutor(max_workers=WRITE_CONCURRENCY) as executor:
+        try:
+            for keys, cursor in pages:
+                futures = [
+                    executor.submit(write_delete_batch, dynamodb, table_name, keys[start:start + BATCH_WRITE_MAX_ITEMS])
+                    for start in range(0, len(keys), BATCH_WRITE_MAX_ITEMS)
+                ]
+                open_pages.append((futures, len(keys), cursor))
+                settle(block=False)
+                while open_pages and sum(len(page[0]) for page in open_pages) > MAX_IN_FLIGHT_BATCHES:
+                    wait(open_pages[0][0])
+                    settle(block=False)
+            settle(block=True)
+        finally:
+            stats.elapsed_seconds = time.time() - stats.started
+    return stats
@@ -0,0 +1,183 @@
+"""
+Append-only per-space change log backing GET /spaces/{spaceId}/changes.
+
+Each treeVersion bump writes one record to the Spaces table next to the space META item:
+    PK = SPACE#{spaceId}, SK = CHANGE#{version:012d}#{chunk:04d}
+holding the node changes made by that write. Records expire through DynamoDB TTL
+(expiresAt), so the feed only covers a retention window; clients that fall behind it
+are told to reload the full tree.
+"""
+
+import datetime
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+
+from utils.node_queries import query_pages
+from utils.node_versions import VERSION_FIELD
+from utils.order_keys import ORDER_KEY_FIELD
+from utils.space_version import space_meta_key
+
+CHANGE_TTL_SECONDS = int(os.environ.get('CHANGE_LOG_TTL_SECONDS', str(7 * 24 * 3600)))
+CHANGES_PER_RECORD = 500
+CHANGE_PREFIX = 'CHANGE#'
+VERSION_DIGITS = 12
+LAST_CHANGE_SORT_KEY = f'{CHANGE_PREFIX}{"9" * VERSION_DIGITS}#9999'
+
+# Change operations
+CREATED = 'created'
+UPDATED = 'updated'
+MOVED = 'moved'
+DELETED = 'deleted'
+
+# Node attributes a CREATED entry carries, whichever write brings the node into the tree
+CREATED_FIELDS = ('title', 'parentNodeId', 'orderIndex', ORDER_KEY_FIELD, 'updatedAt', VERSION_FIELD)
+
+
+def change_sort_key(version: int, chunk: int = 0) -> str:
+    return f'{CHANGE_PREFIX}{version:0{VERSION_DIGITS}d}#{chunk:04d}'
+
+
+def node_change(op: str, node_id: str, fields: Optional[Dict[str, Any]] = None,
+                cleared: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Build one change entry; deletes are tombstones carrying only the node id. None values
+    mean "unchanged" and are dropped, except for the fields in cleared, which are sent as
+    null (e.g. parentNodeId of a node moved to the top level).
+    """
+    change = {'op': op, 'nodeId': node_id}
+    if op != DELETED:
+        change['node'] = {k: v for k, v in (fields or {}).items() if v is not None or k in cleared}
+    return change
+
+
+def record_changes(spaces_table, space_id: str, version: int, changes: List[Dict[str, Any]]):
+    """Append the changes made by the write that produced `version`."""
+    changed_at = datetime.datetime.utcnow().isoformat()
+    expires_at = int(time.time()) + CHANGE_TTL_SECONDS
+    chunks = [changes[i:i + CHANGES_PER_RECORD] for i in range(0, len(changes), CHANGES_PER_RECORD)] or [[]]
+    for chunk_number, chunk in enumerate(chunks):
+        spaces_table.put_item(Item={
+            'PK': space_meta_key(space_id)['PK'],
+            'SK': change_sort_key(version, chunk_number),
+            'version': version,
+            'changes': chunk,
+            'changedAt': changed_at,
+            'expiresAt': expires_at
+        })
+
+
+def _version_of(record: Dict[str, Any]) -> int:
+    return int(record['version'])
+
+
+def read_changes(spaces_table, space_id: str, since_version: int,
+                 limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Read change records newer than since_version in version order.
+    Returns (records, has_more); records of one version are never split across calls.
+    """
+    params = {
+        'KeyConditionExpression': Key('PK').eq(space_meta_key(space_id)['PK']) & Key('SK').between(
+            change_sort_key(since_version + 1), LAST_CHANGE_SORT_KEY),
+        'ConsistentRead': True
+    }
+    records: List[Dict[str, Any]] = []
+    for page in query_pages(spaces_table, **params):
+        for record in page:
+            if len(records) >= limit and _version_of(record) != _version_of(records[-1]):
+                return records, True
+            records.append(record)
+    return records, False
+
+
+def _record_from(spaces_table, space_id: str, version: int,
+                 newest: bool = False) -> Optional[Dict[str, Any]]:
+    """version and changedAt of the first retained record at or after `version` (or the newest record)."""
+    response = spaces_table.query(
+        KeyConditionExpression=Key('PK').eq(space_meta_key(space_id)['PK']) & Key('SK').between(
+            change_sort_key(version), LAST_CHANGE_SORT_KEY),
+        ProjectionExpression='version, changedAt',
+        ScanIndexForward=not newest,
+        Limit=1,
+        ConsistentRead=True
+    )
+    items = response.get('Items', [])
+    return items[0] if items else None
+
+
+def find_first_version_after(spaces_table, space_id: str, timestamp: str) -> Optional[int]:
+    """
+    Version of the oldest retained change made after an ISO timestamp.
+    Records are written in version order, so changedAt grows with the version: a binary search
+    over versions, each step a one-item Query from that version's sort key, finds it in
+    O(log n) reads however long the log is. Versions without a record (a write whose record
+    failed or is still being written) resolve to the next record.
+    """
+    oldest = _record_from(spaces_table, space_id, 0)
+    if oldest is None or oldest['changedAt'] > timestamp:
+        return _version_of(oldest) if oldest else None
+    newest = _record_from(spaces_table, space_id, 0, newest=True)
+    if newest['changedAt'] <= timestamp:
+        return None
+    # The record from `low` is at or before the timestamp, the one from `high` after it
+    low, high, found = _version_of(oldest), _version_of(newest), newest
+    while high - low > 1:
+        middle = (low + high) // 2
+        record = _record_from(spaces_table, space_id, middle)
+        if record['changedAt'] > timestamp:
+            high, found = middle, record
+        else:
+            low = middle
+    return _version_of(found)
+
+
+def has_record(spaces_table, space_id: str, version: int) -> bool:
+    response = spaces_table.get_item(
+        Key={'PK': space_meta_key(space_id)['PK'], 'SK': change_sort_key(version)},
+        ProjectionExpression='version',
+        ConsistentRead=True
+    )
+    return 'Item' in response
+
+
+def compact_changes(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Collapse a run of change records into one entry per node, in order of last change.
+    Field updates are merged; a node whose last change is a delete becomes a tombstone.
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        for change in record.get('changes', []):
+            node_id = change['nodeId']
+            previous = latest.pop(node_id, None)
+            if change['op'] == DELETED or previous is None or previous['op'] == DELETED:
+                merged = dict(change)
+            else:
+                merged = {
+                    'op': CREATED if previous['op'] == CREATED else change['op'],
+                    'nodeId': node_id,
+                    'node': dict(previous.get('node', {}), **change.get('node', {}))
+                }
+                if previous['op'] == MOVED and change['op'] == UPDATED:
+                    merged['op'] = MOVED
+            merged['version'] = _version_of(record)
+            latest[node_id] = merged
+    return list(latest.values())
+
+
+def purge_change_log(spaces_table, space_id: str) -> int:
+    """Delete every change record of a space (used when the space itself is deleted)."""
+    params = {
+        'KeyConditionExpression': Key('PK').eq(space_meta_key(space_id)['PK']) & Key('SK').begins_with(CHANGE_PREFIX),
+        'ProjectionExpression': 'PK, SK'
+    }
+    deleted = 0
+    with spaces_table.batch_writer() as batch:
+        for page in query_pages(spaces_table, **params):
+            for record in page:
+                batch.delete_item(Key={'PK': record['PK'], 'SK': record['SK']})
+                deleted += 1
+    return deleted
@@ -0,0 +1,133 @@
+"""
+Response compression for large JSON payloads behind API Gateway.
+
+The encoding is negotiated from Accept-Encoding (br when the optional brotli package is
+installed, otherwise gzip). Bodies are fed to the compressor incrementally from an iterable
+of string chunks, so a tree is never held as one uncompressed string next to its compressed
+copy. Compressed bodies are returned base64-encoded with isBase64Encoded, which API Gateway
+decodes because the API declares their media types (application/json, text/html) as
+binaryMediaTypes; clients send that type in Accept. Bodies below COMPRESSION_MIN_BYTES are
+returned as plain text.
+"""
+
+import base64
+import os
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Chunks are joined into blocks of about this size before each compressor call
+FEED_BLOCK_CHARS = 64 * 1024
+
+# (body, Content-Encoding or None, isBase64Encoded)
+EncodedBody = Tuple[str, Optional[str], bool]
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """Encodings this container can produce, in order of preference."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding: Optional[str],
+                       candidates: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Pick the preferred encoding allowed by an Accept-Encoding header, or None. Candidates
+    default to supported_encodings(); nodes_get_handler passes the encoding content is stored with.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        fields = part.strip().split(';')
+        coding = fields[0].strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for coding in candidates if candidates is not None else supported_encodings():
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def _compressor(encoding: str):
+    if encoding == 'br':
+        return brotli.Compressor(quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def _finish(compressor, encoding: str) -> bytes:
+    return compressor.finish() if encoding == 'br' else compressor.flush()
+
+
+def _feed(compressor, encoding: str, text: str) -> bytes:
+    data = text.encode('utf-8')
+    return compressor.process(data) if encoding == 'br' else compressor.compress(data)
+
+
+def encode_body(chunks: Iterable[str], encoding: Optional[str]) -> EncodedBody:
+    """
+    Encode a body given as string chunks. Returns (body, content_encoding, is_base64);
+    content_encoding is None when the body stayed uncompressed.
+    """
+    iterator = iter(chunks)
+    buffered = []
+    buffered_chars = 0
+    if encoding:
+        for chunk in iterator:
+            buffered.append(chunk)
+            buffered_chars += len(chunk)
+            if buffered_chars >= COMPRESSION_MIN_BYTES:
+                break
+        else:
+            encoding = None
+    if not encoding:
+        buffered.extend(iterator)
+        return ''.join(buffered), None, False
+
+    compressor = _compressor(encoding)
+    output = [_feed(compressor, encoding, ''.join(buffered))]
+    block, block_chars = [], 0
+    for chunk in iterator:
+        block.append(chunk)
+        block_chars += len(chunk)
+        if block_chars >= FEED_BLOCK_CHARS:
+            output.append(_feed(compressor, encoding, ''.join(block)))
+            block, block_chars = [], 0
+    if block:
+        output.append(_feed(compressor, encoding, ''.join(block)))
+    output.append(_finish(compressor, encoding))
+    return base64.b64encode(b''.join(output)).decode('ascii'), encoding, True
+
+
+def encoded_response(status_code: int, headers: Dict[str, str], encoded: EncodedBody) -> Dict[str, object]:
+    """Build an API Gateway proxy response from encode_body() output."""
+    body, content_encoding, is_base64 = encoded
+    headers = dict(headers, Vary='Accept-Encoding')
+    if content_encoding:
+        headers['Content-Encoding'] = content_encoding
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
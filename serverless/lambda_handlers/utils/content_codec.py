@@ -0,0 +1,89 @@
+"""
+Compression of node content stored in S3.
+
+Content of at least CONTENT_COMPRESSION_MIN_BYTES (UTF-8) is stored compressed with
+CONTENT_CODEC: gzip by default, or zstd when the optional zstandard package is installed.
+The encoding is recorded on the node (contentEncoding) and on the object (ContentEncoding),
+so readers decode by the node's value and a client that accepts the encoding can be sent the
+stored bytes unchanged. Content without an encoding is plain UTF-8 HTML, which is what every
+object written before compression holds.
+
+Inline contentPreview values stay uncompressed: they are at most 1,000 characters, where
+compression saves little, and tree and listing responses return them as they are.
+"""
+
+import os
+import zlib
+from typing import Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CONTENT_ENCODING_FIELD = 'contentEncoding'
+CONTENT_COMPRESSION_MIN_BYTES = int(os.environ.get('CONTENT_COMPRESSION_MIN_BYTES', '1024'))
+CONTENT_CODEC = os.environ.get('CONTENT_CODEC', 'gzip')
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# wbits for the gzip container (header and CRC), as HTTP Content-Encoding: gzip expects
+GZIP_WBITS = 31
+
+
+def content_codec(codec: Optional[str] = None) -> Optional[str]:
+    """The codec new content is written with: 'zstd', 'gzip', or None for 'identity'."""
+    codec = (codec or CONTENT_CODEC).lower()
+    if codec == 'zstd':
+        # Without the package this container can neither write nor read zstd
+        return 'zstd' if zstandard is not None else 'gzip'
+    if codec == 'gzip':
+        return 'gzip'
+    return None
+
+
+def decodable(encoding: Optional[str]) -> bool:
+    return encoding in (None, 'gzip') or (encoding == 'zstd' and zstandard is not None)
+
+
+def encode_content(content_html: str, codec: Optional[str] = None,
+                   min_bytes: Optional[int] = None) -> Tuple[bytes, Optional[str]]:
+    """UTF-8 encode content_html and compress it if it is large enough. Returns (body, encoding)."""
+    data = content_html.encode('utf-8')
+    codec = content_codec(codec)
+    threshold = CONTENT_COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+    if codec is None or len(data) < threshold:
+        return data, None
+    if codec == 'zstd':
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+        compressed = compressor.compress(data) + compressor.flush()
+    # Content that does not shrink (already compressed media inlined as base64, say) stays plain
+    if len(compressed) >= len(data):
+        return data, None
+    return compressed, codec
+
+
+def decode_content(data: bytes, encoding: Optional[str]) -> str:
+    """Inverse of encode_content. Raises ValueError for an encoding this container cannot read."""
+    if not encoding:
+        return data.decode('utf-8')
+    if encoding == 'gzip':
+        return zlib.decompress(data, GZIP_WBITS).decode('utf-8')
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data).decode('utf-8')
+    raise ValueError(f'Unsupported content encoding: {encoding}')
+
+
+def decode_prefix(data: bytes, encoding: Optional[str], max_bytes: int) -> str:
+    """
+    Decode the start of an object from a ranged read: data may end anywhere in the compressed
+    stream (and the text inside a multi-byte character). Returns at most max_bytes of text.
+    """
+    if encoding == 'gzip':
+        data = zlib.decompressobj(GZIP_WBITS).decompress(data, max_bytes)
+    elif encoding == 'zstd' and zstandard is not None:
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    elif encoding:
+        raise ValueError(f'Unsupported content encoding: {encoding}')
+    return data[:max_bytes].decode('utf-8', errors='ignore')
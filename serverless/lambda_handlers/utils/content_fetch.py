@@ -0,0 +1,139 @@
+"""
+Inline node content for GET /spaces/{spaceId}?include=preview|content.
+
+Content lives in one of two places: short content (and the preview of long content) in the
+node item's contentPreview, full content in S3 in any of the layouts utils.content_store
+resolves (content_object). DynamoDB-resident values are used directly; S3 objects are
+fetched through a bounded thread pool under a per-request byte and time budget. Nodes whose
+content could not be fetched within the budget are flagged contentPending so the client can
+fall back to GET /spaces/{spaceId}/nodes/{nodeId}.
+
+Objects under s3Key may be compressed (contentEncoding on the node, see utils.content_codec);
+they are decoded here, previews from the start of the compressed stream.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.content_codec import CONTENT_ENCODING_FIELD, decode_content, decode_prefix
+from utils.content_store import content_object
+
+CONTENT_FIELDS = ('contentPreview', 's3Key', 'contentS3Key', CONTENT_ENCODING_FIELD)
+INCLUDE_MODES = ('preview', 'content')
+
+# The add handler keeps content up to this many characters inline; previews use the same size
+PREVIEW_BYTES = 1000
+FETCH_CONCURRENCY = int(os.environ.get('CONTENT_FETCH_CONCURRENCY', '16'))
+BYTE_BUDGET = int(os.environ.get('CONTENT_FETCH_BYTE_BUDGET', str(2 * 1024 * 1024)))
+TIME_BUDGET_MS = int(os.environ.get('CONTENT_FETCH_TIME_BUDGET_MS', '3000'))
+
+
+class FetchBudget:
+    """Byte and wall-clock allowance shared by the fetch workers of one request."""
+
+    def __init__(self, max_bytes: int = BYTE_BUDGET, time_budget_ms: int = TIME_BUDGET_MS):
+        self.bytes_left = max_bytes
+        self.deadline = time.monotonic() + time_budget_ms / 1000.0
+        self._lock = threading.Lock()
+
+    def remaining_seconds(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def exhausted(self) -> bool:
+        return self.bytes_left <= 0 or self.remaining_seconds() == 0
+
+    def take(self, size: int) -> bool:
+        """Charge size bytes; False (and nothing charged) if that would exceed the budget."""
+        with self._lock:
+            if size > self.bytes_left:
+                self.bytes_left = 0
+                return False
+            self.bytes_left -= size
+            return True
+
+
+def resolve_content(item: Dict[str, Any], include: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Decide where a node's content comes from. Returns (inline_value, s3_key); at most one is set.
+    An object under s3Key wins over contentPreview because the update handler rewrites s3Key
+    without refreshing the preview; the add handler's preview next to contentS3Key is the start
+    of that object, good enough for previews. Without an object, contentPreview holds the
+    complete content.
+    """
+    key, _ = content_object(item)
+    preview = item.get('contentPreview')
+    if key and (item.get('s3Key') or include == 'content' or preview is None):
+        return None, key
+    return preview, None
+
+
+def _fetch(s3_client, bucket: str, key: str, encoding: Optional[str], include: str,
+           budget: FetchBudget) -> Optional[str]:
+    if budget.exhausted():
+        return None
+    params = {'Bucket': bucket, 'Key': key}
+    if include == 'preview':
+        params['Range'] = f'bytes=0-{PREVIEW_BYTES - 1}'
+    data = s3_client.get_object(**params)['Body'].read()
+    if not budget.take(len(data)):
+        return None
+    # A ranged read can end inside a multi-byte character (or the compressed stream)
+    if include == 'preview':
+        return decode_prefix(data, encoding, PREVIEW_BYTES)
+    return decode_content(data, encoding)
+
+
+def fetch_node_content(s3_client, bucket: str, items: List[Dict[str, Any]], include: str,
+                       budget: Optional[FetchBudget] = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Any]]:
+    """
+    Resolve content for items (in priority order). Returns ({nodeId: fields}, stats) where fields
+    is {'contentPreview'|'contentHTML': text}, {'contentPending': True} or {'contentError': msg}.
+    Nodes without content get no entry.
+    """
+    budget = budget or FetchBudget()
+    field = 'contentPreview' if include == 'preview' else 'contentHTML'
+    results: Dict[str, Dict[str, Any]] = {}
+    to_fetch: List[Tuple[str, str, Optional[str]]] = []
+    for item in items:
+        inline, s3_key = resolve_content(item, include)
+        if inline is not None:
+            results[item['nodeId']] = {field: inline}
+        elif s3_key:
+            to_fetch.append((item['nodeId'], s3_key, content_object(item)[1]))
+
+    stats = {'inline': len(results), 's3_requested': len(to_fetch), 's3_fetched': 0, 'pending': 0, 'errors': 0}
+    if not to_fetch:
+        return results, stats
+
+    executor = ThreadPoolExecutor(max_workers=min(FETCH_CONCURRENCY, len(to_fetch)))
+    try:
+        futures = {
+            executor.submit(_fetch, s3_client, bucket, key, encoding, include, budget): node_id
+            for node_id, key, encoding in to_fetch
+        }
+        done, _ = wait(futures, timeout=budget.remaining_seconds())
+        for future, node_id in futures.items():
+            if future not in done:
+                future.cancel()
+                results[node_id] = {'contentPending': True}
+                stats['pending'] += 1
+                continue
+            try:
+                text = future.result()
+            except Exception as e:
+                results[node_id] = {'contentError': f'Failed to fetch content from S3: {str(e)}'}
+                stats['errors'] += 1
+                continue
+            if text is None:
+                results[node_id] = {'contentPending': True}
+                stats['pending'] += 1
+            else:
+                results[node_id] = {field: text}
+                stats['s3_fetched'] += 1
+    finally:
+        # Do not wait for fetches still running past the time budget
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results, stats
@@ -0,0 +1,145 @@
+"""
+Deleting node content from the content bucket.
+
+Node content has been written under these key layouts over time:
+    nodes/{nodeId}/content.html          add handler (contentS3Key)
+    nodes/{spaceId}/{nodeId}/content.html content generator (s3Key), until it stored content by hash
+    {spaceId}/{nodeId}.html              update handler (s3Key), until each edit got its own object
+    {spaceId}/{nodeId}/{revision}.html   update handler (s3Key), until content was stored by hash
+    {spaceId}/content/{hash}.html        utils.content_store (s3Key with contentHash), shared
+utils.content_store reads all of them; tools/migrate_content_keys.py moves the older ones to
+hashed keys.
+Node deletes purge the keys recorded on the deleted items, except shared objects, which are
+released through their reference count (utils.content_store.release_contents). Space
+deletes additionally purge the per-space prefixes, which catches objects whose node item is
+already gone, together with the space's tree snapshot. Keys are deleted with DeleteObjects in batches of 1000 issued in
+parallel; keys reported in a batch's Errors are retried with exponential backoff.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List
+
+from utils.tree_snapshot import SNAPSHOT_KEY_TEMPLATE
+
+DELETE_OBJECTS_MAX_KEYS = 1000
+PURGE_CONCURRENCY = int(os.environ.get('CONTENT_PURGE_CONCURRENCY', '8'))
+PURGE_MAX_ATTEMPTS = 4
+PURGE_BACKOFF_BASE_SECONDS = 0.1
+
+# Node item attributes holding content object keys
+CONTENT_KEY_FIELDS = ('s3Key', 'contentS3Key')
+# Set on nodes whose s3Key is a shared, reference-counted object (see utils.content_store)
+CONTENT_HASH_FIELD = 'contentHash'
+
+
+class PurgeResult:
+    """Counters for one purge; failed maps each key that could not be deleted to its last error."""
+
+    def __init__(self):
+        self.requested = 0
+        self.deleted = 0
+        self.requests = 0
+        self.failed: Dict[str, str] = {}
+
+    def merge(self, other: 'PurgeResult'):
+        self.requested += other.requested
+        self.deleted += other.deleted
+        self.requests += other.requests
+        self.failed.update(other.failed)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'requested': self.requested,
+            'deleted': self.deleted,
+            'requests': self.requests,
+            'failed': len(self.failed)
+        }
+
+
+def node_content_keys(items: Iterable[Dict[str, Any]]) -> List[str]:
+    """Content object keys recorded on node items, without duplicates or shared (hashed) objects."""
+    keys = []
+    seen = set()
+    for item in items:
+        for field in CONTENT_KEY_FIELDS:
+            if field == 's3Key' and item.get(CONTENT_HASH_FIELD):
+                continue
+            key = item.get(field)
+            if key and key not in seen:
+                seen.add(key)
+                keys.append(key)
+    return keys
+
+
+def space_content_prefixes(space_id: str) -> List[str]:
+    """Prefixes holding only objects of one space (add-handler keys are per node, not per space)."""
+    return [
+        f'nodes/{space_id}/',
+        f'{space_id}/',
+        SNAPSHOT_KEY_TEMPLATE.format(space_id=space_id).rsplit('/', 1)[0] + '/'
+    ]
+
+
+def _delete_batch(s3_client, bucket: str, keys: List[str]) -> PurgeResult:
+    result = PurgeResult()
+    result.requested = len(keys)
+    pending = keys
+    for attempt in range(PURGE_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(PURGE_BACKOFF_BASE_SECONDS * (2 ** (attempt - 1)))
+        result.requests += 1
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in pending], 'Quiet': True}
+            )
+        except Exception as e:
+            errors = {key: str(e) for key in pending}
+        else:
+            errors = {error['Key']: error.get('Code', 'Error') for error in response.get('Errors', [])}
+        result.deleted += len(pending) - len(errors)
+        pending = [key for key in pending if key in errors]
+        if not pending:
+            return result
+        result.failed = {key: errors[key] for key in pending}
+    return result
+
+
+def purge_keys(s3_client, bucket: str, keys: Iterable[str]) -> PurgeResult:
+    """Delete keys in batches of 1000, up to PURGE_CONCURRENCY batches at a time."""
+    keys = list(keys)
+    batches = [keys[start:start + DELETE_OBJECTS_MAX_KEYS]
+               for start in range(0, len(keys), DELETE_OBJECTS_MAX_KEYS)]
+    result = PurgeResult()
+    if len(batches) <= 1:
+        for batch in batches:
+            result.merge(_delete_batch(s3_client, bucket, batch))
+        return result
+    with ThreadPoolExecutor(max_workers=min(PURGE_CONCURRENCY, len(batches))) as executor:
+        for batch_result in executor.map(lambda batch: _delete_batch(s3_client, bucket, batch), batches):
+            result.merge(batch_result)
+    return result
+
+
+def _list_keys(s3_client, bucket: str, prefix: str) -> Iterator[List[str]]:
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys = [obj['Key'] for obj in page.get('Contents', [])]
+        if keys:
+            yield keys
+
+
+def purge_prefixes(s3_client, bucket: str, prefixes: Iterable[str]) -> PurgeResult:
+    """Delete every object under the prefixes; listing pages (1000 keys) are deleted as they arrive."""
+    result = PurgeResult()
+    with ThreadPoolExecutor(max_workers=PURGE_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(_delete_batch, s3_client, bucket, keys)
+            for prefix in prefixes
+            for keys in _list_keys(s3_client, bucket, prefix)
+        ]
+        for future in futures:
+            result.merge(future.result())
+    return result
@@ -0,0 +1,306 @@
+"""
+Content-addressed storage of node content.
+
+Content is stored once per space under its SHA-256, {spaceId}/content/{hash}.html, and the
+node records the hash as contentHash next to s3Key. A record in the Spaces table
+(PK SPACE#{spaceId}, SK CONTENT#{hash}) counts the nodes referencing the object.
+acquire_content adds references with one UpdateItem whose old image tells whether the
+object is already stored; if it is, the PUT is skipped, so an autosave of unchanged content
+or a template pasted into another node costs no upload.
+
+release_content drops references; the last one only marks the record released (releasedAt,
+and released, the hash key of the sparse ReleasedContentIndex GSI). Nothing is deleted in
+line: collect_released_content, run by node_reaper_handler, takes records released longer
+than CONTENT_GC_GRACE_SECONDS ago, claims each with a conditional write (refs <= 0, sets
+deletingAt), deletes the object and then the record, provided it is still the claimed one.
+An acquire clears the release mark. If it lands on a claimed record, the object may be
+going, so it uploads the content under the next generation's key
+({spaceId}/content/{hash}.{generation}.html) and removes the claim; the collector then
+only deletes the old generation's object and leaves the record alone.
+
+Objects are compressed per utils.content_codec; the record keeps the encoding next to
+storedAt, so a write that skips the upload still learns how the stored bytes are encoded.
+
+Keys are per space, so a space delete purges the objects with the space's S3 prefixes and
+the records with purge_content_records. Objects in the older per-node layouts (see
+utils.content_purge) carry no hash and are deleted directly. The content generator stores
+through this module as well (its package bundles utils/).
+
+Readers locate content with content_object and read it with read_object/read_content,
+whichever layout wrote it; tools/migrate_content_keys.py moves older layouts to hashed keys.
+"""
+
+import datetime
+import hashlib
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from utils.content_codec import CONTENT_ENCODING_FIELD, decode_content, decode_prefix, encode_content
+from utils.content_purge import CONTENT_HASH_FIELD
+from utils.node_queries import query_pages
+from utils.space_version import space_meta_key
+from utils.tombstones import timestamp
+
+CONTENT_PREFIX = 'CONTENT#'
+CONTENT_KEY_TEMPLATE = '{space_id}/content/{digest}.html'
+GENERATION_KEY_TEMPLATE = '{space_id}/content/{digest}.{generation}.html'
+RELEASED_CONTENT_INDEX = 'ReleasedContentIndex'
+RELEASED_MARKER = 'content'
+CONTENT_GC_GRACE_SECONDS = int(os.environ.get('CONTENT_GC_GRACE_SECONDS', '3600'))
+# Layouts reported by content_layout; all but 'hashed' and 'inline' are migrated
+LEGACY_LAYOUTS = ('add', 'update', 'generator')
+
+
+class ContentStats:
+    """Upload counters for StructuredLogger.performance (cumulative for the container)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.uploads = 0
+        self.skipped = 0
+        self.stored_bytes = 0
+
+    def record(self, uploaded: bool, stored_bytes: int = 0):
+        with self._lock:
+            self.writes += 1
+            if uploaded:
+                self.uploads += 1
+                self.stored_bytes += stored_bytes
+            else:
+                self.skipped += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'content_writes': self.writes,
+                'content_uploads': self.uploads,
+                'content_uploads_skipped': self.skipped,
+                'content_bytes_stored': self.stored_bytes,
+                'put_avoidance_ratio': round(self.skipped / self.writes, 4) if self.writes else 0.0
+            }
+
+
+content_stats = ContentStats()
+
+
+def content_hash(content_html: str) -> str:
+    return hashlib.sha256(content_html.encode('utf-8')).hexdigest()
+
+
+def content_key(space_id: str, digest: str, generation: int = 0) -> str:
+    if generation:
+        return GENERATION_KEY_TEMPLATE.format(space_id=space_id, digest=digest, generation=generation)
+    return CONTENT_KEY_TEMPLATE.format(space_id=space_id, digest=digest)
+
+
+def content_record_key(space_id: str, digest: str) -> Dict[str, str]:
+    return {'PK': space_meta_key(space_id)['PK'], 'SK': f'{CONTENT_PREFIX}{digest}'}
+
+
+def content_object(item: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (key, encoding) of the object holding a node's complete content, or (None, None) for
+    content kept inline in contentPreview. s3Key wins over contentS3Key, which writers of
+    s3Key remove; only objects under s3Key are ever compressed.
+    """
+    if item.get('s3Key'):
+        return item['s3Key'], item.get(CONTENT_ENCODING_FIELD)
+    return item.get('contentS3Key') or None, None
+
+
+def content_layout(item: Dict[str, Any]) -> Optional[str]:
+    """Which writer's layout a node's content is in (see utils.content_purge), None without content."""
+    key, _ = content_object(item)
+    if key is None:
+        return 'inline' if item.get('contentPreview') is not None else None
+    if item.get(CONTENT_HASH_FIELD):
+        return 'hashed'
+    if not item.get('s3Key'):
+        return 'add'
+    return 'generator' if key.startswith('nodes/') else 'update'
+
+
+def read_object(s3_client, bucket: str, key: str, encoding: Optional[str] = None,
+                max_bytes: Optional[int] = None) -> str:
+    """Read and decode a content object; with max_bytes only its start (a ranged read)."""
+    params = {'Bucket': bucket, 'Key': key}
+    if max_bytes is not None:
+        params['Range'] = f'bytes=0-{max_bytes - 1}'
+    data = s3_client.get_object(**params)['Body'].read()
+    if max_bytes is not None:
+        return decode_prefix(data, encoding, max_bytes)
+    return decode_content(data, encoding)
+
+
+def read_content(s3_client, bucket: str, item: Dict[str, Any]) -> Optional[str]:
+    """A node's complete content: its object if it has one, otherwise the inline contentPreview."""
+    key, encoding = content_object(item)
+    if key is None:
+        return item.get('contentPreview')
+    return read_object(s3_client, bucket, key, encoding)
+
+
+def acquire_content(spaces_table, s3_client, bucket: str, space_id: str, content_html: str,
+                    refs: int = 1) -> Tuple[str, str, Optional[str]]:
+    """
+    Add `refs` references to content_html and make sure its object exists, uploading it
+    only if no earlier write has. Returns (contentHash, s3Key, contentEncoding). If the
+    upload fails the references are dropped again and the error is raised.
+    """
+    digest = content_hash(content_html)
+    old = spaces_table.update_item(
+        Key=content_record_key(space_id, digest),
+        UpdateExpression='ADD refs :refs SET s3Key = if_not_exists(s3Key, :key), contentSize = :size '
+                         'REMOVE releasedAt, released',
+        ExpressionAttributeValues={':refs': refs, ':key': content_key(space_id, digest),
+                                   ':size': len(content_html.encode('utf-8'))},
+        ReturnValues='ALL_OLD'
+    ).get('Attributes') or {}
+    if old.get('storedAt') and not old.get('deletingAt'):
+        content_stats.record(uploaded=False)
+        return digest, old.get('s3Key') or content_key(space_id, digest), old.get(CONTENT_ENCODING_FIELD)
+
+    # A claimed record's object may be deleted any moment: write the next generation instead
+    generation = int(old.get('generation') or 0) + (1 if old.get('deletingAt') else 0)
+    key = content_key(space_id, digest, generation)
+    body, encoding = encode_content(content_html)
+    params = {'Bucket': bucket, 'Key': key, 'Body': body, 'ContentType': 'text/html'}
+    if encoding:
+        params['ContentEncoding'] = encoding
+    try:
+        s3_client.put_object(**params)
+    except Exception:
+        release_content(spaces_table, s3_client, bucket, space_id, digest, refs=refs)
+        raise
+    stored = {':now': datetime.datetime.utcnow().isoformat(), ':key': key, ':generation': generation}
+    update_expression = 'SET storedAt = :now, s3Key = :key, generation = :generation'
+    if encoding:
+        update_expression += ', contentEncoding = :enc REMOVE deletingAt'
+        stored[':enc'] = encoding
+    else:
+        update_expression += ' REMOVE deletingAt, contentEncoding'
+    spaces_table.update_item(
+        Key=content_record_key(space_id, digest),
+        UpdateExpression=update_expression,
+        ExpressionAttributeValues=stored
+    )
+    content_stats.record(uploaded=True, stored_bytes=len(body))
+    return digest, key, encoding
+
+
+def release_content(spaces_table, s3_client, bucket: str, space_id: str, digest: str, refs: int = 1) -> bool:
+    """
+    Drop `refs` references; the last one marks the record released for
+    collect_released_content. Returns whether it did.
+    """
+    remaining = spaces_table.update_item(
+        Key=content_record_key(space_id, digest),
+        UpdateExpression='ADD refs :refs',
+        ExpressionAttributeValues={':refs': -refs},
+        ReturnValues='UPDATED_NEW'
+    ).get('Attributes', {}).get('refs', 0)
+    if remaining > 0:
+        return False
+    try:
+        spaces_table.update_item(
+            Key=content_record_key(space_id, digest),
+            UpdateExpression='SET releasedAt = :now, released = :marker',
+            ConditionExpression='refs <= :zero',
+            ExpressionAttributeValues={':now': timestamp(), ':marker': RELEASED_MARKER, ':zero': 0}
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            # Referenced again in the meantime
+            return False
+        raise
+    return True
+
+
+def release_contents(spaces_table, s3_client, bucket: str, space_id: str,
+                     items: Iterable[Dict[str, Any]]) -> int:
+    """
+    Drop the references of deleted node items (one UpdateItem per distinct hash). Failures
+    are logged, not raised, like utils.node_deletion.delete_content_objects. Returns the
+    number of records marked released.
+    """
+    deleted = 0
+    counts = Counter(item[CONTENT_HASH_FIELD] for item in items if item.get(CONTENT_HASH_FIELD))
+    for digest, refs in counts.items():
+        try:
+            deleted += release_content(spaces_table, s3_client, bucket, space_id, digest, refs=refs)
+        except Exception as e:
+            print(f"Error releasing content {digest} of space {space_id}: {e}")
+    return deleted
+
+
+def collect_released_content(spaces_table, s3_client, bucket: str, cutoff: Optional[str] = None,
+                             should_stop=None) -> Dict[str, int]:
+    """
+    Delete the records and objects of content released before cutoff (default: the grace
+    period ago) and not referenced since. should_stop() is checked between records.
+    Returns counters for logging.
+    """
+    if cutoff is None:
+        cutoff = timestamp(datetime.datetime.utcnow() - datetime.timedelta(seconds=CONTENT_GC_GRACE_SECONDS))
+    result = {'released': 0, 'collected': 0, 'reused': 0}
+    params = {
+        'IndexName': RELEASED_CONTENT_INDEX,
+        'KeyConditionExpression': Key('released').eq(RELEASED_MARKER) & Key('releasedAt').lte(cutoff)
+    }
+    for page in query_pages(spaces_table, **params):
+        for record in page:
+            if should_stop is not None and should_stop():
+                return result
+            result['released'] += 1
+            key = {'PK': record['PK'], 'SK': record['SK']}
+            claim = timestamp()
+            try:
+                claimed = spaces_table.update_item(
+                    Key=key,
+                    UpdateExpression='SET deletingAt = :claim',
+                    ConditionExpression='refs <= :zero AND releasedAt <= :cutoff',
+                    ExpressionAttributeValues={':claim': claim, ':zero': 0, ':cutoff': cutoff},
+                    ReturnValues='ALL_NEW'
+                )['Attributes']
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+                result['reused'] += 1
+                continue
+            if claimed.get('s3Key'):
+                s3_client.delete_object(Bucket=bucket, Key=claimed['s3Key'])
+            try:
+                # An acquire since the claim took a reference and owns the record now
+                spaces_table.delete_item(
+                    Key=key,
+                    ConditionExpression='refs <= :zero AND deletingAt = :claim',
+                    ExpressionAttributeValues={':zero': 0, ':claim': claim}
+                )
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+                result['reused'] += 1
+                continue
+            result['collected'] += 1
+    return result
+
+
+def purge_content_records(spaces_table, space_id: str) -> int:
+    """Delete every content record of a space (used when the space itself is deleted)."""
+    params = {
+        'KeyConditionExpression': Key('PK').eq(space_meta_key(space_id)['PK']) & Key('SK').begins_with(CONTENT_PREFIX),
+        'ProjectionExpression': 'PK, SK'
+    }
+    deleted = 0
+    with spaces_table.batch_writer() as batch:
+        for page in query_pages(spaces_table, **params):
+            for record in page:
+                batch.delete_item(Key={'PK': record['PK'], 'SK': record['SK']})
+                deleted += 1
+    return deleted
@@ -0,0 +1,135 @@
+"""
+Background jobs for deleting large spaces.
+
+A space DELETE that would remove more than DELETE_ASYNC_THRESHOLD nodes stores a job record in the
+Spaces table next to the space items:
+    PK = JOB#{jobId}, SK = META
+hands the job id to delete_worker_handler with an asynchronous Lambda invoke and answers
+202 Accepted. The worker deletes in chunks of DELETE_CHUNK_SIZE nodes, updating the progress
+counters and the resume cursor after every chunk, and re-invokes itself before its own
+timeout. Job records carry no ownerId or spaceId attribute, so they stay out of the
+OwnerIdIndex and SpaceIdIndex GSIs, and expire through TTL (expiresAt) once finished.
+Progress is served by GET /jobs/{jobId}.
+"""
+
+import datetime
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+DELETE_ASYNC_THRESHOLD = int(os.environ.get('DELETE_ASYNC_THRESHOLD', '500'))
+DELETE_CHUNK_SIZE = int(os.environ.get('DELETE_CHUNK_SIZE', '500'))
+JOB_TTL_SECONDS = int(os.environ.get('DELETE_JOB_TTL_SECONDS', str(7 * 24 * 3600)))
+WORKER_FUNCTION_NAME = os.environ.get('DELETE_WORKER_FUNCTION_NAME', '')
+
+JOB_PREFIX = 'JOB#'
+
+# Job types
+DELETE_SPACE = 'deleteSpace'
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+
+def job_key(job_id: str) -> Dict[str, str]:
+    return {'PK': f'{JOB_PREFIX}{job_id}', 'SK': 'META'}
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+def create_job(spaces_table, job_type: str, space_id: str,
+               total_nodes: Optional[int] = None) -> Dict[str, Any]:
+    """Store a queued job record and return it."""
+    job_id = str(uuid.uuid4())
+    now = _now()
+    item = dict(job_key(job_id), **{
+        'jobId': job_id,
+        'jobType': job_type,
+        'targetSpaceId': space_id,
+        'status': QUEUED,
+        'deletedNodes': 0,
+        'createdAt': now,
+        'updatedAt': now
+    })
+    if total_nodes is not None:
+        item['totalNodes'] = total_nodes
+    spaces_table.put_item(Item=item)
+    return item
+
+
+def get_job(spaces_table, job_id: str) -> Optional[Dict[str, Any]]:
+    return spaces_table.get_item(Key=job_key(job_id), ConsistentRead=True).get('Item')
+
+
+def update_job(spaces_table, job_id: str, deleted: int = 0, **fields):
+    """Set fields on a job and add `deleted` to its progress counter."""
+    fields['updatedAt'] = _now()
+    names = {f'#f{i}': name for i, name in enumerate(fields)}
+    values = {f':f{i}': value for i, value in enumerate(fields.values())}
+    expression = 'SET ' + ', '.join(f'#f{i} = :f{i}' for i in range(len(fields)))
+    if deleted:
+        names['#deleted'] = 'deletedNodes'
+        values[':deleted'] = deleted
+        expression += ' ADD #deleted :deleted'
+    spaces_table.update_item(
+        Key=job_key(job_id),
+        UpdateExpression=expression,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def finish_job(spaces_table, job_id: str, status: str, error: Optional[str] = None):
+    fields = {'status': status, 'finishedAt': _now(), 'expiresAt': int(time.time()) + JOB_TTL_SECONDS}
+    if error:
+        fields['error'] = error
+    update_job(spaces_table, job_id, **fields)
+
+
+def enqueue_job(lambda_client, job_id: str, function_name: Optional[str] = None):
+    """Start (or continue) a job in a new asynchronous worker invocation."""
+    lambda_client.invoke(
+        FunctionName=function_name or WORKER_FUNCTION_NAME,
+        InvocationType='Event',
+        Payload=json.dumps({'jobId': job_id}).encode('utf-8')
+    )
+
+
+def job_view(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Public representation of a job record (GET /jobs/{jobId})."""
+    view = {
+        'jobId': item['jobId'],
+        'jobType': item['jobType'],
+        'spaceId': item['targetSpaceId'],
+        'status': item['status'],
+        'deletedNodes': item.get('deletedNodes', 0),
+        'createdAt': item['createdAt'],
+        'updatedAt': item.get('updatedAt')
+    }
+    for field in ('totalNodes', 'finishedAt', 'error'):
+        if field in item:
+            view[field] = item[field]
+    return view
+
+
+def accepted_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """202 Accepted answer for a DELETE handed to the background worker."""
+    status_url = f"/jobs/{job['jobId']}"
+    return {
+        'statusCode': 202,
+        'headers': {'Content-Type': 'application/json', 'Location': status_url},
+        'body': json.dumps({
+            'jobId': job['jobId'],
+            'status': job['status'],
+            'totalNodes': job.get('totalNodes'),
+            'statusUrl': status_url
+        })
+    }
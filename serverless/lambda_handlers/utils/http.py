@@ -0,0 +1,34 @@
+"""
+Helpers for reading API Gateway proxy events.
+"""
+
+import base64
+from typing import Any, Dict, Optional
+
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    """Case-insensitive header lookup (API Gateway preserves the client's casing)."""
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def get_query_param(event: Dict[str, Any], name: str) -> Optional[str]:
+    return (event.get('queryStringParameters') or {}).get(name)
+
+
+def get_body(event: Dict[str, Any], default: str = '{}') -> str:
+    """
+    Raw request body as text. The API declares application/json and text/html as
+    binaryMediaTypes (so that compressed responses can be returned), which makes API Gateway
+    pass request bodies of those types base64-encoded; other bodies arrive as text.
+    """
+    body = event.get('body')
+    if body is None:
+        return default
+    if event.get('isBase64Encoded'):
+        return base64.b64decode(body).decode('utf-8')
+    return body
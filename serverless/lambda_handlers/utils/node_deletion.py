@@ -0,0 +1,71 @@
+"""
+Write steps shared by the space delete paths (spaces_delete_handler, delete_worker_handler)
+and node_reaper_handler.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.content_purge import CONTENT_HASH_FIELD, PurgeResult, node_content_keys, purge_keys
+from utils.node_queries import QueryStats
+from utils.subtree import batch_get_nodes, discover_subtree
+
+REMOVE_CONCURRENCY = int(os.environ.get('NODE_REMOVE_CONCURRENCY', '8'))
+
+# Attributes read for every node that is about to be deleted
+DELETE_FIELDS = ('nodeId', 's3Key', 'contentS3Key', CONTENT_HASH_FIELD)
+
+
+def collect_subtree(dynamodb, nodes_table, space_id: str, node_id: str,
+                    stats: Optional[QueryStats] = None) -> List[Dict[str, Any]]:
+    """
+    Return the existing items of node_id and its descendants, parents before children.
+    Descendants are discovered breadth-first over ParentNodeIdIndex and read with BatchGetItem.
+    Materialized paths are not used here: a stale path must never get a node outside the
+    subtree deleted.
+    """
+    subtree_ids = discover_subtree(nodes_table, space_id, node_id, stats=stats)
+    nodes = batch_get_nodes(dynamodb, nodes_table.name, space_id, subtree_ids, fields=DELETE_FIELDS, stats=stats)
+    return [nodes[subtree_id] for subtree_id in subtree_ids if subtree_id in nodes]
+
+
+def remove_node_items(nodes_table, space_id: str, node_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Delete node items one DeleteItem each (ReturnValues=ALL_OLD, run concurrently) and return
+    the old images of the items that still existed. A retry after a partial run therefore
+    gets back only what it deleted itself, so content references are dropped exactly once.
+    """
+    def remove(node_id):
+        return nodes_table.delete_item(
+            Key={'nodeId': node_id, 'spaceId': space_id},
+            ReturnValues='ALL_OLD'
+        ).get('Attributes')
+
+    if not node_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(REMOVE_CONCURRENCY, len(node_ids))) as executor:
+        return [item for item in executor.map(remove, node_ids) if item]
+
+
+def delete_node_items(nodes_table, space_id: str, node_ids: Iterable[str]) -> int:
+    """Delete node items with batched writes; returns the number of deletes issued."""
+    deleted_count = 0
+    with nodes_table.batch_writer() as batch:
+        for node_id in node_ids:
+            batch.delete_item(Key={'nodeId': node_id, 'spaceId': space_id})
+            deleted_count += 1
+    return deleted_count
+
+
+def delete_content_objects(s3_client, bucket: str, items: Iterable[Dict[str, Any]]) -> PurgeResult:
+    """
+    Delete the S3 content objects of deleted nodes. Failures are logged, not raised. Shared
+    objects are skipped; their references are dropped with utils.content_store.release_contents.
+    """
+    result = purge_keys(s3_client, bucket, node_content_keys(items))
+    if result.requested:
+        print(f"Purged S3 content of deleted nodes: {result.as_dict()}")
+    for key, error in list(result.failed.items())[:20]:
+        print(f"Error deleting S3 object {key}: {error}")
+    return result
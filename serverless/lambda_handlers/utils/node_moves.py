@@ -0,0 +1,203 @@
+"""
+Moving a node (with its subtree) to another parent and position.
+
+POST /spaces/{spaceId}/nodes/{nodeId}/move first reads the ancestry of the new parent. With
+a materialized path that is one BatchGetItem for all ancestors, trusted only if their
+parent links agree with the path; otherwise the chain is walked with one GetItem per level,
+up to MOVE_MAX_DEPTH levels. A move below the node itself or one of its descendants is
+rejected.
+
+The move is then one transaction: the node's new parentNodeId, position and path, the
+sibling order writes the new position needs, and ConditionChecks that the new parent and
+its nearest ancestors still have the parent link read and are not deleted, so two
+concurrent moves cannot form a cycle between them. The node and sibling writes come first;
+ancestors are checked only as far as room is left, and the new parent's check includes
+its path, which covers the ancestors beyond (as far as paths are maintained). The siblings
+left behind keep their positions (a gap in orderIndex does not change the order). Descendant paths are rewritten afterwards, as by
+utils.node_paths.rewrite_subtree_paths, since a subtree can exceed any transaction.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.node_paths import PATH_FIELD, PATH_SEPARATOR, child_path, fits
+from utils.node_queries import QueryStats, projection_params
+from utils.node_versions import INCREMENT_VERSION, VERSION_NAMES, increment_values, version_condition
+from utils.order_keys import ORDER_KEY_FIELD
+from utils.subtree import batch_get_nodes
+from utils.transactions import condition_check_operation, update_operation
+
+MOVE_MAX_DEPTH = int(os.environ.get('NODE_MOVE_MAX_DEPTH', '256'))
+ANCESTOR_FIELDS = ('nodeId', 'parentNodeId', 'deletedAt', PATH_FIELD)
+
+
+class InvalidMove(ValueError):
+    """The requested move cannot be made; the message is safe to return to clients."""
+
+
+def _linked(chain: List[Dict[str, Any]]) -> bool:
+    """Whether each item's parent is the next one and the last is a top-level node."""
+    parents = [item.get('parentNodeId') for item in chain]
+    return parents == [item['nodeId'] for item in chain[1:]] + [None]
+
+
+def load_ancestry(dynamodb, nodes_table, space_id: str, parent_id: str,
+                  stats: Optional[QueryStats] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    parent_id and its ancestors (nodeId, parentNodeId, deletedAt, path), nearest first, read
+    consistently. Returns None if one of them is missing or deleted; raises InvalidMove if
+    the chain is deeper than MOVE_MAX_DEPTH or loops.
+    """
+    def get(node_id):
+        return nodes_table.get_item(
+            Key={'nodeId': node_id, 'spaceId': space_id},
+            ConsistentRead=True,
+            **projection_params(ANCESTOR_FIELDS)
+        ).get('Item')
+
+    parent = get(parent_id)
+    if parent is None:
+        return None
+    chain = [parent]
+    path = parent.get(PATH_FIELD)
+    if path:
+        ancestor_ids = path.split(PATH_SEPARATOR)[1:-1]
+        found = batch_get_nodes(dynamodb, nodes_table.name, space_id, ancestor_ids,
+                                fields=ANCESTOR_FIELDS, stats=stats) if ancestor_ids else {}
+        ancestors = [found.get(ancestor_id) for ancestor_id in reversed(ancestor_ids)]
+        # A concurrent move can leave a stale path behind; then fall back to the walk
+        if all(ancestors) and _linked(chain + ancestors):
+            chain.extend(ancestors)
+    seen = {item['nodeId'] for item in chain}
+    while chain[-1].get('parentNodeId'):
+        if len(chain) >= MOVE_MAX_DEPTH:
+            raise InvalidMove(f'The new parent is nested more than {MOVE_MAX_DEPTH} levels deep')
+        item = get(chain[-1]['parentNodeId'])
+        if item is None:
+            return None
+        if item['nodeId'] in seen:
+            raise InvalidMove('The ancestors of the new parent form a cycle')
+        seen.add(item['nodeId'])
+        chain.append(item)
+    if any(item.get('deletedAt') for item in chain):
+        return None
+    return chain
+
+
+def ancestry_path(chain: List[Dict[str, Any]]) -> Optional[str]:
+    """Path of the nearest node of an ancestry chain (see load_ancestry), if it fits the index."""
+    path = None
+    for item in reversed(chain):
+        path = child_path(path, item['nodeId'])
+    return path if fits(path) else None
+
+
+def index_placement(siblings: List[Dict[str, Any]], index: int) -> Tuple[int, Dict[str, int]]:
+    """
+    orderIndex for a node inserted at `index` of siblings (in display order, without the
+    node) and the {nodeId: orderIndex} shifts that make room for it: only the run of
+    following siblings that would otherwise collide moves up by one.
+    """
+    value = int(siblings[index - 1].get('orderIndex') or 0) + 1 if index > 0 else 0
+    shifts = {}
+    expected = value + 1
+    for item in siblings[index:]:
+        if int(item.get('orderIndex') or 0) >= expected:
+            break
+        shifts[item['nodeId']] = expected
+        expected += 1
+    return value, shifts
+
+
+def sibling_order_operation(table_name: str, space_id: str, parent_id: Optional[str],
+                            sibling: Dict[str, Any], field: str, value: Any,
+                            updated_at: str, expected_version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Conditional update of one sibling's orderIndex or orderKey (field): it must still be a
+    live child of the same parent with the position read (and at expected_version, if
+    given), so a concurrent move, delete or reorder cancels the transaction.
+    """
+    values = increment_values({':value': value, ':ua': updated_at})
+    conditions = ['attribute_not_exists(deletedAt)']
+    if parent_id is None:
+        conditions.append('attribute_not_exists(parentNodeId)')
+    else:
+        conditions.append('parentNodeId = :parent')
+        values[':parent'] = parent_id
+    if sibling.get(field) is None:
+        conditions.append(f'attribute_not_exists({field})')
+    else:
+        conditions.append(f'{field} = :expected')
+        values[':expected'] = sibling[field]
+    if expected_version is not None:
+        conditions.append(version_condition(expected_version, values))
+    return update_operation(
+        table_name,
+        {'nodeId': sibling['nodeId'], 'spaceId': space_id},
+        f'SET {field} = :value, updatedAt = :ua {INCREMENT_VERSION}',
+        values,
+        condition=' AND '.join(conditions),
+        names=VERSION_NAMES
+    )
+
+
+def ancestor_check_operation(table_name: str, space_id: str, ancestor: Dict[str, Any],
+                             check_path: bool = False) -> Dict[str, Any]:
+    """
+    ConditionCheck that an ancestor of the new parent still has the parent read and is live;
+    with check_path also that it still has the path read, if it had one.
+    """
+    values = {}
+    names = {}
+    condition = 'attribute_not_exists(deletedAt) AND '
+    if ancestor.get('parentNodeId') is None:
+        condition += 'attribute_not_exists(parentNodeId)'
+    else:
+        condition += 'parentNodeId = :parent'
+        values[':parent'] = ancestor['parentNodeId']
+    if check_path and ancestor.get(PATH_FIELD):
+        condition += ' AND #path = :path'
+        values[':path'] = ancestor[PATH_FIELD]
+        names['#path'] = PATH_FIELD
+    return condition_check_operation(table_name, {'nodeId': ancestor['nodeId'], 'spaceId': space_id},
+                                     condition, values=values, names=names)
+
+
+def move_operation(table_name: str, space_id: str, node: Dict[str, Any], parent_id: Optional[str],
+                   order_index: int, order_key: Optional[str], path: Optional[str],
+                   updated_at: str, expected_version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Update of the moved node: parent, position and path (removed if it has none), provided
+    it is still live below the parent it was read with and at expected_version, if given.
+    """
+    values: Dict[str, Any] = increment_values({':oi': order_index, ':ua': updated_at})
+    sets = ['orderIndex = :oi', 'updatedAt = :ua']
+    removes = []
+    if parent_id is None:
+        removes.append('parentNodeId')
+    else:
+        sets.append('parentNodeId = :parent')
+        values[':parent'] = parent_id
+    if order_key is not None:
+        sets.append(f'{ORDER_KEY_FIELD} = :key')
+        values[':key'] = order_key
+    if path is None:
+        removes.append('#path')
+    else:
+        sets.append('#path = :path')
+        values[':path'] = path
+
+    condition = 'attribute_exists(nodeId) AND attribute_not_exists(deletedAt) AND '
+    if node.get('parentNodeId') is None:
+        condition += 'attribute_not_exists(parentNodeId)'
+    else:
+        condition += 'parentNodeId = :oldParent'
+        values[':oldParent'] = node['parentNodeId']
+    if expected_version is not None:
+        condition += ' AND ' + version_condition(expected_version, values)
+    expression = 'SET ' + ', '.join(sets)
+    if removes:
+        expression += ' REMOVE ' + ', '.join(removes)
+    expression += ' ' + INCREMENT_VERSION
+    return update_operation(table_name, {'nodeId': node['nodeId'], 'spaceId': space_id}, expression, values,
+                            condition=condition, names=dict(VERSION_NAMES, **{'#path': PATH_FIELD}))
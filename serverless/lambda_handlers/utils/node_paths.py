@@ -0,0 +1,176 @@
+"""
+Materialized ancestor paths on node items.
+
+Every node carries path = '/{rootId}/.../{parentId}/{nodeId}', the ids of its ancestors
+followed by its own. The SpacePathIndex GSI (spaceId, path) turns "all descendants of X"
+into one paginated begins_with query on X's path followed by '/', and because a path sorts
+before every path it prefixes, the results come parents-first. nodes_add_handler writes the
+path of a new node; moving a node to another parent rewrites the paths of its whole subtree.
+
+A GSI sort key holds at most 1024 bytes, about 27 levels of UUIDs. Nodes deeper than that,
+nodes below a missing parent and nodes written before paths existed (until
+tools/backfill_node_paths.py has run) carry no path. Nodes without a path only ever sit
+below a node without one or below a "frontier" node whose children may not fit, so
+readers (utils.subtree.load_descendants) continue with the ParentNodeIdIndex walk there.
+`path` is a DynamoDB reserved word, so expressions always alias it.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from utils.node_queries import QueryStats, projection_params, query_all
+
+SPACE_PATH_INDEX = 'SpacePathIndex'
+PATH_FIELD = 'path'
+PATH_SEPARATOR = '/'
+PATH_WRITE_CONCURRENCY = int(os.environ.get('PATH_WRITE_CONCURRENCY', '16'))
+# Size limit of a GSI sort key value, and the length of the UUIDs used as node ids
+MAX_PATH_BYTES = 1024
+NODE_ID_LENGTH = 36
+
+
+def child_path(parent_path: Optional[str], node_id: str) -> str:
+    """Path of node_id below a parent with parent_path (None for a top-level node)."""
+    return f'{parent_path or ""}{PATH_SEPARATOR}{node_id}'
+
+
+def fits(path: Optional[str]) -> bool:
+    """Whether a path can be stored (is short enough for the index)."""
+    return path is not None and len(path.encode('utf-8')) <= MAX_PATH_BYTES
+
+
+def is_frontier(path: str) -> bool:
+    """Whether children of the node at path may be too deep to carry a path of their own."""
+    return len(path.encode('utf-8')) + len(PATH_SEPARATOR) + NODE_ID_LENGTH > MAX_PATH_BYTES
+
+
+def resolve_path(nodes_table, space_id: str, node_id: str) -> Optional[str]:
+    """
+    Path of an existing node: the stored one, or one built from its ancestors (stopping at
+    the first ancestor that has a stored path) if the node has not been backfilled yet.
+    Returns None if the node or one of its ancestors is missing, or the path is too long.
+    """
+    missing = []
+    current = node_id
+    while current:
+        if current in missing or len(missing) * (NODE_ID_LENGTH + len(PATH_SEPARATOR)) > MAX_PATH_BYTES:
+            return None
+        item = nodes_table.get_item(
+            Key={'nodeId': current, 'spaceId': space_id},
+            **projection_params(('nodeId', 'parentNodeId', PATH_FIELD))
+        ).get('Item')
+        if item is None:
+            return None
+        if item.get(PATH_FIELD):
+            path = item[PATH_FIELD]
+            break
+        missing.append(current)
+        current = item.get('parentNodeId')
+    else:
+        path = None
+    for ancestor_or_self in reversed(missing):
+        path = child_path(path, ancestor_or_self)
+    return path if fits(path) else None
+
+
+def compute_paths(items: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Paths of the nodes of a space from its flat items (nodeId, parentNodeId). Nodes below a
+    missing parent or in a parent cycle, and nodes too deep to store a path, get none.
+    """
+    parents = {item['nodeId']: item.get('parentNodeId') for item in items}
+    paths: Dict[str, Optional[str]] = {}
+    for node_id in parents:
+        chain = []
+        chained = set()
+        current = node_id
+        while current is not None and current not in paths and current in parents and current not in chained:
+            chain.append(current)
+            chained.add(current)
+            current = parents[current]
+        # Top-level nodes start a path; a missing parent or a cycle leaves the chain without one
+        path = paths.get(current) if current is not None else ''
+        for chained_id in reversed(chain):
+            path = child_path(path, chained_id) if path is not None else None
+            if not fits(path):
+                path = None
+            paths[chained_id] = path
+    return {node_id: path for node_id, path in paths.items() if path is not None}
+
+
+def query_descendants(nodes_table, space_id: str, path: str, fields: Optional[Iterable[str]] = None,
+                      stats: Optional[QueryStats] = None) -> List[Dict[str, Any]]:
+    """Every node below path (excluding the node itself), parents before children."""
+    params = {
+        'IndexName': SPACE_PATH_INDEX,
+        'KeyConditionExpression': Key('spaceId').eq(space_id) & Key(PATH_FIELD).begins_with(path + PATH_SEPARATOR)
+    }
+    if fields:
+        params.update(projection_params(fields))
+    return query_all(nodes_table, stats=stats, **params)
+
+
+def set_path(nodes_table, space_id: str, node_id: str, path: Optional[str],
+             expected: Optional[str] = None) -> bool:
+    """
+    Write a node's path (remove it if path is None), provided the stored path is still
+    `expected` (absent if None). Returns False if the node changed in the meantime or no
+    longer exists.
+    """
+    values: Dict[str, Any] = {}
+    if expected is None:
+        condition = 'attribute_exists(nodeId) AND attribute_not_exists(#path)'
+    else:
+        condition = '#path = :expected'
+        values[':expected'] = expected
+    if path is None:
+        update = 'REMOVE #path'
+    else:
+        update = 'SET #path = :path'
+        values[':path'] = path
+    params = {
+        'Key': {'nodeId': node_id, 'spaceId': space_id},
+        'UpdateExpression': update,
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': {'#path': PATH_FIELD}
+    }
+    if values:
+        params['ExpressionAttributeValues'] = values
+    try:
+        nodes_table.update_item(**params)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+
+def rewrite_subtree_paths(nodes_table, space_id: str, node_id: str, new_path: Optional[str],
+                          descendants: List[Dict[str, Any]]) -> int:
+    """
+    Bring the paths of a moved node's descendants (nodeId, parentNodeId, path; parents before
+    children, see utils.subtree.load_descendants) in line with its new path. Writes are
+    issued in parallel and conditional on the path read, so a descendant moved concurrently
+    keeps its newer path. Returns the number of paths written.
+    """
+    paths: Dict[str, Optional[str]] = {node_id: new_path}
+    pending = []
+    for item in descendants:
+        parent_path = paths.get(item.get('parentNodeId'))
+        path = child_path(parent_path, item['nodeId']) if parent_path is not None else None
+        paths[item['nodeId']] = path if fits(path) else None
+        if paths[item['nodeId']] != item.get(PATH_FIELD):
+            pending.append((item['nodeId'], paths[item['nodeId']], item.get(PATH_FIELD)))
+    if not pending:
+        return 0
+
+    def rewrite(entry):
+        descendant_id, path, stored = entry
+        return set_path(nodes_table, space_id, descendant_id, path, expected=stored)
+
+    with ThreadPoolExecutor(max_workers=min(PATH_WRITE_CONCURRENCY, len(pending))) as executor:
+        return sum(1 for written in executor.map(rewrite, pending) if written)
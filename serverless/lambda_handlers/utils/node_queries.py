@@ -0,0 +1,144 @@
+"""
+Paginated DynamoDB read helpers for the Nodes table.
+Every helper follows LastEvaluatedKey so results are never truncated at the 1 MB page limit.
+"""
+
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+
+SPACE_NODES_INDEX = 'SpaceIdNodesIndex'
+PARENT_NODES_INDEX = 'ParentNodeIdIndex'
+
+# BatchGetItem accepts at most this many keys per request
+BATCH_GET_MAX_KEYS = 100
+BATCH_MAX_ATTEMPTS = 6
+BATCH_BACKOFF_BASE_SECONDS = 0.05
+
+# Attributes needed to assemble the hierarchical tree returned by GET /spaces/{spaceId};
+# deletedAt marks tombstoned subtrees, which are filtered out (see utils.tombstones), and
+# orderKey orders siblings in spaces using fractional order keys (see utils.order_keys)
+TREE_FIELDS = ('nodeId', 'title', 'parentNodeId', 'orderIndex', 'orderKey', 'deletedAt')
+
+
+class QueryStats:
+    """Accumulates page, item and capacity counters across paginated calls."""
+
+    def __init__(self):
+        self.pages = 0
+        self.items = 0
+        self.scanned = 0
+        self.consumed_capacity = 0.0
+
+    def record(self, response: Dict[str, Any]):
+        self.pages += 1
+        self.items += response.get('Count', len(response.get('Items', [])))
+        self.scanned += response.get('ScannedCount', 0)
+        capacity = response.get('ConsumedCapacity') or {}
+        self.consumed_capacity += float(capacity.get('CapacityUnits', 0) or 0)
+
+    def record_batch(self, response: Dict[str, Any], item_count: int):
+        """Record a BatchGetItem/BatchWriteItem response, whose ConsumedCapacity is a list."""
+        self.pages += 1
+        self.items += item_count
+        for capacity in response.get('ConsumedCapacity') or []:
+            self.consumed_capacity += float(capacity.get('CapacityUnits', 0) or 0)
+
+    def merge(self, other: 'QueryStats'):
+        """Fold in counters collected separately (e.g. by a worker thread)."""
+        self.pages += other.pages
+        self.items += other.items
+        self.scanned += other.scanned
+        self.consumed_capacity += other.consumed_capacity
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'pages': self.pages,
+            'item_count': self.items,
+            'scanned_count': self.scanned,
+            'consumed_capacity': self.consumed_capacity
+        }
+
+
+def projection_params(fields: Iterable[str]) -> Dict[str, Any]:
+    """Build ProjectionExpression parameters, aliasing every attribute to avoid reserved words."""
+    names = {f'#p{i}': field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+
+def query_cursor_pages(table, stats: Optional[QueryStats] = None,
+                       **query_kwargs) -> Iterator[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """
+    Yield (Items, LastEvaluatedKey) for every page of a query until exhausted; the key is the
+    cursor to resume after that page (ExclusiveStartKey) and None on the last page.
+    """
+    query_kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    while True:
+        response = table.query(**query_kwargs)
+        if stats is not None:
+            stats.record(response)
+        last_key = response.get('LastEvaluatedKey') or None
+        yield response.get('Items', []), last_key
+        if not last_key:
+            return
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def query_pages(table, stats: Optional[QueryStats] = None, **query_kwargs) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the Items of every page of a query, following LastEvaluatedKey until exhausted."""
+    for items, _ in query_cursor_pages(table, stats=stats, **query_kwargs):
+        yield items
+
+
+def query_all(table, stats: Optional[QueryStats] = None, **query_kwargs) -> List[Dict[str, Any]]:
+    """Run a query to completion and return all items."""
+    items = []
+    for page in query_pages(table, stats=stats, **query_kwargs):
+        items.extend(page)
+    return items
+
+
+def load_space_nodes(nodes_table, space_id: str, fields: Optional[Iterable[str]] = TREE_FIELDS,
+                     stats: Optional[QueryStats] = None) -> List[Dict[str, Any]]:
+    """
+    Load every node of a space through the SpaceIdNodesIndex GSI.
+    Cost is proportional to the size of the space, not the size of the Nodes table.
+    Pass fields=None to fetch complete items.
+    """
+    params = {
+        'IndexName': SPACE_NODES_INDEX,
+        'KeyConditionExpression': Key('spaceId').eq(space_id)
+    }
+    if fields:
+        params.update(projection_params(fields))
+    return query_all(nodes_table, stats=stats, **params)
+
+
+def batch_get_items(dynamodb, table_name: str, keys: List[Dict[str, Any]],
+                    fields: Optional[Iterable[str]] = None, consistent_read: bool = False,
+                    stats: Optional[QueryStats] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch up to BATCH_GET_MAX_KEYS items with one BatchGetItem request, retrying
+    UnprocessedKeys with exponential backoff. Missing items are simply absent from the result.
+    """
+    request = {'Keys': list(keys), 'ConsistentRead': consistent_read}
+    if fields:
+        request.update(projection_params(fields))
+    items: List[Dict[str, Any]] = []
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems={table_name: request},
+                                           ReturnConsumedCapacity='TOTAL')
+        page = response.get('Responses', {}).get(table_name, [])
+        items.extend(page)
+        if stats is not None:
+            stats.record_batch(response, len(page))
+        unprocessed = (response.get('UnprocessedKeys') or {}).get(table_name)
+        if not unprocessed:
+            return items
+        request = unprocessed
+        time.sleep(BATCH_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    raise RuntimeError(f'BatchGetItem left {len(request["Keys"])} keys unprocessed after {BATCH_MAX_ATTEMPTS} attempts')
@@ -0,0 +1,99 @@
+"""
+Per-node version numbers for optimistic concurrency.
+
+Every write that changes what clients see of a node (title, content, parent, position,
+deletion, restore) increments its `version` attribute in the same UpdateItem with
+ADD #version :one, so nodes written before versions existed count up from 0; new nodes
+start at 1. Path rewrites are derived data and leave the version alone. Node responses
+carry the version as a strong ETag ("3"). Update, move and delete take the version the
+client last saw in an If-Match header (reorder takes one per entry) and make it part of
+the write's condition expression; a mismatch is answered with 412 Precondition Failed.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from utils.http import get_header
+
+VERSION_FIELD = 'version'
+VERSION_NAMES = {'#version': VERSION_FIELD}
+# Clause for UpdateExpression; the caller supplies :one = 1 (see increment_values)
+INCREMENT_VERSION = 'ADD #version :one'
+
+
+class InvalidIfMatch(ValueError):
+    """The If-Match header is not a node ETag; the message is safe to return to clients."""
+
+
+def node_etag(version: Any) -> str:
+    return f'"{int(version or 0)}"'
+
+
+def etag_headers(version: Any) -> Dict[str, str]:
+    """Response headers carrying the node's ETag, readable by browser clients."""
+    return {'ETag': node_etag(version), 'Access-Control-Expose-Headers': 'ETag'}
+
+
+def increment_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """values with the :one placeholder INCREMENT_VERSION needs."""
+    values[':one'] = 1
+    return values
+
+
+def parse_version(value: Any) -> int:
+    """A version from an ETag ("3", W/"3") or a plain number; raises InvalidIfMatch."""
+    text = str(value).strip()
+    if text.startswith('W/'):
+        text = text[2:]
+    text = text.strip('"')
+    if not text.isdigit():
+        raise InvalidIfMatch(f'Not a node version: {value!r}')
+    return int(text)
+
+
+def expected_version(event: Dict[str, Any]) -> Optional[int]:
+    """
+    The version named by the request's If-Match header, or None if there is none (or it is
+    '*', which only asks for the node to exist, as every node write does anyway).
+    """
+    header = get_header(event, 'If-Match')
+    if header is None or header.strip() in ('', '*'):
+        return None
+    if ',' in header:
+        raise InvalidIfMatch('If-Match must name a single node version')
+    return parse_version(header)
+
+
+def version_condition(expected: int, values: Dict[str, Any]) -> str:
+    """Condition that the stored version is `expected` (a node never written with a version is 0)."""
+    if expected == 0:
+        return 'attribute_not_exists(#version)'
+    values[':expectedVersion'] = expected
+    return '#version = :expectedVersion'
+
+
+def current_version(nodes_table, space_id: str, node_id: str) -> Optional[int]:
+    """
+    After a conditional write with an expected version failed: the node's version if it is
+    still there and not deleted (so the failure was a version mismatch, 412), else None (404).
+    """
+    item = nodes_table.get_item(
+        Key={'nodeId': node_id, 'spaceId': space_id},
+        ProjectionExpression='#version, deletedAt',
+        ExpressionAttributeNames=VERSION_NAMES,
+        ConsistentRead=True
+    ).get('Item')
+    if item is None or item.get('deletedAt'):
+        return None
+    return int(item.get(VERSION_FIELD) or 0)
+
+
+def precondition_failed(version: int) -> Dict[str, Any]:
+    """412 response naming the node's current version."""
+    return {
+        'statusCode': 412,
+        'headers': dict({'Content-Type': 'application/json'}, **etag_headers(version)),
+        'body': json.dumps({'error': 'The node was changed by another write; reload it and retry.',
+                           VERSION_FIELD: version})
+    }
+
@@ -0,0 +1,263 @@
+"""
+Fractional order keys ("ranks") for sibling ordering.
+
+With integer orderIndex values, putting a node between two siblings means renumbering
+every later sibling. Spaces whose META item has orderMode = 'rank' order siblings by the
+string attribute orderKey instead: a base-62 fraction that sorts lexicographically, so a
+key strictly between any two neighbours always exists and an insert or move writes only
+the node itself. Keys grow by about one digit per six inserts at the same spot; once a new
+key would exceed MAX_ORDER_KEY_LENGTH the siblings around it are respaced to short keys
+(see plan_placement). orderIndex is still written because it is the sort key of SpaceIdNodesIndex and
+ParentNodeIdIndex (an item without it would drop out of both); in rank spaces it only records
+the position a node was placed at, and trees are ordered by orderKey in memory.
+tools/migrate_order_keys.py switches existing spaces over.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from botocore.exceptions import ClientError
+
+from utils.node_queries import QueryStats
+from utils.node_versions import INCREMENT_VERSION, VERSION_NAMES, increment_values
+from utils.space_version import space_meta_key
+from utils.subtree import load_children, load_root_nodes
+
+ORDER_KEY_FIELD = 'orderKey'
+ORDER_MODE_FIELD = 'orderMode'
+ORDER_MODE_RANK = 'rank'
+MAX_ORDER_KEY_LENGTH = int(os.environ.get('MAX_ORDER_KEY_LENGTH', '32'))
+ORDER_KEY_WRITE_CONCURRENCY = int(os.environ.get('ORDER_KEY_WRITE_CONCURRENCY', '16'))
+
+# Ascending in ASCII, so string comparison of keys is numeric comparison of the fractions
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+_VALUE = {digit: value for value, digit in enumerate(DIGITS)}
+
+SIBLING_FIELDS = ('nodeId', 'orderIndex', ORDER_KEY_FIELD)
+
+
+def _check(key: str):
+    if not key or key[-1] == DIGITS[0] or any(digit not in _VALUE for digit in key):
+        raise ValueError(f'Invalid order key: {key!r}')
+
+
+def _midpoint(low: str, high: Optional[str]) -> str:
+    """A key strictly between low ('' for the lower bound) and high (None for the upper bound)."""
+    if high is not None:
+        shared = 0
+        while shared < len(high) and (low[shared] if shared < len(low) else DIGITS[0]) == high[shared]:
+            shared += 1
+        if shared:
+            return high[:shared] + _midpoint(low[shared:], high[shared:])
+    low_digit = _VALUE[low[0]] if low else 0
+    high_digit = _VALUE[high[0]] if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def key_after(key: str) -> str:
+    """A short key greater than key: repeated appends grow keys by one digit per 61 appends."""
+    if _VALUE[key[0]] < BASE - 1:
+        return DIGITS[_VALUE[key[0]] + 1]
+    return key[0] + (key_after(key[1:]) if len(key) > 1 else DIGITS[1])
+
+
+def key_before(key: str) -> str:
+    """A short key less than key: repeated prepends grow keys by one digit per 61 prepends."""
+    value = _VALUE[key[0]]
+    if value >= 2:
+        return DIGITS[value - 1]
+    if value == 1 and len(key) > 1:
+        return key[0]
+    return DIGITS[0] + (key_before(key[1:]) if len(key) > 1 else DIGITS[-1])
+
+
+def key_between(before: Optional[str], after: Optional[str]) -> str:
+    """A key that sorts after `before` and before `after` (either may be None for an open end)."""
+    for key in (before, after):
+        if key is not None:
+            _check(key)
+    if before is None and after is None:
+        return _midpoint('', None)
+    if before is None:
+        return key_before(after)
+    if after is None:
+        return key_after(before)
+    if before >= after:
+        raise ValueError(f'Order keys out of order: {before!r} >= {after!r}')
+    return _midpoint(before, after)
+
+
+def spread_keys(count: int) -> List[str]:
+    """count evenly spaced keys of the shortest length that fits them, ascending."""
+    length = 1
+    while BASE ** length <= count:
+        length += 1
+    step = BASE ** length / (count + 1)
+    keys = []
+    for position in range(1, count + 1):
+        value = int(step * position)
+        digits = []
+        for _ in range(length):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        keys.append(''.join(reversed(digits)).rstrip(DIGITS[0]))
+    return keys
+
+
+def sibling_sort_key(item: Dict[str, Any]) -> Tuple[str, Any]:
+    """Siblings order by orderKey, then orderIndex (nodes not migrated yet come first)."""
+    return item.get(ORDER_KEY_FIELD) or '', item.get('orderIndex') or 0
+
+
+def uses_order_keys(spaces_table, space_id: str) -> bool:
+    item = spaces_table.get_item(
+        Key=space_meta_key(space_id),
+        ProjectionExpression=ORDER_MODE_FIELD
+    ).get('Item') or {}
+    return item.get(ORDER_MODE_FIELD) == ORDER_MODE_RANK
+
+
+def load_siblings(nodes_table, space_id: str, parent_id: Optional[str],
+                  stats: Optional[QueryStats] = None) -> List[Dict[str, Any]]:
+    """The live children of parent_id (top-level nodes for None), in display order."""
+    if parent_id is None:
+        items = load_root_nodes(nodes_table, space_id, fields=SIBLING_FIELDS, stats=stats)
+    else:
+        items = load_children(nodes_table, space_id, [parent_id], fields=SIBLING_FIELDS,
+                              stats=stats, live_only=True)[parent_id]
+    return sorted(items, key=sibling_sort_key)
+
+
+def set_order_key(nodes_table, space_id: str, node_id: str, key: str, expected: Optional[str]) -> bool:
+    """Write a node's orderKey if it still is `expected` (absent if None); False on a conflict."""
+    values = increment_values({':key': key})
+    if expected is None:
+        condition = 'attribute_exists(nodeId) AND attribute_not_exists(orderKey)'
+    else:
+        condition = 'orderKey = :expected'
+        values[':expected'] = expected
+    try:
+        nodes_table.update_item(
+            Key={'nodeId': node_id, 'spaceId': space_id},
+            UpdateExpression='SET orderKey = :key ' + INCREMENT_VERSION,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=VERSION_NAMES,
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+
+def write_order_keys(nodes_table, space_id: str, updates: Sequence[Tuple[str, str, Optional[str]]]) -> List[str]:
+    """
+    Write (nodeId, key, expected key) updates in parallel, each conditional on the key read so
+    a node moved meanwhile keeps its newer key. Returns the ids of the nodes written.
+    """
+    if not updates:
+        return []
+
+    def write(update):
+        node_id, key, expected = update
+        return node_id if set_order_key(nodes_table, space_id, node_id, key, expected) else None
+
+    with ThreadPoolExecutor(max_workers=min(ORDER_KEY_WRITE_CONCURRENCY, len(updates))) as executor:
+        return [node_id for node_id in executor.map(write, updates) if node_id]
+
+
+def place_node(nodes_table, space_id: str, parent_id: Optional[str], node_id: str,
+               position: Optional[int] = None, after_id: Optional[str] = None,
+               before_id: Optional[str] = None,
+               stats: Optional[QueryStats] = None) -> Tuple[str, int, Dict[str, str]]:
+    """
+    Order key for node_id among the children of parent_id: right after after_id, right before
+    before_id, or at index `position` of the other siblings (the end if None). Reads the
+    siblings with one query. Returns (key, index placed at, {sibling id: new key} written by a
+    rebalance, usually empty); the caller writes the node itself.
+    """
+    siblings = [item for item in load_siblings(nodes_table, space_id, parent_id, stats=stats)
+                if item['nodeId'] != node_id]
+    ids = [item['nodeId'] for item in siblings]
+    if after_id is not None and after_id in ids:
+        index = ids.index(after_id) + 1
+    elif before_id is not None and before_id in ids:
+        index = ids.index(before_id)
+    elif position is not None:
+        index = max(0, min(int(position), len(siblings)))
+    else:
+        index = len(siblings)
+
+    key, updates = plan_placement(siblings, index)
+    written = set(write_order_keys(nodes_table, space_id, updates))
+    return key, index, {node_id: new_key for node_id, new_key, _ in updates if node_id in written}
+
+
+def keys_between(low: Optional[str], high: Optional[str], count: int) -> List[str]:
+    """count ascending keys between low and high (None for open ends), by recursive bisection."""
+    if count <= 0:
+        return []
+    middle = count // 2
+    key = key_between(low, high)
+    return keys_between(low, key, middle) + [key] + keys_between(key, high, count - middle - 1)
+
+
+def plan_placement(siblings: List[Dict[str, Any]], index: int,
+                   max_length: int = MAX_ORDER_KEY_LENGTH) -> Tuple[str, List[Tuple[str, str, Optional[str]]]]:
+    """
+    Key for a node inserted at `index` of siblings (in display order, without the node), and
+    the (nodeId, key, expected key) sibling updates a rebalance needs: none unless the new
+    key would be longer than max_length or a sibling has no key yet.
+
+    A rebalance respaces a window of siblings around the insertion point, doubling the window
+    until its new keys are at most half of max_length long (or it spans the whole list), so
+    a hot spot costs a few dozen writes every hundred or so inserts rather than the whole list.
+    """
+    before = siblings[index - 1].get(ORDER_KEY_FIELD) if index > 0 else None
+    after = siblings[index].get(ORDER_KEY_FIELD) if index < len(siblings) else None
+    keyed = all(item.get(ORDER_KEY_FIELD) for item in siblings)
+    if keyed:
+        key = key_between(before, after)
+        if len(key) <= max_length:
+            return key, []
+
+    width = 4
+    while True:
+        low = max(0, index - width) if keyed else 0
+        high = min(len(siblings), index + width) if keyed else len(siblings)
+        keys = keys_between(siblings[low - 1][ORDER_KEY_FIELD] if low > 0 else None,
+                            siblings[high][ORDER_KEY_FIELD] if high < len(siblings) else None,
+                            high - low + 1)
+        if (low == 0 and high == len(siblings)) or max(len(key) for key in keys) <= max_length // 2:
+            break
+        width *= 2
+    key = keys.pop(index - low)
+    return key, [
+        (item['nodeId'], new_key, item.get(ORDER_KEY_FIELD))
+        for item, new_key in zip(siblings[low:high], keys) if item.get(ORDER_KEY_FIELD) != new_key
+    ]
+
+
+def permute_keys(siblings: List[Dict[str, Any]], new_order: List[str]) -> Dict[str, str]:
+    """
+    New keys for a reorder of some siblings (all siblings in display order, and the ids being
+    reordered in their new order). The reordered nodes trade the keys of the slots they
+    occupy, so the other siblings keep theirs; if any sibling has no key yet the whole list
+    gets spread keys. Returns {nodeId: new key} for the nodes whose key changes.
+    """
+    moving = set(new_order)
+    if any(item.get(ORDER_KEY_FIELD) is None for item in siblings):
+        queue = iter(new_order)
+        final = [next(queue) if item['nodeId'] in moving else item['nodeId'] for item in siblings]
+        current = {item['nodeId']: item.get(ORDER_KEY_FIELD) for item in siblings}
+        return {node_id: key for node_id, key in zip(final, spread_keys(len(final))) if current[node_id] != key}
+    slots = [item[ORDER_KEY_FIELD] for item in siblings if item['nodeId'] in moving]
+    current = {item['nodeId']: item[ORDER_KEY_FIELD] for item in siblings}
+    return {node_id: key for node_id, key in zip(new_order, slots) if current[node_id] != key}
@@ -0,0 +1,103 @@
+"""
+Per-space tree version counter.
+
+Every node write bumps `treeVersion` on the space META item with an atomic ADD. Writes that
+fit a transaction carry the bump in their own TransactWriteItems (tree_version_operation,
+see utils.tree_writes.transact_tree_write), so a node change is never committed without it;
+bulk writes that cannot use a transaction bump afterwards (bump_tree_version). Readers use
+the counter as a cheap change detector: GET /spaces/{spaceId} exposes it as an ETag and
+answers If-None-Match requests from a single META read.
+"""
+
+import zlib
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from utils.transactions import update_operation
+
+
+# Attribute name prefix of the version a transactional bump produced, until it is claimed
+WRITE_PREFIX = 'treeWrite_'
+
+
+def space_meta_key(space_id: str) -> Dict[str, str]:
+    return {'PK': f'SPACE#{space_id}', 'SK': 'META'}
+
+
+def bump_tree_version(spaces_table, space_id: str) -> Optional[int]:
+    """
+    Atomically increment the space's treeVersion and return the new value.
+    Returns None if the space META item does not exist.
+    """
+    try:
+        response = spaces_table.update_item(
+            Key=space_meta_key(space_id),
+            UpdateExpression='ADD treeVersion :one',
+            ConditionExpression='attribute_exists(PK)',
+            ExpressionAttributeValues={':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return None
+        raise
+    return int(response['Attributes']['treeVersion'])
+
+
+def tree_version_operation(table_name: str, space_id: str, token: str) -> Dict[str, Any]:
+    """
+    Update entry of TransactItems incrementing treeVersion. The increment is unconditional
+    (only the META item must exist), so concurrent writers never fail each other; the new
+    value is also stored under a per-write attribute named by token, which claim_tree_version
+    reads back and removes after the transaction has committed.
+    """
+    return update_operation(
+        table_name, space_meta_key(space_id),
+        'SET #write = if_not_exists(treeVersion, :zero) + :one ADD treeVersion :one',
+        {':zero': 0, ':one': 1},
+        condition='attribute_exists(PK)',
+        names={'#write': f'{WRITE_PREFIX}{token}'}
+    )
+
+
+def claim_tree_version(spaces_table, space_id: str, token: str) -> int:
+    """The treeVersion a committed tree_version_operation produced; removes its attribute."""
+    response = spaces_table.update_item(
+        Key=space_meta_key(space_id),
+        UpdateExpression='REMOVE #write',
+        ExpressionAttributeNames={'#write': f'{WRITE_PREFIX}{token}'},
+        ReturnValues='UPDATED_OLD'
+    )
+    # UPDATED_OLD of a REMOVE returns only the removed attribute
+    (version,) = response['Attributes'].values()
+    return int(version)
+
+
+def get_tree_version(space_item: Dict[str, Any]) -> int:
+    """treeVersion of a META item; spaces created before the counter existed are at 0."""
+    return int(space_item.get('treeVersion', 0))
+
+
+def tree_etag(space_item: Dict[str, Any]) -> str:
+    """
+    Strong ETag for the tree response. The space name is part of the response but is
+    changed by spaces_update_handler without a version bump, so it is folded in as a checksum.
+    """
+    name_checksum = zlib.crc32((space_item.get('name') or '').encode('utf-8'))
+    return f'"{get_tree_version(space_item)}-{name_checksum:08x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header value against the current ETag."""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    for candidate in candidates:
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
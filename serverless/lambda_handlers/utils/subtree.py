@@ -0,0 +1,241 @@
+"""
+Breadth-first loading of part of a space tree.
+
+Used by GET /spaces/{spaceId}?rootNodeId=&depth= so that lazily expanding clients only pay
+for the levels they display. Each level is fetched with one ParentNodeIdIndex query per
+parent, issued in parallel; nodes on the last requested level are probed with Limit=1
+queries so the client knows whether they can be expanded. Tombstoned nodes (see
+utils.tombstones) are filtered out of the walk, which therefore never descends into them.
+Whole subtrees below nodes with a materialized path (see utils.node_paths) skip the walk.
+Subtree reaping always uses the ParentNodeIdIndex walk, including tombstoned nodes, to
+discover descendants, then reads their items with parallel BatchGetItem requests.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from utils.node_queries import (BATCH_GET_MAX_KEYS, PARENT_NODES_INDEX, SPACE_NODES_INDEX, TREE_FIELDS,
+                                QueryStats, batch_get_items, projection_params, query_all, query_pages)
+from utils.node_paths import PATH_FIELD, is_frontier, query_descendants
+from utils.tombstones import is_hidden, visible_items
+
+QUERY_CONCURRENCY = int(os.environ.get('TREE_QUERY_CONCURRENCY', '16'))
+
+
+def _children_params(space_id: str, parent_id: str, fields: Optional[Iterable[str]],
+                     live_only: bool = False) -> Dict[str, Any]:
+    # Node ids are globally unique; the spaceId filter only guards against cross-space references
+    condition = Attr('spaceId').eq(space_id)
+    if live_only:
+        condition = condition & Attr('deletedAt').not_exists()
+    params = {
+        'IndexName': PARENT_NODES_INDEX,
+        'KeyConditionExpression': Key('parentNodeId').eq(parent_id),
+        'FilterExpression': condition
+    }
+    if fields:
+        params.update(projection_params(fields))
+    return params
+
+
+def _parallel_map(func, args: List[Any]) -> List[Any]:
+    if len(args) <= 1:
+        return [func(arg) for arg in args]
+    with ThreadPoolExecutor(max_workers=min(QUERY_CONCURRENCY, len(args))) as executor:
+        return list(executor.map(func, args))
+
+
+def load_children(nodes_table, space_id: str, parent_ids: List[str],
+                  fields: Optional[Iterable[str]] = TREE_FIELDS,
+                  stats: Optional[QueryStats] = None, live_only: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Load the children of several parents with parallel ParentNodeIdIndex queries.
+    With live_only, tombstoned children are left out.
+    """
+    def fetch(parent_id):
+        worker_stats = QueryStats()
+        items = query_all(nodes_table, stats=worker_stats,
+                          **_children_params(space_id, parent_id, fields, live_only=live_only))
+        return parent_id, items, worker_stats
+
+    children = {}
+    for parent_id, items, worker_stats in _parallel_map(fetch, parent_ids):
+        children[parent_id] = items
+        if stats is not None:
+            stats.merge(worker_stats)
+    return children
+
+
+def probe_children(nodes_table, space_id: str, parent_ids: List[str],
+                   stats: Optional[QueryStats] = None) -> Set[str]:
+    """Return the subset of parent_ids that have at least one live child."""
+    def probe(parent_id):
+        worker_stats = QueryStats()
+        params = _children_params(space_id, parent_id, ('nodeId',), live_only=True)
+        # Limit applies before the filter, so keep paging until a match or the end of the partition
+        params['Limit'] = 1
+        found = False
+        for page in query_pages(nodes_table, stats=worker_stats, **params):
+            if page:
+                found = True
+                break
+        return parent_id, found, worker_stats
+
+    with_children = set()
+    for parent_id, found, worker_stats in _parallel_map(probe, parent_ids):
+        if found:
+            with_children.add(parent_id)
+        if stats is not None:
+            stats.merge(worker_stats)
+    return with_children
+
+
+def load_root_nodes(nodes_table, space_id: str, fields: Optional[Iterable[str]] = TREE_FIELDS,
+                    stats: Optional[QueryStats] = None) -> List[Dict[str, Any]]:
+    """
+    Load the live top-level nodes of a space. Root nodes have no parentNodeId and are therefore
+    absent from the sparse ParentNodeIdIndex, so they are read from SpaceIdNodesIndex with a
+    filter; only the roots are returned, but read capacity covers the whole space partition.
+    """
+    params = {
+        'IndexName': SPACE_NODES_INDEX,
+        'KeyConditionExpression': Key('spaceId').eq(space_id),
+        'FilterExpression': Attr('parentNodeId').not_exists() & Attr('deletedAt').not_exists()
+    }
+    if fields:
+        params.update(projection_params(fields))
+    return query_all(nodes_table, stats=stats, **params)
+
+
+def load_subtree(nodes_table, space_id: str, root_node_id: Optional[str] = None,
+                 depth: Optional[int] = None, fields: Optional[Iterable[str]] = TREE_FIELDS,
+                 stats: Optional[QueryStats] = None) -> Optional[Tuple[List[Dict[str, Any]], Set[str]]]:
+    """
+    Walk a space breadth-first from root_node_id (or from the space's root nodes) down to
+    depth levels below the start level (depth=0 returns only the start level; None walks
+    the whole subtree).
+    Returns (items, expandable_ids), where expandable_ids are nodes on the last loaded level
+    that have children which were not loaded, or None if root_node_id does not exist or
+    is hidden by a tombstone on itself or one of its ancestors. A whole subtree (depth=None)
+    below a root with a materialized path is read with a single SpacePathIndex query.
+    """
+    if root_node_id:
+        root_fields = tuple(fields) + (PATH_FIELD,) if fields else None
+        response = nodes_table.get_item(Key={'nodeId': root_node_id, 'spaceId': space_id},
+                                        **(projection_params(root_fields) if root_fields else {}))
+        root = response.get('Item')
+        if root is None or is_hidden(nodes_table, space_id, root):
+            return None
+        if depth is None and root.get(PATH_FIELD):
+            # The whole subtree in one SpacePathIndex query instead of one round of queries per level
+            descendants = load_descendants(nodes_table, space_id, root, fields=fields, stats=stats)
+            return visible_items([root] + descendants), set()
+        level = [root]
+    else:
+        level = load_root_nodes(nodes_table, space_id, fields=fields, stats=stats)
+
+    items = list(level)
+    seen = {item['nodeId'] for item in level}
+    current_depth = 0
+    while level and (depth is None or current_depth < depth):
+        children = load_children(nodes_table, space_id, [item['nodeId'] for item in level],
+                                 fields=fields, stats=stats, live_only=True)
+        level = []
+        for parent in children:
+            for child in children[parent]:
+                # Guard against parent cycles in corrupted data
+                if child['nodeId'] not in seen:
+                    seen.add(child['nodeId'])
+                    level.append(child)
+        items.extend(level)
+        current_depth += 1
+
+    expandable = set()
+    if level and depth is not None:
+        expandable = probe_children(nodes_table, space_id, [item['nodeId'] for item in level], stats=stats)
+    return items, expandable
+
+
+def load_descendants(nodes_table, space_id: str, root: Dict[str, Any],
+                     fields: Optional[Iterable[str]] = TREE_FIELDS,
+                     stats: Optional[QueryStats] = None) -> List[Dict[str, Any]]:
+    """
+    Return every descendant of root (an item with nodeId and, if it has one, path), parents
+    before children, tombstoned ones included. Descendants carrying a materialized path come
+    from one SpacePathIndex query; below frontier nodes, and below a root without a path,
+    the rest is walked level by level over ParentNodeIdIndex.
+
+    A path match is kept only if its parentNodeId is root or a match kept before it (the query
+    returns parents first), so a node whose path was left stale by a failed rewrite after a
+    move is not mistaken for a descendant. Nodes moved into the subtree whose paths were not
+    rewritten are not found by the query at all; destructive callers walk ParentNodeIdIndex
+    (discover_subtree) instead.
+    """
+    fields = tuple(fields) + ('parentNodeId', PATH_FIELD) if fields else None
+    if root.get(PATH_FIELD):
+        accepted = {root['nodeId']}
+        items = []
+        for item in query_descendants(nodes_table, space_id, root[PATH_FIELD], fields=fields, stats=stats):
+            if item.get('parentNodeId') in accepted:
+                accepted.add(item['nodeId'])
+                items.append(item)
+        level = [item['nodeId'] for item in [root] + items if is_frontier(item[PATH_FIELD])]
+    else:
+        items, level = [], [root['nodeId']]
+    seen = {root['nodeId']} | {item['nodeId'] for item in items}
+    while level:
+        children = load_children(nodes_table, space_id, level, fields=fields, stats=stats)
+        level = []
+        for parent_id in children:
+            for child in children[parent_id]:
+                if child['nodeId'] not in seen:
+                    seen.add(child['nodeId'])
+                    items.append(child)
+                    level.append(child['nodeId'])
+    return items
+
+
+def discover_subtree(nodes_table, space_id: str, root_node_id: str,
+                     stats: Optional[QueryStats] = None) -> List[str]:
+    """
+    Return the ids of root_node_id and all of its descendants, level by level (parents before
+    children). Only keys are read; the root is included whether or not it exists, so
+    descendants of an already deleted node are still found.
+    """
+    node_ids = [root_node_id]
+    seen = {root_node_id}
+    level = [root_node_id]
+    while level:
+        children = load_children(nodes_table, space_id, level, fields=('nodeId',), stats=stats)
+        level = []
+        for parent_id in children:
+            for child in children[parent_id]:
+                if child['nodeId'] not in seen:
+                    seen.add(child['nodeId'])
+                    level.append(child['nodeId'])
+        node_ids.extend(level)
+    return node_ids
+
+
+def batch_get_nodes(dynamodb, table_name: str, space_id: str, node_ids: List[str],
+                    fields: Optional[Iterable[str]] = None,
+                    stats: Optional[QueryStats] = None) -> Dict[str, Dict[str, Any]]:
+    """Read node items by id with parallel, strongly consistent BatchGetItem requests."""
+    keys = [{'nodeId': node_id, 'spaceId': space_id} for node_id in node_ids]
+    chunks = [keys[start:start + BATCH_GET_MAX_KEYS] for start in range(0, len(keys), BATCH_GET_MAX_KEYS)]
+
+    def fetch(chunk):
+        worker_stats = QueryStats()
+        return batch_get_items(dynamodb, table_name, chunk, fields=fields, consistent_read=True,
+                               stats=worker_stats), worker_stats
+
+    nodes = {}
+    for items, worker_stats in _parallel_map(fetch, chunks):
+        for item in items:
+            nodes[item['nodeId']] = item
+        if stats is not None:
+            stats.merge(worker_stats)
+    return nodes
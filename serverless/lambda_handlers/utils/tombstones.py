@@ -0,0 +1,109 @@
+"""
+Soft deletion of subtrees.
+
+DELETE /spaces/{spaceId}/nodes/{nodeId} marks only the subtree root, in one conditional write:
+    deletedAt = <ISO timestamp>, tombstone = 'pending'
+A tombstoned node hides itself and all of its descendants from every read path; the
+descendants are left untouched. tombstone is the hash key of the sparse TombstonesIndex GSI
+(range key deletedAt), so only tombstoned nodes are indexed. Within UNDO_WINDOW_SECONDS
+the delete can be undone by removing both attributes again; afterwards node_reaper_handler
+removes the subtree and its content for good.
+"""
+
+import datetime
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from boto3.dynamodb.conditions import Key
+
+from utils.node_queries import QueryStats, query_pages
+from utils.node_versions import INCREMENT_VERSION, VERSION_NAMES, increment_values, version_condition
+from utils.transactions import update_operation
+
+TOMBSTONES_INDEX = 'TombstonesIndex'
+TOMBSTONE_PENDING = 'pending'
+UNDO_WINDOW_SECONDS = int(os.environ.get('NODE_UNDO_WINDOW_SECONDS', '600'))
+
+
+def timestamp(moment: Optional[datetime.datetime] = None) -> str:
+    """UTC timestamp with a fixed width, so that deletedAt values sort as strings."""
+    return (moment or datetime.datetime.utcnow()).isoformat(timespec='microseconds')
+
+
+def undo_cutoff(now: Optional[datetime.datetime] = None) -> str:
+    """Tombstones at or before this timestamp can no longer be restored."""
+    return timestamp((now or datetime.datetime.utcnow()) - datetime.timedelta(seconds=UNDO_WINDOW_SECONDS))
+
+
+def tombstone_operation(table_name: str, space_id: str, node_id: str, deleted_at: str,
+                        expected_version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Update entry of TransactItems marking a live node as deleted, provided it is at
+    expected_version if one is given. It fails if the node does not exist, is already
+    deleted or has another version.
+    """
+    condition = 'attribute_exists(nodeId) AND attribute_not_exists(deletedAt)'
+    values = increment_values({':deletedAt': deleted_at, ':pending': TOMBSTONE_PENDING})
+    if expected_version is not None:
+        condition += ' AND ' + version_condition(expected_version, values)
+    return update_operation(table_name, {'nodeId': node_id, 'spaceId': space_id},
+                            'SET deletedAt = :deletedAt, tombstone = :pending ' + INCREMENT_VERSION,
+                            values, condition=condition, names=VERSION_NAMES)
+
+
+def restore_operation(table_name: str, space_id: str, node_id: str, deleted_at: str, cutoff: str) -> Dict[str, Any]:
+    """
+    Update entry of TransactItems removing the tombstone written at deleted_at, provided it is
+    still inside the undo window. It fails if the node was restored, re-deleted or reaped.
+    """
+    return update_operation(table_name, {'nodeId': node_id, 'spaceId': space_id},
+                            'REMOVE deletedAt, tombstone ' + INCREMENT_VERSION,
+                            increment_values({':deletedAt': deleted_at, ':cutoff': cutoff}),
+                            condition='deletedAt = :deletedAt AND deletedAt > :cutoff', names=VERSION_NAMES)
+
+
+def visible_items(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop tombstoned items and their descendants from a flat list of node items."""
+    items = list(items)
+    children: Dict[str, List[str]] = {}
+    for item in items:
+        if item.get('parentNodeId'):
+            children.setdefault(item['parentNodeId'], []).append(item['nodeId'])
+    hidden = set()
+    pending = [item['nodeId'] for item in items if item.get('deletedAt')]
+    while pending:
+        node_id = pending.pop()
+        if node_id not in hidden:
+            hidden.add(node_id)
+            pending.extend(children.get(node_id, ()))
+    if not hidden:
+        return items
+    return [item for item in items if item['nodeId'] not in hidden]
+
+
+def is_hidden(nodes_table, space_id: str, item: Dict[str, Any]) -> bool:
+    """
+    Whether a node item is tombstoned or has a tombstoned ancestor. Ancestors are read one
+    GetItem per level, stopping at the first tombstone or at a missing parent.
+    """
+    seen = set()
+    while item is not None and item['nodeId'] not in seen:
+        if item.get('deletedAt'):
+            return True
+        seen.add(item['nodeId'])
+        parent_id = item.get('parentNodeId')
+        if not parent_id:
+            return False
+        item = nodes_table.get_item(
+            Key={'nodeId': parent_id, 'spaceId': space_id},
+            ProjectionExpression='nodeId, parentNodeId, deletedAt'
+        ).get('Item')
+    return False
+
+
+def expired_tombstones(nodes_table, cutoff: str,
+                       stats: Optional[QueryStats] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the keys and deletedAt of tombstones past the undo window, oldest first."""
+    for page in query_pages(nodes_table, stats=stats, IndexName=TOMBSTONES_INDEX,
+                            KeyConditionExpression=Key('tombstone').eq(TOMBSTONE_PENDING) & Key('deletedAt').lte(cutoff)):
+        yield from page
@@ -0,0 +1,88 @@
+"""
+TransactWriteItems helpers.
+
+Transactions go through the low-level client, so keys and values are serialized to
+DynamoDB's typed JSON here. A transaction holds at most TRANSACT_MAX_ITEMS operations;
+callers with more split them with chunks() and accept that atomicity is per chunk.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+TRANSACT_MAX_ITEMS = 100
+
+_serializer = TypeSerializer()
+
+
+class TransactionCanceled(Exception):
+    """A transaction was rejected as a whole; reasons holds one code per operation ('None' if it was fine)."""
+
+    def __init__(self, reasons: List[str]):
+        super().__init__(f"Transaction canceled: {', '.join(reasons)}")
+        self.reasons = reasons
+
+
+def serialize(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: _serializer.serialize(value) for name, value in values.items()}
+
+
+def update_operation(table_name: str, key: Dict[str, Any], update_expression: str,
+                     values: Dict[str, Any], condition: Optional[str] = None,
+                     names: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """One Update entry of TransactItems."""
+    update = {
+        'TableName': table_name,
+        'Key': serialize(key),
+        'UpdateExpression': update_expression,
+        'ExpressionAttributeValues': serialize(values)
+    }
+    if condition:
+        update['ConditionExpression'] = condition
+    if names:
+        update['ExpressionAttributeNames'] = names
+    return {'Update': update}
+
+
+def put_operation(table_name: str, item: Dict[str, Any], condition: Optional[str] = None) -> Dict[str, Any]:
+    """One Put entry of TransactItems."""
+    put = {
+        'TableName': table_name,
+        'Item': serialize(item)
+    }
+    if condition:
+        put['ConditionExpression'] = condition
+    return {'Put': put}
+
+
+def condition_check_operation(table_name: str, key: Dict[str, Any], condition: str,
+                              values: Optional[Dict[str, Any]] = None,
+                              names: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """One ConditionCheck entry of TransactItems: the transaction fails unless condition holds."""
+    check = {
+        'TableName': table_name,
+        'Key': serialize(key),
+        'ConditionExpression': condition
+    }
+    if values:
+        check['ExpressionAttributeValues'] = serialize(values)
+    if names:
+        check['ExpressionAttributeNames'] = names
+    return {'ConditionCheck': check}
+
+
+def chunks(operations: List[Any], size: int = TRANSACT_MAX_ITEMS) -> Iterable[List[Any]]:
+    for start in range(0, len(operations), size):
+        yield operations[start:start + size]
+
+
+def transact_write(client, operations: List[Dict[str, Any]]):
+    """Run operations as one transaction; raises TransactionCanceled if any condition failed."""
+    try:
+        client.transact_write_items(TransactItems=operations)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+            raise
+        reasons = [reason.get('Code', 'None') for reason in e.response.get('CancellationReasons', [])]
+        raise TransactionCanceled(reasons) from e
@@ -0,0 +1,292 @@
+"""
+Tree assembly for GET /spaces/{spaceId}.
+
+Turns flat node items into ordered root nodes with nested children without recursion, so
+arbitrarily deep chains neither hit the interpreter recursion limit nor the JSON encoder's.
+Nodes are compact __slots__ objects; siblings are ordered by one global sort of all nodes
+by orderIndex (by orderKey in spaces using fractional order keys, see utils.order_keys)
+instead of one sort per child list. Orphans (nodes whose parent is missing)
+and nodes caught in parent cycles are reported instead of being dropped silently.
+"""
+
+import decimal
+import gc
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from utils.order_keys import ORDER_KEY_FIELD
+
+_ROOT = -1
+_ORPHAN = -2
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+class TreeNode:
+    __slots__ = ('node_id', 'title', 'parent_id', 'order', 'children', 'has_children', 'extra')
+
+    def __init__(self, node_id, title, parent_id, order):
+        self.node_id = node_id
+        self.title = title
+        self.parent_id = parent_id
+        self.order = order
+        self.children = None
+        self.has_children = None
+        self.extra = None  # optional scalar fields emitted after orderIndex (e.g. inline content)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Nested dict form (iterative, safe for deep chains)."""
+        result = self._shallow_dict()
+        stack = [(self, result)]
+        while stack:
+            node, out = stack.pop()
+            for child in node.children or ():
+                child_out = child._shallow_dict()
+                out['children'].append(child_out)
+                stack.append((child, child_out))
+        return result
+
+    def _shallow_dict(self) -> Dict[str, Any]:
+        out = {
+            'nodeId': self.node_id,
+            'title': self.title,
+            'parentNodeId': self.parent_id,
+            'orderIndex': self.order
+        }
+        if self.extra:
+            out.update(self.extra)
+        out['children'] = []
+        if self.has_children is not None:
+            out['hasChildren'] = self.has_children
+        return out
+
+
+class AssembledTree:
+    """Result of assemble_tree()."""
+    __slots__ = ('roots', 'orphans', 'cycles', 'node_count')
+
+    def __init__(self, roots: List[TreeNode], orphans: List[str], cycles: List[str], node_count: int):
+        self.roots = roots
+        self.orphans = orphans
+        self.cycles = cycles
+        self.node_count = node_count
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [root.to_dict() for root in self.roots]
+
+
+def _order_key(value):
+    if value is None:
+        return 0
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    return value
+
+
+def assemble_tree(items: Iterable[Dict[str, Any]], root_ids: Optional[Set[str]] = None,
+                  expandable_ids: Optional[Set[str]] = None, keep_orphans: bool = False) -> AssembledTree:
+    """
+    Assemble flat node items (nodeId, title, parentNodeId, orderIndex) in O(n log n) time.
+
+    root_ids marks the top of a partial tree (nodes whose parent was not loaded on purpose).
+    expandable_ids are loaded nodes whose children were not loaded; when given, every node
+    gets a hasChildren flag. Orphans are dropped together with their subtrees unless
+    keep_orphans is set, in which case they are returned as extra roots.
+    """
+    # The pass allocates one object per node and, short of corrupt parent cycles, no reference
+    # cycles, so pausing the cyclic collector avoids repeated full-generation scans on large spaces
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _assemble(items, root_ids, expandable_ids, keep_orphans)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _assemble(items, root_ids, expandable_ids, keep_orphans) -> AssembledTree:
+    nodes: List[TreeNode] = []
+    index: Dict[str, int] = {}
+    order_keys: Dict[int, str] = {}
+    for item in items:
+        order = item.get('orderIndex', 0)
+        if order.__class__ is not int:
+            order = _order_key(order)
+        node = TreeNode(item['nodeId'], item.get('title'), item.get('parentNodeId'), order)
+        position = index.get(node.node_id)
+        if position is None:
+            position = index[node.node_id] = len(nodes)
+            nodes.append(node)
+        else:
+            nodes[position] = node  # a duplicate id replaces the earlier item
+        order_key = item.get(ORDER_KEY_FIELD)
+        if order_key:
+            order_keys[position] = order_key
+
+    # Parent positions as a flat list: _ROOT, _ORPHAN or the index of the parent node
+    index_get = index.get
+    parents = [
+        _ROOT if not node.parent_id or (root_ids is not None and node.node_id in root_ids)
+        else index_get(node.parent_id, _ORPHAN)
+        for node in nodes
+    ]
+
+    roots: List[TreeNode] = []
+    orphan_nodes: List[TreeNode] = []
+    if order_keys:
+        # Fractional order keys decide; nodes without one (not migrated yet) sort first by orderIndex
+        orders = [(order_keys.get(position, ''), node.order) for position, node in enumerate(nodes)]
+    else:
+        orders = [node.order for node in nodes]
+    # One stable bulk sort orders every sibling list at once
+    for position in sorted(range(len(nodes)), key=orders.__getitem__):
+        node = nodes[position]
+        parent = parents[position]
+        if parent >= 0:
+            parent_node = nodes[parent]
+            if parent_node.children is None:
+                parent_node.children = [node]
+            else:
+                parent_node.children.append(node)
+        elif parent == _ROOT:
+            roots.append(node)
+        else:
+            orphan_nodes.append(node)
+
+    # Every node reachable from a root (or an orphan) is placed; anything else hangs off a cycle
+    reached = 0
+    stack = roots + orphan_nodes
+    while stack:
+        node = stack.pop()
+        reached += 1
+        if expandable_ids is not None:
+            node.has_children = bool(node.children) or node.node_id in expandable_ids
+        if node.children:
+            stack.extend(node.children)
+    cycles = []
+    if reached < len(nodes):
+        placed = set()
+        stack = roots + orphan_nodes
+        while stack:
+            node = stack.pop()
+            placed.add(node.node_id)
+            stack.extend(node.children or ())
+        cycles = sorted(node.node_id for node in nodes if node.node_id not in placed)
+
+    if order_keys:
+        # Clients order by orderIndex, so report each node's position among its siblings
+        for siblings in [roots, orphan_nodes] + [node.children for node in nodes if node.children]:
+            for sibling_position, node in enumerate(siblings):
+                node.order = sibling_position
+
+    if keep_orphans:
+        roots = roots + orphan_nodes
+    return AssembledTree(roots, sorted(node.node_id for node in orphan_nodes), cycles, len(nodes))
+
+
+def _scalar(value) -> str:
+    if value.__class__ is str:
+        return _encode_string(value)
+    if value.__class__ is int:
+        return str(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, decimal.Decimal):
+        value = int(value) if value % 1 == 0 else float(value)
+    return json.dumps(value)
+
+
+def iter_tree_json(roots: List[TreeNode]) -> Iterator[str]:
+    """
+    Yield the JSON array of roots with nested children in chunks, iteratively.
+    Produces the same text as json.dumps([root.to_dict() for root in roots]).
+    """
+    yield '['
+    stack: List[Any] = []
+    for position in range(len(roots) - 1, -1, -1):
+        stack.append(roots[position])
+        if position:
+            stack.append(', ')
+    while stack:
+        node = stack.pop()
+        if node.__class__ is str:
+            yield node
+            continue
+        extra = ''
+        if node.extra:
+            extra = ''.join(f'{_encode_string(key)}: {_scalar(value)}, ' for key, value in node.extra.items())
+        yield (f'{{"nodeId": {_scalar(node.node_id)}, "title": {_scalar(node.title)}, '
+               f'"parentNodeId": {_scalar(node.parent_id)}, "orderIndex": {_scalar(node.order)}, {extra}"children": [')
+        stack.append(']}' if node.has_children is None else f'], "hasChildren": {_scalar(node.has_children)}}}')
+        children = node.children
+        if children:
+            for position in range(len(children) - 1, -1, -1):
+                stack.append(children[position])
+                if position:
+                    stack.append(', ')
+    yield ']'
+
+
+def iter_nodes(roots: List[TreeNode]) -> Iterator[TreeNode]:
+    """Yield every node breadth-first (top levels first)."""
+    level = list(roots)
+    while level:
+        next_level = []
+        for node in level:
+            yield node
+            if node.children:
+                next_level.extend(node.children)
+        level = next_level
+
+
+def columnar_tree(roots: List[TreeNode]) -> Dict[str, Any]:
+    """
+    Columnar form of an assembled tree (GET /spaces/{spaceId}?format=columnar).
+
+    Nodes are listed breadth-first, so every parent precedes its children and siblings keep
+    their order; parents holds the row of each node's parent (-1 for a top-level node).
+    Titles are stored as offsets into a deduplicated strings table. hasChildren and inline
+    content fields, when present, become extra parallel columns (null where absent).
+    """
+    rows = list(iter_nodes(roots))
+    row_of = {id(node): row for row, node in enumerate(rows)}
+    strings: List[Any] = []
+    string_index: Dict[Any, int] = {}
+    ids, titles, order = [], [], []
+    extra_keys: List[str] = []
+    for node in rows:
+        ids.append(node.node_id)
+        title_index = string_index.get(node.title)
+        if title_index is None:
+            title_index = string_index[node.title] = len(strings)
+            strings.append(node.title)
+        titles.append(title_index)
+        order.append(node.order)
+        if node.extra:
+            extra_keys.extend(key for key in node.extra if key not in extra_keys)
+    parents = [-1] * len(rows)
+    for row, node in enumerate(rows):
+        for child in node.children or ():
+            parents[row_of[id(child)]] = row
+
+    columns = {
+        'count': len(rows),
+        'ids': ids,
+        'titles': titles,
+        'parents': parents,
+        'order': order,
+        'strings': strings
+    }
+    if rows and rows[0].has_children is not None:
+        columns['hasChildren'] = [1 if node.has_children else 0 for node in rows]
+    for key in extra_keys:
+        columns[key] = [(node.extra or {}).get(key) for node in rows]
+    return columns
+
+
+def dumps_tree(roots: List[TreeNode]) -> str:
+    return ''.join(iter_tree_json(roots))
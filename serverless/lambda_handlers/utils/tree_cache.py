@@ -0,0 +1,84 @@
+"""
+Memory-bounded LRU of built space trees, kept in module scope so that it survives across
+invocations of a warm Lambda container.
+
+Entries are tagged with the version they were built from (the tree ETag, which changes with
+treeVersion and the space name). Callers read the META item with a consistent read and pass
+its tag to get(); an entry with a different tag is discarded and reported as stale, so a
+container never serves a tree older than the last acknowledged write.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_BYTES = int(os.environ.get('TREE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('TREE_CACHE_MAX_ENTRIES', '256'))
+
+
+class TreeCache:
+    """LRU keyed by spaceId, bounded by total entry size and entry count."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, space_id: str, version_tag: str) -> Optional[Any]:
+        """Return the cached value if it was built from version_tag, else None."""
+        with self._lock:
+            entry = self._entries.get(space_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            tag, value, size = entry
+            if tag != version_tag:
+                self._remove(space_id)
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(space_id)
+            self.hits += 1
+            return value
+
+    def put(self, space_id: str, version_tag: str, value: Any, size: int):
+        """Store a value of the given size in bytes, evicting least recently used entries."""
+        with self._lock:
+            if space_id in self._entries:
+                self._remove(space_id)
+            if size > self.max_bytes:
+                return
+            self._entries[space_id] = (version_tag, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, space_id: str):
+        with self._lock:
+            if space_id in self._entries:
+                self._remove(space_id)
+
+    def _remove(self, space_id: str):
+        _, _, size = self._entries.pop(space_id)
+        self._bytes -= size
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters for StructuredLogger.performance (cumulative for the container)."""
+        with self._lock:
+            return {
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'cache_stale': self.stale,
+                'cache_evictions': self.evictions,
+                'cache_entries': len(self._entries),
+                'cache_bytes': self._bytes
+            }
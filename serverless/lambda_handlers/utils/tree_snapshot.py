@@ -0,0 +1,201 @@
+"""
+Materialized tree snapshots for GET /spaces/{spaceId}.
+
+A snapshot is a JSON document in the content bucket holding the flat node table of a
+space ({nodeId: {title, parentNodeId, orderIndex[, orderKey]}}) and the space treeVersion it reflects.
+The tree handler serves it with a single S3 GET when that version matches the META item;
+node write handlers patch it in place with conditional (If-Match) writes. If a patch
+cannot be applied the snapshot is deleted, and the next read rebuilds it from the Nodes table.
+"""
+
+import datetime
+import decimal
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from utils.node_queries import TREE_FIELDS, load_space_nodes
+from utils.tombstones import visible_items
+
+SNAPSHOT_KEY_TEMPLATE = 'snapshots/{space_id}/tree.json'
+PATCH_RETRIES = 3
+CONFLICT_ERROR_CODES = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+SnapshotNodes = Dict[str, Dict[str, Any]]
+
+
+def snapshot_key(space_id: str) -> str:
+    return SNAPSHOT_KEY_TEMPLATE.format(space_id=space_id)
+
+
+def _plain(value):
+    """Convert DynamoDB Decimals into JSON-friendly ints/floats."""
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    return value
+
+
+def snapshot_entry(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The subset of a node item kept in a snapshot."""
+    entry = {
+        'title': item.get('title'),
+        'parentNodeId': item.get('parentNodeId'),
+        'orderIndex': _plain(item.get('orderIndex', 0))
+    }
+    if item.get('orderKey'):
+        entry['orderKey'] = item['orderKey']
+    return entry
+
+
+def snapshot_items(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand a snapshot document back into node items for tree assembly."""
+    return [dict(entry, nodeId=node_id) for node_id, entry in doc['nodes'].items()]
+
+
+def new_snapshot(space_id: str, items: Iterable[Dict[str, Any]], tree_version: int = 0) -> Dict[str, Any]:
+    return {
+        'spaceId': space_id,
+        'treeVersion': tree_version,
+        'nodes': {item['nodeId']: snapshot_entry(item) for item in items},
+        'updatedAt': datetime.datetime.utcnow().isoformat()
+    }
+
+
+def _is_conflict(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') in CONFLICT_ERROR_CODES
+
+
+def load_snapshot(s3_client, bucket: str, space_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Return (document, etag), or (None, None) if the space has no snapshot."""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=snapshot_key(space_id))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None, None
+        raise
+    return json.loads(response['Body'].read()), response.get('ETag')
+
+
+def save_snapshot(s3_client, bucket: str, space_id: str, doc: Dict[str, Any],
+                  etag: Optional[str] = None, create_only: bool = False) -> bool:
+    """
+    Write a snapshot. With etag the write only succeeds if the stored object is unchanged;
+    with create_only it only succeeds if no snapshot exists. Returns False on a lost race.
+    """
+    params = {
+        'Bucket': bucket,
+        'Key': snapshot_key(space_id),
+        'Body': json.dumps(doc, default=str).encode('utf-8'),
+        'ContentType': 'application/json'
+    }
+    if etag:
+        params['IfMatch'] = etag
+    elif create_only:
+        params['IfNoneMatch'] = '*'
+    try:
+        s3_client.put_object(**params)
+        return True
+    except ClientError as e:
+        if _is_conflict(e):
+            return False
+        raise
+
+
+def delete_snapshot(s3_client, bucket: str, space_id: str):
+    s3_client.delete_object(Bucket=bucket, Key=snapshot_key(space_id))
+
+
+def patch_snapshot(s3_client, bucket: str, space_id: str,
+                   mutate: Callable[[SnapshotNodes], None], version: Optional[int] = None) -> bool:
+    """
+    Apply mutate() to the stored snapshot with optimistic concurrency.
+    version is the treeVersion produced by the write being applied. The patch is only
+    applied on top of the immediately preceding version; a snapshot that already includes
+    the write is left alone, and one that has missed an earlier write is deleted.
+    A missing snapshot is left alone (the next read rebuilds it). If every attempt loses
+    the race, the snapshot is deleted so that a stale document is never served.
+    Returns True if the snapshot was patched.
+    """
+    for _ in range(PATCH_RETRIES):
+        doc, etag = load_snapshot(s3_client, bucket, space_id)
+        if doc is None:
+            return False
+        if version is not None:
+            stored_version = doc.get('treeVersion', 0)
+            if stored_version >= version:
+                return False
+            if stored_version != version - 1:
+                delete_snapshot(s3_client, bucket, space_id)
+                return False
+            doc['treeVersion'] = version
+        mutate(doc['nodes'])
+        doc['updatedAt'] = datetime.datetime.utcnow().isoformat()
+        if save_snapshot(s3_client, bucket, space_id, doc, etag=etag):
+            return True
+    delete_snapshot(s3_client, bucket, space_id)
+    return False
+
+
+def upsert_nodes(items: Iterable[Dict[str, Any]]) -> Callable[[SnapshotNodes], None]:
+    """Mutation adding nodes, or merging the given attributes into existing entries."""
+    def mutate(nodes: SnapshotNodes):
+        for item in items:
+            entry = nodes.setdefault(item['nodeId'], snapshot_entry({}))
+            for field in ('title', 'parentNodeId', 'orderIndex', 'orderKey'):
+                if field in item:
+                    entry[field] = _plain(item[field])
+    return mutate
+
+
+def remove_nodes(node_ids: Iterable[str]) -> Callable[[SnapshotNodes], None]:
+    """Mutation removing nodes together with any descendants still in the snapshot."""
+    def mutate(nodes: SnapshotNodes):
+        children: Dict[str, List[str]] = {}
+        for node_id, entry in nodes.items():
+            if entry.get('parentNodeId'):
+                children.setdefault(entry['parentNodeId'], []).append(node_id)
+        pending = list(node_ids)
+        while pending:
+            node_id = pending.pop()
+            if nodes.pop(node_id, None) is not None:
+                pending.extend(children.get(node_id, ()))
+    return mutate
+
+
+def rebuild_snapshot(nodes_table, s3_client, bucket: str, space_id: str, tree_version: int = 0,
+                     etag: Optional[str] = None, create_only: bool = False, stats=None) -> Dict[str, Any]:
+    """
+    Rebuild a snapshot from scratch out of the live node items and store it.
+    Read tree_version from the META item before calling so that a write racing with the
+    rebuild leaves the snapshot behind the counter (and therefore invalid) rather than ahead.
+    """
+    items = visible_items(load_space_nodes(nodes_table, space_id, fields=TREE_FIELDS, stats=stats))
+    doc = new_snapshot(space_id, items, tree_version)
+    save_snapshot(s3_client, bucket, space_id, doc, etag=etag, create_only=create_only)
+    return doc
+
+
+def check_consistency(doc: Dict[str, Any], live_items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare a snapshot against live node items.
+    Returns the node ids missing from the snapshot, present only in the snapshot,
+    and present in both with differing attributes.
+    """
+    live = {item['nodeId']: snapshot_entry(item) for item in live_items}
+    stored = doc.get('nodes', {}) if doc else {}
+    mismatched = []
+    for node_id in live.keys() & stored.keys():
+        differences = {
+            field: {'snapshot': stored[node_id].get(field), 'live': live[node_id][field]}
+            for field in live[node_id]
+            if stored[node_id].get(field) != live[node_id][field]
+        }
+        if differences:
+            mismatched.append({'nodeId': node_id, 'differences': differences})
+    return {
+        'consistent': not mismatched and live.keys() == stored.keys(),
+        'missing': sorted(live.keys() - stored.keys()),
+        'extra': sorted(stored.keys() - live.keys()),
+        'mismatched': mismatched
+    }
@@ -0,0 +1,100 @@
+"""
+Write-side bookkeeping shared by the node write handlers.
+
+Node writes that fit one transaction go through transact_tree_write(), which commits them
+together with the bump of the space treeVersion (see utils.space_version): a committed node
+change always moves the version that ETags and the change feed are based on. Afterwards the
+handler calls record_tree_change() with change entries built by
+utils.change_log.node_change() and the version its write produced; that appends the entries
+to the space change log and patches the materialized tree snapshot with the same change.
+Bulk adds, which cannot use a transaction, bump the version with
+utils.space_version.bump_tree_version() once they are written and undo the write if that
+fails; node edits (one conditional UpdateItem) bump it the same way afterwards and keep the
+edit if the bump fails. If the snapshot patch fails the snapshot is invalidated so readers rebuild it; a
+change record that is missing shows up as a gap in the feed.
+"""
+
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from utils.change_log import CREATED, DELETED, record_changes
+from utils.space_version import claim_tree_version, tree_version_operation
+from utils.transactions import TRANSACT_MAX_ITEMS, TransactionCanceled, transact_write
+from utils.tree_snapshot import SnapshotNodes, delete_snapshot, patch_snapshot, remove_nodes, upsert_nodes
+
+# Room a transaction passed to transact_tree_write has for the caller's operations
+TREE_WRITE_MAX_ITEMS = TRANSACT_MAX_ITEMS - 1
+# A transaction canceled only by TransactionConflict (a concurrent transaction on one of its
+# items, usually the META item) wrote nothing and is run again, up to this many times
+TREE_WRITE_ATTEMPTS = 5
+TREE_WRITE_BACKOFF_SECONDS = 0.02
+
+
+def snapshot_mutation(changes: List[Dict[str, Any]]):
+    """Snapshot mutation equivalent to a list of change entries, applied in order."""
+    def mutate(nodes: SnapshotNodes):
+        for change in changes:
+            if change['op'] == DELETED:
+                remove_nodes([change['nodeId']])(nodes)
+            # Only a creation adds a node: an edit of a node the snapshot hides (below a
+            # deleted ancestor) must not bring it back
+            elif change['nodeId'] in nodes or change['op'] == CREATED:
+                upsert_nodes([dict(change.get('node', {}), nodeId=change['nodeId'])])(nodes)
+    return mutate
+
+
+def transact_tree_write(client, spaces_table, space_id: str, operations: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Commit operations (at most TREE_WRITE_MAX_ITEMS) in one transaction with the space's
+    treeVersion increment and return the new treeVersion. The increment is an atomic ADD, so
+    writers of a space never fail on each other's version; a transaction canceled only by a
+    TransactionConflict wrote nothing and is run again as it is. The value this write
+    produced is claimed with one UpdateItem afterwards (None if that fails: the write stands,
+    and the tree snapshot no longer matching the META item is rebuilt on the next read). A
+    space without a META item has its operations committed alone and None returned. Raises
+    TransactionCanceled with the reasons of the caller's operations (all 'None' if only the
+    version entry kept conflicting) if the transaction could not be committed.
+    """
+    token = uuid.uuid4().hex
+    items = operations + [tree_version_operation(spaces_table.name, space_id, token)]
+    for attempt in range(TREE_WRITE_ATTEMPTS):
+        try:
+            transact_write(client, items)
+            break
+        except TransactionCanceled as e:
+            reasons = e.reasons[:len(operations)]
+            failed = {reason for reason in e.reasons if reason != 'None'}
+            if failed == {'TransactionConflict'} and attempt + 1 < TREE_WRITE_ATTEMPTS:
+                # Another transaction held one of the items; nothing was written, so run it again
+                time.sleep(random.uniform(0, TREE_WRITE_BACKOFF_SECONDS * 2 ** attempt))
+                continue
+            if any(reason != 'None' for reason in reasons) or e.reasons[len(operations):] != ['ConditionalCheckFailed']:
+                raise TransactionCanceled(reasons) from e
+            transact_write(client, operations)
+            return None
+    try:
+        return claim_tree_version(spaces_table, space_id, token)
+    except Exception as e:
+        print(f"Failed to read back treeVersion of space {space_id} after a committed write: {e}")
+        return None
+
+
+def record_tree_change(spaces_table, s3_client, bucket: str, space_id: str, tree_version: Optional[int],
+                       changes: List[Dict[str, Any]]):
+    """Log committed node changes under the treeVersion their write produced and patch the snapshot."""
+    try:
+        if tree_version is not None:
+            try:
+                record_changes(spaces_table, space_id, tree_version, changes)
+            except Exception as log_error:
+                print(f"Failed to record changes for space {space_id} version {tree_version}: {log_error}")
+        patch_snapshot(s3_client, bucket, space_id, snapshot_mutation(changes), version=tree_version)
+    except Exception:
+        try:
+            delete_snapshot(s3_client, bucket, space_id)
+        except Exception as cleanup_error:
+            print(f"Failed to invalidate tree snapshot for space {space_id}: {cleanup_error}")
+        raise
+
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Backfill materialized ancestor paths (the `path` attribute behind SpacePathIndex).
+
+For each space, every node is loaded from SpaceIdNodesIndex, the paths are computed from the
+parentNodeId links in memory, and only nodes whose stored path is missing or wrong are
+written; nodes that cannot carry a path (see utils.node_paths) have a stored one removed.
+Each write is conditional on the path read, so a node moved while the backfill runs keeps
+the path its move wrote. Spaces finished are appended to the checkpoint file and skipped
+when the tool is run again, so an interrupted backfill resumes where it stopped; re-running
+a space is harmless as well.
+
+This is also the repair path for moves whose descendant path rewrite failed after the node
+itself had moved: the move and update handlers log "Failed to rewrite descendant paths ...
+run tools/backfill_node_paths.py <spaceId>". Until then readers drop the stale matches
+(utils.subtree.load_descendants checks them against the parentNodeId chain) and the reaper
+does not use paths at all, so stale paths cost completeness of path reads, never deletes.
+
+Examples:
+  python tools/backfill_node_paths.py --all --checkpoint backfill-paths.done
+  python tools/backfill_node_paths.py --dry-run 123e4567-e89b-12d3-a456-426614174000
+
+Table names are read from the same environment variables as the Lambda handlers
+(SPACES_TABLE_NAME, NODES_TABLE_NAME).
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from tree_snapshots import list_space_ids  # noqa: E402
+from utils.node_paths import PATH_FIELD, PATH_WRITE_CONCURRENCY, compute_paths, set_path  # noqa: E402
+from utils.node_queries import load_space_nodes  # noqa: E402
+
+
+def read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def backfill_space(nodes_table, space_id, dry_run=False):
+    """Write missing or stale paths of one space; returns a per-space report."""
+    items = load_space_nodes(nodes_table, space_id, fields=('nodeId', 'parentNodeId', PATH_FIELD))
+    paths = compute_paths(items)
+    # Nodes that should carry no path (below a missing parent, in a cycle or too deep) lose a stored one
+    pending = [
+        (item['nodeId'], paths.get(item['nodeId']), item.get(PATH_FIELD))
+        for item in items
+        if item.get(PATH_FIELD) != paths.get(item['nodeId'])
+    ]
+    report = {
+        'spaceId': space_id,
+        'nodes': len(items),
+        'stale': len(pending),
+        'withoutPath': len(items) - len(paths),
+        'written': 0,
+        'conflicts': 0
+    }
+    if dry_run or not pending:
+        return report
+
+    def write(entry):
+        node_id, path, stored = entry
+        return set_path(nodes_table, space_id, node_id, path, expected=stored)
+
+    with ThreadPoolExecutor(max_workers=PATH_WRITE_CONCURRENCY) as executor:
+        for written in executor.map(write, pending):
+            report['written' if written else 'conflicts'] += 1
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('space_ids', nargs='*', help='spaces to process')
+    parser.add_argument('--all', action='store_true', help='process every space in the Spaces table')
+    parser.add_argument('--checkpoint', help='file recording finished spaces; they are skipped on the next run')
+    parser.add_argument('--dry-run', action='store_true', help='only report how many paths are missing or stale')
+    args = parser.parse_args()
+    if not args.all and not args.space_ids:
+        parser.error('pass one or more space ids, or --all')
+
+    dynamodb = boto3.resource('dynamodb')
+    nodes_table = dynamodb.Table(os.environ.get('NODES_TABLE_NAME', 'Nodes'))
+    spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+
+    done = read_checkpoint(args.checkpoint)
+    space_ids = list_space_ids(spaces_table) if args.all else args.space_ids
+    conflicts = 0
+    for space_id in space_ids:
+        if space_id in done:
+            continue
+        report = backfill_space(nodes_table, space_id, dry_run=args.dry_run)
+        conflicts += report['conflicts']
+        print(json.dumps(report))
+        # A space with conflicts is retried on the next run
+        if args.checkpoint and not args.dry_run and not report['conflicts']:
+            with open(args.checkpoint, 'a') as f:
+                f.write(space_id + '\n')
+
+    return 1 if conflicts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
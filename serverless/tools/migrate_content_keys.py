@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Move node content from the older per-node S3 layouts to content stored by hash.
+
+Nodes whose content is in one of the older layouts (utils.content_store.LEGACY_LAYOUTS:
+contentS3Key of the add handler, {spaceId}/{nodeId}[/{revision}].html of the update handler,
+nodes/{spaceId}/{nodeId}/content.html of the content generator) are rewritten the way
+utils.content_store writes content today: the object is read (and decoded), acquired under
+{spaceId}/content/{hash}.html, compressed per utils.content_codec, and the node is pointed at
+it with one UpdateItem conditional on the keys, contentVersion, updatedAt and version read
+and on the node having no contentHash yet. Only then is the old object deleted. A node edited
+or regenerated meanwhile keeps its new content; the reference taken for it is dropped again
+and the node is reported as a conflict. Nodes are migrated in parallel (--concurrency); node
+versions are not changed, the content is the same.
+
+Spaces finished are appended to the checkpoint file and skipped when the tool is run again;
+within a space, migrated nodes carry contentHash and are skipped too, so an interrupted run
+resumes where it stopped. A run killed between the acquire and the node update leaves one
+extra reference behind, which only keeps that object until the space is deleted. The
+content generator still writes its own layout, so run this periodically with --all.
+
+Examples:
+  python tools/migrate_content_keys.py --all --checkpoint migrate-content.done
+  python tools/migrate_content_keys.py --dry-run 123e4567-e89b-12d3-a456-426614174000
+
+Table and bucket names are read from the same environment variables as the Lambda
+handlers (SPACES_TABLE_NAME, NODES_TABLE_NAME, CONTENT_BUCKET_NAME).
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from tree_snapshots import list_space_ids  # noqa: E402
+from backfill_node_paths import read_checkpoint  # noqa: E402
+from utils.content_codec import CONTENT_ENCODING_FIELD  # noqa: E402
+from utils.content_store import (  # noqa: E402
+    CONTENT_HASH_FIELD, LEGACY_LAYOUTS, acquire_content, content_layout, content_object, read_object,
+    release_content
+)
+from utils.node_deletion import delete_content_objects  # noqa: E402
+from utils.node_queries import load_space_nodes  # noqa: E402
+from utils.node_versions import VERSION_FIELD, VERSION_NAMES, version_condition  # noqa: E402
+
+MIGRATE_FIELDS = ('nodeId', 'contentPreview', 's3Key', 'contentS3Key', 'contentVersion', 'updatedAt',
+                  VERSION_FIELD, CONTENT_HASH_FIELD, CONTENT_ENCODING_FIELD)
+MIGRATE_CONCURRENCY = 8
+
+
+def _error_code(error):
+    return error.response.get('Error', {}).get('Code')
+
+
+def migrate_node(spaces_table, nodes_table, s3_client, bucket, space_id, item):
+    """Move one node's content to its hashed key; returns 'migrated', 'conflict' or 'missing'."""
+    key, encoding = content_object(item)
+    try:
+        content_html = read_object(s3_client, bucket, key, encoding)
+    except ClientError as e:
+        if _error_code(e) in ('NoSuchKey', '404'):
+            return 'missing'
+        raise
+    digest, new_key, new_encoding = acquire_content(spaces_table, s3_client, bucket, space_id, content_html)
+
+    values = {':sk': new_key, ':ch': digest}
+    update_expression = 'SET s3Key = :sk, contentHash = :ch'
+    remove_parts = ['contentS3Key']
+    if new_encoding:
+        update_expression += ', contentEncoding = :ce'
+        values[':ce'] = new_encoding
+    else:
+        remove_parts.append(CONTENT_ENCODING_FIELD)
+    # The node must still be as read; a concurrent edit or regeneration wins, even one reusing a key
+    conditions = ['attribute_exists(nodeId)', 'attribute_not_exists(contentHash)',
+                  version_condition(int(item.get(VERSION_FIELD) or 0), values)]
+    for field, placeholder in (('s3Key', ':oldS3Key'), ('contentS3Key', ':oldContentS3Key'),
+                               ('contentVersion', ':oldContentVersion'), ('updatedAt', ':oldUpdatedAt')):
+        if item.get(field):
+            conditions.append(f'{field} = {placeholder}')
+            values[placeholder] = item[field]
+        else:
+            conditions.append(f'attribute_not_exists({field})')
+    try:
+        nodes_table.update_item(
+            Key={'nodeId': item['nodeId'], 'spaceId': space_id},
+            UpdateExpression=update_expression + ' REMOVE ' + ', '.join(remove_parts),
+            ConditionExpression=' AND '.join(conditions),
+            ExpressionAttributeNames=VERSION_NAMES,
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if _error_code(e) != 'ConditionalCheckFailedException':
+            raise
+        release_content(spaces_table, s3_client, bucket, space_id, digest)
+        return 'conflict'
+    # The old objects belonged to this node alone
+    delete_content_objects(s3_client, bucket, [item])
+    return 'migrated'
+
+
+def migrate_space(spaces_table, nodes_table, s3_client, bucket, space_id, concurrency=MIGRATE_CONCURRENCY,
+                  dry_run=False):
+    """Migrate the legacy content of one space; returns a per-space report."""
+    items = load_space_nodes(nodes_table, space_id, fields=MIGRATE_FIELDS)
+    layouts = Counter(content_layout(item) or 'none' for item in items)
+    pending = [item for item in items if content_layout(item) in LEGACY_LAYOUTS]
+    report = {
+        'spaceId': space_id,
+        'nodes': len(items),
+        'layouts': dict(layouts),
+        'pending': len(pending),
+        'migrated': 0,
+        'conflicts': 0,
+        'missing': 0,
+        'errors': 0
+    }
+    if dry_run or not pending:
+        return report
+
+    def migrate(item):
+        try:
+            return migrate_node(spaces_table, nodes_table, s3_client, bucket, space_id, item)
+        except Exception as e:
+            print(f"Error migrating content of node {item['nodeId']} in space {space_id}: {e}", file=sys.stderr)
+            return 'error'
+
+    outcomes = {'migrated': 'migrated', 'conflict': 'conflicts', 'missing': 'missing', 'error': 'errors'}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for outcome in executor.map(migrate, pending):
+            report[outcomes[outcome]] += 1
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('space_ids', nargs='*', help='spaces to process')
+    parser.add_argument('--all', action='store_true', help='process every space in the Spaces table')
+    parser.add_argument('--checkpoint', help='file recording finished spaces; they are skipped on the next run')
+    parser.add_argument('--concurrency', type=int, default=MIGRATE_CONCURRENCY,
+                        help='nodes migrated in parallel per space')
+    parser.add_argument('--dry-run', action='store_true', help='only report the content layouts of each space')
+    args = parser.parse_args()
+    if not args.all and not args.space_ids:
+        parser.error('pass one or more space ids, or --all')
+
+    dynamodb = boto3.resource('dynamodb')
+    nodes_table = dynamodb.Table(os.environ.get('NODES_TABLE_NAME', 'Nodes'))
+    spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+    s3_client = boto3.client('s3')
+    bucket = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+
+    done = read_checkpoint(args.checkpoint)
+    space_ids = list_space_ids(spaces_table) if args.all else args.space_ids
+    failed = 0
+    for space_id in space_ids:
+        if space_id in done:
+            continue
+        report = migrate_space(spaces_table, nodes_table, s3_client, bucket, space_id,
+                               concurrency=args.concurrency, dry_run=args.dry_run)
+        print(json.dumps(report))
+        unfinished = report['conflicts'] + report['errors']
+        failed += unfinished
+        # A space with conflicts or errors is retried on the next run
+        if args.checkpoint and not args.dry_run and not unfinished:
+            with open(args.checkpoint, 'a') as f:
+                f.write(space_id + '\n')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
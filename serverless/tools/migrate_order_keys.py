@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Switch spaces to fractional order keys (orderMode = 'rank', see utils/order_keys.py) and
+rebalance sibling lists whose keys have grown long.
+
+For each space the META item is switched first, so from then on node writes keep order
+keys themselves. Then every node is loaded from SpaceIdNodesIndex and each sibling list,
+in its current display order, that has a node without a key, keys out of order or a key
+longer than --max-length gets evenly spaced short keys. Only keys that change are
+written, each conditional on the key read, so a node placed by a handler meanwhile keeps
+its key (the space is reported with conflicts and handled again on the next run). The
+tree snapshot of a migrated space is deleted so the next read rebuilds it with the keys.
+
+Run it once per space to migrate, and periodically with --all to rebalance:
+  python tools/migrate_order_keys.py --all --checkpoint migrate-order.done
+  python tools/migrate_order_keys.py --dry-run 123e4567-e89b-12d3-a456-426614174000
+
+Table and bucket names are read from the same environment variables as the Lambda
+handlers (SPACES_TABLE_NAME, NODES_TABLE_NAME, CONTENT_BUCKET_NAME).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from tree_snapshots import list_space_ids  # noqa: E402
+from backfill_node_paths import read_checkpoint  # noqa: E402
+from utils.node_queries import load_space_nodes  # noqa: E402
+from utils.order_keys import (  # noqa: E402
+    MAX_ORDER_KEY_LENGTH, ORDER_KEY_FIELD, ORDER_MODE_FIELD, ORDER_MODE_RANK, sibling_sort_key, spread_keys,
+    write_order_keys
+)
+from utils.space_version import space_meta_key  # noqa: E402
+from utils.tree_snapshot import delete_snapshot  # noqa: E402
+
+
+def needs_keys(siblings, max_length):
+    """Whether a sibling list (in display order) needs fresh keys."""
+    keys = [item.get(ORDER_KEY_FIELD) for item in siblings]
+    if any(key is None or len(key) > max_length for key in keys):
+        return True
+    return any(earlier >= later for earlier, later in zip(keys, keys[1:]))
+
+
+def plan_space(items, max_length=MAX_ORDER_KEY_LENGTH):
+    """(nodeId, new key, stored key) updates for the nodes of one space."""
+    children = {}
+    for item in items:
+        children.setdefault(item.get('parentNodeId'), []).append(item)
+    updates = []
+    for siblings in children.values():
+        # Stable sort over the index order, the same order the tree is displayed in
+        siblings.sort(key=sibling_sort_key)
+        if not needs_keys(siblings, max_length):
+            continue
+        for item, key in zip(siblings, spread_keys(len(siblings))):
+            if item.get(ORDER_KEY_FIELD) != key:
+                updates.append((item['nodeId'], key, item.get(ORDER_KEY_FIELD)))
+    return updates
+
+
+def migrate_space(spaces_table, nodes_table, s3_client, bucket, space_id, max_length, dry_run=False):
+    """Switch one space to order keys and key or rebalance its sibling lists; returns a report."""
+    if not dry_run:
+        spaces_table.update_item(
+            Key=space_meta_key(space_id),
+            UpdateExpression='SET orderMode = :mode',
+            ConditionExpression='attribute_exists(PK)',
+            ExpressionAttributeValues={':mode': ORDER_MODE_RANK}
+        )
+    items = load_space_nodes(nodes_table, space_id, fields=('nodeId', 'parentNodeId', 'orderIndex', ORDER_KEY_FIELD))
+    updates = plan_space(items, max_length)
+    report = {
+        'spaceId': space_id,
+        'nodes': len(items),
+        'pending': len(updates),
+        'written': 0,
+        'conflicts': 0,
+        ORDER_MODE_FIELD: ORDER_MODE_RANK
+    }
+    if dry_run or not updates:
+        return report
+    report['written'] = len(write_order_keys(nodes_table, space_id, updates))
+    report['conflicts'] = len(updates) - report['written']
+    delete_snapshot(s3_client, bucket, space_id)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('space_ids', nargs='*', help='spaces to process')
+    parser.add_argument('--all', action='store_true', help='process every space in the Spaces table')
+    parser.add_argument('--checkpoint', help='file recording finished spaces; they are skipped on the next run')
+    parser.add_argument('--max-length', type=int, default=MAX_ORDER_KEY_LENGTH,
+                        help='rebalance sibling lists with a key longer than this')
+    parser.add_argument('--dry-run', action='store_true', help='only report how many keys would be written')
+    args = parser.parse_args()
+    if not args.all and not args.space_ids:
+        parser.error('pass one or more space ids, or --all')
+
+    dynamodb = boto3.resource('dynamodb')
+    nodes_table = dynamodb.Table(os.environ.get('NODES_TABLE_NAME', 'Nodes'))
+    spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+    s3_client = boto3.client('s3')
+    bucket = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+
+    done = read_checkpoint(args.checkpoint)
+    space_ids = list_space_ids(spaces_table) if args.all else args.space_ids
+    conflicts = 0
+    for space_id in space_ids:
+        if space_id in done:
+            continue
+        report = migrate_space(spaces_table, nodes_table, s3_client, bucket, space_id,
+                               args.max_length, dry_run=args.dry_run)
+        conflicts += report['conflicts']
+        print(json.dumps(report))
+        # A space with conflicts is retried on the next run
+        if args.checkpoint and not args.dry_run and not report['conflicts']:
+            with open(args.checkpoint, 'a') as f:
+                f.write(space_id + '\n')
+
+    return 1 if conflicts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Maintenance tool for materialized tree snapshots.
+
+  rebuild  - rebuild snapshots from scratch out of the live node items
+  check    - compare stored snapshots against the live node items
+
+Examples:
+  python tools/tree_snapshots.py check --all
+  python tools/tree_snapshots.py rebuild 123e4567-e89b-12d3-a456-426614174000
+
+Table and bucket names are read from the same environment variables as the Lambda
+handlers (SPACES_TABLE_NAME, NODES_TABLE_NAME, CONTENT_BUCKET_NAME).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_handlers'))
+
+from utils.node_queries import TREE_FIELDS, load_space_nodes  # noqa: E402
+from utils.space_version import get_tree_version, space_meta_key  # noqa: E402
+from utils.tombstones import visible_items  # noqa: E402
+from utils.tree_snapshot import check_consistency, load_snapshot, rebuild_snapshot  # noqa: E402
+
+
+def list_space_ids(spaces_table):
+    """Yield the id of every space META item."""
+    params = {'FilterExpression': Attr('SK').eq('META'), 'ProjectionExpression': 'spaceId'}
+    while True:
+        response = spaces_table.scan(**params)
+        for item in response.get('Items', []):
+            if item.get('spaceId'):
+                yield item['spaceId']
+        if 'LastEvaluatedKey' not in response:
+            return
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def current_tree_version(spaces_table, space_id):
+    item = spaces_table.get_item(Key=space_meta_key(space_id), ConsistentRead=True).get('Item') or {}
+    return get_tree_version(item)
+
+
+def rebuild_space(spaces_table, nodes_table, s3_client, bucket, space_id):
+    # The version must be read before the nodes (see rebuild_snapshot)
+    tree_version = current_tree_version(spaces_table, space_id)
+    return rebuild_snapshot(nodes_table, s3_client, bucket, space_id, tree_version=tree_version)
+
+
+def check_space(spaces_table, nodes_table, s3_client, bucket, space_id):
+    doc, _ = load_snapshot(s3_client, bucket, space_id)
+    if doc is None:
+        return {'spaceId': space_id, 'consistent': None, 'status': 'no snapshot'}
+    tree_version = current_tree_version(spaces_table, space_id)
+    live_items = visible_items(load_space_nodes(nodes_table, space_id, fields=TREE_FIELDS))
+    report = check_consistency(doc, live_items)
+    report['spaceId'] = space_id
+    report['snapshotVersion'] = doc.get('treeVersion', 0)
+    report['treeVersion'] = tree_version
+    # A snapshot behind the counter is never served, so it is only reported, not counted as inconsistent
+    report['stale'] = report['snapshotVersion'] < tree_version
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    parser.add_argument('space_ids', nargs='*', help='spaces to process')
+    parser.add_argument('--all', action='store_true', help='process every space in the Spaces table')
+    parser.add_argument('--repair', action='store_true', help='with check: rebuild inconsistent snapshots')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb')
+    s3_client = boto3.client('s3')
+    bucket = os.environ.get('CONTENT_BUCKET_NAME', 'mindmap-content-bucket')
+    nodes_table = dynamodb.Table(os.environ.get('NODES_TABLE_NAME', 'Nodes'))
+    spaces_table = dynamodb.Table(os.environ.get('SPACES_TABLE_NAME', 'Spaces'))
+
+    space_ids = list_space_ids(spaces_table) if args.all else args.space_ids
+    if not args.all and not args.space_ids:
+        parser.error('pass one or more space ids, or --all')
+
+    inconsistent = 0
+    for space_id in space_ids:
+        if args.command == 'rebuild':
+            doc = rebuild_space(spaces_table, nodes_table, s3_client, bucket, space_id)
+            print(json.dumps({'spaceId': space_id, 'rebuilt': True, 'nodeCount': len(doc['nodes'])}))
+            continue
+
+        report = check_space(spaces_table, nodes_table, s3_client, bucket, space_id)
+        if report['consistent'] is False and not report['stale']:
+            inconsistent += 1
+            if args.repair:
+                rebuild_space(spaces_table, nodes_table, s3_client, bucket, space_id)
+                report['repaired'] = True
+        print(json.dumps(report, default=str))
+
+    return 1 if inconsistent and not args.repair else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
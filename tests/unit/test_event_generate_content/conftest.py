@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The generator imports the API's `utils.*` helpers through the utils symlink at its package root.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'event_generate_content')))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
@@ -91,53 +91,87 @@ def test_delete_item_exception(mock_boto3_resource):
     with pytest.raises(Exception):
         dynamo_utils.delete_item('test-table', {'id': '1'})
 
-@patch('event_generate_content.dynamo_utils.boto3.client')
-@patch('event_generate_content.dynamo_utils.os.environ', {'NODES_TABLE_NAME': 'TestNodes', 'EVENT_BUS_NAME': 'TestBus'})
+ENVIRON = {'NODES_TABLE_NAME': 'TestNodes', 'SPACES_TABLE_NAME': 'TestSpaces',
+           'CONTENT_BUCKET_NAME': 'TestBucket', 'EVENT_BUS_NAME': 'TestBus'}
+
+def _aws(mock_boto3):
+    """Mock tables by name and clients by service name."""
+    tables = {'TestNodes': MagicMock(), 'TestSpaces': MagicMock()}
+    clients = {'s3': MagicMock(), 'events': MagicMock()}
+    mock_boto3.resource.return_value.Table.side_effect = tables.__getitem__
+    mock_boto3.client.side_effect = clients.__getitem__
+    return tables['TestNodes'], tables['TestSpaces'], clients['s3'], clients['events']
+
+@patch('event_generate_content.dynamo_utils.boto3')
+@patch('event_generate_content.dynamo_utils.os.environ', ENVIRON)
 def test_update_node_with_content_success(mock_boto3):
-    mock_dynamodb = MagicMock()
-    mock_events = MagicMock()
-    def client_side_effect(service):
-        if service == 'dynamodb':
-            return mock_dynamodb
-        elif service == 'events':
-            return mock_events
-        raise Exception('Unknown service')
-    mock_boto3.side_effect = client_side_effect
-    mock_dynamodb.update_item.return_value = {}
-    mock_events.put_events.return_value = {'FailedEntryCount': 0}
-    dynamo_utils.update_node_with_content('n1', 's1', 's3key')
-    mock_dynamodb.update_item.assert_called()
-    mock_events.put_events.assert_called()
-
-@patch('event_generate_content.dynamo_utils.boto3.client')
-@patch('event_generate_content.dynamo_utils.os.environ', {'NODES_TABLE_NAME': 'TestNodes', 'EVENT_BUS_NAME': 'TestBus'})
-def test_update_node_with_content_dynamodb_fail(mock_boto3):
-    mock_dynamodb = MagicMock()
-    mock_events = MagicMock()
-    def client_side_effect(service):
-        if service == 'dynamodb':
-            return mock_dynamodb
-        elif service == 'events':
-            return mock_events
-        raise Exception('Unknown service')
-    mock_boto3.side_effect = client_side_effect
-    mock_dynamodb.update_item.side_effect = Exception('ddb fail')
+    nodes, spaces, s3, events = _aws(mock_boto3)
+    nodes.update_item.return_value = {}
+    dynamo_utils.update_node_with_content('n1', 's1', 'h', 's1/content/h.html')
+    params = nodes.update_item.call_args.kwargs
+    assert params['UpdateExpression'].endswith('ADD #version :one')
+    assert params['ExpressionAttributeNames'] == {'#version': 'version'}
+    assert params['ExpressionAttributeValues'][':one'] == 1
+    # The node references the content by hash, like content saved through the API
+    assert params['ExpressionAttributeValues'][':h'] == 'h'
+    assert params['ExpressionAttributeValues'][':s'] == 's1/content/h.html'
+    # Plain content: no encoding
+    assert 'REMOVE contentS3Key, contentEncoding' in params['UpdateExpression']
+    spaces.update_item.assert_not_called()
+    s3.delete_objects.assert_not_called()
+    events.put_events.assert_called()
+
+@patch('event_generate_content.dynamo_utils.boto3')
+@patch('event_generate_content.dynamo_utils.os.environ', ENVIRON)
+def test_update_node_with_content_releases_replaced_content(mock_boto3):
+    nodes, spaces, s3, events = _aws(mock_boto3)
+    nodes.update_item.return_value = {'Attributes': {'s3Key': 's1/content/old.html', 'contentHash': 'old'}}
+    spaces.update_item.side_effect = [
+        {'Attributes': {'refs': 0}},   # release: that was the last reference
+        {}                             # mark the record released
+    ]
+    dynamo_utils.update_node_with_content('n1', 's1', 'h', 's1/content/h.html', 'gzip')
+    node = nodes.update_item.call_args.kwargs
+    # Compressed content: the node records the encoding readers decode it with
+    assert 'contentEncoding = :e' in node['UpdateExpression']
+    assert node['ExpressionAttributeValues'][':e'] == 'gzip'
+    assert 'contentEncoding' not in node['UpdateExpression'].split('REMOVE')[1]
+    assert node['ReturnValues'] == 'UPDATED_OLD'
+    release, mark = [call.kwargs for call in spaces.update_item.call_args_list]
+    assert release['Key'] == {'PK': 'SPACE#s1', 'SK': 'CONTENT#old'}
+    assert release['ExpressionAttributeValues'] == {':refs': -1}
+    assert mark['ConditionExpression'] == 'refs <= :zero'
+    # Shared objects are only released, never deleted in line
+    s3.delete_objects.assert_not_called()
+    events.put_events.assert_called()
+
+@patch('event_generate_content.dynamo_utils.boto3')
+@patch('event_generate_content.dynamo_utils.os.environ', ENVIRON)
+def test_update_node_with_content_deletes_replaced_unhashed_content(mock_boto3):
+    nodes, spaces, s3, events = _aws(mock_boto3)
+    nodes.update_item.return_value = {'Attributes': {'s3Key': 'nodes/s1/n1/content.html'}}
+    s3.delete_objects.return_value = {}
+    dynamo_utils.update_node_with_content('n1', 's1', 'h', 's1/content/h.html')
+    deleted = s3.delete_objects.call_args.kwargs['Delete']['Objects']
+    assert deleted == [{'Key': 'nodes/s1/n1/content.html'}]
+    spaces.update_item.assert_not_called()
+
+@patch('event_generate_content.dynamo_utils.boto3')
+@patch('event_generate_content.dynamo_utils.os.environ', ENVIRON)
+def test_update_node_with_content_dynamodb_fail_releases_the_new_content(mock_boto3):
+    nodes, spaces, s3, events = _aws(mock_boto3)
+    nodes.update_item.side_effect = Exception('ddb fail')
+    spaces.update_item.return_value = {'Attributes': {'refs': 1}}
     with pytest.raises(Exception):
-        dynamo_utils.update_node_with_content('n1', 's1', 's3key')
+        dynamo_utils.update_node_with_content('n1', 's1', 'h', 's1/content/h.html')
+    assert spaces.update_item.call_args.kwargs['Key'] == {'PK': 'SPACE#s1', 'SK': 'CONTENT#h'}
+    events.put_events.assert_not_called()
 
-@patch('event_generate_content.dynamo_utils.boto3.client')
-@patch('event_generate_content.dynamo_utils.os.environ', {'NODES_TABLE_NAME': 'TestNodes', 'EVENT_BUS_NAME': 'TestBus'})
+@patch('event_generate_content.dynamo_utils.boto3')
+@patch('event_generate_content.dynamo_utils.os.environ', ENVIRON)
 def test_update_node_with_content_eventbridge_fail(mock_boto3):
-    mock_dynamodb = MagicMock()
-    mock_events = MagicMock()
-    def client_side_effect(service):
-        if service == 'dynamodb':
-            return mock_dynamodb
-        elif service == 'events':
-            return mock_events
-        raise Exception('Unknown service')
-    mock_boto3.side_effect = client_side_effect
-    mock_dynamodb.update_item.return_value = {}
-    mock_events.put_events.side_effect = Exception('eventbridge fail')
+    nodes, spaces, s3, events = _aws(mock_boto3)
+    nodes.update_item.return_value = {}
+    events.put_events.side_effect = Exception('eventbridge fail')
     with pytest.raises(Exception):
-        dynamo_utils.update_node_with_content('n1', 's1', 's3key')
+        dynamo_utils.update_node_with_content('n1', 's1', 'h', 's1/content/h.html')
@@ -0,0 +1,45 @@
+import zlib
+import pytest
+from unittest.mock import patch, MagicMock
+import event_generate_content.s3_utils as s3_utils
+
+HTML = '<section><h2>Overview</h2><p>Photosynthesis converts light into chemical energy.</p></section>' * 40
+ENVIRON = {'CONTENT_BUCKET_NAME': 'TestBucket', 'SPACES_TABLE_NAME': 'TestSpaces'}
+
+@patch('event_generate_content.s3_utils.boto3')
+@patch('event_generate_content.s3_utils.os.environ', ENVIRON)
+def test_store_content_uploads_by_hash_compressed(mock_boto3):
+    spaces = mock_boto3.resource.return_value.Table.return_value
+    spaces.update_item.return_value = {'Attributes': {}}
+    s3 = mock_boto3.client.return_value
+    digest, key, encoding = s3_utils.store_content('s1', HTML)
+    assert key == f's1/content/{digest}.html'
+    assert encoding == 'gzip'
+    mock_boto3.resource.return_value.Table.assert_called_with('TestSpaces')
+    params = s3.put_object.call_args.kwargs
+    assert params['Bucket'] == 'TestBucket'
+    assert params['Key'] == key
+    assert params['ContentEncoding'] == 'gzip'
+    # Readable by utils.content_codec.decode_content of the API handlers
+    assert zlib.decompress(params['Body'], 31).decode('utf-8') == HTML
+    # One reference is taken for the node
+    assert spaces.update_item.call_args_list[0].kwargs['ExpressionAttributeValues'][':refs'] == 1
+
+@patch('event_generate_content.s3_utils.boto3')
+@patch('event_generate_content.s3_utils.os.environ', ENVIRON)
+def test_store_content_skips_the_upload_of_stored_content(mock_boto3):
+    spaces = mock_boto3.resource.return_value.Table.return_value
+    spaces.update_item.return_value = {'Attributes': {'storedAt': '2024-01-01T00:00:00', 'refs': 1}}
+    s3 = mock_boto3.client.return_value
+    digest, key, encoding = s3_utils.store_content('s1', '<p>short</p>')
+    assert encoding is None
+    s3.put_object.assert_not_called()
+
+@patch('event_generate_content.s3_utils.boto3')
+@patch('event_generate_content.s3_utils.os.environ', ENVIRON)
+def test_store_content_fail(mock_boto3):
+    spaces = mock_boto3.resource.return_value.Table.return_value
+    spaces.update_item.return_value = {'Attributes': {}}
+    mock_boto3.client.return_value.put_object.side_effect = Exception('s3 fail')
+    with pytest.raises(Exception):
+        s3_utils.store_content('s1', HTML)
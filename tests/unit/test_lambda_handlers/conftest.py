@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Lambda handlers import their helpers as top-level `utils.*` modules, mirroring the deployment package root.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'serverless', 'lambda_handlers')))
+
+# boto3 resources are created at import time and need a region.
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
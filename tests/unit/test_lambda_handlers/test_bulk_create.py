@@ -0,0 +1,134 @@
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+
+from utils.bulk_create import (
+    OutlineError, assign_order_keys, flatten_outline, publish_created_events, put_items, put_new_items, store_contents
+)
+from botocore.exceptions import ClientError
+from utils.content_store import content_hash
+
+CLIENT_ID = '123e4567-e89b-12d3-a456-426614174000'
+
+
+def test_flatten_outline_orders_parents_before_children():
+    outline = [
+        {'title': 'a', 'children': [{'title': 'a1'}, {'title': 'a2', 'children': [{'title': 'a2x'}]}]},
+        {'title': 'b', 'nodeId': CLIENT_ID.upper(), 'contentHTML': '<p>b</p>'},
+    ]
+
+    items, contents, supplied = flatten_outline('s1', outline, None, None, first_order_index=3)
+
+    assert [item['title'] for item in items] == ['a', 'a1', 'a2', 'a2x', 'b']
+    by_title = {item['title']: item for item in items}
+    assert [by_title[t]['orderIndex'] for t in ('a', 'b', 'a1', 'a2', 'a2x')] == [3, 4, 0, 1, 0]
+    assert 'parentNodeId' not in by_title['a']
+    assert by_title['a2x']['parentNodeId'] == by_title['a2']['nodeId']
+    assert by_title['a2x']['path'] == '/'.join(['', by_title['a']['nodeId'], by_title['a2']['nodeId'],
+                                                by_title['a2x']['nodeId']])
+    assert supplied == [CLIENT_ID] and by_title['b']['nodeId'] == CLIENT_ID
+    assert contents == {CLIENT_ID: '<p>b</p>'}
+    uuid.UUID(by_title['a']['nodeId'])
+
+
+def test_flatten_outline_skips_paths_below_a_parent_without_one():
+    items, _, _ = flatten_outline('s1', [{'title': 'a', 'children': [{'title': 'b'}]}], 'p', None)
+
+    assert items[0]['parentNodeId'] == 'p'
+    assert all('path' not in item for item in items)
+
+
+@pytest.mark.parametrize('outline, message', [
+    ([], 'non-empty'),
+    ([{'title': ''}], 'title'),
+    ([{'title': 'a', 'nodeId': 'not-a-uuid'}], 'UUID'),
+    ([{'title': 'a', 'nodeId': CLIENT_ID}, {'title': 'b', 'nodeId': CLIENT_ID}], 'more than once'),
+    ([{'title': 'a', 'children': [{'title': 'b'}, {'title': 'c'}]}], 'at most 2'),
+])
+def test_flatten_outline_rejects_bad_outlines(outline, message):
+    with pytest.raises(OutlineError, match=message):
+        flatten_outline('s1', outline, None, None, max_nodes=2)
+
+
+def test_assign_order_keys_uses_given_keys_for_top_level_only():
+    items, _, _ = flatten_outline('s1', [{'title': 'a', 'children': [{'title': 'a1'}, {'title': 'a2'}]},
+                                         {'title': 'b'}], 'p', '/p')
+
+    assign_order_keys(items, 'p', ['V1', 'V2'])
+
+    keys = {item['title']: item['orderKey'] for item in items}
+    assert (keys['a'], keys['b']) == ('V1', 'V2')
+    assert keys['a1'] < keys['a2']
+
+
+def test_store_contents_stores_long_content_once_per_hash_and_keeps_short_inline():
+    items, contents, _ = flatten_outline('s1', [{'title': 'short', 'contentHTML': 'hi'},
+                                                {'title': 'long', 'contentHTML': 'x' * 1500},
+                                                {'title': 'copy', 'contentHTML': 'x' * 1500},
+                                                {'title': 'broken', 'contentHTML': 'y' * 1500}], None, None)
+    spaces_table = MagicMock()
+    spaces_table.update_item.return_value = {'Attributes': {}}
+    s3_client = MagicMock()
+    s3_client.put_object.side_effect = lambda **kwargs: (_ for _ in ()).throw(RuntimeError('down')) \
+        if kwargs['Key'] == f"s1/content/{content_hash('y' * 1500)}.html" else {}
+
+    failed = store_contents(spaces_table, s3_client, 'bucket', 's1', items, contents)
+
+    short, long, copy, broken = items
+    assert short['contentPreview'] == 'hi' and 's3Key' not in short
+    assert long['s3Key'] == copy['s3Key'] == f"s1/content/{long['contentHash']}.html"
+    assert long['contentPreview'] == 'x' * 100
+    assert long['contentEncoding'] == copy['contentEncoding'] == 'gzip'
+    assert failed == [broken['nodeId']] and 's3Key' not in broken
+    assert s3_client.put_object.call_count == 2
+    acquired = [call.kwargs['ExpressionAttributeValues'][':refs'] for call in spaces_table.update_item.call_args_list
+                if call.kwargs['UpdateExpression'].startswith('ADD refs :refs SET')]
+    assert sorted(acquired) == [1, 2]
+
+
+def test_put_items_writes_batches_of_25():
+    items = [{'nodeId': str(i), 'spaceId': 's1'} for i in range(60)]
+    dynamodb = MagicMock()
+    dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}, 'ConsumedCapacity': [{'CapacityUnits': 1}]}
+
+    stats = put_items(dynamodb, 'Nodes', items)
+
+    sizes = sorted(len(call.kwargs['RequestItems']['Nodes']) for call in dynamodb.batch_write_item.call_args_list)
+    assert sizes == [10, 25, 25]
+    assert stats['items_written'] == 60 and stats['batch_write_requests'] == 3
+
+
+def test_publish_created_events_sends_ten_entries_per_call():
+    items, _, _ = flatten_outline('s1', [{'title': str(i)} for i in range(23)], None, None)
+    client = MagicMock()
+    client.put_events.return_value = {'FailedEntryCount': 1}
+
+    failed = publish_created_events(client, 'bus', items)
+
+    sizes = sorted(len(call.kwargs['Entries']) for call in client.put_events.call_args_list)
+    assert sizes == [3, 10, 10]
+    assert failed == 3
+    assert client.put_events.call_args.kwargs['Entries'][0]['DetailType'] == 'MindMapNode Created'
+
+
+def test_put_new_items_writes_conditional_puts_and_reports_existing_ids():
+    client = MagicMock()
+    items = [{'nodeId': f'n{i}', 'spaceId': 's1'} for i in range(150)]
+    def transact(TransactItems):
+        # The second transaction holds n120, which exists already
+        reasons = ['ConditionalCheckFailed' if put['Put']['Item']['nodeId'] == {'S': 'n120'} else 'None'
+                   for put in TransactItems]
+        if 'ConditionalCheckFailed' in reasons:
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException'},
+                               'CancellationReasons': [{'Code': reason} for reason in reasons]}, 'TransactWriteItems')
+        return {}
+    client.transact_write_items.side_effect = transact
+
+    result = put_new_items(client, 'Nodes', items)
+
+    assert [item['nodeId'] for item in result['written']] == [f'n{i}' for i in range(100)]
+    assert result['existing'] == ['n120'] and result['errors'] == []
+    puts = client.transact_write_items.call_args_list[0].kwargs['TransactItems']
+    assert len(puts) == 100
+    assert puts[0]['Put']['ConditionExpression'] == 'attribute_not_exists(nodeId)'
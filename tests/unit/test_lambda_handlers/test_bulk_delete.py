@@ -0,0 +1,31 @@
+from unittest.mock import MagicMock, patch
+from utils.bulk_delete import delete_pages
+
+
+def _keys(prefix, count):
+    return [{'nodeId': f'{prefix}{i}', 'spaceId': 's1'} for i in range(count)]
+
+
+@patch('utils.bulk_delete.time.sleep')
+def test_pages_are_split_into_batches_and_unprocessed_items_retried(mock_sleep):
+    dynamodb = MagicMock()
+    retried = []
+
+    def batch_write_item(RequestItems, **kwargs):
+        requests = RequestItems['Nodes']
+        if requests[0]['DeleteRequest']['Key']['nodeId'] == 'a0' and not retried:
+            retried.append(True)
+            return {'UnprocessedItems': {'Nodes': requests[:5]}, 'ConsumedCapacity': [{'CapacityUnits': 20.0}]}
+        return {'ConsumedCapacity': [{'CapacityUnits': float(len(requests))}]}
+
+    dynamodb.batch_write_item.side_effect = batch_write_item
+    done = []
+
+    stats = delete_pages(dynamodb, 'Nodes', [(_keys('a', 30), {'k': 'a'}), (_keys('b', 10), None)],
+                         on_page_done=lambda deleted, cursor: done.append((deleted, cursor)))
+
+    assert done == [(30, {'k': 'a'}), (10, None)]
+    assert stats.items == 40 and stats.pages == 2
+    assert stats.requests == 4 and stats.retries == 1
+    assert stats.consumed_wcu == 20 + 5 + 5 + 10
+    assert stats.as_dict()['items_per_second'] > 0
@@ -0,0 +1,166 @@
+from unittest.mock import MagicMock, patch
+from botocore.exceptions import ClientError
+import pytest
+from utils import change_log
+from utils.change_log import CREATED, DELETED, MOVED, UPDATED, node_change
+from utils.transactions import TransactionCanceled
+from utils.tree_writes import record_tree_change, snapshot_mutation, transact_tree_write
+
+
+def record(version, *changes):
+    return {'version': version, 'changes': list(changes)}
+
+
+def test_record_changes_chunks_large_writes():
+    table = MagicMock()
+    changes = [node_change(DELETED, f'n{i}') for i in range(change_log.CHANGES_PER_RECORD + 1)]
+
+    change_log.record_changes(table, 's1', 7, changes)
+
+    items = [c.kwargs['Item'] for c in table.put_item.call_args_list]
+    assert [item['SK'] for item in items] == ['CHANGE#000000000007#0000', 'CHANGE#000000000007#0001']
+    assert all(item['PK'] == 'SPACE#s1' and item['version'] == 7 and 'expiresAt' in item for item in items)
+    assert len(items[1]['changes']) == 1
+
+
+def test_compact_changes_merges_per_node_and_keeps_tombstones():
+    changes = change_log.compact_changes([
+        record(1, node_change(CREATED, 'a', {'title': 'A', 'orderIndex': 0}), node_change(CREATED, 'b', {'title': 'B'})),
+        record(2, node_change(UPDATED, 'a', {'title': 'A2'})),
+        record(3, node_change(MOVED, 'a', {'orderIndex': 4}), node_change(DELETED, 'b')),
+    ])
+
+    assert changes == [
+        {'op': CREATED, 'nodeId': 'a', 'node': {'title': 'A2', 'orderIndex': 4}, 'version': 3},
+        {'op': DELETED, 'nodeId': 'b', 'version': 3},
+    ]
+
+
+def test_read_changes_does_not_split_a_version_across_pages():
+    table = MagicMock()
+    table.query.return_value = {'Items': [
+        {'version': 2, 'changes': []}, {'version': 2, 'changes': []}, {'version': 3, 'changes': []}
+    ]}
+
+    records, has_more = change_log.read_changes(table, 's1', 1, limit=1)
+
+    assert [r['version'] for r in records] == [2, 2]
+    assert has_more
+
+
+def test_record_tree_change_logs_changes_under_the_version_of_the_write():
+    table = MagicMock()
+    s3 = MagicMock()
+    s3.get_object.side_effect = ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+
+    record_tree_change(table, s3, 'bucket', 's1', 5, [node_change(DELETED, 'a')])
+
+    item = table.put_item.call_args.kwargs['Item']
+    assert item['SK'] == 'CHANGE#000000000005#0000'
+    assert item['changes'] == [{'op': DELETED, 'nodeId': 'a'}]
+
+
+def _canceled(*codes):
+    return ClientError({'Error': {'Code': 'TransactionCanceledException'},
+                        'CancellationReasons': [{'Code': code} for code in codes]}, 'TransactWriteItems')
+
+
+@patch('utils.tree_writes.time.sleep')
+def test_transact_tree_write_adds_to_the_version_in_the_write_and_reruns_a_conflict(mock_sleep):
+    spaces = MagicMock(name='Spaces')
+    spaces.name = 'Spaces'
+    spaces.update_item.return_value = {'Attributes': {'treeWrite_t': 6}}
+    client = MagicMock()
+    client.transact_write_items.side_effect = [_canceled('None', 'TransactionConflict'), {}]
+    operation = {'Update': {'TableName': 'Nodes'}}
+
+    assert transact_tree_write(client, spaces, 's1', [operation]) == 6
+
+    attempts = [call.kwargs['TransactItems'] for call in client.transact_write_items.call_args_list]
+    assert attempts[0] == attempts[1]
+    assert attempts[0][0] == operation
+    assert 'ADD treeVersion :one' in attempts[0][1]['Update']['UpdateExpression']
+    spaces.get_item.assert_not_called()
+    claim = spaces.update_item.call_args.kwargs
+    assert claim['UpdateExpression'] == 'REMOVE #write'
+    assert claim['ExpressionAttributeNames']['#write'] == \
+        attempts[0][1]['Update']['ExpressionAttributeNames']['#write']
+
+
+def test_transact_tree_write_reports_only_the_callers_failed_conditions():
+    spaces = MagicMock(name='Spaces')
+    spaces.name = 'Spaces'
+    client = MagicMock()
+    client.transact_write_items.side_effect = _canceled('ConditionalCheckFailed', 'None')
+
+    with pytest.raises(TransactionCanceled) as canceled:
+        transact_tree_write(client, spaces, 's1', [{'Update': {}}])
+
+    assert canceled.value.reasons == ['ConditionalCheckFailed']
+    assert client.transact_write_items.call_count == 1
+    spaces.update_item.assert_not_called()
+
+
+def test_transact_tree_write_without_space_meta_commits_the_write_alone():
+    spaces = MagicMock(name='Spaces')
+    spaces.name = 'Spaces'
+    client = MagicMock()
+    client.transact_write_items.side_effect = [_canceled('None', 'ConditionalCheckFailed'), {}]
+
+    assert transact_tree_write(client, spaces, 's1', [{'Update': {}}]) is None
+    assert client.transact_write_items.call_args.kwargs['TransactItems'] == [{'Update': {}}]
+
+
+def test_transact_tree_write_keeps_a_committed_write_when_the_claim_fails():
+    spaces = MagicMock(name='Spaces')
+    spaces.name = 'Spaces'
+    spaces.update_item.side_effect = RuntimeError('throttled')
+    client = MagicMock()
+
+    assert transact_tree_write(client, spaces, 's1', [{'Update': {}}]) is None
+    assert client.transact_write_items.call_count == 1
+
+
+def test_snapshot_mutation_adds_only_created_nodes():
+    nodes = {'a': {'title': 'A', 'parentNodeId': None, 'orderIndex': 0}}
+
+    snapshot_mutation([node_change(UPDATED, 'hidden', {'title': 'edited'}),
+                       node_change(UPDATED, 'a', {'title': 'A2'}),
+                       node_change(CREATED, 'b', {'title': 'B', 'parentNodeId': 'a'})])(nodes)
+
+    assert sorted(nodes) == ['a', 'b']
+    assert nodes['a']['title'] == 'A2'
+
+
+class _ChangeLogTable:
+    """Spaces table stand-in answering the one-item change record queries from a list of records."""
+
+    def __init__(self, records):
+        self.records = sorted(records, key=lambda record: record['SK'])
+        self.queries = 0
+
+    def query(self, KeyConditionExpression, ScanIndexForward=True, **kwargs):
+        self.queries += 1
+        low, high = (value for value in KeyConditionExpression.get_expression()['values'][1]
+                     .get_expression()['values'][1:])
+        matching = [record for record in self.records if low <= record['SK'] <= high]
+        if not ScanIndexForward:
+            matching.reverse()
+        return {'Items': matching[:kwargs['Limit']]}
+
+
+def _records(versions):
+    return [{'SK': change_log.change_sort_key(version), 'version': version,
+             'changedAt': f'2024-01-01T00:{version // 60:02d}:{version % 60:02d}'} for version in versions]
+
+
+def test_find_first_version_after_searches_instead_of_scanning():
+    # Versions 1-99 expired; 250 and 251 have no record
+    table = _ChangeLogTable(_records([v for v in range(100, 1000) if v not in (250, 251)]))
+
+    assert change_log.find_first_version_after(table, 's1', '2024-01-01T00:04:09') == 252
+    assert change_log.find_first_version_after(table, 's1', '2024-01-01T00:05:00') == 301
+    assert table.queries < 30
+    assert change_log.find_first_version_after(table, 's1', '2023-12-31T00:00:00') == 100
+    assert change_log.find_first_version_after(table, 's1', '2024-01-02T00:00:00') is None
+    assert change_log.find_first_version_after(_ChangeLogTable([]), 's1', '2024-01-01T00:00:00') is None
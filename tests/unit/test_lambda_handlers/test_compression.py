@@ -0,0 +1,35 @@
+import base64
+import gzip
+from unittest.mock import patch
+from utils import compression
+from utils.http import get_body
+
+
+def test_negotiation_honours_q_values():
+    with patch.object(compression, 'brotli', None):
+        assert compression.negotiate_encoding('gzip, deflate, br') == 'gzip'
+        assert compression.negotiate_encoding('gzip;q=0, identity') is None
+        assert compression.negotiate_encoding('*;q=0.5') == 'gzip'
+    assert compression.negotiate_encoding(None) is None
+
+
+def test_small_bodies_are_not_compressed():
+    assert compression.encode_body(['{"a": 1}'], 'gzip') == ('{"a": 1}', None, False)
+
+
+def test_large_bodies_are_gzipped_incrementally():
+    chunks = ['['] + ['{"nodeId": "n%d"}, ' % i for i in range(5000)] + ['null]']
+
+    body, encoding, is_base64 = compression.encode_body(iter(chunks), 'gzip')
+
+    assert encoding == 'gzip' and is_base64
+    assert gzip.decompress(base64.b64decode(body)).decode('utf-8') == ''.join(chunks)
+    response = compression.encoded_response(200, {'Content-Type': 'application/json'}, (body, encoding, is_base64))
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert response['isBase64Encoded'] is True
+
+
+def test_base64_request_bodies_are_decoded():
+    event = {'body': base64.b64encode(b'{"title": "x"}').decode('ascii'), 'isBase64Encoded': True}
+    assert get_body(event) == '{"title": "x"}'
+    assert get_body({'body': None}, '[]') == '[]'
@@ -0,0 +1,38 @@
+import zlib
+
+import pytest
+
+from utils.content_codec import decode_content, decode_prefix, encode_content
+
+HTML = '<section><h2>Overview</h2><p>Photosynthesis converts light into chemical energy.</p></section>' * 40
+
+
+def test_large_content_is_gzip_compressed_and_round_trips():
+    body, encoding = encode_content(HTML)
+
+    assert encoding == 'gzip'
+    assert len(body) < len(HTML) // 4
+    assert zlib.decompress(body, 31).decode('utf-8') == HTML
+    assert decode_content(body, encoding) == HTML
+
+
+def test_small_incompressible_and_identity_content_stays_plain():
+    assert encode_content('<p>hi</p>') == (b'<p>hi</p>', None)
+    # Compression that does not shrink the content (here: gzip framing around two bytes) is dropped
+    assert encode_content('ab', min_bytes=0) == (b'ab', None)
+    assert encode_content(HTML, codec='identity') == (HTML.encode('utf-8'), None)
+    assert decode_content('<p>ü</p>'.encode('utf-8'), None) == '<p>ü</p>'
+
+
+def test_prefix_of_a_compressed_object_decodes_to_the_start_of_the_content():
+    body, encoding = encode_content('ü' + HTML)
+
+    preview = decode_prefix(body[:200], encoding, 1000)
+
+    assert ('ü' + HTML).encode('utf-8').startswith(preview.encode('utf-8'))
+    assert 0 < len(preview.encode('utf-8')) <= 1000
+
+
+def test_unknown_encodings_are_rejected():
+    with pytest.raises(ValueError):
+        decode_content(b'x', 'br')
@@ -0,0 +1,73 @@
+import io
+import zlib
+from unittest.mock import MagicMock
+from utils.content_fetch import FetchBudget, fetch_node_content, resolve_content
+
+
+def _s3(objects):
+    s3 = MagicMock()
+
+    def get_object(Bucket, Key, Range=None):
+        data = objects[Key]
+        if Range:
+            end = int(Range.split('-')[1])
+            data = data[:end + 1]
+        return {'Body': io.BytesIO(data)}
+
+    s3.get_object.side_effect = get_object
+    return s3
+
+
+def test_resolution_prefers_fresh_s3_content():
+    assert resolve_content({'contentPreview': '<p>short</p>'}, 'content') == ('<p>short</p>', None)
+    assert resolve_content({'contentPreview': '<p>lo', 'contentS3Key': 'k1'}, 'preview') == ('<p>lo', None)
+    assert resolve_content({'contentPreview': '<p>lo', 'contentS3Key': 'k1'}, 'content') == (None, 'k1')
+    # The update handler rewrites s3Key but leaves the old preview behind
+    assert resolve_content({'contentPreview': 'stale', 's3Key': 'k2'}, 'preview') == (None, 'k2')
+
+
+def test_previews_use_ranged_reads_and_inline_values():
+    s3 = _s3({'k': b'x' * 5000})
+    items = [{'nodeId': 'a', 'contentPreview': 'inline'}, {'nodeId': 'b', 's3Key': 'k'}, {'nodeId': 'c'}]
+
+    results, stats = fetch_node_content(s3, 'bucket', items, 'preview')
+
+    assert results['a'] == {'contentPreview': 'inline'}
+    assert len(results['b']['contentPreview']) == 1000
+    assert 'c' not in results
+    assert s3.get_object.call_args.kwargs['Range'] == 'bytes=0-999'
+    assert stats['s3_fetched'] == 1
+
+
+def test_byte_budget_marks_remaining_nodes_pending():
+    s3 = _s3({'k1': b'a' * 600, 'k2': b'b' * 600})
+    items = [{'nodeId': 'a', 's3Key': 'k1'}, {'nodeId': 'b', 's3Key': 'k2'}]
+
+    results, stats = fetch_node_content(s3, 'bucket', items, 'content', budget=FetchBudget(max_bytes=1000))
+
+    assert sorted(r.get('contentPending', False) for r in results.values()) == [False, True]
+    assert stats['pending'] == 1
+
+
+def test_fetch_errors_are_reported_per_node():
+    s3 = MagicMock()
+    s3.get_object.side_effect = Exception('AccessDenied')
+
+    results, stats = fetch_node_content(s3, 'bucket', [{'nodeId': 'a', 's3Key': 'k'}], 'content')
+
+    assert 'AccessDenied' in results['a']['contentError']
+    assert stats['errors'] == 1
+
+
+def test_compressed_objects_are_decoded_for_previews_and_content():
+    html = '<p>' + 'lorem ipsum dolor sit amet ' * 400 + '</p>'
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    body = compressor.compress(html.encode('utf-8')) + compressor.flush()
+    s3 = _s3({'k': body})
+    items = [{'nodeId': 'a', 's3Key': 'k', 'contentEncoding': 'gzip'}]
+
+    previews, _ = fetch_node_content(s3, 'bucket', items, 'preview')
+    contents, _ = fetch_node_content(s3, 'bucket', items, 'content')
+
+    assert previews['a'] == {'contentPreview': html[:1000]}
+    assert contents['a'] == {'contentHTML': html}
@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock, patch
+from utils.content_purge import node_content_keys, purge_keys, purge_prefixes, space_content_prefixes
+
+
+def test_keys_are_deleted_in_batches_of_1000():
+    s3 = MagicMock()
+    s3.delete_objects.return_value = {}
+
+    result = purge_keys(s3, 'bucket', [f'k{i}' for i in range(2500)])
+
+    sizes = sorted(len(call.kwargs['Delete']['Objects']) for call in s3.delete_objects.call_args_list)
+    assert sizes == [500, 1000, 1000]
+    assert result.deleted == 2500 and not result.failed
+
+
+@patch('utils.content_purge.time.sleep')
+def test_per_key_errors_are_retried_until_attempts_run_out(mock_sleep):
+    s3 = MagicMock()
+    s3.delete_objects.side_effect = [
+        {'Errors': [{'Key': 'a', 'Code': 'SlowDown'}, {'Key': 'b', 'Code': 'AccessDenied'}]},
+        {'Errors': [{'Key': 'b', 'Code': 'AccessDenied'}]},
+        {'Errors': [{'Key': 'b', 'Code': 'AccessDenied'}]},
+        {'Errors': [{'Key': 'b', 'Code': 'AccessDenied'}]},
+    ]
+
+    result = purge_keys(s3, 'bucket', ['a', 'b', 'c'])
+
+    assert [obj['Key'] for obj in s3.delete_objects.call_args_list[1].kwargs['Delete']['Objects']] == ['a', 'b']
+    assert result.deleted == 2
+    assert result.failed == {'b': 'AccessDenied'}
+
+
+def test_space_prefixes_cover_every_layout_and_node_keys_are_deduplicated():
+    s3 = MagicMock()
+    s3.delete_objects.return_value = {}
+    s3.get_paginator.return_value.paginate.side_effect = lambda Bucket, Prefix: [
+        {'Contents': [{'Key': f'{Prefix}x'}]}, {'Contents': [{'Key': f'{Prefix}y'}]}]
+
+    result = purge_prefixes(s3, 'bucket', space_content_prefixes('s1'))
+
+    assert space_content_prefixes('s1') == ['nodes/s1/', 's1/', 'snapshots/s1/']
+    assert result.deleted == 6 and s3.delete_objects.call_count == 6
+    assert node_content_keys([{'s3Key': 's1/a.html', 'contentS3Key': 'nodes/a/content.html'},
+                              {'s3Key': 's1/a.html'}]) == ['s1/a.html', 'nodes/a/content.html']
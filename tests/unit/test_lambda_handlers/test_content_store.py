@@ -0,0 +1,186 @@
+from unittest.mock import MagicMock
+
+import io
+import zlib
+
+import pytest
+from botocore.exceptions import ClientError
+
+from utils.content_purge import node_content_keys
+from utils.content_store import (
+    ContentStats, acquire_content, collect_released_content, content_hash, content_layout, content_object, read_content, release_content,
+    release_contents
+)
+
+
+def test_acquire_uploads_new_content_and_marks_it_stored():
+    spaces_table = MagicMock()
+    spaces_table.update_item.return_value = {'Attributes': {}}
+    s3_client = MagicMock()
+
+    digest, key, encoding = acquire_content(spaces_table, s3_client, 'bucket', 's1', '<p>x</p>')
+
+    assert digest == content_hash('<p>x</p>') and key == f's1/content/{digest}.html'
+    assert encoding is None
+    assert s3_client.put_object.call_args.kwargs['Body'] == b'<p>x</p>'
+    assert 'ContentEncoding' not in s3_client.put_object.call_args.kwargs
+    first, second = spaces_table.update_item.call_args_list
+    assert first.kwargs['Key'] == {'PK': 'SPACE#s1', 'SK': f'CONTENT#{digest}'}
+    assert first.kwargs['ReturnValues'] == 'ALL_OLD'
+    assert second.kwargs['UpdateExpression'] == ('SET storedAt = :now, s3Key = :key, generation = :generation '
+                                                 'REMOVE deletingAt, contentEncoding')
+
+
+def test_acquire_compresses_large_content_and_records_the_encoding():
+    html = '<p>lorem ipsum</p>' * 200
+    spaces_table = MagicMock()
+    spaces_table.update_item.return_value = {'Attributes': {}}
+    s3_client = MagicMock()
+
+    _, _, encoding = acquire_content(spaces_table, s3_client, 'bucket', 's1', html)
+
+    put = s3_client.put_object.call_args.kwargs
+    assert encoding == put['ContentEncoding'] == 'gzip'
+    assert zlib.decompress(put['Body'], 31).decode('utf-8') == html
+    acquired, stored = spaces_table.update_item.call_args_list
+    # The record keeps the uncompressed size and the encoding for later writes of the same content
+    assert acquired.kwargs['ExpressionAttributeValues'][':size'] == len(html)
+    assert stored.kwargs['UpdateExpression'] == ('SET storedAt = :now, s3Key = :key, generation = :generation, '
+                                                 'contentEncoding = :enc REMOVE deletingAt')
+
+
+def test_acquire_of_stored_content_skips_the_upload():
+    spaces_table = MagicMock()
+    spaces_table.update_item.return_value = {'Attributes': {'refs': 3, 'storedAt': '2024-01-01T00:00:00',
+                                                            'contentEncoding': 'gzip'}}
+    s3_client = MagicMock()
+
+    _, _, encoding = acquire_content(spaces_table, s3_client, 'bucket', 's1', '<p>x</p>', refs=2)
+
+    s3_client.put_object.assert_not_called()
+    assert encoding == 'gzip'
+    spaces_table.update_item.assert_called_once()
+    assert spaces_table.update_item.call_args.kwargs['ExpressionAttributeValues'][':refs'] == 2
+
+
+def test_failed_upload_drops_the_references_again():
+    spaces_table = MagicMock()
+    spaces_table.update_item.side_effect = [{'Attributes': {}}, {'Attributes': {'refs': 0}}, {}]
+    s3_client = MagicMock()
+    s3_client.put_object.side_effect = RuntimeError('down')
+
+    with pytest.raises(RuntimeError):
+        acquire_content(spaces_table, s3_client, 'bucket', 's1', '<p>x</p>')
+
+    released, marked = spaces_table.update_item.call_args_list[1:]
+    assert released.kwargs['ExpressionAttributeValues'] == {':refs': -1}
+    assert marked.kwargs['UpdateExpression'] == 'SET releasedAt = :now, released = :marker'
+
+
+def test_release_marks_the_record_only_with_the_last_reference_and_deletes_nothing():
+    spaces_table = MagicMock()
+    s3_client = MagicMock()
+
+    spaces_table.update_item.return_value = {'Attributes': {'refs': 1}}
+    assert release_content(spaces_table, s3_client, 'bucket', 's1', 'abc') is False
+    spaces_table.update_item.assert_called_once()
+
+    spaces_table.update_item.return_value = {'Attributes': {'refs': 0}}
+    assert release_content(spaces_table, s3_client, 'bucket', 's1', 'abc') is True
+    mark = spaces_table.update_item.call_args.kwargs
+    assert mark['UpdateExpression'] == 'SET releasedAt = :now, released = :marker'
+    assert mark['ConditionExpression'] == 'refs <= :zero'
+    spaces_table.delete_item.assert_not_called()
+    s3_client.delete_object.assert_not_called()
+
+
+def test_release_leaves_the_record_unmarked_when_referenced_again_meanwhile():
+    spaces_table = MagicMock()
+    spaces_table.update_item.side_effect = [
+        {'Attributes': {'refs': 0}},
+        ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+    ]
+
+    assert release_content(spaces_table, MagicMock(), 'bucket', 's1', 'abc') is False
+
+
+def test_acquire_of_a_record_being_collected_uploads_the_next_generation():
+    spaces_table = MagicMock()
+    spaces_table.update_item.return_value = {'Attributes': {'refs': 0, 'storedAt': '2024-01-01T00:00:00',
+                                                            'deletingAt': '2024-01-02T00:00:00',
+                                                            's3Key': 's1/content/h.html'}}
+    s3_client = MagicMock()
+
+    digest, key, _ = acquire_content(spaces_table, s3_client, 'bucket', 's1', '<p>x</p>')
+
+    assert key == f's1/content/{digest}.1.html' == s3_client.put_object.call_args.kwargs['Key']
+    acquired, stored = spaces_table.update_item.call_args_list
+    assert 'REMOVE releasedAt, released' in acquired.kwargs['UpdateExpression']
+    assert 'REMOVE deletingAt' in stored.kwargs['UpdateExpression']
+    assert stored.kwargs['ExpressionAttributeValues'][':generation'] == 1
+
+
+def test_collector_deletes_object_and_record_of_content_still_unreferenced():
+    spaces_table = MagicMock()
+    spaces_table.query.return_value = {'Items': [{'PK': 'SPACE#s1', 'SK': 'CONTENT#a'},
+                                                 {'PK': 'SPACE#s1', 'SK': 'CONTENT#b'}]}
+    spaces_table.update_item.side_effect = [
+        {'Attributes': {'refs': 0, 's3Key': 's1/content/a.html'}},
+        ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')  # b reused
+    ]
+    s3_client = MagicMock()
+
+    result = collect_released_content(spaces_table, s3_client, 'bucket', cutoff='2024-01-01T00:00:00')
+
+    assert result == {'released': 2, 'collected': 1, 'reused': 1}
+    assert spaces_table.query.call_args.kwargs['IndexName'] == 'ReleasedContentIndex'
+    s3_client.delete_object.assert_called_once_with(Bucket='bucket', Key='s1/content/a.html')
+    deleted = spaces_table.delete_item.call_args.kwargs
+    assert deleted['Key'] == {'PK': 'SPACE#s1', 'SK': 'CONTENT#a'}
+    assert deleted['ConditionExpression'] == 'refs <= :zero AND deletingAt = :claim'
+
+
+def test_release_contents_drops_one_update_per_hash_and_direct_purges_skip_shared_objects():
+    items = [{'nodeId': 'a', 'contentHash': 'h1', 's3Key': 's1/content/h1.html'},
+             {'nodeId': 'b', 'contentHash': 'h1', 's3Key': 's1/content/h1.html'},
+             {'nodeId': 'c', 's3Key': 's1/c.html', 'contentS3Key': 'nodes/c/content.html'}]
+    spaces_table = MagicMock()
+    spaces_table.update_item.return_value = {'Attributes': {'refs': 4}}
+
+    release_contents(spaces_table, MagicMock(), 'bucket', 's1', items)
+
+    spaces_table.update_item.assert_called_once()
+    assert spaces_table.update_item.call_args.kwargs['ExpressionAttributeValues'] == {':refs': -2}
+    assert node_content_keys(items) == ['s1/c.html', 'nodes/c/content.html']
+
+
+def test_content_stats_report_the_put_avoidance_ratio():
+    stats = ContentStats()
+    for uploaded in (True, False, False, False):
+        stats.record(uploaded, stored_bytes=100)
+
+    assert stats.metrics() == {'content_writes': 4, 'content_uploads': 1, 'content_uploads_skipped': 3,
+                               'content_bytes_stored': 100, 'put_avoidance_ratio': 0.75}
+
+
+def test_content_object_resolves_every_layout():
+    hashed = {'s3Key': 's1/content/h.html', 'contentHash': 'h', 'contentEncoding': 'gzip'}
+    added = {'contentS3Key': 'nodes/n1/content.html', 'contentPreview': 'start'}
+    updated = {'s3Key': 's1/n1.html', 'contentPreview': 'stale'}
+    generated = {'s3Key': 'nodes/s1/n1/content.html'}
+
+    assert content_object(hashed) == ('s1/content/h.html', 'gzip')
+    assert content_object(added) == ('nodes/n1/content.html', None)
+    assert content_object({'contentPreview': 'short'}) == (None, None)
+    assert [content_layout(item) for item in (hashed, added, updated, generated, {'contentPreview': ''}, {})] == [
+        'hashed', 'add', 'update', 'generator', 'inline', None
+    ]
+
+
+def test_read_content_prefers_the_object_over_the_preview():
+    s3_client = MagicMock()
+    s3_client.get_object.return_value = {'Body': io.BytesIO(zlib.compress(b'<p>full</p>', wbits=31))}
+
+    assert read_content(s3_client, 'bucket', {'contentPreview': 'short'}) == 'short'
+    assert read_content(s3_client, 'bucket', {'s3Key': 'k', 'contentEncoding': 'gzip',
+                                              'contentPreview': '<p>fu'}) == '<p>full</p>'
@@ -0,0 +1,45 @@
+from unittest.mock import patch, MagicMock
+import delete_worker_handler
+
+
+def _job(**fields):
+    return dict({'jobId': 'j1', 'targetSpaceId': 's1', 'status': 'queued', 'deletedNodes': 0}, **fields)
+
+
+def _context(remaining_ms):
+    context = MagicMock(function_name='worker')
+    context.get_remaining_time_in_millis.side_effect = remaining_ms
+    return context
+
+
+@patch('delete_worker_handler.dynamodb')
+@patch('delete_worker_handler.lambda_client')
+@patch('delete_worker_handler.purge_change_log')
+@patch('delete_worker_handler.s3_client')
+@patch('delete_worker_handler.spaces_table')
+@patch('delete_worker_handler.nodes_table')
+def test_space_job_checkpoints_cursor_and_continues_before_timeout(mock_nodes_table, mock_spaces_table, mock_s3,
+                                                                    mock_purge, mock_lambda, mock_dynamodb):
+    mock_spaces_table.get_item.return_value = {'Item': _job(jobType='deleteSpace', cursor={'nodeId': 'a'})}
+    mock_nodes_table.query.return_value = {'Items': [{'nodeId': 'b'}], 'LastEvaluatedKey': {'nodeId': 'b'}}
+    mock_dynamodb.batch_write_item.return_value = {}
+
+    result = delete_worker_handler.lambda_handler({'jobId': 'j1'}, _context([1000]))
+
+    assert result['status'] == 'running'
+    assert mock_nodes_table.query.call_args.kwargs['ExclusiveStartKey'] == {'nodeId': 'a'}
+    progress = mock_spaces_table.update_item.call_args.kwargs
+    assert progress['ExpressionAttributeValues'][':deleted'] == 1
+    assert {'nodeId': 'b'} in progress['ExpressionAttributeValues'].values()
+    assert mock_nodes_table.query.call_count == 1
+    mock_dynamodb.batch_write_item.assert_called_once()
+    mock_lambda.invoke.assert_called_once()
+    mock_purge.assert_not_called()
+
+
+@patch('delete_worker_handler.spaces_table')
+def test_finished_job_is_not_run_again(mock_spaces_table):
+    mock_spaces_table.get_item.return_value = {'Item': _job(jobType='deleteSpace', status='succeeded')}
+
+    assert delete_worker_handler.lambda_handler({'jobId': 'j1'}, None)['status'] == 'succeeded'
+    mock_spaces_table.update_item.assert_not_called()
@@ -0,0 +1,78 @@
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils.node_moves import InvalidMove, ancestry_path, index_placement, load_ancestry, move_operation
+
+NODES = {
+    'root': {'nodeId': 'root', 'path': '/root'},
+    'a': {'nodeId': 'a', 'parentNodeId': 'root', 'path': '/root/a'},
+    'b': {'nodeId': 'b', 'parentNodeId': 'a', 'path': '/root/a/b'},
+}
+
+
+def _table(nodes):
+    table = MagicMock()
+    table.name = 'Nodes'
+    table.get_item.side_effect = lambda Key, **kwargs: {'Item': nodes[Key['nodeId']]} if Key['nodeId'] in nodes else {}
+    return table
+
+
+@patch('utils.node_moves.batch_get_nodes')
+def test_load_ancestry_reads_ancestors_on_the_path_in_one_batch(mock_batch_get):
+    mock_batch_get.return_value = {'root': NODES['root'], 'a': NODES['a']}
+    table = _table(NODES)
+
+    chain = load_ancestry(MagicMock(), table, 's1', 'b')
+
+    assert [item['nodeId'] for item in chain] == ['b', 'a', 'root']
+    assert mock_batch_get.call_args.args[3] == ['root', 'a']
+    assert table.get_item.call_count == 1
+    assert ancestry_path(chain) == '/root/a/b'
+
+
+@patch('utils.node_moves.batch_get_nodes')
+def test_load_ancestry_walks_up_when_the_path_is_stale(mock_batch_get):
+    # 'a' was moved to the top level after b's path was written
+    nodes = dict(NODES, a={'nodeId': 'a', 'path': '/a'})
+    mock_batch_get.return_value = {'root': nodes['root'], 'a': nodes['a']}
+
+    chain = load_ancestry(MagicMock(), _table(nodes), 's1', 'b')
+
+    assert [item['nodeId'] for item in chain] == ['b', 'a']
+
+
+@patch('utils.node_moves.batch_get_nodes')
+def test_load_ancestry_hides_deleted_or_missing_ancestors(mock_batch_get):
+    nodes = {'a': {'nodeId': 'a', 'parentNodeId': 'gone'},
+             'c': {'nodeId': 'c', 'parentNodeId': 'd'}, 'd': {'nodeId': 'd', 'deletedAt': 'then'}}
+
+    assert load_ancestry(MagicMock(), _table(nodes), 's1', 'a') is None
+    assert load_ancestry(MagicMock(), _table(nodes), 's1', 'c') is None
+    assert load_ancestry(MagicMock(), _table(nodes), 's1', 'missing') is None
+    mock_batch_get.assert_not_called()
+
+
+def test_load_ancestry_rejects_cyclic_ancestors():
+    nodes = {'a': {'nodeId': 'a', 'parentNodeId': 'b'}, 'b': {'nodeId': 'b', 'parentNodeId': 'a'}}
+
+    with pytest.raises(InvalidMove):
+        load_ancestry(MagicMock(), _table(nodes), 's1', 'a')
+
+
+def test_index_placement_shifts_only_colliding_siblings():
+    siblings = [{'nodeId': n, 'orderIndex': Decimal(i)} for n, i in (('x', 0), ('y', 1), ('z', 2), ('w', 7))]
+
+    assert index_placement(siblings, 1) == (1, {'y': 2, 'z': 3})
+    assert index_placement(siblings, 4) == (8, {})
+    assert index_placement([], 0) == (0, {})
+
+
+def test_move_operation_to_top_level_removes_parent_and_keeps_condition_on_old_parent():
+    operation = move_operation('Nodes', 's1', {'nodeId': 'n', 'parentNodeId': 'p'}, None, 3, None, '/n', 'now')
+
+    update = operation['Update']
+    assert update['UpdateExpression'] == 'SET orderIndex = :oi, updatedAt = :ua, #path = :path REMOVE parentNodeId ADD #version :one'
+    assert 'parentNodeId = :oldParent' in update['ConditionExpression']
+    assert update['ExpressionAttributeValues'][':oldParent'] == {'S': 'p'}
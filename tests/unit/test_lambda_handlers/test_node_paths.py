@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock
+from utils.node_paths import MAX_PATH_BYTES, compute_paths, resolve_path, rewrite_subtree_paths
+
+
+def test_compute_paths_follows_parent_links():
+    items = [
+        {'nodeId': 'c', 'parentNodeId': 'b'},
+        {'nodeId': 'a'},
+        {'nodeId': 'b', 'parentNodeId': 'a'},
+        {'nodeId': 'orphan', 'parentNodeId': 'gone'},
+        {'nodeId': 'x', 'parentNodeId': 'y'},
+        {'nodeId': 'y', 'parentNodeId': 'x'},
+    ]
+
+    assert compute_paths(items) == {'a': '/a', 'b': '/a/b', 'c': '/a/b/c'}
+
+
+def test_compute_paths_leaves_nodes_too_deep_for_the_index_without_path():
+    ids = [f'{i:036d}' for i in range(40)]
+    items = [{'nodeId': ids[0]}] + [{'nodeId': ids[i], 'parentNodeId': ids[i - 1]} for i in range(1, 40)]
+
+    paths = compute_paths(items)
+
+    assert 0 < len(paths) < 40
+    assert all(len(path) <= MAX_PATH_BYTES for path in paths.values())
+    assert set(paths) == set(ids[:len(paths)])
+
+
+def test_resolve_path_builds_missing_paths_from_the_nearest_stored_one():
+    nodes = {
+        'a': {'nodeId': 'a', 'path': '/a'},
+        'b': {'nodeId': 'b', 'parentNodeId': 'a'},
+        'c': {'nodeId': 'c', 'parentNodeId': 'b'},
+        'orphan': {'nodeId': 'orphan', 'parentNodeId': 'gone'},
+    }
+    table = MagicMock()
+    table.get_item.side_effect = lambda Key, **kwargs: {'Item': nodes[Key['nodeId']]} if Key['nodeId'] in nodes else {}
+
+    assert resolve_path(table, 's1', 'c') == '/a/b/c'
+    assert resolve_path(table, 's1', 'orphan') is None
+
+
+def test_rewrite_subtree_paths_writes_only_changed_paths_conditionally():
+    table = MagicMock()
+    descendants = [
+        {'nodeId': 'b', 'parentNodeId': 'a', 'path': '/old/a/b'},
+        {'nodeId': 'c', 'parentNodeId': 'b'},
+        {'nodeId': 'd', 'parentNodeId': 'a', 'path': '/new/a/d'},
+    ]
+
+    assert rewrite_subtree_paths(table, 's1', 'a', '/new/a', descendants) == 2
+    writes = {call.kwargs['Key']['nodeId']: call.kwargs for call in table.update_item.call_args_list}
+    assert writes['b']['ExpressionAttributeValues'] == {':path': '/new/a/b', ':expected': '/old/a/b'}
+    assert writes['c']['ExpressionAttributeValues'] == {':path': '/new/a/b/c'}
+    assert 'attribute_not_exists(#path)' in writes['c']['ConditionExpression']
+
+
+def test_rewrite_subtree_paths_removes_paths_below_a_node_without_one():
+    table = MagicMock()
+
+    rewrite_subtree_paths(table, 's1', 'a', None, [{'nodeId': 'b', 'parentNodeId': 'a', 'path': '/a/b'}])
+
+    assert table.update_item.call_args.kwargs['UpdateExpression'] == 'REMOVE #path'
@@ -0,0 +1,126 @@
+from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
+import node_reaper_handler
+
+
+DELETED_AT = '2024-01-01T00:00:00.000000'
+TOMBSTONES = {'Items': [{'nodeId': 'root', 'spaceId': 's1', 'deletedAt': DELETED_AT}]}
+
+
+def _context(remaining_ms):
+    context = MagicMock()
+    context.get_remaining_time_in_millis.side_effect = remaining_ms
+    return context
+
+
+@patch('node_reaper_handler.collect_released_content', return_value={'released': 2, 'collected': 2, 'reused': 0})
+@patch('node_reaper_handler.s3_client')
+@patch('node_reaper_handler.collect_subtree')
+@patch('node_reaper_handler.nodes_table')
+def test_expired_subtree_is_deleted_deepest_first_with_root_last(mock_nodes_table, mock_collect, mock_s3, mock_gc):
+    mock_nodes_table.query.return_value = TOMBSTONES
+    mock_nodes_table.get_item.return_value = {'Item': {'deletedAt': DELETED_AT}}
+    items = {'root': {'nodeId': 'root'}, 'child': {'nodeId': 'child', 's3Key': 's1/child.html'},
+             'grandchild': {'nodeId': 'grandchild'}}
+    mock_collect.return_value = list(items.values())
+    mock_nodes_table.delete_item.side_effect = lambda Key, **kwargs: {'Attributes': items[Key['nodeId']]}
+
+    with patch.object(node_reaper_handler, 'REAPER_CHUNK_SIZE', 2):
+        result = node_reaper_handler.lambda_handler({}, _context([600000] * 5))
+
+    assert result == {'reaped': 1, 'skipped': 0, 'deletedNodes': 3, 'failed': 0, 'finished': True,
+                      'content': {'released': 2, 'collected': 2, 'reused': 0}}
+    query = mock_nodes_table.query.call_args.kwargs
+    assert query['IndexName'] == 'TombstonesIndex'
+    deletes = mock_nodes_table.delete_item.call_args_list
+    assert [call.kwargs['Key']['nodeId'] for call in deletes] == ['grandchild', 'child', 'root']
+    # The root is checked again with a consistent read and deleted only while still the indexed tombstone
+    assert mock_nodes_table.get_item.call_args.kwargs['ConsistentRead']
+    assert deletes[-1].kwargs['ConditionExpression'] == 'deletedAt = :deletedAt'
+    assert deletes[-1].kwargs['ExpressionAttributeValues'] == {':deletedAt': DELETED_AT}
+    mock_s3.delete_objects.assert_called_once()
+
+
+@patch('node_reaper_handler.collect_released_content')
+@patch('node_reaper_handler.s3_client')
+@patch('node_reaper_handler.collect_subtree')
+@patch('node_reaper_handler.nodes_table')
+def test_run_stops_before_timeout_leaving_the_tombstoned_root(mock_nodes_table, mock_collect, mock_s3, mock_gc):
+    mock_nodes_table.query.return_value = TOMBSTONES
+    mock_nodes_table.get_item.return_value = {'Item': {'deletedAt': DELETED_AT}}
+    mock_collect.return_value = [{'nodeId': 'root'}, {'nodeId': 'child'}]
+    mock_nodes_table.delete_item.side_effect = lambda Key, **kwargs: {'Attributes': dict(Key)}
+
+    with patch.object(node_reaper_handler, 'REAPER_CHUNK_SIZE', 1):
+        result = node_reaper_handler.lambda_handler({}, _context([600000, 600000, 1000]))
+
+    assert result['finished'] is False and result['deletedNodes'] == 1
+    deletes = mock_nodes_table.delete_item.call_args_list
+    assert [call.kwargs['Key']['nodeId'] for call in deletes] == ['child']
+    # Content is collected only by runs that got through the tombstones
+    mock_gc.assert_not_called()
+
+
+@patch('node_reaper_handler.collect_released_content', return_value={})
+@patch('node_reaper_handler.release_contents')
+@patch('node_reaper_handler.s3_client')
+@patch('node_reaper_handler.collect_subtree')
+@patch('node_reaper_handler.nodes_table')
+def test_retried_chunk_releases_only_the_content_of_items_it_deleted(mock_nodes_table, mock_collect, mock_s3,
+                                                                     mock_release, mock_gc):
+    mock_nodes_table.query.return_value = TOMBSTONES
+    mock_nodes_table.get_item.return_value = {'Item': {'deletedAt': DELETED_AT}}
+    # A previous run deleted 'child' (and dropped its reference) before it failed
+    mock_collect.return_value = [{'nodeId': 'root', 'contentHash': 'h'}, {'nodeId': 'child', 'contentHash': 'h'}]
+    mock_nodes_table.delete_item.side_effect = lambda Key, **kwargs: (
+        {'Attributes': {'nodeId': 'root', 'contentHash': 'h'}} if Key['nodeId'] == 'root' else {})
+
+    result = node_reaper_handler.lambda_handler({}, _context([600000] * 5))
+
+    assert result['deletedNodes'] == 1
+    assert mock_release.call_args.args[4] == [{'nodeId': 'root', 'contentHash': 'h'}]
+
+
+@patch('node_reaper_handler.collect_released_content', return_value={})
+@patch('node_reaper_handler.s3_client')
+@patch('node_reaper_handler.collect_subtree')
+@patch('node_reaper_handler.nodes_table')
+def test_tombstone_restored_since_it_was_indexed_is_skipped(mock_nodes_table, mock_collect, mock_s3, mock_gc):
+    mock_nodes_table.query.return_value = TOMBSTONES
+    # Restored and deleted again: the index still shows the old deletedAt
+    mock_nodes_table.get_item.return_value = {'Item': {'deletedAt': '2024-06-01T00:00:00.000000'}}
+
+    result = node_reaper_handler.lambda_handler({}, _context([600000] * 5))
+
+    assert result['reaped'] == 0 and result['skipped'] == 1
+    mock_collect.assert_not_called()
+    mock_nodes_table.delete_item.assert_not_called()
+
+
+@patch('node_reaper_handler.collect_released_content', return_value={})
+@patch('node_reaper_handler.release_contents')
+@patch('node_reaper_handler.s3_client')
+@patch('node_reaper_handler.collect_subtree')
+@patch('node_reaper_handler.nodes_table')
+def test_root_changed_during_the_run_is_kept(mock_nodes_table, mock_collect, mock_s3, mock_release, mock_gc):
+    mock_nodes_table.query.return_value = TOMBSTONES
+    mock_nodes_table.get_item.return_value = {'Item': {'deletedAt': DELETED_AT}}
+    mock_collect.return_value = [{'nodeId': 'root'}]
+    mock_nodes_table.delete_item.side_effect = ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException'}}, 'DeleteItem')
+
+    result = node_reaper_handler.lambda_handler({}, _context([600000] * 5))
+
+    assert result['skipped'] == 1 and result['failed'] == 0
+    mock_release.assert_not_called()
+
+
+def test_rate_limiter_spaces_out_work():
+    limiter = node_reaper_handler.RateLimiter(100)
+    with patch('node_reaper_handler.time') as mock_time:
+        mock_time.monotonic.return_value = limiter.next_at
+        limiter.acquire(50)
+        limiter.acquire(10)
+
+    mock_time.sleep.assert_called_once()
+    assert abs(mock_time.sleep.call_args.args[0] - 0.5) < 1e-9
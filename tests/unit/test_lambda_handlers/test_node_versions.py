@@ -0,0 +1,30 @@
+import pytest
+
+from utils.node_versions import InvalidIfMatch, expected_version, node_etag, version_condition
+
+
+def _event(value):
+    return {'headers': {'If-Match': value}}
+
+
+def test_expected_version_reads_strong_and_weak_etags():
+    assert expected_version(_event('"7"')) == 7
+    assert expected_version(_event('W/"7"')) == 7
+    assert expected_version({'headers': {}}) is None
+    assert expected_version(_event('*')) is None
+
+
+def test_expected_version_rejects_lists_and_other_etags():
+    with pytest.raises(InvalidIfMatch):
+        expected_version(_event('"1", "2"'))
+    with pytest.raises(InvalidIfMatch):
+        expected_version(_event('"abc"'))
+
+
+def test_version_zero_matches_nodes_written_before_versions():
+    values = {}
+    assert version_condition(0, values) == 'attribute_not_exists(#version)'
+    assert values == {}
+    assert version_condition(5, values) == '#version = :expectedVersion'
+    assert values == {':expectedVersion': 5}
+    assert node_etag(None) == '"0"'
@@ -0,0 +1,133 @@
+import json
+from unittest.mock import patch
+
+import nodes_batch_add_handler
+
+EXISTING_ID = '123e4567-e89b-12d3-a456-426614174000'
+
+
+def _event(body):
+    return {'pathParameters': {'spaceId': 's1'}, 'body': json.dumps(body)}
+
+
+@patch('nodes_batch_add_handler.publish_created_events', return_value=0)
+@patch('nodes_batch_add_handler.record_tree_change')
+@patch('nodes_batch_add_handler.bump_tree_version', return_value=6)
+@patch('nodes_batch_add_handler.put_items', return_value={'items_written': 3, 'consumed_wcu': 3.0})
+@patch('nodes_batch_add_handler.store_contents', return_value=[])
+@patch('nodes_batch_add_handler.uses_order_keys', return_value=False)
+@patch('nodes_batch_add_handler.resolve_path', return_value='/p')
+@patch('nodes_batch_add_handler.is_hidden', return_value=False)
+@patch('nodes_batch_add_handler.nodes_table')
+def test_batch_add_creates_outline_below_parent(mock_nodes_table, mock_hidden, mock_resolve, mock_order_keys,
+                                                mock_store, mock_put, mock_bump, mock_record, mock_events):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'p'}}
+    body = {'parentNodeId': 'p', 'orderIndex': 2,
+            'nodes': [{'title': 'a', 'contentHTML': '<p>a</p>', 'children': [{'title': 'b'}]}, {'title': 'c'}]}
+
+    response = nodes_batch_add_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 201
+    result = json.loads(response['body'])
+    assert result['created'] == 3
+    a, b, c = result['nodes']
+    assert (a['parentNodeId'], b['parentNodeId'], c['parentNodeId']) == ('p', a['nodeId'], 'p')
+    assert (a['orderIndex'], c['orderIndex']) == (2, 3)
+    assert b['path'] == f"/p/{a['nodeId']}/{b['nodeId']}"
+    assert len(mock_put.call_args.args[2]) == 3
+    assert mock_record.call_args.args[4] == 6
+    assert len(mock_record.call_args.args[5]) == 3
+    # Only the nodes created without content ask for generated content
+    assert [item['title'] for item in mock_events.call_args.args[2]] == ['b', 'c']
+
+
+@patch('nodes_batch_add_handler.record_tree_change')
+@patch('nodes_batch_add_handler.release_contents')
+@patch('nodes_batch_add_handler.delete_node_items')
+@patch('nodes_batch_add_handler.bump_tree_version', side_effect=RuntimeError('throttled'))
+@patch('nodes_batch_add_handler.put_items', return_value={'items_written': 1, 'consumed_wcu': 1.0})
+@patch('nodes_batch_add_handler.store_contents', return_value=[])
+@patch('nodes_batch_add_handler.uses_order_keys', return_value=False)
+def test_failed_tree_version_bump_undoes_the_write(mock_order_keys, mock_store, mock_put, mock_bump, mock_delete,
+                                                   mock_release, mock_record):
+    response = nodes_batch_add_handler.lambda_handler(_event({'nodes': [{'title': 'a'}]}), None)
+
+    assert response['statusCode'] == 500
+    assert mock_delete.call_args.args[2] == [item['nodeId'] for item in mock_put.call_args.args[2]]
+    mock_release.assert_called_once()
+    mock_record.assert_not_called()
+
+
+@patch('nodes_batch_add_handler.put_items')
+@patch('nodes_batch_add_handler.batch_get_nodes', return_value={EXISTING_ID: {'nodeId': EXISTING_ID}})
+def test_batch_add_rejects_existing_client_ids(mock_batch_get, mock_put):
+    body = {'nodes': [{'title': 'a', 'nodeId': EXISTING_ID}]}
+
+    response = nodes_batch_add_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['nodeIds'] == [EXISTING_ID]
+    mock_put.assert_not_called()
+
+
+@patch('nodes_batch_add_handler.put_items')
+@patch('nodes_batch_add_handler.is_hidden', return_value=True)
+@patch('nodes_batch_add_handler.nodes_table')
+def test_batch_add_rejects_deleted_parent(mock_nodes_table, mock_hidden, mock_put):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'p', 'deletedAt': 'then'}}
+
+    response = nodes_batch_add_handler.lambda_handler(_event({'parentNodeId': 'p', 'nodes': [{'title': 'a'}]}), None)
+
+    assert response['statusCode'] == 404
+    mock_put.assert_not_called()
+
+
+def test_batch_add_rejects_malformed_outline():
+    response = nodes_batch_add_handler.lambda_handler(_event({'nodes': [{'title': 'a', 'children': 'b'}]}), None)
+
+    assert response['statusCode'] == 400
+    assert 'children' in json.loads(response['body'])['error']
+
+
+@patch('nodes_batch_add_handler.release_contents')
+@patch('nodes_batch_add_handler.delete_node_items')
+@patch('nodes_batch_add_handler.put_items', side_effect=RuntimeError('throttled'))
+@patch('nodes_batch_add_handler.store_contents', return_value=[])
+@patch('nodes_batch_add_handler.uses_order_keys', return_value=False)
+def test_batch_add_cleans_up_after_failed_write(mock_order_keys, mock_store, mock_put, mock_delete_items,
+                                                mock_delete_content):
+    response = nodes_batch_add_handler.lambda_handler(_event({'nodes': [{'title': 'a'}, {'title': 'b'}]}), None)
+
+    assert response['statusCode'] == 500
+    assert len(mock_delete_items.call_args.args[2]) == 2
+    mock_delete_content.assert_called_once()
+
+
+@patch('nodes_batch_add_handler.record_tree_change')
+@patch('nodes_batch_add_handler.release_contents')
+@patch('nodes_batch_add_handler.delete_node_items')
+@patch('nodes_batch_add_handler.bump_tree_version')
+@patch('nodes_batch_add_handler.put_items')
+@patch('nodes_batch_add_handler.put_new_items')
+@patch('nodes_batch_add_handler.batch_get_nodes', return_value={})
+@patch('nodes_batch_add_handler.store_contents', return_value=[])
+@patch('nodes_batch_add_handler.uses_order_keys', return_value=False)
+def test_client_id_created_concurrently_returns_409_and_keeps_that_node(mock_order_keys, mock_store, mock_batch_get,
+                                                                        mock_put_new, mock_put, mock_bump, mock_delete,
+                                                                        mock_release, mock_record):
+    other_id = '123e4567-e89b-12d3-a456-426614174001'
+    # Another request created EXISTING_ID between the read and the conditional puts
+    mock_put_new.side_effect = lambda client, table, items: {
+        'written': [item for item in items if item['nodeId'] == other_id], 'existing': [EXISTING_ID], 'errors': []}
+    body = {'nodes': [{'title': 'a', 'nodeId': EXISTING_ID}, {'title': 'b', 'nodeId': other_id}, {'title': 'c'}]}
+
+    response = nodes_batch_add_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['nodeIds'] == [EXISTING_ID]
+    assert [item['nodeId'] for item in mock_put_new.call_args.args[2]] == [EXISTING_ID, other_id]
+    # Only what this request wrote is deleted again
+    assert mock_delete.call_args.args[2] == [other_id]
+    mock_put.assert_not_called()
+    mock_bump.assert_not_called()
+    mock_record.assert_not_called()
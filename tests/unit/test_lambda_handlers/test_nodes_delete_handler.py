@@ -0,0 +1,66 @@
+import json
+from unittest.mock import patch
+from utils.transactions import TransactionCanceled
+import nodes_delete_handler
+
+
+@patch('nodes_delete_handler.record_tree_change')
+@patch('nodes_delete_handler.transact_tree_write', return_value=4)
+@patch('nodes_delete_handler.nodes_table')
+def test_delete_writes_a_single_tombstone(mock_nodes_table, mock_transact, mock_record):
+    event = {'pathParameters': {'spaceId': 's1', 'nodeId': 'n'}}
+
+    response = nodes_delete_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 204
+    operations = mock_transact.call_args.args[3]
+    assert len(operations) == 1
+    update = operations[0]['Update']
+    assert update['Key'] == {'nodeId': {'S': 'n'}, 'spaceId': {'S': 's1'}}
+    assert 'attribute_not_exists(deletedAt)' in update['ConditionExpression']
+    assert update['ExpressionAttributeValues'][':pending'] == {'S': 'pending'}
+    mock_nodes_table.query.assert_not_called()
+    mock_nodes_table.batch_writer.assert_not_called()
+    assert mock_record.call_args.args[4] == 4
+    assert mock_record.call_args.args[5] == [{'op': 'deleted', 'nodeId': 'n'}]
+
+
+@patch('nodes_delete_handler.record_tree_change')
+@patch('nodes_delete_handler.transact_tree_write', side_effect=TransactionCanceled(['ConditionalCheckFailed']))
+@patch('nodes_delete_handler.nodes_table')
+def test_missing_or_deleted_node_returns_404(mock_nodes_table, mock_transact, mock_record):
+    event = {'pathParameters': {'spaceId': 's1', 'nodeId': 'gone'}}
+
+    response = nodes_delete_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 404
+    assert 'gone' in json.loads(response['body'])['error']
+    mock_record.assert_not_called()
+
+
+@patch('nodes_delete_handler.record_tree_change')
+@patch('nodes_delete_handler.transact_tree_write', side_effect=TransactionCanceled(['ConditionalCheckFailed']))
+@patch('nodes_delete_handler.nodes_table')
+def test_delete_of_changed_node_returns_412(mock_nodes_table, mock_transact, mock_record):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'n', 'version': 2}}
+    event = {'pathParameters': {'spaceId': 's1', 'nodeId': 'n'}, 'headers': {'If-Match': '"1"'}}
+
+    response = nodes_delete_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 412
+    assert json.loads(response['body'])['version'] == 2
+    mock_record.assert_not_called()
+
+
+@patch('nodes_delete_handler.record_tree_change')
+@patch('nodes_delete_handler.transact_tree_write', side_effect=TransactionCanceled(['TransactionConflict']))
+@patch('nodes_delete_handler.nodes_table')
+def test_conflicting_transaction_returns_409_not_404(mock_nodes_table, mock_transact, mock_record):
+    event = {'pathParameters': {'spaceId': 's1', 'nodeId': 'n'}}
+
+    response = nodes_delete_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['reasons'] == ['TransactionConflict']
+    mock_nodes_table.get_item.assert_not_called()
+    mock_record.assert_not_called()
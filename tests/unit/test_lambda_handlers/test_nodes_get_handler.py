@@ -0,0 +1,80 @@
+import base64
+import io
+import json
+import zlib
+from unittest.mock import patch
+
+import nodes_get_handler
+
+HTML = '<h2>Cells</h2>' + '<p>The cell is the basic unit of life.</p>' * 100
+
+
+def _gzip(text):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+def _event(accept_encoding=None, node_format=None):
+    return {
+        'pathParameters': {'spaceId': 's1', 'nodeId': 'n1'},
+        'headers': {'Accept-Encoding': accept_encoding} if accept_encoding else {},
+        'queryStringParameters': {'format': node_format} if node_format else None
+    }
+
+
+def _node():
+    return {'Item': {'nodeId': 'n1', 'spaceId': 's1', 's3Key': 's1/content/h.html', 'contentEncoding': 'gzip',
+                     'version': 3}}
+
+
+@patch('nodes_get_handler.is_hidden', return_value=False)
+@patch('nodes_get_handler.s3_client')
+@patch('nodes_get_handler.nodes_table')
+def test_compressed_content_is_decoded_into_the_json_response(mock_nodes_table, mock_s3, mock_hidden):
+    mock_nodes_table.get_item.return_value = _node()
+    mock_s3.get_object.return_value = {'Body': io.BytesIO(_gzip(HTML))}
+
+    response = nodes_get_handler.lambda_handler(_event(accept_encoding='gzip'), None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['contentHTML'] == HTML
+
+
+@patch('nodes_get_handler.is_hidden', return_value=False)
+@patch('nodes_get_handler.s3_client')
+@patch('nodes_get_handler.nodes_table')
+def test_html_format_passes_stored_bytes_through_when_the_encoding_is_accepted(mock_nodes_table, mock_s3,
+                                                                                mock_hidden):
+    mock_nodes_table.get_item.return_value = _node()
+    stored = _gzip(HTML)
+    mock_s3.get_object.side_effect = lambda **kwargs: {'Body': io.BytesIO(stored)}
+
+    passed = nodes_get_handler.lambda_handler(_event(accept_encoding='gzip, br', node_format='html'), None)
+    decoded = nodes_get_handler.lambda_handler(_event(accept_encoding='br', node_format='html'), None)
+
+    assert passed['isBase64Encoded'] and base64.b64decode(passed['body']) == stored
+    assert passed['headers']['Content-Encoding'] == 'gzip'
+    assert passed['headers']['ETag'] == '"3"'
+    assert not decoded['isBase64Encoded'] and decoded['body'] == HTML
+    assert 'Content-Encoding' not in decoded['headers']
+
+
+@patch('nodes_get_handler.is_hidden', return_value=False)
+@patch('nodes_get_handler.s3_client')
+@patch('nodes_get_handler.nodes_table')
+def test_content_of_the_add_handler_layout_is_read_in_full_not_from_the_preview(mock_nodes_table, mock_s3,
+                                                                                 mock_hidden):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'n1', 'contentS3Key': 'nodes/n1/content.html',
+                                                       'contentPreview': HTML[:100]}}
+    mock_s3.get_object.return_value = {'Body': io.BytesIO(HTML.encode('utf-8'))}
+
+    response = nodes_get_handler.lambda_handler(_event(), None)
+
+    assert json.loads(response['body'])['contentHTML'] == HTML
+    assert mock_s3.get_object.call_args.kwargs['Key'] == 'nodes/n1/content.html'
+
+
+def test_unknown_format_is_rejected():
+    response = nodes_get_handler.lambda_handler(_event(node_format='xml'), None)
+
+    assert response['statusCode'] == 400
@@ -0,0 +1,145 @@
+import json
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+import nodes_move_handler
+
+SPACES = MagicMock(name='Spaces')
+SPACES.name = 'Spaces'
+SPACES.update_item.return_value = {'Attributes': {'treeWrite_t': 4}}
+NODE = {'nodeId': 'n', 'parentNodeId': 'old', 'orderIndex': Decimal(0), 'path': '/old/n'}
+ANCESTRY = [{'nodeId': 'p', 'parentNodeId': 'root'}, {'nodeId': 'root'}]
+SIBLINGS = [{'nodeId': f's{i}', 'orderIndex': Decimal(i)} for i in range(3)]
+
+
+def _event(body):
+    return {'pathParameters': {'spaceId': 's1', 'nodeId': 'n'}, 'body': json.dumps(body)}
+
+
+@patch('nodes_move_handler.rewrite_subtree_paths', return_value=4)
+@patch('nodes_move_handler.load_descendants', return_value=[])
+@patch('nodes_move_handler.spaces_table', SPACES)
+@patch('nodes_move_handler.record_tree_change')
+@patch('nodes_move_handler.uses_order_keys', return_value=False)
+@patch('nodes_move_handler.load_siblings', return_value=SIBLINGS)
+@patch('nodes_move_handler.load_ancestry', return_value=ANCESTRY)
+@patch('nodes_move_handler.is_hidden', return_value=False)
+@patch('nodes_move_handler.dynamodb')
+@patch('nodes_move_handler.nodes_table')
+def test_move_writes_node_siblings_and_ancestor_checks_in_one_transaction(
+        mock_nodes_table, mock_dynamodb, mock_hidden, mock_ancestry, mock_siblings, mock_order_keys,
+        mock_record, mock_descendants, mock_rewrite):
+    mock_nodes_table.get_item.return_value = {'Item': NODE}
+
+    response = nodes_move_handler.lambda_handler(_event({'parentNodeId': 'p', 'orderIndex': 1}), None)
+
+    assert response['statusCode'] == 200
+    result = json.loads(response['body'])
+    assert (result['orderIndex'], result['path'], result['pathsRewritten']) == (1, '/root/p/n', 4)
+    assert result['siblingsUpdated'] == [{'nodeId': 's1', 'orderIndex': 2}, {'nodeId': 's2', 'orderIndex': 3}]
+    items = mock_dynamodb.meta.client.transact_write_items.call_args.kwargs['TransactItems']
+    assert [next(iter(item)) for item in items] == ['Update', 'Update', 'Update', 'ConditionCheck', 'ConditionCheck',
+                                                    'Update']
+    assert 'ADD treeVersion :one' in items[-1]['Update']['UpdateExpression']
+    assert items[3]['ConditionCheck']['Key']['nodeId'] == {'S': 'p'}
+    assert items[0]['Update']['ExpressionAttributeValues'][':parent'] == {'S': 'p'}
+    assert mock_dynamodb.meta.client.transact_write_items.call_count == 1
+    assert mock_record.call_args.args[4] == 4
+    changes = mock_record.call_args.args[5]
+    assert changes[0]['node']['parentNodeId'] == 'p' and len(changes) == 3
+
+
+@patch('nodes_move_handler.load_ancestry', return_value=[{'nodeId': 'child', 'parentNodeId': 'n'}] + [NODE])
+@patch('nodes_move_handler.is_hidden', return_value=False)
+@patch('nodes_move_handler.dynamodb')
+@patch('nodes_move_handler.nodes_table')
+def test_move_below_a_descendant_is_rejected(mock_nodes_table, mock_dynamodb, mock_hidden, mock_ancestry):
+    mock_nodes_table.get_item.return_value = {'Item': NODE}
+
+    response = nodes_move_handler.lambda_handler(_event({'parentNodeId': 'child'}), None)
+
+    assert response['statusCode'] == 400
+    assert 'descendants' in json.loads(response['body'])['error']
+    mock_dynamodb.meta.client.transact_write_items.assert_not_called()
+
+
+@patch('nodes_move_handler.spaces_table', SPACES)
+@patch('nodes_move_handler.record_tree_change')
+@patch('nodes_move_handler.uses_order_keys', return_value=False)
+@patch('nodes_move_handler.load_siblings', return_value=[])
+@patch('nodes_move_handler.load_ancestry', return_value=ANCESTRY)
+@patch('nodes_move_handler.is_hidden', return_value=False)
+@patch('nodes_move_handler.dynamodb')
+@patch('nodes_move_handler.nodes_table')
+def test_move_conflict_returns_409(mock_nodes_table, mock_dynamodb, mock_hidden, mock_ancestry, mock_siblings,
+                                   mock_order_keys, mock_record):
+    mock_nodes_table.get_item.return_value = {'Item': NODE}
+    mock_dynamodb.meta.client.transact_write_items.side_effect = ClientError({
+        'Error': {'Code': 'TransactionCanceledException'},
+        'CancellationReasons': [{'Code': 'None'}, {'Code': 'ConditionalCheckFailed'}, {'Code': 'None'}]
+    }, 'TransactWriteItems')
+
+    response = nodes_move_handler.lambda_handler(_event({'parentNodeId': 'p'}), None)
+
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['reasons'] == ['None', 'ConditionalCheckFailed', 'None']
+    mock_record.assert_not_called()
+
+
+@patch('nodes_move_handler.rewrite_subtree_paths', side_effect=RuntimeError('throttled'))
+@patch('nodes_move_handler.load_descendants', return_value=[])
+@patch('nodes_move_handler.spaces_table', SPACES)
+@patch('nodes_move_handler.record_tree_change')
+@patch('nodes_move_handler.uses_order_keys', return_value=False)
+@patch('nodes_move_handler.load_siblings', return_value=[])
+@patch('nodes_move_handler.load_ancestry', return_value=ANCESTRY)
+@patch('nodes_move_handler.is_hidden', return_value=False)
+@patch('nodes_move_handler.dynamodb')
+@patch('nodes_move_handler.nodes_table')
+def test_failed_path_rewrite_still_publishes_the_committed_move(
+        mock_nodes_table, mock_dynamodb, mock_hidden, mock_ancestry, mock_siblings, mock_order_keys,
+        mock_record, mock_descendants, mock_rewrite):
+    mock_nodes_table.get_item.return_value = {'Item': NODE}
+
+    response = nodes_move_handler.lambda_handler(_event({'parentNodeId': 'p'}), None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['pathsRewritten'] == 0
+    mock_record.assert_called_once()
+
+
+@patch('nodes_move_handler.rewrite_subtree_paths', return_value=0)
+@patch('nodes_move_handler.load_descendants', return_value=[])
+@patch('nodes_move_handler.spaces_table', SPACES)
+@patch('nodes_move_handler.record_tree_change')
+@patch('nodes_move_handler.uses_order_keys', return_value=False)
+@patch('nodes_move_handler.load_siblings', return_value=[{'nodeId': f's{i}', 'orderIndex': Decimal(i)}
+                                                         for i in range(150)])
+@patch('nodes_move_handler.load_ancestry', return_value=[{'nodeId': 'p', 'parentNodeId': 'root', 'path': '/root/p'}]
+       + [{'nodeId': f'a{i}', 'parentNodeId': 'root'} for i in range(60)])
+@patch('nodes_move_handler.is_hidden', return_value=False)
+@patch('nodes_move_handler.dynamodb')
+@patch('nodes_move_handler.nodes_table')
+def test_move_caps_ancestor_checks_and_refuses_what_does_not_fit_one_transaction(
+        mock_nodes_table, mock_dynamodb, mock_hidden, mock_ancestry, mock_siblings, mock_order_keys, mock_record,
+        mock_descendants, mock_rewrite):
+    mock_nodes_table.get_item.return_value = {'Item': NODE}
+
+    # 50 siblings shift: the node, the shifts and the meta bump leave 48 ancestor checks
+    response = nodes_move_handler.lambda_handler(_event({'parentNodeId': 'p', 'orderIndex': 100}), None)
+
+    assert response['statusCode'] == 200
+    items = mock_dynamodb.meta.client.transact_write_items.call_args.kwargs['TransactItems']
+    assert len(items) == 100
+    checks = [item['ConditionCheck'] for item in items if 'ConditionCheck' in item]
+    assert len(checks) == 48
+    assert checks[0]['ExpressionAttributeValues'][':path'] == {'S': '/root/p'}
+
+    # 149 siblings would have to shift; nothing is written
+    mock_dynamodb.reset_mock()
+    response = nodes_move_handler.lambda_handler(_event({'parentNodeId': 'p', 'orderIndex': 1}), None)
+
+    assert response['statusCode'] == 409
+    mock_dynamodb.meta.client.transact_write_items.assert_not_called()
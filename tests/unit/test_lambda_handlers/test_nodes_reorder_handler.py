@@ -0,0 +1,143 @@
+import json
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+from botocore.exceptions import ClientError
+import nodes_reorder_handler
+
+SPACES = MagicMock(name='Spaces')
+SPACES.name = 'Spaces'
+SPACES.update_item.return_value = {'Attributes': {'treeWrite_t': 8}}
+SIBLINGS = [{'nodeId': f'n{i}', 'parentNodeId': 'p', 'orderIndex': Decimal(i)} for i in range(250)]
+
+
+def _event(body):
+    return {'pathParameters': {'spaceId': 's1'}, 'body': json.dumps(body)}
+
+
+@patch('nodes_reorder_handler.uses_order_keys', return_value=False)
+@patch('nodes_reorder_handler.spaces_table', SPACES)
+@patch('nodes_reorder_handler.record_tree_change')
+@patch('nodes_reorder_handler.dynamodb')
+@patch('nodes_reorder_handler.is_hidden', return_value=False)
+@patch('nodes_reorder_handler.load_children', return_value={'p': SIBLINGS})
+@patch('nodes_reorder_handler.nodes_table')
+def test_reorder_writes_changed_positions_in_transaction_chunks(mock_nodes_table, mock_load_children, mock_hidden,
+                                                                mock_dynamodb, mock_record, mock_order_keys):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'n0', 'parentNodeId': 'p'}}
+    # Reverse the order; the middle node keeps its position
+    body = [{'nodeId': f'n{i}', 'newOrderIndex': 249 - i} for i in range(250)]
+    body[125]['newOrderIndex'] = 125
+
+    response = nodes_reorder_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 200
+    result = json.loads(response['body'])
+    assert len(result['updated']) == 249
+    assert result['unchanged'] == 1
+    mock_load_children.assert_called_once()
+    transactions = [call.kwargs['TransactItems'] for call in mock_dynamodb.meta.client.transact_write_items.call_args_list]
+    # 99 nodes per transaction plus the space tree version bump
+    assert [len(items) for items in transactions] == [100, 100, 52]
+    assert 'ADD treeVersion :one' in transactions[0][-1]['Update']['UpdateExpression']
+    update = transactions[0][0]['Update']
+    assert update['Key'] == {'nodeId': {'S': 'n0'}, 'spaceId': {'S': 's1'}}
+    assert update['ExpressionAttributeValues'][':value'] == {'N': '249'}
+    assert 'orderIndex = :expected' in update['ConditionExpression']
+    assert [len(call.args[5]) for call in mock_record.call_args_list] == [99, 99, 51]
+
+
+@patch('nodes_reorder_handler.dynamodb')
+@patch('nodes_reorder_handler.is_hidden', return_value=False)
+@patch('nodes_reorder_handler.load_children', return_value={'p': SIBLINGS[:2]})
+@patch('nodes_reorder_handler.nodes_table')
+def test_reorder_rejects_nodes_of_another_parent(mock_nodes_table, mock_load_children, mock_hidden, mock_dynamodb):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'n0', 'parentNodeId': 'p'}}
+    body = [{'nodeId': 'n0', 'newOrderIndex': 1}, {'nodeId': 'elsewhere', 'newOrderIndex': 0}]
+
+    response = nodes_reorder_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['nodeIds'] == ['elsewhere']
+    mock_dynamodb.meta.client.transact_write_items.assert_not_called()
+
+
+@patch('nodes_reorder_handler.uses_order_keys', return_value=False)
+@patch('nodes_reorder_handler.spaces_table', SPACES)
+@patch('nodes_reorder_handler.record_tree_change')
+@patch('nodes_reorder_handler.dynamodb')
+@patch('nodes_reorder_handler.is_hidden', return_value=False)
+@patch('nodes_reorder_handler.load_root_nodes', return_value=[{'nodeId': 'a', 'orderIndex': 0}, {'nodeId': 'b', 'orderIndex': 1}])
+@patch('nodes_reorder_handler.nodes_table')
+def test_reorder_reports_canceled_transaction_as_conflict(mock_nodes_table, mock_load_roots, mock_hidden,
+                                                          mock_dynamodb, mock_record, mock_order_keys):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'a'}}
+    mock_dynamodb.meta.client.transact_write_items.side_effect = ClientError({
+        'Error': {'Code': 'TransactionCanceledException'},
+        'CancellationReasons': [{'Code': 'None'}, {'Code': 'ConditionalCheckFailed'}]
+    }, 'TransactWriteItems')
+    body = [{'nodeId': 'a', 'newOrderIndex': 1}, {'nodeId': 'b', 'newOrderIndex': 0}]
+
+    response = nodes_reorder_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 409
+    result = json.loads(response['body'])
+    assert result['updated'] == []
+    assert result['failedUpdates'] == [{'nodeId': 'b', 'error': 'ConditionalCheckFailed'}]
+    condition = mock_dynamodb.meta.client.transact_write_items.call_args.kwargs['TransactItems'][0]['Update']['ConditionExpression']
+    assert 'attribute_not_exists(parentNodeId)' in condition
+    mock_record.assert_not_called()
+
+
+@patch('nodes_reorder_handler.uses_order_keys', return_value=False)
+@patch('nodes_reorder_handler.spaces_table', SPACES)
+@patch('nodes_reorder_handler.record_tree_change')
+@patch('nodes_reorder_handler.dynamodb')
+@patch('nodes_reorder_handler.is_hidden', return_value=False)
+@patch('nodes_reorder_handler.load_root_nodes', return_value=[{'nodeId': 'a', 'orderIndex': 0, 'version': 2},
+                                                              {'nodeId': 'b', 'orderIndex': 1, 'version': 5}])
+@patch('nodes_reorder_handler.nodes_table')
+def test_reorder_of_node_at_another_version_returns_412(mock_nodes_table, mock_load_roots, mock_hidden,
+                                                        mock_dynamodb, mock_record, mock_order_keys):
+    mock_nodes_table.get_item.side_effect = [{'Item': {'nodeId': 'a'}}, {'Item': {'nodeId': 'b', 'version': 6}}]
+    mock_dynamodb.meta.client.transact_write_items.side_effect = ClientError({
+        'Error': {'Code': 'TransactionCanceledException'},
+        'CancellationReasons': [{'Code': 'None'}, {'Code': 'ConditionalCheckFailed'}]
+    }, 'TransactWriteItems')
+    body = [{'nodeId': 'a', 'newOrderIndex': 1}, {'nodeId': 'b', 'newOrderIndex': 0, 'version': 5}]
+
+    response = nodes_reorder_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 412
+    assert json.loads(response['body'])['failedUpdates'] == [
+        {'nodeId': 'b', 'error': 'ConditionalCheckFailed', 'version': 6}
+    ]
+    items = mock_dynamodb.meta.client.transact_write_items.call_args.kwargs['TransactItems']
+    assert '#version = :expectedVersion' not in items[0]['Update']['ConditionExpression']
+    assert items[1]['Update']['ExpressionAttributeValues'][':expectedVersion'] == {'N': '5'}
+    mock_record.assert_not_called()
+
+
+@patch('nodes_reorder_handler.uses_order_keys', return_value=True)
+@patch('nodes_reorder_handler.spaces_table', SPACES)
+@patch('nodes_reorder_handler.record_tree_change')
+@patch('nodes_reorder_handler.dynamodb')
+@patch('nodes_reorder_handler.is_hidden', return_value=False)
+@patch('nodes_reorder_handler.load_children', return_value={'p': [
+    {'nodeId': 'a', 'parentNodeId': 'p', 'orderIndex': 0, 'orderKey': 'A'},
+    {'nodeId': 'b', 'parentNodeId': 'p', 'orderIndex': 0, 'orderKey': 'B'},
+    {'nodeId': 'c', 'parentNodeId': 'p', 'orderIndex': 0, 'orderKey': 'C'},
+]})
+@patch('nodes_reorder_handler.nodes_table')
+def test_reorder_with_order_keys_swaps_keys_of_listed_nodes(mock_nodes_table, mock_load_children, mock_hidden,
+                                                            mock_dynamodb, mock_record, mock_order_keys):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'a', 'parentNodeId': 'p'}}
+    body = [{'nodeId': 'a', 'newOrderIndex': 2}, {'nodeId': 'c', 'newOrderIndex': 0}]
+
+    response = nodes_reorder_handler.lambda_handler(_event(body), None)
+
+    assert response['statusCode'] == 200
+    assert sorted(json.loads(response['body'])['updated'], key=lambda item: item['nodeId']) == [
+        {'nodeId': 'a', 'orderKey': 'C', 'version': 1}, {'nodeId': 'c', 'orderKey': 'A', 'version': 1}
+    ]
+    update = mock_dynamodb.meta.client.transact_write_items.call_args.kwargs['TransactItems'][0]['Update']
+    assert update['UpdateExpression'] == 'SET orderKey = :value, updatedAt = :ua ADD #version :one'
@@ -0,0 +1,54 @@
+import datetime
+from unittest.mock import patch
+from utils.tombstones import timestamp
+import nodes_restore_handler
+
+EVENT = {'pathParameters': {'spaceId': 's1', 'nodeId': 'n'}}
+
+
+@patch('nodes_restore_handler.record_tree_change')
+@patch('nodes_restore_handler.transact_tree_write', return_value=9)
+@patch('nodes_restore_handler.load_subtree')
+@patch('nodes_restore_handler.nodes_table')
+def test_restore_removes_tombstone_and_republishes_subtree(mock_nodes_table, mock_load_subtree, mock_transact,
+                                                           mock_record):
+    deleted_at = timestamp()
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'n', 'deletedAt': deleted_at}}
+    mock_load_subtree.return_value = ([
+        {'nodeId': 'n', 'title': 'N', 'orderIndex': 0},
+        {'nodeId': 'c', 'title': 'C', 'parentNodeId': 'n', 'orderIndex': 0, 'orderKey': 'a0',
+         'updatedAt': '2024-01-01T00:00:00', 'version': 3},
+    ], set())
+
+    response = nodes_restore_handler.lambda_handler(EVENT, None)
+
+    assert response['statusCode'] == 200
+    update = mock_transact.call_args.args[3][0]['Update']
+    assert update['UpdateExpression'] == 'REMOVE deletedAt, tombstone ADD #version :one'
+    assert update['ExpressionAttributeValues'][':deletedAt'] == {'S': deleted_at}
+    assert mock_record.call_args.args[4] == 9
+    changes = mock_record.call_args.args[5]
+    assert [(change['op'], change['nodeId']) for change in changes] == [('created', 'n'), ('created', 'c')]
+    # The same fields as the entries of a node added through the API
+    assert changes[1]['node'] == {'title': 'C', 'parentNodeId': 'n', 'orderIndex': 0, 'orderKey': 'a0',
+                                  'updatedAt': '2024-01-01T00:00:00', 'version': 3}
+    fields = mock_load_subtree.call_args.kwargs['fields']
+    assert {'orderKey', 'updatedAt', 'version', 'deletedAt'} <= set(fields)
+    assert len(fields) == len(set(fields))
+
+
+@patch('nodes_restore_handler.transact_tree_write')
+@patch('nodes_restore_handler.nodes_table')
+def test_restore_after_undo_window_returns_410(mock_nodes_table, mock_transact):
+    long_ago = timestamp(datetime.datetime.utcnow() - datetime.timedelta(days=1))
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'n', 'deletedAt': long_ago}}
+
+    assert nodes_restore_handler.lambda_handler(EVENT, None)['statusCode'] == 410
+    mock_transact.assert_not_called()
+
+
+@patch('nodes_restore_handler.nodes_table')
+def test_restore_of_live_node_returns_409(mock_nodes_table):
+    mock_nodes_table.get_item.return_value = {'Item': {'nodeId': 'n'}}
+
+    assert nodes_restore_handler.lambda_handler(EVENT, None)['statusCode'] == 409
@@ -0,0 +1,210 @@
+import json
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+import nodes_update_handler
+from utils.content_store import content_hash
+
+CONDITION_FAILED = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+
+
+def _event(body):
+    return {'pathParameters': {'spaceId': 's1', 'nodeId': 'n1'}, 'body': json.dumps(body)}
+
+
+@patch('nodes_update_handler.eventbridge_client')
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version', return_value=12)
+@patch('nodes_update_handler.nodes_table')
+def test_title_edit_is_one_conditional_update(mock_nodes_table, mock_bump, mock_record, mock_events):
+    mock_nodes_table.update_item.return_value = {'Attributes': {'nodeId': 'n1', 'title': 'old', 's3Key': 'k'}}
+
+    response = nodes_update_handler.lambda_handler(_event({'title': 'new'}), None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['title'] == 'new'
+    mock_nodes_table.get_item.assert_not_called()
+    kwargs = mock_nodes_table.update_item.call_args.kwargs
+    assert kwargs['ConditionExpression'] == 'attribute_exists(nodeId) AND attribute_not_exists(deletedAt)'
+    assert kwargs['ReturnValues'] == 'ALL_OLD'
+    assert mock_record.call_args.args[4] == 12
+    # The node already has content, so no generation event
+    mock_events.put_events.assert_not_called()
+
+
+@patch('nodes_update_handler.delete_content_objects')
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version', return_value=12)
+@patch('nodes_update_handler.s3_client')
+@patch('nodes_update_handler.spaces_table')
+@patch('nodes_update_handler.nodes_table')
+def test_content_edit_stores_content_by_hash_and_releases_the_old_image(mock_nodes_table, mock_spaces_table, mock_s3,
+                                                                       mock_bump, mock_record, mock_delete):
+    old_image = {'nodeId': 'n1', 's3Key': 's1/content/old.html', 'contentHash': 'old',
+                 'contentS3Key': 'nodes/n1/content.html'}
+    mock_nodes_table.update_item.return_value = {'Attributes': old_image}
+    mock_spaces_table.update_item.return_value = {'Attributes': {}}
+
+    response = nodes_update_handler.lambda_handler(_event({'contentHTML': '<p>new</p>'}), None)
+
+    assert response['statusCode'] == 200
+    new_key = mock_s3.put_object.call_args.kwargs['Key']
+    assert new_key.startswith('s1/content/') and json.loads(response['body'])['s3Key'] == new_key
+    update = mock_nodes_table.update_item.call_args.kwargs
+    assert 'REMOVE contentS3Key' in update['UpdateExpression']
+    # Content below the compression threshold is stored as plain HTML
+    assert 'contentEncoding' in update['UpdateExpression'].split('REMOVE')[1]
+    assert update['ExpressionAttributeValues'][':ch'] in new_key
+    # The old hash loses its reference; the unhashed object is deleted directly
+    released = [call.kwargs for call in mock_spaces_table.update_item.call_args_list
+                if call.kwargs['ExpressionAttributeValues'] == {':refs': -1}]
+    assert [call['Key'] for call in released] == [{'PK': 'SPACE#s1', 'SK': 'CONTENT#old'}]
+    assert mock_delete.call_args.args[2] == [old_image]
+
+
+@patch('nodes_update_handler.delete_content_objects')
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version', return_value=12)
+@patch('nodes_update_handler.s3_client')
+@patch('nodes_update_handler.spaces_table')
+@patch('nodes_update_handler.nodes_table')
+def test_saving_unchanged_content_uploads_nothing(mock_nodes_table, mock_spaces_table, mock_s3, mock_bump,
+                                                  mock_record, mock_delete):
+    digest = content_hash('<p>same</p>')
+    mock_nodes_table.update_item.return_value = {'Attributes': {'nodeId': 'n1', 'contentHash': digest}}
+    mock_spaces_table.update_item.side_effect = [
+        {'Attributes': {'refs': 1, 'storedAt': '2024-01-01T00:00:00',    # acquire: already stored
+                        'contentEncoding': 'gzip'}},
+        {'Attributes': {'refs': 1}}                                       # release of the old image
+    ]
+
+    response = nodes_update_handler.lambda_handler(_event({'contentHTML': '<p>same</p>'}), None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['contentHash'] == digest
+    assert json.loads(response['body'])['contentEncoding'] == 'gzip'
+    mock_s3.put_object.assert_not_called()
+    mock_s3.delete_object.assert_not_called()
+    keys = [call.kwargs['Key']['SK'] for call in mock_spaces_table.update_item.call_args_list]
+    assert keys == [f'CONTENT#{digest}', f'CONTENT#{digest}']
+
+
+@patch('nodes_update_handler.delete_content_objects')
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version')
+@patch('nodes_update_handler.s3_client')
+@patch('nodes_update_handler.spaces_table')
+@patch('nodes_update_handler.nodes_table')
+def test_edit_of_missing_or_deleted_node_returns_404_and_releases_the_new_content(mock_nodes_table, mock_spaces_table,
+                                                                                  mock_s3, mock_bump, mock_record,
+                                                                                  mock_delete):
+    mock_nodes_table.update_item.side_effect = CONDITION_FAILED
+    mock_spaces_table.update_item.side_effect = [{'Attributes': {}}, {}, {'Attributes': {'refs': 0}}, {}]
+
+    response = nodes_update_handler.lambda_handler(_event({'title': 't', 'contentHTML': '<p>x</p>'}), None)
+
+    assert response['statusCode'] == 404
+    # Without If-Match a failed condition can only mean the node is gone; nothing is read
+    mock_nodes_table.get_item.assert_not_called()
+    # The only reference is gone again, so the record is marked for collection
+    mark = mock_spaces_table.update_item.call_args.kwargs
+    assert mark['UpdateExpression'] == 'SET releasedAt = :now, released = :marker'
+    mock_s3.delete_object.assert_not_called()
+    mock_bump.assert_not_called()
+    mock_record.assert_not_called()
+
+
+@patch('nodes_update_handler.bump_tree_version')
+@patch('nodes_update_handler.nodes_table')
+def test_stale_if_match_returns_412_with_current_version(mock_nodes_table, mock_bump):
+    mock_nodes_table.update_item.side_effect = CONDITION_FAILED
+    mock_nodes_table.get_item.return_value = {'Item': {'version': 4}}
+    event = dict(_event({'title': 't'}), headers={'If-Match': '"3"'})
+
+    response = nodes_update_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 412
+    assert response['headers']['ETag'] == '"4"'
+    mock_bump.assert_not_called()
+
+
+@patch('nodes_update_handler.bump_tree_version')
+@patch('nodes_update_handler.nodes_table')
+def test_if_match_on_a_deleted_node_returns_404(mock_nodes_table, mock_bump):
+    mock_nodes_table.update_item.side_effect = CONDITION_FAILED
+    mock_nodes_table.get_item.return_value = {'Item': {'version': 4, 'deletedAt': '2024-01-01T00:00:00'}}
+    event = dict(_event({'title': 't'}), headers={'If-Match': '"4"'})
+
+    response = nodes_update_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 404
+
+
+@patch('nodes_update_handler.eventbridge_client')
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version', return_value=12)
+@patch('nodes_update_handler.nodes_table')
+def test_update_increments_version_and_returns_etag(mock_nodes_table, mock_bump, mock_record, mock_events):
+    mock_nodes_table.update_item.return_value = {'Attributes': {'nodeId': 'n1', 'version': 3, 's3Key': 'k'}}
+    event = dict(_event({'title': 'new'}), headers={'if-match': '"3"'})
+
+    response = nodes_update_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] == '"4"'
+    assert json.loads(response['body'])['version'] == 4
+    update = mock_nodes_table.update_item.call_args.kwargs
+    assert update['UpdateExpression'].endswith('ADD #version :one')
+    assert update['ConditionExpression'].endswith('AND #version = :expectedVersion')
+    assert update['ExpressionAttributeValues'][':expectedVersion'] == 3
+
+
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version', side_effect=RuntimeError('throttled'))
+@patch('nodes_update_handler.nodes_table')
+def test_failed_tree_version_bump_keeps_the_edit(mock_nodes_table, mock_bump, mock_record):
+    mock_nodes_table.update_item.return_value = {'Attributes': {'nodeId': 'n1', 's3Key': 'k'}}
+
+    response = nodes_update_handler.lambda_handler(_event({'title': 'new'}), None)
+
+    assert response['statusCode'] == 200
+    assert mock_record.call_args.args[4] is None
+
+
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version', return_value=12)
+@patch('nodes_update_handler.place_node', return_value=('a1', 2, {}))
+@patch('nodes_update_handler.uses_order_keys', return_value=True)
+@patch('nodes_update_handler.nodes_table')
+def test_rank_change_reads_only_the_current_parent(mock_nodes_table, mock_order_keys, mock_place, mock_bump,
+                                                   mock_record):
+    mock_nodes_table.get_item.return_value = {'Item': {'parentNodeId': 'p'}}
+    mock_nodes_table.update_item.return_value = {'Attributes': {'nodeId': 'n1', 'parentNodeId': 'p', 's3Key': 'k'}}
+
+    response = nodes_update_handler.lambda_handler(_event({'afterNodeId': 'n2'}), None)
+
+    assert response['statusCode'] == 200
+    assert mock_nodes_table.get_item.call_args.kwargs['ProjectionExpression'] == 'parentNodeId'
+    assert mock_place.call_args.args[2] == 'p'
+    assert mock_nodes_table.update_item.call_args.kwargs['ExpressionAttributeValues'][':ok'] == 'a1'
+
+
+@patch('nodes_update_handler.record_tree_change')
+@patch('nodes_update_handler.bump_tree_version', return_value=12)
+@patch('nodes_update_handler.rewrite_subtree_paths')
+@patch('nodes_update_handler.resolve_path', return_value='/p')
+@patch('nodes_update_handler.load_ancestry', return_value=[{'nodeId': 'p'}])
+@patch('nodes_update_handler.uses_order_keys', return_value=False)
+@patch('nodes_update_handler.nodes_table')
+def test_resending_the_current_parent_leaves_descendant_paths_alone(mock_nodes_table, mock_order_keys, mock_ancestry,
+                                                                    mock_resolve, mock_rewrite, mock_bump,
+                                                                    mock_record):
+    mock_nodes_table.update_item.return_value = {'Attributes': {'nodeId': 'n1', 'parentNodeId': 'p',
+                                                                'path': '/p/n1', 's3Key': 'k'}}
+
+    response = nodes_update_handler.lambda_handler(_event({'parentNodeId': 'p', 'orderIndex': 2}), None)
+
+    assert response['statusCode'] == 200
+    assert mock_nodes_table.update_item.call_args.kwargs['ExpressionAttributeValues'][':path'] == '/p/n1'
+    mock_rewrite.assert_not_called()
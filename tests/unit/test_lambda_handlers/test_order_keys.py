@@ -0,0 +1,74 @@
+import random
+from unittest.mock import MagicMock, patch
+import pytest
+from utils.order_keys import (
+    MAX_ORDER_KEY_LENGTH, key_between, permute_keys, place_node, spread_keys
+)
+
+
+def test_random_inserts_keep_keys_strictly_ordered():
+    rng = random.Random(7)
+    keys = []
+    for _ in range(3000):
+        position = rng.randint(0, len(keys))
+        before = keys[position - 1] if position else None
+        after = keys[position] if position < len(keys) else None
+        key = key_between(before, after)
+        assert (before is None or before < key) and (after is None or key < after)
+        assert not key.endswith('0')
+        keys.insert(position, key)
+    assert keys == sorted(keys)
+
+
+def test_appends_and_prepends_stay_short():
+    last = first = key_between(None, None)
+    for _ in range(500):
+        last = key_between(last, None)
+        first = key_between(None, first)
+    assert len(last) <= 10
+    assert len(first) <= 10
+
+
+def test_key_between_rejects_keys_out_of_order():
+    with pytest.raises(ValueError):
+        key_between('b', 'a')
+
+
+def test_spread_keys_are_short_and_ascending():
+    keys = spread_keys(5000)
+    assert keys == sorted(set(keys))
+    assert max(len(key) for key in keys) == 3
+
+
+@patch('utils.order_keys.load_children')
+def test_place_node_rebalances_when_the_key_gets_too_long(mock_load_children):
+    low = 'V' * MAX_ORDER_KEY_LENGTH
+    high = low + '1'
+    mock_load_children.return_value = {'p': [
+        {'nodeId': 'a', 'orderKey': low}, {'nodeId': 'b', 'orderKey': high}
+    ]}
+    table = MagicMock()
+
+    key, index, rebalanced = place_node(table, 's1', 'p', 'new', after_id='a')
+
+    assert index == 1
+    assert rebalanced['a'] < key < rebalanced['b']
+    assert table.update_item.call_count == 2
+
+
+@patch('utils.order_keys.load_children')
+def test_place_node_between_neighbours_writes_nothing_else(mock_load_children):
+    mock_load_children.return_value = {'p': [{'nodeId': 'a', 'orderKey': 'A'}, {'nodeId': 'b', 'orderKey': 'B'}]}
+    table = MagicMock()
+
+    key, index, rebalanced = place_node(table, 's1', 'p', 'new', position=1)
+
+    assert 'A' < key < 'B' and index == 1 and rebalanced == {}
+    table.update_item.assert_not_called()
+
+
+def test_permute_keys_trades_slots_of_the_listed_nodes():
+    siblings = [{'nodeId': node_id, 'orderKey': key} for node_id, key in (('a', 'A'), ('b', 'B'), ('c', 'C'))]
+
+    assert permute_keys(siblings, ['c', 'a']) == {'c': 'A', 'a': 'C'}
+    assert permute_keys(siblings, ['a', 'c']) == {}
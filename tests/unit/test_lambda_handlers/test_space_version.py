@@ -0,0 +1,54 @@
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from utils import space_version
+
+
+def test_bump_tree_version_uses_atomic_add():
+    table = MagicMock()
+    table.update_item.return_value = {'Attributes': {'treeVersion': 8}}
+
+    assert space_version.bump_tree_version(table, 's1') == 8
+    kwargs = table.update_item.call_args.kwargs
+    assert kwargs['Key'] == {'PK': 'SPACE#s1', 'SK': 'META'}
+    assert kwargs['UpdateExpression'] == 'ADD treeVersion :one'
+
+
+def test_bump_tree_version_returns_none_for_missing_space():
+    table = MagicMock()
+    table.update_item.side_effect = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+
+    assert space_version.bump_tree_version(table, 's1') is None
+
+
+def test_tree_version_operation_adds_one_and_records_the_result_under_the_token():
+    update = space_version.tree_version_operation('Spaces', 's1', 'abc')['Update']
+
+    assert update['Key'] == {'PK': {'S': 'SPACE#s1'}, 'SK': {'S': 'META'}}
+    assert update['UpdateExpression'] == 'SET #write = if_not_exists(treeVersion, :zero) + :one ADD treeVersion :one'
+    assert update['ConditionExpression'] == 'attribute_exists(PK)'
+    assert update['ExpressionAttributeNames'] == {'#write': 'treeWrite_abc'}
+
+
+def test_claim_tree_version_removes_the_recorded_result():
+    table = MagicMock()
+    table.update_item.return_value = {'Attributes': {'treeWrite_abc': 9}}
+
+    assert space_version.claim_tree_version(table, 's1', 'abc') == 9
+    kwargs = table.update_item.call_args.kwargs
+    assert kwargs['UpdateExpression'] == 'REMOVE #write'
+    assert kwargs['ExpressionAttributeNames'] == {'#write': 'treeWrite_abc'}
+    assert kwargs['ReturnValues'] == 'UPDATED_OLD'
+
+
+def test_etag_changes_with_version_and_name():
+    etag = space_version.tree_etag({'name': 'A', 'treeVersion': 1})
+    assert etag != space_version.tree_etag({'name': 'A', 'treeVersion': 2})
+    assert etag != space_version.tree_etag({'name': 'B', 'treeVersion': 1})
+
+
+def test_etag_matches_lists_and_weak_validators():
+    etag = space_version.tree_etag({'name': 'A', 'treeVersion': 1})
+    assert space_version.etag_matches(f'"x", W/{etag}', etag)
+    assert space_version.etag_matches('*', etag)
+    assert not space_version.etag_matches('"other"', etag)
+    assert not space_version.etag_matches(None, etag)
@@ -0,0 +1,88 @@
+import datetime
+import json
+from unittest.mock import MagicMock, patch
+import spaces_changes_handler as handler
+
+
+def make_event(since, limit=None):
+    params = {'since': since}
+    if limit:
+        params['limit'] = limit
+    return {'pathParameters': {'spaceId': 's1'}, 'queryStringParameters': params, 'headers': {}}
+
+
+def spaces_table(tree_version, records):
+    table = MagicMock()
+    table.get_item.return_value = {'Item': {'PK': 'SPACE#s1', 'SK': 'META', 'treeVersion': tree_version}}
+    table.query.return_value = {'Items': records}
+    return table
+
+
+def test_returns_collapsed_changes_since_version():
+    table = spaces_table(3, [
+        {'version': 2, 'changes': [{'op': 'created', 'nodeId': 'a', 'node': {'title': 'A'}}]},
+        {'version': 3, 'changes': [{'op': 'deleted', 'nodeId': 'b'}]},
+    ])
+    with patch.object(handler, 'spaces_table', table):
+        response = handler.lambda_handler(make_event('1'), None)
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['nextSince'] == 3 and body['treeVersion'] == 3 and not body['hasMore']
+    assert [c['op'] for c in body['changes']] == ['created', 'deleted']
+
+
+def recent(seconds=0):
+    return (datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)).isoformat()
+
+
+def test_gap_in_log_requires_reset():
+    # Versions 1 and 2 have expired from the log
+    table = spaces_table(3, [{'version': 3, 'changes': [], 'changedAt': recent()}])
+    table.get_item.side_effect = [table.get_item.return_value, {}]
+    with patch.object(handler, 'spaces_table', table):
+        response = handler.lambda_handler(make_event('1'), None)
+
+    assert response['statusCode'] == 410
+    assert json.loads(response['body'])['resetRequired'] is True
+
+
+def test_version_not_recorded_yet_is_served_as_pending():
+    # Version 3 has committed but its writer has not recorded it yet; version 4 has
+    table = spaces_table(4, [
+        {'version': 2, 'changes': [{'op': 'created', 'nodeId': 'a', 'node': {'title': 'A'}}], 'changedAt': recent()},
+        {'version': 4, 'changes': [{'op': 'deleted', 'nodeId': 'b'}], 'changedAt': recent()},
+    ])
+    with patch.object(handler, 'spaces_table', table):
+        response = handler.lambda_handler(make_event('1'), None)
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['nextSince'] == 2 and body['hasMore'] and body['pendingVersion'] == 3
+    assert [c['nodeId'] for c in body['changes']] == ['a']
+
+
+def test_version_missing_past_the_pending_window_requires_reset():
+    table = spaces_table(3, [
+        {'version': 3, 'changes': [], 'changedAt': recent(handler.PENDING_CHANGE_SECONDS + 5)},
+    ])
+    with patch.object(handler, 'spaces_table', table):
+        response = handler.lambda_handler(make_event('1'), None)
+
+    assert response['statusCode'] == 410
+
+
+def test_client_up_to_date_gets_empty_feed():
+    table = spaces_table(4, [])
+    with patch.object(handler, 'spaces_table', table):
+        response = handler.lambda_handler(make_event('4'), None)
+
+    body = json.loads(response['body'])
+    assert body['changes'] == [] and body['nextSince'] == 4
+
+
+def test_rejects_invalid_since():
+    with patch.object(handler, 'spaces_table', MagicMock()):
+        response = handler.lambda_handler(make_event('yesterday'), None)
+
+    assert response['statusCode'] == 400
@@ -0,0 +1,49 @@
+import json
+from unittest.mock import patch
+import spaces_delete_handler
+
+
+@patch('spaces_delete_handler.dynamodb')
+@patch('spaces_delete_handler.s3_client')
+@patch('spaces_delete_handler.purge_content_records')
+@patch('spaces_delete_handler.purge_change_log')
+@patch('spaces_delete_handler.spaces_table')
+@patch('spaces_delete_handler.nodes_table')
+def test_small_space_is_deleted_in_request(mock_nodes_table, mock_spaces_table, mock_purge, mock_purge_records,
+                                           mock_s3, mock_dynamodb):
+    mock_nodes_table.query.return_value = {'Items': [{'nodeId': 'a', 'contentS3Key': 'nodes/a/content.html'}, {'nodeId': 'b'}]}
+    mock_s3.delete_objects.return_value = {}
+    mock_dynamodb.batch_write_item.return_value = {}
+    mock_s3.get_paginator.return_value.paginate.side_effect = lambda Bucket, Prefix: (
+        [{'Contents': [{'Key': 's1/b.html'}]}] if Prefix == 's1/' else [{}])
+
+    response = spaces_delete_handler.lambda_handler({'pathParameters': {'spaceId': 's1'}}, None)
+
+    assert response['statusCode'] == 204
+    mock_nodes_table.scan.assert_not_called()
+    assert mock_nodes_table.query.call_args.kwargs['IndexName'] == 'SpaceIdNodesIndex'
+    requests = mock_dynamodb.batch_write_item.call_args.kwargs['RequestItems'][spaces_delete_handler.nodes_table_name]
+    assert [request['DeleteRequest']['Key'] for request in requests] == [
+        {'nodeId': 'a', 'spaceId': 's1'}, {'nodeId': 'b', 'spaceId': 's1'}]
+    mock_spaces_table.delete_item.assert_called_once_with(Key={'PK': 'SPACE#s1', 'SK': 'META'})
+    purged = [[obj['Key'] for obj in call.kwargs['Delete']['Objects']] for call in mock_s3.delete_objects.call_args_list]
+    assert purged == [['nodes/a/content.html'], ['s1/b.html']]
+    mock_purge_records.assert_called_once_with(mock_spaces_table, 's1')
+
+
+@patch('spaces_delete_handler.lambda_client')
+@patch('spaces_delete_handler.spaces_table')
+@patch('spaces_delete_handler.nodes_table')
+def test_large_space_is_hidden_and_handed_to_delete_worker(mock_nodes_table, mock_spaces_table, mock_lambda):
+    mock_nodes_table.query.return_value = {'Items': [{'nodeId': f'n{i}'} for i in range(3)], 'LastEvaluatedKey': {'k': 1}}
+
+    with patch.object(spaces_delete_handler, 'DELETE_ASYNC_THRESHOLD', 2):
+        response = spaces_delete_handler.lambda_handler({'pathParameters': {'spaceId': 's1'}}, None)
+
+    assert response['statusCode'] == 202
+    assert mock_nodes_table.query.call_count == 1
+    mock_spaces_table.delete_item.assert_called_once_with(Key={'PK': 'SPACE#s1', 'SK': 'META'})
+    job = mock_spaces_table.put_item.call_args.kwargs['Item']
+    assert job['jobType'] == 'deleteSpace' and job['jobId'] == json.loads(response['body'])['jobId']
+    mock_nodes_table.batch_writer.assert_not_called()
+    mock_lambda.invoke.assert_called_once()
@@ -0,0 +1,252 @@
+import io
+import json
+from unittest.mock import patch, MagicMock
+import pytest
+from botocore.exceptions import ClientError
+import spaces_tree_handler
+from utils.tree_cache import TreeCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_tree_cache():
+    with patch.object(spaces_tree_handler, 'tree_cache', TreeCache()) as cache:
+        yield cache
+
+
+def _space_table(name='My Space', tree_version=0):
+    table = MagicMock()
+    table.get_item.return_value = {'Item': {'PK': 'SPACE#s1', 'SK': 'META', 'name': name, 'treeVersion': tree_version}}
+    return table
+
+
+def _event(space_id='s1', headers=None):
+    return {'pathParameters': {'spaceId': space_id}, 'headers': headers or {}}
+
+
+def _no_snapshot(s3):
+    s3.get_object.side_effect = ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+    return s3
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_tree_is_loaded_with_paginated_gsi_query(mock_dynamodb, mock_s3):
+    _no_snapshot(mock_s3)
+    nodes_table = MagicMock()
+    nodes_table.query.side_effect = [
+        {'Items': [{'nodeId': 'root', 'title': 'Root', 'orderIndex': 0}], 'LastEvaluatedKey': {'k': 1}},
+        {'Items': [{'nodeId': 'child', 'title': 'Child', 'parentNodeId': 'root', 'orderIndex': 0}]},
+    ]
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table()
+
+    response = spaces_tree_handler.lambda_handler(_event(), None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['nodes'][0]['nodeId'] == 'root'
+    assert body['nodes'][0]['children'][0]['nodeId'] == 'child'
+    nodes_table.scan.assert_not_called()
+    assert nodes_table.query.call_count == 2
+    first_call, second_call = nodes_table.query.call_args_list
+    assert first_call.kwargs['IndexName'] == 'SpaceIdNodesIndex'
+    assert 'ProjectionExpression' in first_call.kwargs
+    assert second_call.kwargs['ExclusiveStartKey'] == {'k': 1}
+    # The rebuilt snapshot is stored for later reads without clobbering a concurrent one
+    assert mock_s3.put_object.call_args.kwargs['IfNoneMatch'] == '*'
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_tree_is_served_from_snapshot(mock_dynamodb, mock_s3):
+    nodes_table = MagicMock()
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table()
+    snapshot = {'spaceId': 's1', 'nodes': {
+        'b': {'title': 'B', 'parentNodeId': None, 'orderIndex': 1},
+        'a': {'title': 'A', 'parentNodeId': None, 'orderIndex': 0},
+    }}
+    mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(snapshot).encode('utf-8')), 'ETag': '"e"'}
+
+    response = spaces_tree_handler.lambda_handler(_event(), None)
+
+    assert [n['nodeId'] for n in json.loads(response['body'])['nodes']] == ['a', 'b']
+    nodes_table.query.assert_not_called()
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_stale_snapshot_is_rebuilt_from_nodes(mock_dynamodb, mock_s3):
+    nodes_table = MagicMock()
+    nodes_table.query.return_value = {'Items': [{'nodeId': 'a', 'title': 'A', 'orderIndex': 0}]}
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table(tree_version=3)
+    stale = {'spaceId': 's1', 'treeVersion': 2, 'nodes': {}}
+    mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(stale).encode('utf-8')), 'ETag': '"old"'}
+
+    response = spaces_tree_handler.lambda_handler(_event(), None)
+
+    assert [n['nodeId'] for n in json.loads(response['body'])['nodes']] == ['a']
+    put_kwargs = mock_s3.put_object.call_args.kwargs
+    assert put_kwargs['IfMatch'] == '"old"'
+    assert json.loads(put_kwargs['Body'])['treeVersion'] == 3
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_matching_if_none_match_returns_304_from_meta_read(mock_dynamodb, mock_s3):
+    nodes_table = MagicMock()
+    nodes_table.query.return_value = {'Items': []}
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table(tree_version=7)
+    _no_snapshot(mock_s3)
+    first = spaces_tree_handler.lambda_handler(_event(), None)
+    etag = first['headers']['ETag']
+    nodes_table.reset_mock()
+    mock_s3.reset_mock()
+
+    response = spaces_tree_handler.lambda_handler(_event(headers={'if-none-match': etag}), None)
+
+    assert response['statusCode'] == 304
+    assert response['headers']['ETag'] == etag
+    assert response['body'] == ''
+    nodes_table.query.assert_not_called()
+    mock_s3.get_object.assert_not_called()
+
+
+@patch('spaces_tree_handler.dynamodb')
+def test_missing_space_returns_404(mock_dynamodb):
+    space_table = MagicMock()
+    space_table.get_item.return_value = {}
+    mock_dynamodb.Table.return_value = space_table
+
+    response = spaces_tree_handler.lambda_handler(_event(), None)
+
+    assert response['statusCode'] == 404
+
+
+def test_missing_space_id_returns_400():
+    response = spaces_tree_handler.lambda_handler({'pathParameters': {}}, None)
+    assert response['statusCode'] == 400
+
+
+@patch('spaces_tree_handler.load_subtree')
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_depth_limited_fetch_marks_expandable_nodes(mock_dynamodb, mock_s3, mock_load_subtree):
+    mock_dynamodb.Table.side_effect = lambda name: MagicMock() if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table()
+    mock_load_subtree.return_value = ([
+        {'nodeId': 'r', 'title': 'R', 'parentNodeId': 'p', 'orderIndex': 0},
+        {'nodeId': 'c', 'title': 'C', 'parentNodeId': 'r', 'orderIndex': 0},
+    ], {'c'})
+    event = dict(_event(), queryStringParameters={'rootNodeId': 'r', 'depth': '1'})
+
+    response = spaces_tree_handler.lambda_handler(event, None)
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert mock_load_subtree.call_args.kwargs['depth'] == 1
+    root = body['nodes'][0]
+    assert root['nodeId'] == 'r' and root['hasChildren']
+    assert root['children'][0]['hasChildren'] is True
+    mock_s3.get_object.assert_not_called()
+
+
+def test_invalid_depth_returns_400():
+    event = dict(_event(), queryStringParameters={'depth': '-1'})
+    assert spaces_tree_handler.lambda_handler(event, None)['statusCode'] == 400
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_warm_cache_is_reused_until_version_changes(mock_dynamodb, mock_s3, fresh_tree_cache):
+    _no_snapshot(mock_s3)
+    nodes_table = MagicMock()
+    nodes_table.query.return_value = {'Items': [{'nodeId': 'a', 'title': 'A', 'orderIndex': 0}]}
+    space_tables = [_space_table(tree_version=1), _space_table(tree_version=1), _space_table(tree_version=2)]
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else space_tables[0]
+
+    first = spaces_tree_handler.lambda_handler(_event(), None)
+    second = spaces_tree_handler.lambda_handler(_event(), None)
+    assert second['body'] == first['body']
+    assert nodes_table.query.call_count == 1
+
+    space_tables.pop(0)
+    space_tables.pop(0)
+    third = spaces_tree_handler.lambda_handler(_event(), None)
+    assert json.loads(third['body'])['treeVersion'] == 2
+    assert fresh_tree_cache.metrics()['cache_hits'] == 1
+    assert fresh_tree_cache.metrics()['cache_stale'] == 1
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_large_tree_is_gzipped_when_accepted(mock_dynamodb, mock_s3):
+    import base64
+    import gzip
+    _no_snapshot(mock_s3)
+    nodes_table = MagicMock()
+    nodes_table.query.return_value = {'Items': [
+        {'nodeId': f'n{i}', 'title': f'Node {i}', 'orderIndex': i} for i in range(200)
+    ]}
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table()
+
+    response = spaces_tree_handler.lambda_handler(_event(headers={'Accept-Encoding': 'gzip'}), None)
+
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert response['headers']['Vary'] == 'Accept-Encoding'
+    body = json.loads(gzip.decompress(base64.b64decode(response['body'])))
+    assert len(body['nodes']) == 200
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_include_preview_inlines_content_in_one_response(mock_dynamodb, mock_s3):
+    nodes_table = MagicMock()
+    nodes_table.query.return_value = {'Items': [
+        {'nodeId': 'a', 'title': 'A', 'orderIndex': 0, 'contentPreview': '<p>A</p>'},
+        {'nodeId': 'b', 'title': 'B', 'parentNodeId': 'a', 'orderIndex': 0, 's3Key': 's1/b.html'},
+    ]}
+    mock_s3.get_object.return_value = {'Body': io.BytesIO(b'<p>B body</p>')}
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table()
+    event = dict(_event(headers={'If-None-Match': spaces_tree_handler.tree_etag({'name': 'My Space', 'treeVersion': 0})}),
+                 queryStringParameters={'include': 'preview'})
+
+    response = spaces_tree_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert 'ETag' not in response['headers']
+    root = json.loads(response['body'])['nodes'][0]
+    assert root['contentPreview'] == '<p>A</p>'
+    assert root['children'][0]['contentPreview'] == '<p>B body</p>'
+    assert 'contentPreview' in nodes_table.query.call_args.kwargs['ExpressionAttributeNames'].values()
+
+
+@patch('spaces_tree_handler.s3_client')
+@patch('spaces_tree_handler.dynamodb')
+def test_columnar_format_is_cached_separately(mock_dynamodb, mock_s3):
+    _no_snapshot(mock_s3)
+    nodes_table = MagicMock()
+    nodes_table.query.return_value = {'Items': [
+        {'nodeId': 'root', 'title': 'Root', 'orderIndex': 0},
+        {'nodeId': 'child', 'title': 'Child', 'parentNodeId': 'root', 'orderIndex': 0},
+    ]}
+    mock_dynamodb.Table.side_effect = lambda name: nodes_table if name == spaces_tree_handler.NODES_TABLE_NAME else _space_table()
+
+    nested = json.loads(spaces_tree_handler.lambda_handler(_event(), None)['body'])
+    event = dict(_event(), queryStringParameters={'format': 'columnar'})
+    columnar = json.loads(spaces_tree_handler.lambda_handler(event, None)['body'])
+
+    assert nested['nodes'][0]['children'][0]['nodeId'] == 'child'
+    assert columnar['format'] == 'columnar'
+    assert columnar['nodes']['ids'] == ['root', 'child']
+    assert columnar['nodes']['parents'] == [-1, 0]
+    assert spaces_tree_handler.lambda_handler(event, None)['body'] == json.dumps(columnar)
+    assert nodes_table.query.call_count == 2
+
+
+def test_unknown_format_returns_400():
+    event = dict(_event(), queryStringParameters={'format': 'xml'})
+    assert spaces_tree_handler.lambda_handler(event, None)['statusCode'] == 400
+
+
+def test_unknown_include_returns_400():
+    event = dict(_event(), queryStringParameters={'include': 'everything'})
+    assert spaces_tree_handler.lambda_handler(event, None)['statusCode'] == 400
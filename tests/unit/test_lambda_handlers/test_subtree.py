@@ -0,0 +1,153 @@
+from unittest.mock import MagicMock, patch
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+from utils.node_deletion import collect_subtree
+from utils.node_paths import MAX_PATH_BYTES
+from utils.subtree import batch_get_nodes, discover_subtree, load_descendants, load_subtree
+
+# root -> a -> a1 -> a1x
+#      -> b
+CHILDREN = {'root': ['a', 'b'], 'a': ['a1'], 'a1': ['a1x']}
+
+
+def _nodes_table():
+    table = MagicMock()
+
+    def query(**kwargs):
+        parent_id = kwargs['KeyConditionExpression'].get_expression()['values'][1]
+        child_ids = CHILDREN.get(parent_id, [])[:kwargs.get('Limit')]
+        return {'Items': [{'nodeId': c, 'parentNodeId': parent_id, 'orderIndex': i} for i, c in enumerate(child_ids)]}
+
+    table.query.side_effect = query
+    table.get_item.return_value = {'Item': {'nodeId': 'root', 'orderIndex': 0}}
+    return table
+
+
+def test_walk_stops_at_depth_and_reports_expandable_nodes():
+    table = _nodes_table()
+
+    items, expandable = load_subtree(table, 's1', root_node_id='root', depth=1)
+
+    assert sorted(item['nodeId'] for item in items) == ['a', 'b', 'root']
+    assert expandable == {'a'}
+    assert all(call.kwargs['IndexName'] == 'ParentNodeIdIndex' for call in table.query.call_args_list)
+
+
+def test_walk_without_depth_loads_whole_subtree():
+    items, expandable = load_subtree(_nodes_table(), 's1', root_node_id='root')
+
+    assert len(items) == 5
+    assert expandable == set()
+
+
+def test_missing_root_returns_none():
+    table = _nodes_table()
+    table.get_item.return_value = {}
+
+    assert load_subtree(table, 's1', root_node_id='nope', depth=1) is None
+
+
+def test_discover_subtree_walks_every_level():
+    table = _nodes_table()
+
+    assert discover_subtree(table, 's1', 'root') == ['root', 'a', 'b', 'a1', 'a1x']
+    assert all('Limit' not in call.kwargs for call in table.query.call_args_list)
+
+
+@patch('utils.node_queries.time.sleep')
+def test_batch_get_nodes_chunks_keys_and_retries_unprocessed(mock_sleep):
+    dynamodb = MagicMock()
+    calls = []
+
+    def batch_get_item(RequestItems, **kwargs):
+        keys = RequestItems['Nodes']['Keys']
+        calls.append(len(keys))
+        unprocessed = keys[-1:] if len(calls) == 1 else []
+        return {
+            'Responses': {'Nodes': [{'nodeId': key['nodeId']} for key in keys if key not in unprocessed]},
+            'UnprocessedKeys': {'Nodes': dict(RequestItems['Nodes'], Keys=unprocessed)} if unprocessed else {}
+        }
+
+    dynamodb.batch_get_item.side_effect = batch_get_item
+
+    with patch('utils.subtree.QUERY_CONCURRENCY', 1):
+        nodes = batch_get_nodes(dynamodb, 'Nodes', 's1', [f'n{i}' for i in range(150)], fields=('nodeId',))
+
+    assert len(nodes) == 150
+    assert calls == [100, 1, 50]
+    mock_sleep.assert_called_once()
+
+
+def test_walk_skips_tombstoned_children_and_hidden_roots():
+    table = _nodes_table()
+
+    load_subtree(table, 's1', root_node_id='root', depth=1)
+    builder = ConditionExpressionBuilder()
+    filters = [builder.build_expression(call.kwargs['FilterExpression']) for call in table.query.call_args_list]
+    assert all('deletedAt' in expression.attribute_name_placeholders.values() for expression in filters)
+
+    table.get_item.return_value = {'Item': {'nodeId': 'root', 'deletedAt': '2024-01-01T00:00:00.000000'}}
+    assert load_subtree(table, 's1', root_node_id='root', depth=1) is None
+
+
+def test_root_with_path_loads_subtree_with_one_index_query():
+    table = _nodes_table()
+    table.get_item.return_value = {'Item': {'nodeId': 'root', 'path': '/root'}}
+    descendants = [
+        {'nodeId': 'a', 'parentNodeId': 'root', 'path': '/root/a'},
+        {'nodeId': 'a1', 'parentNodeId': 'a', 'path': '/root/a/a1'},
+        {'nodeId': 'b', 'parentNodeId': 'root', 'path': '/root/b', 'deletedAt': '2024-01-01T00:00:00.000000'},
+    ]
+    table.query.side_effect = lambda **kwargs: {'Items': descendants}
+
+    items, expandable = load_subtree(table, 's1', root_node_id='root')
+
+    assert [item['nodeId'] for item in items] == ['root', 'a', 'a1']
+    assert expandable == set()
+    assert [call.kwargs['IndexName'] for call in table.query.call_args_list] == ['SpacePathIndex']
+
+
+def test_path_query_continues_with_walk_below_frontier_nodes():
+    table = _nodes_table()
+    deep_path = '/root/' + 'x' * (MAX_PATH_BYTES - 20)
+    walk = table.query.side_effect
+
+    def query(**kwargs):
+        if kwargs['IndexName'] == 'SpacePathIndex':
+            return {'Items': [{'nodeId': 'a', 'parentNodeId': 'root', 'path': deep_path}]}
+        return walk(**kwargs)
+
+    table.query.side_effect = query
+
+    items = load_descendants(table, 's1', {'nodeId': 'root', 'path': '/root'})
+
+    assert [item['nodeId'] for item in items] == ['a', 'a1', 'a1x']
+
+
+def test_path_matches_outside_the_parent_chain_are_dropped():
+    table = _nodes_table()
+    # 'z' was moved elsewhere and its path rewrite failed; 'z1' hangs below it
+    table.query.side_effect = lambda **kwargs: {'Items': [
+        {'nodeId': 'a', 'parentNodeId': 'root', 'path': '/root/a'},
+        {'nodeId': 'a1', 'parentNodeId': 'a', 'path': '/root/a/a1'},
+        {'nodeId': 'z', 'parentNodeId': 'elsewhere', 'path': '/root/a/z'},
+        {'nodeId': 'z1', 'parentNodeId': 'z', 'path': '/root/a/z/z1'},
+    ]}
+
+    items = load_descendants(table, 's1', {'nodeId': 'root', 'path': '/root'})
+
+    assert [item['nodeId'] for item in items] == ['a', 'a1']
+
+
+def test_collect_subtree_walks_parents_even_below_a_root_with_path():
+    table = _nodes_table()
+    table.name = 'Nodes'
+    table.get_item.return_value = {'Item': {'nodeId': 'root', 'path': '/root'}}
+    dynamodb = MagicMock()
+    dynamodb.batch_get_item.side_effect = lambda RequestItems, **kwargs: {
+        'Responses': {'Nodes': [{'nodeId': key['nodeId']} for key in RequestItems['Nodes']['Keys']]}
+    }
+
+    nodes = collect_subtree(dynamodb, table, 's1', 'root')
+
+    assert [item['nodeId'] for item in nodes] == ['root', 'a', 'b', 'a1', 'a1x']
+    assert all(call.kwargs['IndexName'] == 'ParentNodeIdIndex' for call in table.query.call_args_list)
@@ -0,0 +1,29 @@
+from unittest.mock import MagicMock
+from utils.tombstones import is_hidden, visible_items
+
+
+def test_visible_items_drops_tombstoned_subtrees():
+    items = [
+        {'nodeId': 'a'},
+        {'nodeId': 'b', 'parentNodeId': 'a', 'deletedAt': '2024-01-01T00:00:00.000000'},
+        {'nodeId': 'c', 'parentNodeId': 'b'},
+        {'nodeId': 'd', 'parentNodeId': 'c'},
+        {'nodeId': 'e', 'parentNodeId': 'a'},
+    ]
+
+    assert [item['nodeId'] for item in visible_items(items)] == ['a', 'e']
+
+
+def test_is_hidden_walks_ancestors_until_a_tombstone():
+    ancestors = {
+        'p': {'nodeId': 'p', 'parentNodeId': 'gp'},
+        'gp': {'nodeId': 'gp', 'deletedAt': '2024-01-01T00:00:00.000000'},
+    }
+    table = MagicMock()
+    table.get_item.side_effect = lambda Key, **kwargs: {'Item': ancestors[Key['nodeId']]}
+
+    assert is_hidden(table, 's1', {'nodeId': 'n', 'parentNodeId': 'p'})
+    assert table.get_item.call_count == 2
+
+    ancestors['gp'] = {'nodeId': 'gp'}
+    assert not is_hidden(table, 's1', {'nodeId': 'n', 'parentNodeId': 'p'})
@@ -0,0 +1,77 @@
+import json
+from decimal import Decimal
+from utils.tree_builder import assemble_tree, columnar_tree, dumps_tree
+
+
+def _node(node_id, parent=None, order=0, title=None):
+    return {'nodeId': node_id, 'parentNodeId': parent, 'orderIndex': order, 'title': title or node_id}
+
+
+def test_siblings_are_ordered_and_json_matches_dict_form():
+    tree = assemble_tree([
+        _node('r2', order=Decimal(1)), _node('r1', order=0),
+        _node('b', 'r1', 2), _node('a', 'r1', 1, title='Ä "quoted"'),
+    ])
+
+    assert [root.node_id for root in tree.roots] == ['r1', 'r2']
+    assert [child.node_id for child in tree.roots[0].children] == ['a', 'b']
+    assert dumps_tree(tree.roots) == json.dumps(tree.to_dicts())
+    assert json.loads(dumps_tree(tree.roots))[1]['orderIndex'] == 1
+
+
+def test_deep_chain_does_not_recurse():
+    depth = 50_000
+    items = [_node('n0')] + [_node(f'n{i}', f'n{i - 1}') for i in range(1, depth)]
+
+    tree = assemble_tree(items)
+    encoded = dumps_tree(tree.roots)
+
+    assert tree.node_count == depth
+    assert encoded.count('"nodeId"') == depth
+
+
+def test_orphans_and_cycles_are_reported():
+    tree = assemble_tree([
+        _node('root'), _node('lost', 'missing'), _node('under-lost', 'lost'),
+        _node('x', 'y'), _node('y', 'x'), _node('z', 'x'),
+    ])
+
+    assert [root.node_id for root in tree.roots] == ['root']
+    assert tree.orphans == ['lost']
+    assert tree.cycles == ['x', 'y', 'z']
+    assert [root.node_id for root in assemble_tree([_node('lost', 'missing')], keep_orphans=True).roots] == ['lost']
+
+
+def test_partial_tree_flags_expandable_nodes():
+    tree = assemble_tree([_node('top', 'above'), _node('leaf', 'top')],
+                         root_ids={'top'}, expandable_ids={'leaf'})
+
+    top = tree.to_dicts()[0]
+    assert top['hasChildren'] and top['children'][0]['hasChildren']
+    assert tree.orphans == []
+
+
+def test_columnar_form_lists_parents_before_children():
+    tree = assemble_tree([
+        _node('r', title='Same'), _node('b', 'r', 2, title='Same'), _node('a', 'r', 1), _node('c', 'a'),
+    ])
+
+    columns = columnar_tree(tree.roots)
+
+    assert columns['ids'] == ['r', 'a', 'b', 'c']
+    assert columns['parents'] == [-1, 0, 0, 1]
+    assert [columns['strings'][i] for i in columns['titles']] == ['Same', 'a', 'Same', 'c']
+    assert len(columns['strings']) == 3
+
+
+def test_order_keys_decide_sibling_order_and_positions_are_reported():
+    items = [
+        {'nodeId': 'r', 'title': 'R', 'orderKey': 'V'},
+        {'nodeId': 'a', 'title': 'A', 'parentNodeId': 'r', 'orderIndex': 0, 'orderKey': 'k'},
+        {'nodeId': 'b', 'title': 'B', 'parentNodeId': 'r', 'orderIndex': 5, 'orderKey': 'P'},
+        {'nodeId': 'c', 'title': 'C', 'parentNodeId': 'r', 'orderIndex': 9, 'orderKey': 'PV'},
+    ]
+
+    root = assemble_tree(items).to_dicts()[0]
+
+    assert [(child['nodeId'], child['orderIndex']) for child in root['children']] == [('b', 0), ('c', 1), ('a', 2)]
@@ -0,0 +1,31 @@
+from utils.tree_cache import TreeCache
+
+
+def test_lru_evicts_by_size_and_counts():
+    cache = TreeCache(max_bytes=10)
+    cache.put('a', 'v1', 'AAAA', 4)
+    cache.put('b', 'v1', 'BBBB', 4)
+    assert cache.get('a', 'v1') == 'AAAA'  # a becomes most recently used
+
+    cache.put('c', 'v1', 'CCCC', 4)
+
+    assert cache.get('b', 'v1') is None
+    assert cache.get('a', 'v1') == 'AAAA'
+    metrics = cache.metrics()
+    assert metrics['cache_evictions'] == 1
+    assert metrics['cache_bytes'] == 8
+
+
+def test_entry_from_other_version_is_dropped():
+    cache = TreeCache()
+    cache.put('a', 'v1', 'old', 3)
+
+    assert cache.get('a', 'v2') is None
+    assert cache.get('a', 'v1') is None
+    assert cache.metrics()['cache_stale'] == 1
+
+
+def test_oversized_value_is_not_cached():
+    cache = TreeCache(max_bytes=2)
+    cache.put('a', 'v1', 'xxx', 3)
+    assert cache.metrics()['cache_entries'] == 0
@@ -0,0 +1,95 @@
+import io
+import json
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from utils import tree_snapshot
+
+
+def _client_error(code):
+    return ClientError({'Error': {'Code': code}}, 'PutObject')
+
+
+def _stored(doc, etag='"e1"'):
+    return {'Body': io.BytesIO(json.dumps(doc).encode('utf-8')), 'ETag': etag}
+
+
+def test_patch_snapshot_applies_mutation_with_if_match():
+    s3 = MagicMock()
+    s3.get_object.return_value = _stored({'spaceId': 's1', 'nodes': {}})
+
+    assert tree_snapshot.patch_snapshot(s3, 'bucket', 's1', tree_snapshot.upsert_nodes([
+        {'nodeId': 'n1', 'title': 'Root', 'orderIndex': 0}
+    ]))
+
+    put_kwargs = s3.put_object.call_args.kwargs
+    assert put_kwargs['IfMatch'] == '"e1"'
+    assert json.loads(put_kwargs['Body'])['nodes']['n1'] == {'title': 'Root', 'parentNodeId': None, 'orderIndex': 0}
+
+
+def test_patch_snapshot_ignores_missing_snapshot():
+    s3 = MagicMock()
+    s3.get_object.side_effect = _client_error('NoSuchKey')
+
+    assert not tree_snapshot.patch_snapshot(s3, 'bucket', 's1', tree_snapshot.remove_nodes(['n1']))
+    s3.put_object.assert_not_called()
+
+
+def test_patch_snapshot_invalidates_after_repeated_conflicts():
+    s3 = MagicMock()
+    s3.get_object.side_effect = lambda **kwargs: _stored({'spaceId': 's1', 'nodes': {}})
+    s3.put_object.side_effect = _client_error('PreconditionFailed')
+
+    assert not tree_snapshot.patch_snapshot(s3, 'bucket', 's1', tree_snapshot.remove_nodes(['n1']))
+    assert s3.put_object.call_count == tree_snapshot.PATCH_RETRIES
+    s3.delete_object.assert_called_once_with(Bucket='bucket', Key='snapshots/s1/tree.json')
+
+
+def test_check_consistency_reports_differences():
+    doc = {'nodes': {
+        'a': {'title': 'A', 'parentNodeId': None, 'orderIndex': 0},
+        'b': {'title': 'Old', 'parentNodeId': 'a', 'orderIndex': 0},
+        'stale': {'title': 'Gone', 'parentNodeId': None, 'orderIndex': 1},
+    }}
+    live = [
+        {'nodeId': 'a', 'title': 'A', 'orderIndex': 0},
+        {'nodeId': 'b', 'title': 'New', 'parentNodeId': 'a', 'orderIndex': 0},
+        {'nodeId': 'c', 'title': 'C', 'parentNodeId': 'a', 'orderIndex': 1},
+    ]
+
+    report = tree_snapshot.check_consistency(doc, live)
+
+    assert not report['consistent']
+    assert report['missing'] == ['c']
+    assert report['extra'] == ['stale']
+    assert report['mismatched'] == [{'nodeId': 'b', 'differences': {'title': {'snapshot': 'Old', 'live': 'New'}}}]
+
+
+def test_versioned_patch_applies_only_on_top_of_previous_version():
+    s3 = MagicMock()
+    s3.get_object.side_effect = lambda **kwargs: _stored({'spaceId': 's1', 'treeVersion': 4, 'nodes': {}})
+
+    assert tree_snapshot.patch_snapshot(s3, 'bucket', 's1', tree_snapshot.remove_nodes([]), version=5)
+    assert json.loads(s3.put_object.call_args.kwargs['Body'])['treeVersion'] == 5
+
+    s3.reset_mock()
+    # Already includes version 4: nothing to do
+    assert not tree_snapshot.patch_snapshot(s3, 'bucket', 's1', tree_snapshot.remove_nodes([]), version=4)
+    s3.put_object.assert_not_called()
+    s3.delete_object.assert_not_called()
+
+    # Missed version 5: the snapshot can no longer be trusted
+    assert not tree_snapshot.patch_snapshot(s3, 'bucket', 's1', tree_snapshot.remove_nodes([]), version=6)
+    s3.delete_object.assert_called_once()
+
+
+def test_remove_nodes_takes_descendants_along():
+    nodes = {
+        'a': {'title': 'A', 'parentNodeId': None, 'orderIndex': 0},
+        'b': {'title': 'B', 'parentNodeId': 'a', 'orderIndex': 0},
+        'c': {'title': 'C', 'parentNodeId': 'b', 'orderIndex': 0},
+        'd': {'title': 'D', 'parentNodeId': None, 'orderIndex': 1},
+    }
+
+    tree_snapshot.remove_nodes(['a'])(nodes)
+
+    assert list(nodes) == ['d']